@@ -0,0 +1,160 @@
+"""
+Compresión de respuestas (gzip / brotli) y archivos estáticos precomprimidos.
+
+CompresionMiddleware
+  - Negocia con Accept-Encoding (respeta q=0): brotli si el paquete `brotli`
+    está instalado y el cliente lo acepta, si no gzip.
+  - Solo comprime tipos de texto (JSON, HTML, JS, CSS, SVG...) y a partir de
+    COMPRESION_MIN_BYTES; las respuestas chicas se mandan tal cual (el costo
+    de comprimir no se recupera en la red).
+  - No toca respuestas que ya traen Content-Encoding (estáticos
+    precomprimidos), 304/204, ni text/event-stream (debe fluir sin buffer).
+  - Niveles moderados (gzip 6, brotli 4): las respuestas son dinámicas y se
+    comprimen en cada request. Los estáticos van precomprimidos al máximo
+    desde el build (vite.config.ts).
+
+respuesta_estatica(ruta, accept_encoding)
+  - Sirve `ruta.br` / `ruta.gz` si existen y el cliente los acepta.
+  - Archivos de assets/ con hash en el nombre (assets/index-3f2a9c1b.js) son
+    inmutables: Cache-Control de un año. El resto (index.html, public/) se
+    revalida siempre.
+"""
+import mimetypes
+import os
+import re
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depende del entorno
+    brotli = None
+
+COMPRESION_MIN_BYTES = int(os.environ.get("COMPRESION_MIN_BYTES", "1024"))
+NIVEL_GZIP = 6
+CALIDAD_BROTLI = 4
+
+_TIPOS_COMPRIMIBLES = ("application/json", "text/", "application/javascript", "image/svg+xml",
+                       "application/xml", "application/manifest+json")
+_TIPOS_EXCLUIDOS = ("text/event-stream",)
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+# Nombres que genera Vite en assets/: <nombre>-<hash de 8 caracteres>.<ext>
+_CON_HASH = re.compile(r"(^|[\\/])assets[\\/][^\\/]+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+
+
+def elegir_codificacion(accept_encoding: Optional[str], disponibles=None) -> Optional[str]:
+    """La codificación preferida por el cliente entre las disponibles ("br", "gzip") o None."""
+    if not accept_encoding:
+        return None
+    disponibles = disponibles if disponibles is not None else (("br", "gzip") if brotli else ("gzip",))
+    pesos: dict = {}
+    for parte in accept_encoding.split(","):
+        nombre, _, params = parte.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        pesos[nombre.strip().lower()] = q
+    candidatas = [(pesos.get(c, pesos.get("*", 0.0)), -i, c) for i, c in enumerate(disponibles)]
+    q, _, mejor = max(candidatas, default=(0.0, 0, None))
+    return mejor if q > 0 else None
+
+
+def _comprimible(headers: Headers) -> bool:
+    tipo = headers.get("content-type", "").lower()
+    return (not tipo.startswith(_TIPOS_EXCLUIDOS)) and tipo.startswith(_TIPOS_COMPRIMIBLES)
+
+
+class _Compresor:
+    def __init__(self, codificacion: str):
+        if codificacion == "br":
+            self._c = brotli.Compressor(quality=CALIDAD_BROTLI)
+            self._comprimir, self._terminar = self._c.process, self._c.finish
+        else:
+            self._c = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # formato gzip
+            self._comprimir, self._terminar = self._c.compress, self._c.flush
+
+    def bloque(self, datos: bytes, final: bool) -> bytes:
+        salida = self._comprimir(datos) if datos else b""
+        return salida + self._terminar() if final else salida
+
+
+class CompresionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESION_MIN_BYTES) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacion = elegir_codificacion(Headers(scope=scope).get("accept-encoding"))
+        if codificacion is None:
+            await self.app(scope, receive, send)
+            return
+
+        inicial: Message = {}
+        estado = {"decidido": False, "compresor": None}
+
+        async def enviar(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                inicial.update(message)  # se manda hasta saber si se comprime
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if not estado["decidido"]:
+                estado["decidido"] = True
+                headers = MutableHeaders(raw=inicial["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                comprimir = (
+                    inicial["status"] not in (204, 304) and "content-encoding" not in headers
+                    and _comprimible(headers) and (more_body or len(body) >= self.minimum_size)
+                )
+                if not comprimir:
+                    await send(inicial)
+                    await send(message)
+                    return
+                estado["compresor"] = _Compresor(codificacion)
+                headers["Content-Encoding"] = codificacion
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                salida = estado["compresor"].bloque(body, final=not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(salida))
+                await send(inicial)
+                await send({"type": "http.response.body", "body": salida, "more_body": more_body})
+                return
+            if estado["compresor"] is None:
+                await send(message)
+                return
+            await send({"type": "http.response.body", "more_body": more_body,
+                        "body": estado["compresor"].bloque(body, final=not more_body)})
+
+        await self.app(scope, receive, enviar)
+
+
+# ── Estáticos precomprimidos ──────────────────────────────────────────────────
+
+def respuesta_estatica(ruta: str, accept_encoding: Optional[str]) -> FileResponse:
+    """FileResponse de `ruta`, usando su variante .br/.gz si existe y el cliente la acepta."""
+    tipo = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+    cache = CACHE_INMUTABLE if _CON_HASH.search(ruta) else CACHE_REVALIDAR
+    headers = {"Cache-Control": cache, "Vary": "Accept-Encoding"}
+    disponibles = tuple(c for c, ext in (("br", ".br"), ("gzip", ".gz")) if os.path.isfile(ruta + ext))
+    codificacion = elegir_codificacion(accept_encoding, disponibles) if disponibles else None
+    if codificacion:
+        headers["Content-Encoding"] = codificacion
+        return FileResponse(ruta + (".br" if codificacion == "br" else ".gz"), media_type=tipo, headers=headers)
+    return FileResponse(ruta, media_type=tipo, headers=headers)
@@ -0,0 +1,60 @@
+"""
+ETag / If-None-Match para los GET de analytics.
+
+    @router.get("/{restaurante_id}/...", dependencies=[Depends(etag_guard("ventas", "gastos"))])
+
+El ETag sale de las versiones de datos del restaurante (services/data_versions.py):
+una sola lectura de data_versions. Si el cliente manda el mismo ETag en
+If-None-Match se contesta 304 sin ejecutar el endpoint, y por lo tanto sin
+tocar cierres, gastos ni nómina.
+"""
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import models
+from ..services import data_versions
+from .auth import get_optional_user
+
+
+def _coincide(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: W/"x" y "x" son el mismo validador
+    valor = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if (candidato[2:] if candidato.startswith("W/") else candidato) == valor:
+            return True
+    return False
+
+
+def etag_guard(*dominios: str):
+    """Dependencia que fija ETag y contesta 304 si los dominios no han cambiado."""
+    desconocidos = set(dominios) - set(data_versions.DOMINIOS)
+    if desconocidos:
+        raise ValueError(f"Dominios de datos desconocidos: {sorted(desconocidos)}")
+
+    def _guard(
+        restaurante_id: int,
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db),
+        current_user: Optional[models.Usuario] = Depends(get_optional_user),
+    ) -> None:
+        # Sin acceso al restaurante: que el endpoint conteste su 403 normal
+        if current_user is not None and current_user.rol != "SUPER_ADMIN" \
+                and current_user.restaurante_id != restaurante_id:
+            return
+        recurso = request.url.path + ("?" + request.url.query if request.url.query else "")
+        etag = data_versions.etag(db, restaurante_id, dominios, recurso)
+        if _coincide(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+
+    return _guard
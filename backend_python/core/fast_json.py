@@ -0,0 +1,135 @@
+"""
+Serialización rápida de listas grandes.
+
+Con `response_model=List[X]` FastAPI convierte cada objeto ORM a un modelo
+Pydantic, lo valida y lo vuelve a serializar con jsonable_encoder + json.
+Para listas de miles de filas eso domina el tiempo de respuesta.
+
+Aquí, por ruta (opt-in):
+
+    @app.get("/api/gastos", response_model=List[schemas.GastoResponse])
+    def listar_gastos(...):
+        return fast_json.lista(query, schemas.GastoResponse)
+
+  - Se seleccionan solo las columnas de los campos del schema (tuplas, sin
+    instanciar objetos ORM) y se serializan directo a bytes con orjson.
+  - El response_model del decorador se conserva: el esquema OpenAPI no cambia
+    (FastAPI no revalida cuando el endpoint regresa un Response).
+  - Relaciones anidadas (List[...] del schema) se cargan con una consulta por
+    relación (IN por bloques), no una por fila.
+
+orjson es opcional: sin él se usa json de la librería estándar con el mismo
+formato de salida.
+"""
+import enum
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+_BLOQUE_IN = 900  # parámetros por IN (SQLite limita el número de variables)
+
+
+def _default(obj: Any):
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"{type(obj).__name__} no es serializable a JSON")
+
+
+def dumps(contenido: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(contenido, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(contenido, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serializada con orjson (o json si no está instalado)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# ── Filas de un schema ────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=None)
+def _plan(modelo, schema) -> tuple:
+    """
+    (campos escalares, columnas, anidados) del schema sobre el modelo.
+    anidados: [(campo, modelo_hijo, schema_hijo, fk_hijo)] para List[...] de relaciones.
+    """
+    from sqlalchemy import inspect as sa_inspect
+
+    mapper = sa_inspect(modelo)
+    campos, columnas, anidados = [], [], []
+    for nombre, info in schema.model_fields.items():
+        if nombre in mapper.relationships:
+            rel = mapper.relationships[nombre]
+            hijo = getattr(info.annotation, "__args__", (None,))[0]
+            fk = rel.mapper.get_property_by_column(next(iter(rel.remote_side))).key
+            anidados.append((nombre, rel.mapper.class_, hijo, fk))
+        elif nombre in mapper.column_attrs:
+            campos.append(nombre)
+            columnas.append(getattr(modelo, nombre))
+        else:
+            raise ValueError(f"{schema.__name__}.{nombre} no es columna ni relación de {modelo.__name__}")
+    return tuple(campos), tuple(columnas), tuple(anidados)
+
+
+def filas(query, schema) -> list:
+    """Dicts con los campos de `schema` para cada fila de `query` (un Query del ORM sobre un modelo)."""
+    modelo = query.column_descriptions[0]["entity"]
+    campos, columnas, anidados = _plan(modelo, schema)
+    if anidados and "id" not in campos:
+        raise ValueError(f"{schema.__name__} necesita 'id' para cargar relaciones anidadas")
+    resultado = [dict(zip(campos, fila)) for fila in query.with_entities(*columnas)]
+    if anidados and resultado:
+        db = query.session
+        ids = [r["id"] for r in resultado]
+        for nombre, modelo_hijo, schema_hijo, fk in anidados:
+            h_campos, h_columnas, _ = _plan(modelo_hijo, schema_hijo)
+            col_fk = getattr(modelo_hijo, fk)
+            por_padre: dict = {i: [] for i in ids}
+            for i in range(0, len(ids), _BLOQUE_IN):
+                q = db.query(col_fk, *h_columnas).filter(col_fk.in_(ids[i:i + _BLOQUE_IN])).order_by(modelo_hijo.id)
+                for padre, *valores in q:
+                    por_padre[padre].append(dict(zip(h_campos, valores)))
+            for r in resultado:
+                r[nombre] = por_padre[r["id"]]
+    return resultado
+
+
+def respuesta(contenido: Any, response: Optional[Response] = None) -> FastJSONResponse:
+    """
+    FastJSONResponse de `contenido`. Si el endpoint recibe `response: Response`,
+    se pasan sus headers (p. ej. el ETag que fija core/etag.py), que FastAPI
+    descarta cuando el endpoint regresa su propio Response.
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return FastJSONResponse(contenido, headers=headers)
+
+
+def lista(query, schema, response: Optional[Response] = None) -> FastJSONResponse:
+    """Respuesta JSON de `query` con la forma de List[schema], sin pasar por Pydantic."""
+    return respuesta(filas(query, schema), response)
+
+
+def lista_paginada(query, schema, pagina, llaves, request=None) -> FastJSONResponse:
+    """Una página de `query` (core/paginacion.Pagina) con el cursor siguiente en los headers."""
+    resultado = pagina.cerrar(filas(pagina.aplicar(query, llaves), schema), query)
+    return FastJSONResponse(resultado, headers=pagina.headers(request))
@@ -0,0 +1,135 @@
+"""
+Paginación por llave (keyset) con cursores opacos para los listados.
+
+    pagina = paginacion.Pagina.de_params("gastos", cursor, limit, incluir_total)
+    if pagina is None:
+        ...  # cliente sin cursor ni limit: respuesta completa, como antes
+    q = pagina.aplicar(query, (models.Gasto.fecha, models.Gasto.id))
+    filas = fast_json.filas(q, schemas.GastoResponse)
+    filas = pagina.cerrar(filas, query)
+    return FastJSONResponse(filas, headers=pagina.headers())
+
+  - Orden descendente por las llaves (fecha, id); la última llave debe ser
+    única. La página siguiente filtra "llave < última llave vista", así que el
+    costo no crece con la profundidad (a diferencia de OFFSET) y las filas
+    nuevas no desplazan páginas ya leídas.
+  - El cursor es base64url de las llaves de la última fila + el recurso;
+    un cursor de otro listado es 400 INVALID_CURSOR.
+  - limit se recorta a PAGINA_MAX (env PAGINA_MAX, default 500).
+  - El total (X-Total-Count) solo se cuenta con incluir_total=true.
+  - Los listados siguen regresando una lista: la página siguiente va en los
+    headers X-Next-Cursor y Link (rel="next"), así el response_model y los
+    clientes actuales no cambian. Sin cursor ni limit se regresa todo, como
+    antes, hasta que los clientes migren.
+"""
+import base64
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Optional, Sequence
+from urllib.parse import urlencode
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+PAGINA_MAX = int(os.environ.get("PAGINA_MAX", "500"))
+HEADERS_EXPUESTOS = ["X-Next-Cursor", "X-Total-Count", "Link", "ETag"]
+
+
+def _cursor_invalido() -> HTTPException:
+    return HTTPException(status_code=400, detail={"detail": "Cursor inválido", "code": "INVALID_CURSOR"})
+
+
+def _a_json(valor: Any):
+    if isinstance(valor, datetime):
+        return {"dt": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"d": valor.isoformat()}
+    return valor
+
+
+def _de_json(valor: Any):
+    if isinstance(valor, dict):
+        if "dt" in valor:
+            return datetime.fromisoformat(valor["dt"])
+        if "d" in valor:
+            return date.fromisoformat(valor["d"])
+        raise ValueError(valor)
+    return valor
+
+
+def encode_cursor(recurso: str, valores: Sequence) -> str:
+    raw = json.dumps([recurso, [_a_json(v) for v in valores]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(recurso: str, cursor: str, n_llaves: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        de, valores = json.loads(raw)
+        if de != recurso or len(valores) != n_llaves:
+            raise ValueError(de)
+        return [_de_json(v) for v in valores]
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise _cursor_invalido()
+
+
+def _despues_de(llaves: Sequence, valores: Sequence):
+    """(k1, k2, ..., kn) < (v1, v2, ..., vn) en orden lexicográfico, como OR de prefijos iguales."""
+    condiciones = []
+    for i, (col, valor) in enumerate(zip(llaves, valores)):
+        iguales = [llaves[j] == valores[j] for j in range(i)]
+        condiciones.append(and_(*iguales, col < valor))
+    return or_(*condiciones)
+
+
+def _valor(fila, col) -> Any:
+    return fila[col.key] if isinstance(fila, dict) else getattr(fila, col.key)
+
+
+class Pagina:
+
+    def __init__(self, recurso: str, cursor: Optional[str], limit: int, incluir_total: bool):
+        self.recurso = recurso
+        self.cursor = cursor
+        self.limit = max(1, min(limit, PAGINA_MAX))
+        self.incluir_total = incluir_total
+        self.siguiente: Optional[str] = None
+        self.total: Optional[int] = None
+        self._llaves: tuple = ()
+
+    @classmethod
+    def de_params(cls, recurso: str, cursor: Optional[str], limit: Optional[int],
+                  incluir_total: bool = False, limit_default: int = 100) -> Optional["Pagina"]:
+        """None si el cliente no pidió paginar (ni cursor ni limit): modo compatible."""
+        if cursor is None and limit is None:
+            return None
+        return cls(recurso, cursor, limit or limit_default, incluir_total)
+
+    def aplicar(self, query, llaves: Sequence):
+        """Filtra después del cursor, ordena por llaves desc y pide limit+1 filas."""
+        self._llaves = tuple(llaves)
+        if self.cursor:
+            query = query.filter(_despues_de(self._llaves, decode_cursor(self.recurso, self.cursor, len(llaves))))
+        return query.order_by(None).order_by(*(c.desc() for c in self._llaves)).limit(self.limit + 1)
+
+    def cerrar(self, filas: list, query_total=None) -> list:
+        """Recorta la fila de sobra, arma el cursor siguiente y (si se pidió) cuenta el total."""
+        if len(filas) > self.limit:
+            filas = filas[:self.limit]
+            self.siguiente = encode_cursor(self.recurso, [_valor(filas[-1], c) for c in self._llaves])
+        if self.incluir_total and query_total is not None:
+            self.total = query_total.order_by(None).count()
+        return filas
+
+    def headers(self, request=None) -> dict:
+        headers = {}
+        if self.siguiente:
+            headers["X-Next-Cursor"] = self.siguiente
+            if request is not None:
+                params = dict(request.query_params)
+                params.update(cursor=self.siguiente, limit=str(self.limit))
+                headers["Link"] = f'<{request.url.path}?{urlencode(params)}>; rel="next"'
+        if self.total is not None:
+            headers["X-Total-Count"] = str(self.total)
+        return headers
@@ -1,7 +1,13 @@
-import pdfplumber
 import re
 from datetime import date
 
+from .services.parse_cache import parse_cache
+from .services.pdf_document import PDFDocument
+from .services.proveedor_matcher import default_matcher
+
+# Subir cuando cambie la lógica de parseo — invalida el cache de resultados
+PARSER_VERSION = "1"
+
 PROVEEDOR_MAP = {
     "BUENA TIERRA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS", "metodo": "EFECTIVO"},
     "CESAR HUMBERTO CARRANZA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS", "metodo": "EFECTIVO"},
@@ -15,12 +21,9 @@ PROVEEDOR_MAP = {
     "KUME IMPORTACIONES": {"nombre": "KUME", "categoria": "PRODUCTOS_ASIATICOS", "metodo": "TRANSFERENCIA"},
 }
 
-def detect_proveedor(text):
-    text_upper = text.upper()
-    for key, info in PROVEEDOR_MAP.items():
-        if key.upper() in text_upper:
-            return info
-    return None
+def detect_proveedor(text, matcher=None):
+    """Proveedor del texto en una sola pasada (matcher del restaurante o PROVEEDOR_MAP)."""
+    return (matcher or default_matcher(PROVEEDOR_MAP)).match(text)
 
 def extract_total(text):
     """Busca el total en el texto de la factura"""
@@ -69,8 +72,16 @@ def extract_items(text):
             items.append({"desc": m.group(1).strip(), "monto": m.group(2)})
     return items
 
-def parse_factura_pdf(file_bytes):
-    """Parsea un PDF de factura y extrae datos"""
+def cache_version(matcher=None):
+    """Versión para parse_cache: cambia con el parser y con el catálogo de proveedores."""
+    return f"{PARSER_VERSION}:{(matcher or default_matcher(PROVEEDOR_MAP)).fingerprint}"
+
+def parse_factura_pdf(file_bytes, matcher=None):
+    """Parsea un PDF de factura y extrae datos (cacheado por hash del contenido)"""
+    return parse_cache.get_or_parse("factura", cache_version(matcher), file_bytes,
+                                    lambda: parse_factura_pdf_uncached(file_bytes, matcher))
+
+def parse_factura_pdf_uncached(file_bytes, matcher=None):
     result = {
         "proveedor": None,
         "categoria": None,
@@ -84,30 +95,21 @@ def parse_factura_pdf(file_bytes):
     }
     
     try:
-        import io
-        pdf = pdfplumber.open(io.BytesIO(file_bytes))
-        full_text = ""
-        for page in pdf.pages:
-            t = page.extract_text()
-            if t:
-                full_text += t + "\n"
-            # Tambien extraer tablas
-            tables = page.extract_tables()
-            for table in tables:
-                for row in table:
-                    if row:
-                        full_text += " ".join([str(c) for c in row if c]) + "\n"
-        pdf.close()
+        # Texto + filas de tablas, con el PDF abierto una sola vez
+        with PDFDocument(file_bytes) as doc:
+            full_text = doc.text_with_tables()
         
         if not full_text.strip():
             return result
         
         # Detectar proveedor
-        prov_info = detect_proveedor(full_text)
+        prov_info = detect_proveedor(full_text, matcher)
         if prov_info:
             result["proveedor"] = prov_info["nombre"]
             result["categoria"] = prov_info["categoria"]
-            result["metodo_pago"] = prov_info["metodo"]
+            result["metodo_pago"] = prov_info.get("metodo", result["metodo_pago"])
+            if prov_info.get("proveedor_id"):
+                result["proveedor_id"] = prov_info["proveedor_id"]
             result["confianza"] = 0.9
         
         # Extraer fecha
@@ -2,11 +2,10 @@
 KOI Dashboard - API Principal
 """
 from fastapi import FastAPI, Request, Depends, HTTPException, UploadFile, File, Query, status, BackgroundTasks
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 import os
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm import Session
 from sqlalchemy import func, extract, cast, String
 import os as _os
 _USE_PG = bool(_os.environ.get("DATABASE_URL"))
@@ -31,15 +30,13 @@ def _sum_filtered(db, model_col, date_col, mes, anio, extra_filter=None):
 
 
 from typing import List, Optional
-from datetime import date, datetime, timedelta
-import csv
-import pdfplumber
-import io
+from datetime import date, timedelta
 import os
-import re
 
 from . import models, schemas
 from .database import engine, get_db
+from .core import fast_json, paginacion
+from .core.compresion import CompresionMiddleware, respuesta_estatica
 from .core.auth import get_optional_user, get_restaurante_id
 from .routers.auth_router import router as auth_router
 from .routers.restaurantes_router import router as restaurantes_router
@@ -52,6 +49,19 @@ from .routers.proveedores_analytics_router import router as proveedores_analytic
 from .routers.flujo_caja_router import router as flujo_caja_router
 from .routers.rbs_router import router as rbs_router
 from .routers.propinas_router import router as propinas_router
+from .routers.conciliacion_router import router as conciliacion_router
+from .routers.dashboard_router import router as dashboard_router
+from .routers.eventos_router import router as eventos_router
+from .routers.proveedores_canonicos_router import router as proveedores_canonicos_router
+from .services.parse_cache import parse_cache
+from .services import parse_executor
+from .services.parse_executor import ParseTimeoutError, run_parse, run_parse_cached
+from .services.gastos_pdf_parser import PROV_MAP as OCR_PROV_MAP, ocr_cache_version, parse_bitacora_pdf, parse_ocr_pdf
+from .services import proveedor_matcher, resumen_dashboard
+from .services.importadores import (
+    hash_movimiento, importar_movimientos, importar_ventas, iter_movimientos_csv, iter_movimientos_pdf,
+    parse_ventas_csv,
+)
 
 models.Base.metadata.create_all(bind=engine)
 
@@ -227,6 +237,99 @@ try:
 except Exception as e:
     print(f"Migracion documentos_empleado: {e}")
 
+# Migracion: agregar rfc a proveedores (detección de proveedor por RFC)
+try:
+    _insp_prov = _inspect(engine)
+    _cols_prov = [c['name'] for c in _insp_prov.get_columns('proveedores')]
+    if 'rfc' not in _cols_prov:
+        with engine.begin() as _conn_prov:
+            _conn_prov.execute(_text("ALTER TABLE proveedores ADD COLUMN rfc VARCHAR(20)"))
+            print("Columna rfc agregada a proveedores")
+except Exception as e:
+    print(f"Migracion proveedores.rfc: {e}")
+
+# Migracion: llave natural de movimientos_banco (dedup al reimportar estados de cuenta)
+try:
+    _insp_mb = _inspect(engine)
+    _cols_mb = [c['name'] for c in _insp_mb.get_columns('movimientos_banco')]
+    if 'hash_natural' not in _cols_mb:
+        with engine.begin() as _conn_mb:
+            _conn_mb.execute(_text("ALTER TABLE movimientos_banco ADD COLUMN hash_natural VARCHAR(40)"))
+            # Backfill: solo la primera copia de movimientos ya duplicados recibe la llave
+            _vistos_mb = set()
+            _filas_mb = _conn_mb.execute(_text(
+                "SELECT id, restaurante_id, fecha, referencia, monto, saldo FROM movimientos_banco ORDER BY id"
+            )).fetchall()
+            for _f in _filas_mb:
+                _fecha_mb = _f.fecha if isinstance(_f.fecha, date) else date.fromisoformat(str(_f.fecha)[:10])
+                _h = hash_movimiento(_f.restaurante_id, _fecha_mb, _f.referencia, _f.monto, _f.saldo)
+                if _h in _vistos_mb:
+                    continue
+                _vistos_mb.add(_h)
+                _conn_mb.execute(_text("UPDATE movimientos_banco SET hash_natural = :h WHERE id = :id"), {"h": _h, "id": _f.id})
+            _conn_mb.execute(_text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_movimientos_banco_hash_natural ON movimientos_banco (hash_natural)"
+            ))
+            print(f"Columna hash_natural agregada a movimientos_banco ({len(_vistos_mb)} llaves)")
+except Exception as e:
+    print(f"Migracion movimientos_banco.hash_natural: {e}")
+
+# Migracion: columnas de conciliación en movimientos_banco
+try:
+    _cols_mbc = [c['name'] for c in _inspect(engine).get_columns('movimientos_banco')]
+    with engine.begin() as _conn_mbc:
+        for _col_mbc, _tipo_mbc in [("conciliacion_tipo", "VARCHAR(20)"), ("conciliacion_ref_id", "INTEGER"),
+                                    ("conciliacion_confianza", "FLOAT")]:
+            if _col_mbc not in _cols_mbc:
+                _conn_mbc.execute(_text(f"ALTER TABLE movimientos_banco ADD COLUMN {_col_mbc} {_tipo_mbc}"))
+                print(f"Columna {_col_mbc} agregada a movimientos_banco")
+except Exception as e:
+    print(f"Migracion movimientos_banco conciliacion: {e}")
+
+# Migracion: índices para paginar gastos por llave (restaurante, fecha, id)
+try:
+    with engine.begin() as _conn_ix:
+        _conn_ix.execute(_text(
+            "CREATE INDEX IF NOT EXISTS ix_gastos_restaurante_fecha_id ON gastos (restaurante_id, fecha, id)"
+        ))
+        _conn_ix.execute(_text(
+            "CREATE INDEX IF NOT EXISTS ix_gastos_diarios_cierre_id ON gastos_diarios (cierre_id, id)"
+        ))
+except Exception as e:
+    print(f"Migracion indices gastos: {e}")
+
+# Migracion: proveedor_key (clave normalizada, indexada) en gastos y gastos_diarios + backfill
+try:
+    for _tabla_pk, _ix_pk in (
+        ("gastos", "ix_gastos_restaurante_proveedor_key_fecha ON gastos (restaurante_id, proveedor_key, fecha)"),
+        ("gastos_diarios", "ix_gastos_diarios_restaurante_proveedor_key ON gastos_diarios (restaurante_id, proveedor_key)"),
+    ):
+        _cols_pk = [c['name'] for c in _inspect(engine).get_columns(_tabla_pk)]
+        with engine.begin() as _conn_pk:
+            if "proveedor_key" not in _cols_pk:
+                _conn_pk.execute(_text(f"ALTER TABLE {_tabla_pk} ADD COLUMN proveedor_key VARCHAR(100)"))
+                print(f"Columna proveedor_key agregada a {_tabla_pk}")
+            _conn_pk.execute(_text(f"CREATE INDEX IF NOT EXISTS {_ix_pk}"))
+            # La clave se calcula en Python (upper() de SQLite no convierte acentos)
+            _pend_pk = _conn_pk.execute(_text(
+                f"SELECT id, proveedor FROM {_tabla_pk} WHERE proveedor_key IS NULL AND TRIM(proveedor) <> ''"
+            )).fetchall()
+            if _pend_pk:
+                _conn_pk.execute(_text(f"UPDATE {_tabla_pk} SET proveedor_key = :k WHERE id = :id"),
+                                 [{"k": models.clave_proveedor(_p), "id": _i} for _i, _p in _pend_pk])
+                print(f"proveedor_key: {len(_pend_pk)} filas de {_tabla_pk} actualizadas")
+except Exception as e:
+    print(f"Migracion proveedor_key: {e}")
+
+# Migracion: índice de ventas_diarias por restaurante y fecha (resumen de inicio)
+try:
+    with engine.begin() as _conn_ixv:
+        _conn_ixv.execute(_text(
+            "CREATE INDEX IF NOT EXISTS ix_ventas_diarias_restaurante_fecha ON ventas_diarias (restaurante_id, fecha)"
+        ))
+except Exception as e:
+    print(f"Migracion indice ventas_diarias: {e}")
+
 # Auto-seed categorias si tabla vacia
 try:
     from sqlalchemy.orm import Session as _Session
@@ -494,7 +597,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=paginacion.HEADERS_EXPUESTOS,
 )
+app.add_middleware(CompresionMiddleware)
 
 app.include_router(auth_router)
 app.include_router(restaurantes_router)
@@ -507,79 +612,51 @@ app.include_router(proveedores_analytics_router)
 app.include_router(flujo_caja_router)
 app.include_router(rbs_router)
 app.include_router(propinas_router)
+app.include_router(conciliacion_router)
+app.include_router(dashboard_router)
+app.include_router(eventos_router)
+app.include_router(proveedores_canonicos_router)
 
-UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
-os.makedirs(os.path.join(UPLOADS_DIR, "documentos"), exist_ok=True)
 
+@app.exception_handler(ParseTimeoutError)
+async def _parse_timeout_handler(request: Request, exc: ParseTimeoutError):
+    return JSONResponse(status_code=504, content={"detail": str(exc), "code": "PARSE_TIMEOUT"})
 
-def parse_money(value: str) -> float:
-    if not value or value.strip() == "-":
-        return 0.0
-    cleaned = re.sub(r'[$,\s"]', '', value.strip())
-    try:
-        return float(cleaned)
-    except ValueError:
-        return 0.0
+
+@app.on_event("shutdown")
+def _shutdown_parse_pool():
+    parse_executor.shutdown()
+
+UPLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads")
+os.makedirs(os.path.join(UPLOADS_DIR, "documentos"), exist_ok=True)
 
 
 @app.post("/api/ventas/importar-csv", status_code=status.HTTP_201_CREATED)
-def importar_csv_ventas(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def importar_csv_ventas(file: UploadFile = File(...), restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
     try:
-        content = file.file.read().decode("utf-8")
-        reader = csv.reader(io.StringIO(content))
-        rows = list(reader)
+        ventas, registros_saltados = parse_ventas_csv(file.file)
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Error leyendo CSV: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error leyendo CSV: {str(e)}")
-    header_row_idx = None
-    for i, row in enumerate(rows):
-        if len(row) > 0 and row[0].strip() == "FECHA":
-            header_row_idx = i
-            break
-    if header_row_idx is None:
-        raise HTTPException(status_code=400, detail="No se encontro la seccion de detalle diario")
-    registros_creados = 0
-    registros_saltados = 0
-    for row in rows[header_row_idx + 1:]:
-        if len(row) < 15:
-            continue
-        fecha_str = row[0].strip()
-        if not fecha_str or fecha_str == "-":
-            continue
-        try:
-            fecha = datetime.strptime(fecha_str, "%d-%b-%Y").date()
-        except ValueError:
-            continue
-        existing = db.query(models.VentaDiaria).filter(models.VentaDiaria.fecha == fecha).first()
-        valores = [row[i].strip() for i in range(3, 15)]
-        if all(v == "-" or v == "" for v in valores):
-            registros_saltados += 1
-            continue
-        venta = models.VentaDiaria(
-            fecha=fecha, mes=row[1].strip().lower(),
-            semana=int(row[2].strip()) if row[2].strip().isdigit() else 0,
-            efectivo=parse_money(row[3]), prop_ef=parse_money(row[4]),
-            pay=parse_money(row[5]), prop_pa=parse_money(row[6]),
-            terminales=parse_money(row[7]), prop_te=parse_money(row[8]),
-            uber_eats=parse_money(row[9]), rappi=parse_money(row[10]),
-            cortesias=parse_money(row[11]), otros_ingresos=parse_money(row[12]),
-            total_venta=parse_money(row[13]), total_propina=parse_money(row[14]),
-        )
-        if existing:
-            for key in ['mes','semana','efectivo','prop_ef','pay','prop_pa','terminales','prop_te','uber_eats','rappi','cortesias','otros_ingresos','total_venta','total_propina']:
-                setattr(existing, key, getattr(venta, key))
-        else:
-            db.add(venta)
-        registros_creados += 1
     try:
-        db.commit()
+        res = importar_ventas(db, ventas, restaurante_id)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error guardando: {str(e)}")
-    return {"mensaje": "Importacion completada", "registros_importados": registros_creados, "registros_saltados": registros_saltados}
+    return {
+        "mensaje": "Importacion completada",
+        "registros_importados": res["creados"] + res["actualizados"],
+        "registros_creados": res["creados"],
+        "registros_actualizados": res["actualizados"],
+        "registros_saltados": registros_saltados,
+    }
 
 
 @app.get("/api/ventas", response_model=List[schemas.VentaDiariaResponse])
-def get_ventas(mes: Optional[str] = None, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, db: Session = Depends(get_db)):
+def get_ventas(request: Request, mes: Optional[str] = None, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), incluir_total: bool = False, db: Session = Depends(get_db)):
     query = db.query(models.VentaDiaria)
     if mes:
         query = query.filter(models.VentaDiaria.mes == mes.lower())
@@ -587,7 +664,11 @@ def get_ventas(mes: Optional[str] = None, fecha_inicio: Optional[date] = None, f
         query = query.filter(models.VentaDiaria.fecha >= fecha_inicio)
     if fecha_fin:
         query = query.filter(models.VentaDiaria.fecha <= fecha_fin)
-    return query.order_by(models.VentaDiaria.fecha.desc()).all()
+    pagina = paginacion.Pagina.de_params("ventas", cursor, limit, incluir_total)
+    if pagina:
+        return fast_json.lista_paginada(query, schemas.VentaDiariaResponse, pagina,
+                                        (models.VentaDiaria.fecha, models.VentaDiaria.id), request)
+    return fast_json.lista(query.order_by(models.VentaDiaria.fecha.desc()), schemas.VentaDiariaResponse)
 
 
 @app.post("/api/cierre-turno", response_model=schemas.CierreTurnoResponse, status_code=status.HTTP_201_CREATED)
@@ -701,7 +782,7 @@ def listar_cierres(mes: Optional[int] = None, anio: Optional[int] = None, limit:
         query = query.filter(extract("month", models.CierreTurno.fecha) == mes, extract("year", models.CierreTurno.fecha) == anio)
     if restaurante_id is not None:
         query = query.filter(models.CierreTurno.restaurante_id == restaurante_id)
-    return query.order_by(models.CierreTurno.fecha.desc()).limit(limit).all()
+    return fast_json.lista(query.order_by(models.CierreTurno.fecha.desc()).limit(limit), schemas.CierreTurnoResponse)
 
 
 @app.get("/api/cierre-turno/ultimo-saldo/final")
@@ -757,7 +838,7 @@ def crear_gasto(gasto: schemas.GastoCreate, db: Session = Depends(get_db)):
 
 
 @app.get("/api/gastos", response_model=List[schemas.GastoResponse])
-def listar_gastos(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, categoria: Optional[str] = None, restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
+def listar_gastos(request: Request, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, categoria: Optional[str] = None, restaurante_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), incluir_total: bool = False, db: Session = Depends(get_db)):
     query = db.query(models.Gasto)
     if fecha_inicio:
         query = query.filter(models.Gasto.fecha >= fecha_inicio)
@@ -767,7 +848,10 @@ def listar_gastos(fecha_inicio: Optional[date] = None, fecha_fin: Optional[date]
         query = query.filter(models.Gasto.categoria == categoria)
     if restaurante_id is not None:
         query = query.filter(models.Gasto.restaurante_id == restaurante_id)
-    return query.order_by(models.Gasto.fecha.desc()).all()
+    pagina = paginacion.Pagina.de_params("gastos", cursor, limit, incluir_total)
+    if pagina:
+        return fast_json.lista_paginada(query, schemas.GastoResponse, pagina, (models.Gasto.fecha, models.Gasto.id), request)
+    return fast_json.lista(query.order_by(models.Gasto.fecha.desc()), schemas.GastoResponse)
 
 
 
@@ -970,151 +1054,36 @@ def eliminar_comision_config(
 
 
 @app.post("/api/gastos/parse-factura")
-async def parse_factura(file: UploadFile = File(...)):
+async def parse_factura(file: UploadFile = File(...), restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Solo se aceptan archivos PDF")
     contents = await file.read()
-    from backend_python.factura_parser import parse_factura_pdf
-    result = parse_factura_pdf(contents)
+    from backend_python.factura_parser import PROVEEDOR_MAP, cache_version, parse_factura_pdf_uncached
+    # Con restaurante_id se detecta contra sus proveedores, alias y RFCs
+    matcher = proveedor_matcher.get_matcher(db, restaurante_id, PROVEEDOR_MAP) if restaurante_id else None
+    result = await run_parse_cached("factura", cache_version(matcher), contents, parse_factura_pdf_uncached, contents, matcher)
     return result
 
 @app.post("/api/gastos/ocr")
-async def ocr_gasto(file: UploadFile = File(...)):
+async def ocr_gasto(file: UploadFile = File(...), restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
     contents = await file.read()
     ext = os.path.splitext(file.filename or "")[1].lower()
     
     if ext == ".pdf":
-        # Intentar con pdfplumber
+        matcher = proveedor_matcher.get_matcher(db, restaurante_id, OCR_PROV_MAP) if restaurante_id else None
+        # Re-subidas del mismo PDF salen del cache por hash de contenido
         try:
-            import pdfplumber, io, re as _re
-            pdf = pdfplumber.open(io.BytesIO(contents))
-            full_text = ""
-            for page in pdf.pages:
-                t = page.extract_text()
-                if t:
-                    full_text += t + "\n"
-                tables = page.extract_tables()
-                for table in tables:
-                    for row in table:
-                        if row:
-                            full_text += " ".join([str(c) for c in row if c]) + "\n"
-            pdf.close()
-            
-            if len(full_text.strip()) < 20:
-                raise HTTPException(status_code=422, detail="El PDF no contiene texto extraible. Sube un PDF con texto, no una imagen escaneada.")
-            
-            # Detectar proveedor
-            PROV_MAP = {
-                "BUENA TIERRA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS"},
-                "CESAR HUMBERTO CARRANZA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS"},
-                "COMERCIAL TOYO": {"nombre": "TOYO", "categoria": "PRODUCTOS_ASIATICOS"},
-                "TOYO": {"nombre": "TOYO", "categoria": "PRODUCTOS_ASIATICOS"},
-                "EL NAVEGANTE": {"nombre": "EL NAVEGANTE", "categoria": "PROTEINA"},
-                "MARIA ISABEL HERNANDEZ": {"nombre": "EL NAVEGANTE", "categoria": "PROTEINA"},
-                "VACA NEGRA": {"nombre": "VACA NEGRA", "categoria": "PROTEINA"},
-                "ALIMENTOS Y CARNES": {"nombre": "VACA NEGRA", "categoria": "PROTEINA"},
-                "KUME": {"nombre": "KUME", "categoria": "PRODUCTOS_ASIATICOS"},
-                "KUME IMPORTACIONES": {"nombre": "KUME", "categoria": "PRODUCTOS_ASIATICOS"},
-                "FREKO": {"nombre": "FREKO", "categoria": "ABARROTES"},
-                "WALMART": {"nombre": "WALMART", "categoria": "ABARROTES"},
-                "SAMS": {"nombre": "SAMS", "categoria": "ABARROTES"},
-                "COSTCO": {"nombre": "COSTCO", "categoria": "ABARROTES"},
-                "AMAZON": {"nombre": "AMAZON", "categoria": "DESECHABLES_EMPAQUES"},
-                "MERCADO LIBRE": {"nombre": "MERCADO LIBRE", "categoria": "EQUIPO"},
-                "FEMSA": {"nombre": "FEMSA", "categoria": "BEBIDAS"},
-            }
-            
-            text_upper = full_text.upper()
-            proveedor = None
-            categoria = "OTROS"
-            for key, info in PROV_MAP.items():
-                if key.upper() in text_upper:
-                    proveedor = info["nombre"]
-                    categoria = info["categoria"]
-                    break
-            
-            # Extraer total
-            total = None
-            for pattern in [r"TOTAL[:\s]*\$?\s*([\d,]+\.\d{2})", r"Total[:\s]*\$?\s*([\d,]+\.\d{2})", r"TOTAL\s+\$([\d,]+\.\d{2})"]:
-                m = _re.search(pattern, full_text)
-                if m:
-                    total = float(m.group(1).replace(",", ""))
-                    break
-            
-            # Extraer fecha
-            fecha = None
-            for pattern in [r"(\d{4}-\d{2}-\d{2})", r"(\d{1,2}/\d{1,2}/\d{4})", r"Fecha[:\s]*(\d{4}-\d{2}-\d{2})"]:
-                m = _re.search(pattern, full_text)
-                if m:
-                    d = m.group(1)
-                    if "-" in d and len(d) == 10:
-                        fecha = d
-                    elif "/" in d:
-                        parts = d.split("/")
-                        if len(parts) == 3 and len(parts[2]) == 4:
-                            fecha = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
-                    break
-            
-            # Extraer descripcion de conceptos
-            lines = [l.strip() for l in full_text.split("\n") if len(l.strip()) > 5]
-            keywords = ["SALMON","CARNE","NEW YORK","ATUN","CAMARON","SAKE","MIRIN","NARANJA","AGUACATE","LIMON","PEPINO","NORI","SESAME","ZANAHORIA","CEBOLL"]
-            desc_items = [l for l in lines if any(kw in l.upper() for kw in keywords)]
-            descripcion = "; ".join(desc_items[:3]) if desc_items else None
-            
-            # Extraer items individuales de la tabla
-            items = []
-            for line in full_text.split("\n"):
-                # Buscar patron: cantidad + unidad + descripcion + precio + importe
-                import re as _re2
-                m = _re2.match(r"^\s*(\d+(?:\.\d+)?)\s+(?:KGM|KG|H87|PZA|Pieza|L)\s+(.+?)\s+(\d[\d,]*\.\d{2})\s*$", line.strip())
-                if m:
-                    cant = m.group(1)
-                    desc = m.group(2).strip()
-                    # Quitar ClaveProdServ
-                    desc = _re.sub(r"ClaveProdServ\s*-\s*\d+", "", desc).strip()
-                    importe = float(m.group(3).replace(",",""))
-                    if importe > 0 and len(desc) > 2:
-                        items.append({"descripcion": desc, "monto": importe, "categoria": categoria})
-            
-            # Si no encontramos items con regex, intentar con tablas de pdfplumber
-            if not items:
-                try:
-                    pdf2 = pdfplumber.open(io.BytesIO(contents))
-                    for page in pdf2.pages:
-                        tables = page.extract_tables()
-                        for table in tables:
-                            for row in table:
-                                if row and len(row) >= 4:
-                                    try:
-                                        last_val = str(row[-1] or "").replace(",","").replace("$","").strip()
-                                        importe = float(last_val)
-                                        desc_parts = [str(c) for c in row[1:-1] if c and not str(c).replace(".","").replace(",","").isdigit()]
-                                        desc = " ".join(desc_parts).strip()
-                                        desc = _re.sub(r"ClaveProdServ\s*-\s*\d+", "", desc).strip()
-                                        if importe > 0 and len(desc) > 2 and importe < (total or 999999):
-                                            items.append({"descripcion": desc, "monto": importe, "categoria": categoria})
-                                    except:
-                                        pass
-                    pdf2.close()
-                except:
-                    pass
-            
-            return {
-                "fecha": fecha,
-                "proveedor": proveedor,
-                "categoria": categoria,
-                "total": total,
-                "descripcion": descripcion,
-                "confianza": 0.8 if proveedor else 0.3,
-                "items": items,
-            }
-        except HTTPException:
-            raise
-        except Exception as e:
-            raise HTTPException(status_code=422, detail=f"Error procesando PDF: {str(e)}")
+            return await run_parse_cached("ocr", ocr_cache_version(matcher), contents, parse_ocr_pdf, contents, matcher)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
     else:
         raise HTTPException(status_code=422, detail="Solo se aceptan archivos PDF por ahora.")
 
+@app.get("/api/parse-cache/stats")
+def parse_cache_stats():
+    """Métricas del cache de parseo (hit rate, evicciones, entradas en memoria)."""
+    return parse_cache.stats()
+
 @app.get("/api/pl/{mes}/{anio}")
 def calcular_pl(mes: int, anio: int, db: Session = Depends(get_db)):
     # Ventas desde CierreTurno
@@ -1261,26 +1230,15 @@ def calcular_distribucion(mes: int, anio: int, db: Session = Depends(get_db)):
 
 
 @app.get("/api/dashboard/resumen", response_model=schemas.DashboardResumen)
-def get_dashboard(db: Session = Depends(get_db)):
-    hoy = date.today()
-    vh = db.query(func.sum(models.VentaDiaria.total_venta)).filter(models.VentaDiaria.fecha == hoy).scalar() or 0.0
-    ayer = hoy - timedelta(days=1)
-    va = db.query(func.sum(models.VentaDiaria.total_venta)).filter(models.VentaDiaria.fecha == ayer).scalar() or 0.0
-    ca = ((vh - va) / va * 100) if va > 0 else None
-    is_ = hoy - timedelta(days=hoy.weekday())
-    vs = db.query(func.sum(models.VentaDiaria.total_venta)).filter(models.VentaDiaria.fecha >= is_, models.VentaDiaria.fecha <= hoy).scalar() or 0.0
-    vm = db.query(func.sum(models.VentaDiaria.total_venta)).filter(extract("month", models.VentaDiaria.fecha) == hoy.month, extract("year", models.VentaDiaria.fecha) == hoy.year).scalar() or 0.0
-    gp = db.query(func.count(models.CuentaPorPagar.id)).filter(models.CuentaPorPagar.estado_pago == models.EstadoPago.PENDIENTE).scalar() or 0
-    uc = db.query(models.CierreTurno).order_by(models.CierreTurno.fecha.desc()).first()
-    ec = None
-    ua = None
-    if uc:
-        if uc.estado:
-            ec = uc.estado.value
-            if uc.estado != models.EstadoArqueo.CUADRADA and uc.diferencia:
-                ec += f" ({'+' if uc.diferencia > 0 else ''}{uc.diferencia:.2f})"
-        ua = str(uc.fecha)
-    return schemas.DashboardResumen(ventas_hoy=vh, ventas_semana=vs, ventas_mes=vm, cambio_vs_ayer=ca, gastos_pendientes=gp, estado_caja=ec, ultimo_arqueo=ua)
+def get_dashboard(
+    restaurante_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    """Resumen de inicio del restaurante (parámetro o el del usuario); sin ninguno, global como antes."""
+    if restaurante_id is None and current_user is not None:
+        restaurante_id = get_restaurante_id(current_user)
+    return schemas.DashboardResumen(**resumen_dashboard.get_resumen(db, restaurante_id))
 
 
 @app.get("/api/reportes/ventas-por-canal")
@@ -1301,120 +1259,39 @@ def ventas_diarias_reporte(mes: Optional[int] = None, anio: Optional[int] = None
 
 
 @app.post("/api/banco/upload")
-def upload_estado_cuenta(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    import tempfile, os
-    registros = 0
+def upload_estado_cuenta(file: UploadFile = File(...), restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
     filename = file.filename or ""
-    raw = file.file.read()
-    
-    # Detectar si es PDF o CSV
-    if filename.lower().endswith(".pdf") or raw[:5] == b"%PDF-":
-        # Parser PDF Santander
-        import re as re_mod
-        try:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                tmp.write(raw)
-                tmp_path = tmp.name
-            with pdfplumber.open(tmp_path) as pdf:
-                for page in pdf.pages:
-                    table = page.extract_table()
-                    if not table:
-                        continue
-                    for row in table:
-                        if not row or len(row) < 8:
-                            continue
-                        # Limpiar saltos de linea en todas las celdas
-                        row = [(c or "").replace("\n", "").replace("\r", "").strip() for c in row]
-                        # Col 0=Cuenta, 1=Fecha, 2=Hora, 3=Sucursal, 4=Desc, 5=Cargo, 6=Abono, 7=Saldo, 8=Ref, 9=Concepto, 10=DescLarga
-                        fecha_raw = row[1].replace(" ", "").replace("\n", "")
-                        # Saltar header
-                        if not fecha_raw or "echa" in fecha_raw.lower():
-                            continue
-                        # Fecha viene como DDMMYYYY (8 digitos) ej: 03022026
-                        digits = re_mod.sub(r"[^0-9]", "", fecha_raw)
-                        if len(digits) < 8:
-                            continue
-                        try:
-                            dia = int(digits[:2])
-                            mes_num = int(digits[2:4])
-                            anio_num = int(digits[4:8])
-                            if anio_num < 2000 or anio_num > 2099 or mes_num < 1 or mes_num > 12 or dia < 1 or dia > 31:
-                                continue
-                            from datetime import date as date_cls
-                            fecha = date_cls(anio_num, mes_num, dia)
-                        except (ValueError, IndexError):
-                            continue
-                        hora = row[2] if len(row) > 2 else ""
-                        descripcion = row[4] if len(row) > 4 else ""
-                        cargo = parse_money(row[5]) if len(row) > 5 else 0.0
-                        abono = parse_money(row[6]) if len(row) > 6 else 0.0
-                        saldo_val = parse_money(row[7]) if len(row) > 7 else None
-                        referencia = row[8] if len(row) > 8 else None
-                        concepto = row[9] if len(row) > 9 else descripcion
-                        desc_larga = row[10] if len(row) > 10 else None
-                        if cargo > 0:
-                            monto, tipo = cargo, models.TipoMovimientoBanco.CARGO
-                        elif abono > 0:
-                            monto, tipo = abono, models.TipoMovimientoBanco.ABONO
-                        else:
-                            continue
-                        mov = models.MovimientoBanco(
-                            fecha=fecha, referencia=referencia, concepto=concepto,
-                            monto=monto, tipo=tipo, saldo=saldo_val
-                        )
-                        db.add(mov)
-                        registros += 1
-            os.unlink(tmp_path)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error procesando PDF: {str(e)}")
-    else:
-        # Parser CSV original
-        try:
-            text = raw.decode("utf-8", errors="replace")
-            reader = csv.reader(io.StringIO(text))
-            rows = list(reader)
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error: {str(e)}")
-        for row in rows:
-            if len(row) < 4:
-                continue
-            try:
-                fecha = None
-                for fmt in ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"]:
-                    try:
-                        fecha = datetime.strptime(row[0].strip(), fmt).date()
-                        break
-                    except ValueError:
-                        continue
-                if not fecha:
-                    continue
-                ref = row[1].strip() if len(row) > 1 else None
-                con = row[2].strip() if len(row) > 2 else ""
-                cargo_val = parse_money(row[3]) if len(row) > 3 else 0.0
-                abono_val = parse_money(row[4]) if len(row) > 4 else 0.0
-                saldo_val = parse_money(row[5]) if len(row) > 5 else None
-                if cargo_val > 0:
-                    monto, tipo = cargo_val, models.TipoMovimientoBanco.CARGO
-                elif abono_val > 0:
-                    monto, tipo = abono_val, models.TipoMovimientoBanco.ABONO
-                else:
-                    continue
-                db.add(models.MovimientoBanco(fecha=str(fecha), referencia=ref, concepto=con, monto=monto, tipo=tipo, saldo=saldo_val))
-                registros += 1
-            except (ValueError, IndexError):
-                continue
-    db.commit()
-    return {"mensaje": f"Se importaron {registros} movimientos", "importados": registros}
+    stream = file.file
+    es_pdf = filename.lower().endswith(".pdf") or stream.read(5) == b"%PDF-"
+    stream.seek(0)
+
+    # Detectar si es PDF (Santander) o CSV; ambos se leen en streaming y se insertan por bloques
+    try:
+        movimientos = iter_movimientos_pdf(stream) if es_pdf else iter_movimientos_csv(stream)
+        res = importar_movimientos(db, movimientos, restaurante_id)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Error procesando {'PDF' if es_pdf else 'CSV'}: {str(e)}")
+    return {
+        "mensaje": f"Se importaron {res['importados']} movimientos ({res['duplicados']} duplicados omitidos)",
+        **res,
+    }
 
 
 @app.get("/api/banco/movimientos", response_model=List[schemas.MovimientoBancoResponse])
-def listar_movimientos_banco(mes: Optional[int] = None, anio: Optional[int] = None, solo_sin_reconciliar: bool = False, db: Session = Depends(get_db)):
+def listar_movimientos_banco(request: Request, mes: Optional[int] = None, anio: Optional[int] = None, solo_sin_reconciliar: bool = False, restaurante_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), incluir_total: bool = False, db: Session = Depends(get_db)):
     q = db.query(models.MovimientoBanco)
+    if restaurante_id:
+        q = q.filter(models.MovimientoBanco.restaurante_id == restaurante_id)
     if mes and anio:
         q = q.filter(extract("month", models.MovimientoBanco.fecha) == mes, extract("year", models.MovimientoBanco.fecha) == anio)
     if solo_sin_reconciliar:
         q = q.filter(models.MovimientoBanco.reconciliado == False)
-    return q.order_by(models.MovimientoBanco.fecha.desc()).all()
+    pagina = paginacion.Pagina.de_params("banco_movimientos", cursor, limit, incluir_total)
+    if pagina:
+        return fast_json.lista_paginada(q, schemas.MovimientoBancoResponse, pagina,
+                                        (models.MovimientoBanco.fecha, models.MovimientoBanco.id), request)
+    return fast_json.lista(q.order_by(models.MovimientoBanco.fecha.desc()), schemas.MovimientoBancoResponse)
 
 
 @app.post("/api/proveedores", response_model=schemas.ProveedorResponse, status_code=201)
@@ -1426,11 +1303,37 @@ def crear_proveedor(prov: schemas.ProveedorCreate, db: Session = Depends(get_db)
     return db_prov
 
 @app.get("/api/proveedores", response_model=List[schemas.ProveedorResponse])
-def listar_proveedores(restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
+def listar_proveedores(request: Request, restaurante_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), incluir_total: bool = False, db: Session = Depends(get_db)):
     query = db.query(models.Proveedor).filter(models.Proveedor.activo == True)
     if restaurante_id is not None:
         query = query.filter(models.Proveedor.restaurante_id == restaurante_id)
-    return query.all()
+    pagina = paginacion.Pagina.de_params("proveedores", cursor, limit, incluir_total)
+    if pagina:
+        return fast_json.lista_paginada(query, schemas.ProveedorResponse, pagina, (models.Proveedor.id,), request)
+    return fast_json.lista(query, schemas.ProveedorResponse)
+
+@app.get("/api/proveedores/{prov_id}/aliases", response_model=List[schemas.ProveedorAliasResponse])
+def listar_aliases_proveedor(prov_id: int, db: Session = Depends(get_db)):
+    return db.query(models.ProveedorAlias).filter(models.ProveedorAlias.proveedor_id == prov_id).all()
+
+@app.post("/api/proveedores/{prov_id}/aliases", response_model=schemas.ProveedorAliasResponse, status_code=201)
+def crear_alias_proveedor(prov_id: int, data: schemas.ProveedorAliasCreate, db: Session = Depends(get_db)):
+    prov = db.query(models.Proveedor).filter(models.Proveedor.id == prov_id).first()
+    if not prov:
+        raise HTTPException(status_code=404, detail="Proveedor no encontrado")
+    alias = proveedor_matcher.registrar_alias(db, prov, data.alias, tipo=data.tipo, origen="MANUAL")
+    db.commit()
+    db.refresh(alias)
+    return alias
+
+@app.delete("/api/proveedores/aliases/{alias_id}")
+def eliminar_alias_proveedor(alias_id: int, db: Session = Depends(get_db)):
+    alias = db.query(models.ProveedorAlias).filter(models.ProveedorAlias.id == alias_id).first()
+    if not alias:
+        raise HTTPException(status_code=404, detail="Alias no encontrado")
+    db.delete(alias)
+    db.commit()
+    return {"mensaje": "Alias eliminado"}
 
 @app.post("/api/empleados", response_model=schemas.EmpleadoResponse, status_code=201)
 def crear_empleado(emp: schemas.EmpleadoCreate, db: Session = Depends(get_db)):
@@ -1446,11 +1349,14 @@ def crear_empleado(emp: schemas.EmpleadoCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/empleados", response_model=List[schemas.EmpleadoResponse])
-def listar_empleados(restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
-    query = db.query(models.Empleado).filter(models.Empleado.activo == True).options(selectinload(models.Empleado.documentos))
+def listar_empleados(request: Request, restaurante_id: Optional[int] = None, cursor: Optional[str] = None, limit: Optional[int] = Query(None, ge=1), incluir_total: bool = False, db: Session = Depends(get_db)):
+    query = db.query(models.Empleado).filter(models.Empleado.activo == True)
     if restaurante_id is not None:
         query = query.filter(models.Empleado.restaurante_id == restaurante_id)
-    return query.all()
+    pagina = paginacion.Pagina.de_params("empleados", cursor, limit, incluir_total)
+    if pagina:
+        return fast_json.lista_paginada(query, schemas.EmpleadoResponse, pagina, (models.Empleado.id,), request)
+    return fast_json.lista(query, schemas.EmpleadoResponse)
 
 @app.post("/api/nomina", response_model=schemas.NominaPagoResponse, status_code=201)
 def registrar_pago_nomina(pago: schemas.NominaPagoCreate, db: Session = Depends(get_db)):
@@ -1467,25 +1373,14 @@ def listar_nomina(restaurante_id: Optional[int] = None, meses: int = 3, db: Sess
     q = db.query(models.NominaPago).filter(models.NominaPago.fecha_pago >= cutoff)
     if restaurante_id is not None:
         q = q.filter(models.NominaPago.restaurante_id == restaurante_id)
-    pagos = q.order_by(models.NominaPago.fecha_pago.desc()).all()
-    result = []
-    for p in pagos:
-        emp = db.query(models.Empleado).filter(models.Empleado.id == p.empleado_id).first()
-        result.append({
-            "id": p.id,
-            "empleado_id": p.empleado_id,
-            "empleado_nombre": emp.nombre if emp else None,
-            "empleado_puesto": emp.puesto if emp else None,
-            "periodo_inicio": str(p.periodo_inicio),
-            "periodo_fin": str(p.periodo_fin),
-            "salario_base": p.salario_base,
-            "horas_extra": p.horas_extra,
-            "deducciones": p.deducciones,
-            "neto_pagado": p.neto_pagado,
-            "fecha_pago": str(p.fecha_pago),
-            "restaurante_id": p.restaurante_id,
-        })
-    return result
+    NP, E = models.NominaPago, models.Empleado
+    filas = q.outerjoin(E, E.id == NP.empleado_id).with_entities(
+        NP.id, NP.empleado_id, E.nombre, E.puesto, NP.periodo_inicio, NP.periodo_fin, NP.salario_base,
+        NP.horas_extra, NP.deducciones, NP.neto_pagado, NP.fecha_pago, NP.restaurante_id,
+    ).order_by(NP.fecha_pago.desc())
+    campos = ("id", "empleado_id", "empleado_nombre", "empleado_puesto", "periodo_inicio", "periodo_fin",
+              "salario_base", "horas_extra", "deducciones", "neto_pagado", "fecha_pago", "restaurante_id")
+    return fast_json.respuesta([dict(zip(campos, f)) for f in filas])
 
 @app.post("/api/nomina/semana", status_code=201)
 def registrar_nomina_semana(data: schemas.NominaSemanaCreate, db: Session = Depends(get_db)):
@@ -1660,268 +1555,11 @@ async def actualizar_propinas(cierre_id: int, request: Request, db: Session = De
 
 @app.post("/api/gastos/importar-bitacora")
 async def importar_bitacora(file: UploadFile = File(...)):
-    import pdfplumber, io, re as _re
-    from collections import defaultdict
     contents = await file.read()
-
     try:
-        with pdfplumber.open(io.BytesIO(contents)) as _pdf:
-            pagina_p1 = _pdf.pages[0] if _pdf.pages else None
-            pagina_p2 = _pdf.pages[1] if len(_pdf.pages) > 1 else None
-            texto_p1 = pagina_p1.extract_text() or "" if pagina_p1 else ""
-            texto_p2 = pagina_p2.extract_text() or "" if pagina_p2 else ""
-            texto_completo = texto_p1 + "\n" + texto_p2
-    except Exception as e:
-        raise HTTPException(status_code=422, detail=f"Error leyendo PDF: {str(e)}")
-
-    # ── Metadata from text ────────────────────────────────────────────────
-    responsable = "Sin responsable"
-    fecha = None
-    MESES_NUM = {"ENERO":"01","FEBRERO":"02","MARZO":"03","ABRIL":"04","MAYO":"05",
-                 "JUNIO":"06","JULIO":"07","AGOSTO":"08","SEPTIEMBRE":"09",
-                 "OCTUBRE":"10","NOVIEMBRE":"11","DICIEMBRE":"12"}
-    for ln in texto_p1.split("\n")[:10]:
-        lu = ln.strip().upper()
-        if "RESPONSABLE:" in lu:
-            responsable = ln.split(":", 1)[-1].strip()
-        elif "FECHA:" in lu:
-            fm = _re.search(r"FECHA[:\s]*\w+\s+(\d{1,2})\s+(\w+)\s+(\d{4})", lu)
-            if fm:
-                dia, mes_txt, anio = fm.group(1).zfill(2), fm.group(2), fm.group(3)
-                fecha = f"{anio}-{MESES_NUM.get(mes_txt,'01')}-{dia}"
-
-    # ── Category helpers ──────────────────────────────────────────────────
-    CATEGORIAS_KOI = [
-        "COMIDA PERSONAL", "ENTREGA DE UTILIDADES", "PRODUCTOS ASIATICOS",
-        "DESECHABLES EMPAQUES", "VEGETALES FRUTAS", "LIMPIEZA MANTTO",
-        "COMISIONES BANCARIAS", "COMISIONES PLATAFORMAS", "ABARROTES",
-        "BEBIDAS", "PERSONAL", "PROPINAS", "PROTEINA", "MARKETING",
-        "MANTENIMIENTO", "SERVICIOS", "PAPELERIA", "EQUIPO", "OTROS",
-        "ESTACIONAMIENTO", "LUZ", "NOMINA", "RENTA",
-    ]
-    CAT_MAP = {
-        "COMISIONES PLATAFORMAS": "COMISIONES_PLATAFORMAS",
-        "COMISIONES BANCARIAS":   "COMISIONES_BANCARIAS",
-        "ENTREGA DE UTILIDADES":  "OTROS",
-        "DESECHABLES EMPAQUES":   "DESECHABLES_EMPAQUES",
-        "VEGETALES FRUTAS":       "VEGETALES_FRUTAS",
-        "PRODUCTOS ASIATICOS":    "PRODUCTOS_ASIATICOS",
-        "COMIDA PERSONAL":        "PERSONAL",
-        "LIMPIEZA MANTTO":        "LIMPIEZA_MANTTO",
-        "ESTACIONAMIENTO":        "SERVICIOS",
-        "MANTENIMIENTO":          "LIMPIEZA_MANTTO",
-        "ABARROTES":              "ABARROTES",
-        "PROTEINA":               "PROTEINA",
-        "BEBIDAS":                "BEBIDAS",
-        "PROPINAS":               "PROPINAS",
-        "MARKETING":              "MARKETING",
-        "SERVICIOS":              "SERVICIOS",
-        "PERSONAL":               "PERSONAL",
-        "PAPELERIA":              "PAPELERIA",
-        "EQUIPO":                 "EQUIPO",
-        "NOMINA":                 "NOMINA",
-        "IMPUESTOS":              "IMPUESTOS",
-        "RENTA":                  "RENTA",
-        "LUZ":                    "LUZ",
-        "SOFTWARE":               "SOFTWARE",
-        "OTROS":                  "OTROS",
-    }
-
-    def extraer_categoria(texto: str) -> str:
-        t = texto.upper()
-        for cat in sorted(CATEGORIAS_KOI, key=len, reverse=True):
-            if cat in t:
-                return cat
-        return "OTROS"
-
-    def map_categoria(raw: str) -> str:
-        return CAT_MAP.get(raw, "OTROS")
-
-    def limpiar_monto(s: str) -> float:
-        try:
-            return float(str(s or "").replace("$", "").replace(",", "").strip())
-        except Exception:
-            return 0.0
-
-    def make_gasto(proveedor: str, clase: str, categoria_raw: str,
-                   comprobante: str, descripcion: str, monto: float) -> dict:
-        proveedor = _re.sub(r"\s*\(.*?\)\s*", " ", proveedor).strip().strip("/, ").upper()
-        proveedor = " ".join(proveedor.split())
-        INVALID = {"MP", "NMP", "TICKET", "VALE", "TOTAL", ""}
-        valido = bool(proveedor) and proveedor not in INVALID and len(proveedor.split()) <= 5
-        return {
-            "fecha":              fecha or str(date.today()),
-            "proveedor":          proveedor[:80] or "DESCONOCIDO",
-            "clase":              clase if clase in ("MP", "NMP") else "NMP",
-            "categoria":          map_categoria(categoria_raw),
-            "categoria_bitacora": categoria_raw,
-            "monto":              monto,
-            "metodo_pago":        "EFECTIVO",
-            "comprobante":        comprobante if comprobante in ("TICKET","VALE","FACTURA","TRANSFERENCIA","RECIBO") else "VALE",
-            "descripcion":        str(descripcion or "")[:200],
-            "valido":             valido,
-            "advertencias":       [] if valido else ["Proveedor no identificado"],
-        }
-
-    # ── INTENTO 1: extract_table() automático ─────────────────────────────
-    gastos_parsed: list = []
-    total_pdf = 0.0
-    tabla_ok = False
-
-    if pagina_p1:
-        for strategy in [None, {"vertical_strategy": "lines", "horizontal_strategy": "lines"}]:
-            tabla = pagina_p1.extract_table(strategy) if strategy else pagina_p1.extract_table()
-            if not tabla:
-                continue
-
-            # Find header row
-            enc_idx = None
-            for ri, row in enumerate(tabla):
-                row_str = " ".join(str(c or "").lower() for c in row)
-                if "proveedor" in row_str and "clase" in row_str:
-                    enc_idx = ri
-                    break
-            if enc_idx is None:
-                continue
-
-            enc = [str(c or "").lower().strip() for c in tabla[enc_idx]]
-            ci = lambda kw, default: next((i for i, c in enumerate(enc) if kw in c), default)
-            c_prov = ci("proveedor", 0); c_cls = ci("clase", 1)
-            c_cat  = ci("categ", 2);     c_cmp = ci("comprobante", 3)
-            c_desc = ci("descrip", 4);   c_mnt = ci("monto", 5)
-
-            def gc(row, idx):
-                return str(row[idx]).strip() if idx < len(row) and row[idx] else ""
-
-            for row in tabla[enc_idx + 1:]:
-                if not row or all(not (c or "").strip() for c in row):
-                    continue
-                prov = gc(row, c_prov)
-                if not prov or prov.upper() in ("PROVEEDOR",):
-                    continue
-                if "TOTAL" in prov.upper():
-                    m = _re.search(r"\$?([\d,]+)", gc(row, c_mnt) or prov)
-                    if m:
-                        total_pdf = float(m.group(1).replace(",", ""))
-                    break
-                monto = limpiar_monto(gc(row, c_mnt))
-                if monto <= 0:
-                    continue
-                cat_raw = extraer_categoria(gc(row, c_cat))
-                gastos_parsed.append(make_gasto(
-                    proveedor   = prov,
-                    clase       = gc(row, c_cls).upper(),
-                    categoria_raw = cat_raw,
-                    comprobante = gc(row, c_cmp).upper(),
-                    descripcion = gc(row, c_desc),
-                    monto       = monto,
-                ))
-
-            if gastos_parsed:
-                tabla_ok = True
-                break
-
-    # ── INTENTO 2: extract_words() por coordenadas x ──────────────────────
-    if not tabla_ok and pagina_p1:
-        words = pagina_p1.extract_words() or []
-
-        # Calibrate column x-positions from header words
-        header_x: dict = {}
-        for kw, key in [("proveedor","prov"),("clase","cls"),("categ","cat"),
-                        ("comprobante","cmp"),("descrip","desc"),("monto","mnt")]:
-            for w in words:
-                if kw in w["text"].lower() and key not in header_x:
-                    header_x[key] = w["x0"]
-
-        if len(header_x) >= 4:
-            col_keys  = ["prov","cls","cat","cmp","desc","mnt"]
-            col_x     = [header_x.get(k, 0) for k in col_keys]
-
-            def get_col(x: float) -> int:
-                best = 0
-                for ci2, cx in enumerate(col_x[1:], 1):
-                    if x >= cx:
-                        best = ci2
-                return best
-
-            y_inicio = max((w["top"] for w in words if "proveedor" in w["text"].lower()), default=0)
-            y_fin    = min((w["top"] for w in words if w["text"].upper() == "TOTAL"), default=pagina_p1.height)
-
-            filas: dict = defaultdict(lambda: defaultdict(list))
-            for w in words:
-                if w["top"] <= y_inicio or w["top"] >= y_fin:
-                    continue
-                y_key = round(w["top"] / 4) * 4
-                filas[y_key][get_col(w["x0"])].append(w["text"])
-
-            gasto_raw: dict = defaultdict(list)
-            for y_key in sorted(filas.keys()):
-                fila = filas[y_key]
-                # New gasto starts when col 0 (proveedor) AND col 1 (clase) have content
-                if 0 in fila and 1 in fila:
-                    if gasto_raw:
-                        prov  = " ".join(gasto_raw[0])
-                        cls_  = " ".join(gasto_raw[1]).upper()
-                        cat_t = " ".join(gasto_raw[2])
-                        cmp_  = " ".join(gasto_raw[3]).upper()
-                        desc  = " ".join(gasto_raw[4])
-                        mnt   = limpiar_monto(" ".join(gasto_raw[5]))
-                        if mnt > 0 and prov.upper() not in ("PROVEEDOR",):
-                            gastos_parsed.append(make_gasto(prov, cls_, extraer_categoria(cat_t), cmp_, desc, mnt))
-                    gasto_raw = defaultdict(list)
-                for col, ws in fila.items():
-                    gasto_raw[col].extend(ws)
-
-            # Flush last block
-            if gasto_raw:
-                prov  = " ".join(gasto_raw[0])
-                cls_  = " ".join(gasto_raw[1]).upper()
-                cat_t = " ".join(gasto_raw[2])
-                cmp_  = " ".join(gasto_raw[3]).upper()
-                desc  = " ".join(gasto_raw[4])
-                mnt   = limpiar_monto(" ".join(gasto_raw[5]))
-                if mnt > 0 and "TOTAL" not in prov.upper() and prov.upper() not in ("PROVEEDOR",):
-                    gastos_parsed.append(make_gasto(prov, cls_, extraer_categoria(cat_t), cmp_, desc, mnt))
-
-        # total_pdf from text if not found
-        m_tot = _re.search(r"\bTOTAL\b[^\d]*\$?([\d,]+)", texto_p1, _re.IGNORECASE)
-        if m_tot:
-            total_pdf = float(m_tot.group(1).replace(",", ""))
-
-    # ── Cierre del día ────────────────────────────────────────────────────
-    def _ev(pat: str) -> float:
-        m = _re.search(pat, texto_completo, _re.IGNORECASE)
-        return float(m.group(1).replace(",", "")) if m else 0.0
-
-    cierre_data = {
-        "saldo_inicial":       _ev(r"Saldo Inicial[:\s]*\$?([\d,]+)"),
-        "total_gastos":        _ev(r"Total Gastos[:\s]*\$?([\d,]+)"),
-        "ventas_efectivo":     _ev(r"Ventas en Efectivo[:\s]*\$?([\d,]+)"),
-        "saldo_final_esperado":_ev(r"Saldo Final Esperado[:\s]*\$?([\d,]+)"),
-        "efectivo_fisico":     _ev(r"Efectivo F[ií]sico[:\s]*\$?([\d,]+)"),
-        "diferencia":          _ev(r"Diferencia[:\s]*\$?([\d,]+)"),
-    }
-    if not any(cierre_data.values()):
-        cierre_data = None
-
-    if not total_pdf:
-        m_tot2 = _re.search(r"\bTOTAL\b[^\d]*\$?([\d,]+)", texto_completo, _re.IGNORECASE)
-        if m_tot2:
-            total_pdf = float(m_tot2.group(1).replace(",", ""))
-
-    total_extraido = round(sum(g["monto"] for g in gastos_parsed), 2)
-    coincide_total = abs(total_extraido - total_pdf) < 2.0 if total_pdf > 0 else None
-
-    return {
-        "fecha":          fecha,
-        "responsable":    responsable,
-        "gastos":         gastos_parsed,
-        "total_gastos":   total_extraido,
-        "total_pdf":      total_pdf,
-        "coincide_total": coincide_total,
-        "cierre":         cierre_data,
-        "gastos_count":   len(gastos_parsed),
-    }
+        return await run_parse(parse_bitacora_pdf, contents)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
 
 @app.get("/api/categorias", response_model=List[schemas.CategoriaResponse])
 def get_categorias(solo_activas: bool = True, restaurante_id: Optional[int] = None, db: Session = Depends(get_db)):
@@ -2486,13 +2124,17 @@ def desmarcar_obligacion_declarada(
     return {"ok": True}
 
 # Servir frontend en produccion
+# Los .br/.gz los genera el build (vite.config.ts); assets con hash → caché inmutable
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dist")
 if os.path.exists(frontend_path):
-    app.mount("/assets", StaticFiles(directory=os.path.join(frontend_path, "assets")), name="assets")
-    
+    _frontend_real = os.path.realpath(frontend_path)
+
     @app.get("/{full_path:path}")
-    async def serve_frontend(full_path: str):
-        file_path = os.path.join(frontend_path, full_path)
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            return FileResponse(file_path)
-        return FileResponse(os.path.join(frontend_path, "index.html"))
+    async def serve_frontend(full_path: str, request: Request):
+        file_path = os.path.realpath(os.path.join(frontend_path, full_path))
+        accept = request.headers.get("accept-encoding")
+        if file_path.startswith(_frontend_real + os.sep) and os.path.isfile(file_path):
+            return respuesta_estatica(file_path, accept)
+        if full_path.startswith("assets/"):
+            raise HTTPException(status_code=404, detail="Asset no encontrado")
+        return respuesta_estatica(os.path.join(frontend_path, "index.html"), accept)
@@ -3,10 +3,11 @@ KOI Dashboard - Modelos de Base de Datos
 """
 from sqlalchemy import (
     Column, Integer, String, Float, Date, DateTime, ForeignKey,
-    Boolean, Text, Enum as SQLEnum
+    Boolean, Text, Index, Enum as SQLEnum
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime, date
+from typing import Optional
 import enum
 
 from .database import Base
@@ -149,8 +150,21 @@ class CierreTurno(Base):
     propinas = relationship("PropinaDiaria", back_populates="cierre", cascade="all, delete-orphan")
 
 
+def clave_proveedor(nombre: Optional[str]) -> Optional[str]:
+    """Clave con que se agrupan los gastos por proveedor: mayúsculas y espacios colapsados."""
+    if not nombre:
+        return None
+    return " ".join(nombre.upper().split()) or None
+
+
+def _clave_proveedor_default(context):
+    # INSERTs por Core (insert(models.Gasto), importadores, scripts): se calcula del proveedor de la fila
+    return clave_proveedor(context.get_current_parameters().get("proveedor"))
+
+
 class GastoDiario(Base):
     __tablename__ = "gastos_diarios"
+    __table_args__ = (Index("ix_gastos_diarios_restaurante_proveedor_key", "restaurante_id", "proveedor_key"),)
     id = Column(Integer, primary_key=True, index=True)
     cierre_id = Column(Integer, ForeignKey("cierres_turno.id"), nullable=False)
     proveedor = Column(String(100), nullable=False)
@@ -162,8 +176,14 @@ class GastoDiario(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     catalogo_cuenta_id = Column(Integer, ForeignKey("catalogo_cuentas.id"), nullable=True)
     restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=True)
+    proveedor_key = Column(String(100), nullable=True, default=_clave_proveedor_default)
     cierre = relationship("CierreTurno", back_populates="gastos")
 
+    @validates("proveedor")
+    def _validar_proveedor(self, _campo, valor):
+        self.proveedor_key = clave_proveedor(valor)
+        return valor
+
 
 class PropinaDiaria(Base):
     __tablename__ = "propinas_diarias"
@@ -182,7 +202,32 @@ class Proveedor(Base):
     categoria_default = Column(String(50), nullable=False)
     activo = Column(Boolean, default=True)
     restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=True)
+    rfc = Column(String(20), nullable=True, index=True)
     cuentas = relationship("CuentaPorPagar", back_populates="proveedor")
+    aliases = relationship("ProveedorAlias", back_populates="proveedor", cascade="all, delete-orphan")
+
+
+class ProveedorAlias(Base):
+    """Nombres alternos / RFCs con que un proveedor aparece en facturas (manuales o aprendidos)."""
+    __tablename__ = "proveedor_aliases"
+    id = Column(Integer, primary_key=True, index=True)
+    restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=True, index=True)
+    proveedor_id = Column(Integer, ForeignKey("proveedores.id", ondelete="CASCADE"), nullable=False, index=True)
+    alias = Column(String(150), nullable=False)
+    tipo = Column(String(10), default="NOMBRE")     # NOMBRE | RFC
+    origen = Column(String(15), default="MANUAL")   # MANUAL | APRENDIDO
+    created_at = Column(DateTime, default=datetime.utcnow)
+    proveedor = relationship("Proveedor", back_populates="aliases")
+
+
+class ProveedorFusionDescartada(Base):
+    """Par de nombres de proveedor que la revisión marcó como distintos (no volver a sugerir)."""
+    __tablename__ = "proveedor_fusiones_descartadas"
+    id = Column(Integer, primary_key=True, index=True)
+    restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=False, index=True)
+    clave_a = Column(String(100), nullable=False)  # proveedor_key; clave_a < clave_b
+    clave_b = Column(String(100), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class CuentaPorPagar(Base):
@@ -200,6 +245,9 @@ class CuentaPorPagar(Base):
 
 class Gasto(Base):
     __tablename__ = "gastos"
+    __table_args__ = (
+        Index("ix_gastos_restaurante_proveedor_key_fecha", "restaurante_id", "proveedor_key", "fecha"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     fecha = Column(Date, nullable=False, index=True)
     proveedor = Column(String(100), nullable=False)
@@ -213,6 +261,12 @@ class Gasto(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     catalogo_cuenta_id = Column(Integer, ForeignKey("catalogo_cuentas.id"), nullable=True)
     restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=True)
+    proveedor_key = Column(String(100), nullable=True, default=_clave_proveedor_default)
+
+    @validates("proveedor")
+    def _validar_proveedor(self, _campo, valor):
+        self.proveedor_key = clave_proveedor(valor)
+        return valor
 
 
 class Empleado(Base):
@@ -290,6 +344,12 @@ class MovimientoBanco(Base):
     gasto_id = Column(Integer, ForeignKey("gastos.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     restaurante_id = Column(Integer, ForeignKey("restaurantes.id"), nullable=True)
+    # sha1 de (restaurante, fecha, referencia, monto, saldo) — evita duplicar al reimportar
+    hash_natural = Column(String(40), nullable=True, unique=True)
+    # Conciliación: documento al que se ligó el cargo (GASTO / TRANSFERENCIA / CXP)
+    conciliacion_tipo = Column(String(20), nullable=True)
+    conciliacion_ref_id = Column(Integer, nullable=True)
+    conciliacion_confianza = Column(Float, nullable=True)
 
 
 class PLMensual(Base):
@@ -426,6 +486,24 @@ class AuditLog(Base):
     ip_address = Column(String(45), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class DataVersion(Base):
+    """Versión por restaurante y dominio de datos; sube con cada escritura (ETags de analytics)."""
+    __tablename__ = "data_versions"
+    restaurante_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 = todos
+    dominio = Column(String(20), primary_key=True)  # ventas | gastos | nomina | catalogo | alertas
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class EventoCambio(Base):
+    """Eventos de cambio recientes para el canal SSE; cada worker los lee por id (puente entre procesos)."""
+    __tablename__ = "eventos_cambio"
+    __table_args__ = {"sqlite_autoincrement": True}  # ids nunca reutilizados: los lectores avanzan por id
+    id = Column(Integer, primary_key=True)
+    restaurante_id = Column(Integer, nullable=False, index=True)  # 0 = todos
+    tipo = Column(String(20), nullable=False)  # cierre | alerta | pl
+    datos = Column(Text, nullable=False)  # JSON compacto
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
 class DeclaracionFiscal(Base):
     __tablename__ = "declaraciones_fiscales"
     id = Column(Integer, primary_key=True, index=True)
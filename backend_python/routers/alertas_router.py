@@ -11,6 +11,8 @@ from pydantic import BaseModel
 from ..database import get_db
 from .. import models
 from ..core.auth import get_optional_user
+from ..core import paginacion
+from ..core.etag import etag_guard
 from ..jobs.alertas_job import alertas_job
 
 router = APIRouter(prefix="/api/alertas", tags=["alertas"])
@@ -32,25 +34,32 @@ def _ser_alerta(a: models.AlertaLog) -> dict:
     }
 
 
-# ── GET /api/alertas/{restaurante_id}/activas ────────────────────────────────
-@router.get("/{restaurante_id}/activas")
-def get_alertas_activas(
-    restaurante_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[models.Usuario] = Depends(get_optional_user),
-):
-    """Alertas no revisadas, ordenadas CRITICAL → WARNING → INFO."""
-    alertas = db.query(models.AlertaLog).filter(
+def _query_activas(db: Session, restaurante_id: int) -> List[models.AlertaLog]:
+    """Alertas no revisadas, de la más reciente a la más antigua."""
+    return db.query(models.AlertaLog).filter(
         models.AlertaLog.restaurante_id == restaurante_id,
         models.AlertaLog.revisada == False,
     ).order_by(models.AlertaLog.created_at.desc()).all()
 
+
+def _ordenar_por_severidad(alertas: List[models.AlertaLog]) -> list:
     alertas_sorted = sorted(alertas, key=lambda a: _SEV_ORDER.get(
         getattr(a, "severidad", "WARNING") or "WARNING", 1
     ))
     return [_ser_alerta(a) for a in alertas_sorted]
 
 
+# ── GET /api/alertas/{restaurante_id}/activas ────────────────────────────────
+@router.get("/{restaurante_id}/activas", dependencies=[Depends(etag_guard("alertas"))])
+def get_alertas_activas(
+    restaurante_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    """Alertas no revisadas, ordenadas CRITICAL → WARNING → INFO."""
+    return _ordenar_por_severidad(_query_activas(db, restaurante_id))
+
+
 # ── POST /api/alertas/{restaurante_id}/evaluar ───────────────────────────────
 @router.post("/{restaurante_id}/evaluar")
 def evaluar_alertas(
@@ -97,33 +106,39 @@ def revisar_alerta(
 
 
 # ── GET /api/alertas/{restaurante_id}/historial ──────────────────────────────
-@router.get("/{restaurante_id}/historial")
+@router.get("/{restaurante_id}/historial", dependencies=[Depends(etag_guard("alertas"))])
 def get_historial_alertas(
     restaurante_id: int,
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor de la respuesta anterior (ignora page)"),
+    incluir_total: bool = Query(True, description="Con cursor, omitirlo ahorra el COUNT"),
     db: Session = Depends(get_db),
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
-    """Todas las alertas (revisadas y no) de los últimos 30 días. Paginado."""
+    """Todas las alertas (revisadas y no) de los últimos 30 días. Paginado por page o por cursor."""
     hace_30d = datetime.utcnow() - timedelta(days=30)
-    base_q = db.query(models.AlertaLog).filter(
-        models.AlertaLog.restaurante_id == restaurante_id,
-        models.AlertaLog.created_at >= hace_30d,
+    A = models.AlertaLog
+    base_q = db.query(A).filter(
+        A.restaurante_id == restaurante_id,
+        A.created_at >= hace_30d,
     )
-    total = base_q.count()
-    alertas = base_q.order_by(models.AlertaLog.created_at.desc()) \
-                    .offset((page - 1) * limit).limit(limit).all()
+    pagina = paginacion.Pagina("alertas_historial", cursor, limit, incluir_total or not cursor)
+    q = pagina.aplicar(base_q, (A.created_at, A.id))
+    if not cursor:
+        q = q.offset((page - 1) * limit)
+    alertas = pagina.cerrar(q.all(), base_q)
     return {
-        "total": total,
-        "page": page,
+        "total": pagina.total,
+        "page": page if not cursor else None,
         "limit": limit,
+        "next_cursor": pagina.siguiente,
         "items": [_ser_alerta(a) for a in alertas],
     }
 
 
 # ── GET /api/alertas/config/{restaurante_id} ─────────────────────────────────
-@router.get("/config/{restaurante_id}")
+@router.get("/config/{restaurante_id}", dependencies=[Depends(etag_guard("alertas"))])
 def get_config_alertas(
     restaurante_id: int,
     db: Session = Depends(get_db),
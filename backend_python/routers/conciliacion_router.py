@@ -0,0 +1,77 @@
+"""
+Conciliación bancaria — KOI Dashboard
+GET  /api/conciliacion/{restaurante_id}/sugerencias?mes=3&anio=2026
+POST /api/conciliacion/{restaurante_id}/aceptar
+GET  /api/conciliacion/{restaurante_id}/depositos?desde=2026-01-01&hasta=2026-03-31
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..services import conciliacion, conciliacion_ventas
+
+router = APIRouter(prefix="/api/conciliacion", tags=["conciliacion"])
+
+
+# ── Schemas ───────────────────────────────────────────────────────────────────
+
+class MatchSchema(BaseModel):
+    movimiento_id: int
+    tipo: str
+    ref_id: int
+    confianza: Optional[float] = None
+
+
+class AceptarSchema(BaseModel):
+    # Pares explícitos (revisados en la UI) ...
+    matches: List[MatchSchema] = []
+    # ... o aceptar todas las sugerencias del mes con confianza >= min_confianza
+    mes: Optional[int] = None
+    anio: Optional[int] = None
+    min_confianza: Optional[float] = None
+
+
+# ── Endpoints ─────────────────────────────────────────────────────────────────
+
+@router.get("/{restaurante_id}/sugerencias")
+def sugerencias(
+    restaurante_id: int,
+    mes: int = Query(..., ge=1, le=12),
+    anio: int = Query(..., ge=2000, le=2100),
+    tolerancia: float = Query(conciliacion.TOLERANCIA_PESOS, ge=0),
+    min_confianza: float = Query(conciliacion.CONFIANZA_MINIMA, ge=0, le=1),
+    db: Session = Depends(get_db),
+):
+    return conciliacion.sugerencias_mes(db, restaurante_id, mes, anio, tolerancia, min_confianza)
+
+
+@router.post("/{restaurante_id}/aceptar")
+def aceptar(restaurante_id: int, body: AceptarSchema, db: Session = Depends(get_db)):
+    if body.matches:
+        matches = [m.model_dump() for m in body.matches]
+    elif body.mes and body.anio and body.min_confianza is not None:
+        matches = conciliacion.sugerencias_mes(
+            db, restaurante_id, body.mes, body.anio, confianza_minima=body.min_confianza
+        )["sugerencias"]
+    else:
+        raise HTTPException(status_code=400, detail="Envía matches o mes/anio/min_confianza")
+    return conciliacion.aceptar(db, restaurante_id, matches)
+
+
+@router.get("/{restaurante_id}/depositos")
+def depositos_ventas(
+    restaurante_id: int,
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Ventas con terminal / Uber / Rappi contra los depósitos netos de comisión."""
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=365)
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="desde debe ser anterior a hasta")
+    return conciliacion_ventas.conciliar_depositos(db, restaurante_id, desde, hasta)
@@ -0,0 +1,204 @@
+"""
+Endpoint compuesto del dashboard — todos los widgets de la pantalla de inicio
+en una sola respuesta.
+
+GET /api/dashboard/{restaurante_id}/bundle
+
+La pantalla pedía por separado kpis-hoy, resumen-semana, margen-mensual,
+P&L del mes (v1 y v2), ventas diarias, top platillos, alertas activas y el
+dashboard de gastos; cada endpoint recargaba cierres y gastos del mismo
+restaurante (un calcular_pl por semana/mes → cientos de consultas).
+
+Aquí:
+  - Los widgets de P&L/ventas salen de un solo RollupDiario (2 consultas)
+    que cubre el rango más amplio que piden (12 meses + mes seleccionado).
+  - Alertas, top platillos y gastos no comparten datos con el rollup: corren
+    en paralelo en un pool de hilos, cada uno con su propia sesión, mientras
+    se carga el rollup.
+  - La respuesta incluye el tiempo de cada widget en `tiempos_ms`.
+  - ETag por versión de datos de todos los dominios: 304 si nada cambió.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import models
+from ..core.auth import get_optional_user
+from ..core.etag import etag_guard
+from ..services.data_versions import DOMINIOS
+from ..services.kpis_snapshot import SEMANAS_COMPARACION, armar_kpis
+from ..services.pl_rollup import RollupDiario
+from .alertas_router import _ordenar_por_severidad, _query_activas
+from .gastos_dashboard_router import gastos_dashboard
+from .pl_router import (
+    _build_v2, _check_tenant_access, _margen_mensual, _resumen_semanas, _top_platillos,
+    _ventas_diarias_resumen, _wrap,
+)
+
+router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
+
+WIDGETS = ("kpis_hoy", "pl_mes", "pl_v2", "resumen_semana", "margen_mensual", "ventas_diarias",
+           "top_platillos", "alertas", "gastos")
+_WIDGETS_ROLLUP = {"kpis_hoy", "pl_mes", "pl_v2", "resumen_semana", "margen_mensual", "ventas_diarias"}
+
+_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("DASHBOARD_WORKERS", "6")),
+                           thread_name_prefix="dashboard")
+
+
+def _ms(inicio: float) -> float:
+    return round((time.perf_counter() - inicio) * 1000, 2)
+
+
+def _fin_de_mes(d: date) -> date:
+    siguiente = date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+    return siguiente - timedelta(days=1)
+
+
+def _rango_rollup(hoy: date, mes: int, anio: int, semanas: int) -> tuple:
+    """Rango que cubre todos los widgets del rollup."""
+    m, a = hoy.month - 11, hoy.year
+    if m <= 0:
+        m, a = m + 12, a - 1
+    lunes = hoy - timedelta(days=hoy.weekday())
+    desde = min(
+        date(a, m, 1),                                          # margen_mensual
+        lunes - timedelta(weeks=semanas - 1),                   # resumen_semana
+        hoy - timedelta(weeks=SEMANAS_COMPARACION),             # kpis_hoy
+        hoy - timedelta(days=29),                               # ventas_diarias
+        date(anio, mes, 1),                                     # pl_mes / pl_v2
+    )
+    hasta = max(_fin_de_mes(hoy), lunes + timedelta(days=6), _fin_de_mes(date(anio, mes, 1)))
+    return desde, hasta
+
+
+def _en_sesion(bind, fn, *args):
+    """Corre fn(db, *args) con una sesión propia (las sesiones no se comparten entre hilos)."""
+    inicio = time.perf_counter()
+    db = Session(bind=bind)
+    try:
+        return fn(db, *args), _ms(inicio)
+    finally:
+        db.close()
+
+
+def _alertas(db: Session, restaurante_id: int) -> tuple:
+    filas = _query_activas(db, restaurante_id)
+    return _ordenar_por_severidad(filas), [(a.tipo, a.mensaje, a.created_at) for a in filas[:5]]
+
+
+def _gastos(db: Session, restaurante_id: int, mes: int, anio: int) -> dict:
+    return gastos_dashboard(restaurante_id, mes=mes, anio=anio, max_detalle=15, db=db)
+
+
+@router.get("/{restaurante_id}/bundle", dependencies=[Depends(etag_guard(*DOMINIOS))])
+def dashboard_bundle(
+    restaurante_id: int,
+    mes: Optional[int] = Query(None),
+    anio: Optional[int] = Query(None),
+    semanas: int = Query(8, ge=1, le=52),
+    widgets: Optional[str] = Query(None, description="Lista separada por comas; default: todos"),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    inicio_total = time.perf_counter()
+    hoy = date.today()
+    mes = mes or hoy.month
+    anio = anio or hoy.year
+    if not (1 <= mes <= 12):
+        raise HTTPException(status_code=400, detail={"detail": "Mes inválido (1-12)", "code": "INVALID_MONTH"})
+    pedidos = [w.strip() for w in widgets.split(",") if w.strip()] if widgets else list(WIDGETS)
+    desconocidos = [w for w in pedidos if w not in WIDGETS]
+    if desconocidos:
+        raise HTTPException(status_code=400, detail={
+            "detail": f"Widgets desconocidos: {', '.join(desconocidos)}", "code": "INVALID_WIDGET",
+            "disponibles": list(WIDGETS),
+        })
+
+    salida: dict = {}
+    errores: dict = {}
+    tiempos: dict = {}
+
+    # ── 1. Widgets independientes: en paralelo, cada uno con su sesión ────────
+    bind = db.get_bind()
+    futuros = {}
+    if "alertas" in pedidos or "kpis_hoy" in pedidos:
+        futuros["alertas"] = _pool.submit(_en_sesion, bind, _alertas, restaurante_id)
+    if "top_platillos" in pedidos:
+        futuros["top_platillos"] = _pool.submit(_en_sesion, bind, _top_platillos, restaurante_id, mes, anio)
+    if "gastos" in pedidos:
+        futuros["gastos"] = _pool.submit(_en_sesion, bind, _gastos, restaurante_id, mes, anio)
+
+    # ── 2. Carga compartida + widgets de P&L/ventas ───────────────────────────
+    rollup = None
+    if _WIDGETS_ROLLUP.intersection(pedidos):
+        inicio = time.perf_counter()
+        desde, hasta = _rango_rollup(hoy, mes, anio, semanas)
+        rollup = RollupDiario.cargar(db, restaurante_id, desde, hasta)
+        tiempos["carga_compartida"] = _ms(inicio)
+
+    def _calcular(nombre: str, fn):
+        inicio = time.perf_counter()
+        try:
+            salida[nombre] = fn()
+        except Exception as e:
+            print(f"[WARN] dashboard bundle widget {nombre} rest={restaurante_id}: {e}")
+            salida[nombre] = None
+            errores[nombre] = str(e)
+        tiempos[nombre] = _ms(inicio)
+
+    if rollup is not None:
+        ini_mes = date(anio, mes, 1)
+        pl_mes = None
+        if "pl_mes" in pedidos or "pl_v2" in pedidos:
+            pl_mes = rollup.pl(ini_mes, _fin_de_mes(ini_mes))
+        if "pl_mes" in pedidos:
+            _calcular("pl_mes", lambda: _wrap(pl_mes, pl_mes.fecha_inicio, pl_mes.fecha_fin))
+        if "pl_v2" in pedidos:
+            _calcular("pl_v2", lambda: _build_v2(pl_mes, pl_mes.ventas_netas))
+        if "resumen_semana" in pedidos:
+            _calcular("resumen_semana", lambda: {"semanas": _resumen_semanas(rollup.pl, hoy, semanas)})
+        if "margen_mensual" in pedidos:
+            _calcular("margen_mensual", lambda: {"meses": _margen_mensual(rollup.pl, hoy)})
+        if "ventas_diarias" in pedidos:
+            hace30 = hoy - timedelta(days=29)
+            _calcular("ventas_diarias", lambda: _ventas_diarias_resumen(
+                sorted((f, t) for f, t in rollup.ventas_por_fecha.items() if hace30 <= f <= hoy), hoy,
+            ))
+
+    # ── 3. Resultados de los hilos ────────────────────────────────────────────
+    alertas_recientes = []
+    for nombre, futuro in futuros.items():
+        try:
+            valor, ms = futuro.result()
+        except Exception as e:
+            print(f"[WARN] dashboard bundle widget {nombre} rest={restaurante_id}: {e}")
+            salida[nombre], errores[nombre] = None, str(e)
+            continue
+        if nombre == "alertas":
+            valor, alertas_recientes = valor
+        if nombre in pedidos:
+            salida[nombre] = valor
+            tiempos[nombre] = ms
+
+    if "kpis_hoy" in pedidos:
+        _calcular("kpis_hoy", lambda: armar_kpis(
+            hoy, rollup.ventas_por_fecha, rollup.pl(hoy, hoy), alertas_recientes,
+        ))
+
+    tiempos["total"] = _ms(inicio_total)
+    return {
+        "generado_en": datetime.utcnow().isoformat(),
+        "restaurante_id": restaurante_id,
+        "mes": mes,
+        "anio": anio,
+        "widgets": {w: salida.get(w) for w in pedidos},
+        "errores": errores,
+        "tiempos_ms": tiempos,
+    }
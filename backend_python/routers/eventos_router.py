@@ -0,0 +1,90 @@
+"""
+Canal de eventos en vivo (Server-Sent Events) por restaurante.
+
+GET /api/eventos/{restaurante_id}?token=<jwt>
+
+    const es = new EventSource(`${API_BASE}/api/eventos/1?token=${token}`)
+    es.addEventListener("cierre", ...)   // creado / actualizado / eliminado
+    es.addEventListener("alerta", ...)   // alerta nueva
+    es.addEventListener("pl", ...)       // P&L / KPIs invalidados: recargar
+    es.addEventListener("resync", ...)   // se perdieron eventos: recargar todo
+
+Reemplaza el polling de kpis-hoy, alertas y cierres. EventSource no puede
+mandar headers, así que el token va en ?token= (Authorization también sirve).
+El navegador reconecta solo con Last-Event-ID y recibe lo que se perdió
+(ver services/eventos.py). Cada conexión dura a lo más EVENTOS_VIDA_SEGUNDOS
+para que el balanceador reparta de nuevo tras un deploy; la reconexión no
+pierde eventos.
+"""
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..core.auth import bearer_scheme, get_optional_user
+from ..services import eventos
+from .pl_router import _check_tenant_access
+
+router = APIRouter(prefix="/api/eventos", tags=["eventos"])
+
+HEARTBEAT_SEGUNDOS = float(os.environ.get("EVENTOS_HEARTBEAT_SEGUNDOS", "20"))
+VIDA_SEGUNDOS = float(os.environ.get("EVENTOS_VIDA_SEGUNDOS", "1800"))
+RETRY_MS = 3000
+
+
+async def _flujo(canal: eventos.Canal, restaurante_id: int, desde: Optional[int]):
+    sub = canal.suscribir(restaurante_id)  # antes de leer lo perdido: no se escapa nada entre ambos
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        visto = 0
+        if desde is not None:
+            perdidos = await asyncio.to_thread(eventos.perdidos, canal.bind, restaurante_id, desde)
+            if perdidos is None:
+                yield eventos.RESYNC
+            else:
+                for evento in perdidos:
+                    yield eventos.formato_sse(evento)
+                    visto = evento[0]
+        loop = asyncio.get_running_loop()
+        fin = loop.time() + VIDA_SEGUNDOS
+        while True:
+            restante = fin - loop.time()
+            if restante <= 0:
+                break
+            try:
+                evento = await asyncio.wait_for(sub.cola.get(), timeout=min(HEARTBEAT_SEGUNDOS, restante))
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"  # mantiene viva la conexión en proxies
+                continue
+            if evento is None:
+                yield eventos.RESYNC
+            elif evento[0] > visto:
+                yield eventos.formato_sse(evento)
+    finally:
+        canal.cancelar(sub)
+
+
+@router.get("/{restaurante_id}")
+def stream_eventos(
+    restaurante_id: int,
+    token: Optional[str] = Query(None, description="JWT (EventSource no manda headers)"),
+    last_event_id: Optional[int] = Header(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Session = Depends(get_db),
+):
+    if credentials is None and token:
+        credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    current_user = get_optional_user(credentials, db)
+    _check_tenant_access(restaurante_id, current_user)
+    canal = eventos.canal_para(db.get_bind())
+    db.close()  # la conexión vive horas: no retener la sesión ni su conexión del pool
+    return StreamingResponse(
+        _flujo(canal, restaurante_id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -8,15 +8,17 @@ Dos conceptos separados:
   → guardadas en gastos.catalogo_cuenta_id (int FK)
   → mapeadas automáticamente por el PLService / endpoint recategorizar
 """
-from datetime import datetime
+import base64
+from datetime import date, datetime
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, literal, or_, select, union_all, update
 from pydantic import BaseModel
 from ..database import get_db
 from .. import models
 from ..core.auth import get_optional_user, get_restaurante_id
+from ..services import sugerencias_cuenta
 
 router = APIRouter(tags=["gastos-categorizacion"])
 
@@ -95,6 +97,80 @@ def categorizar_gasto_diario(
     return {"ok": True, "id": gasto_id, "catalogo_cuenta_id": body.catalogo_cuenta_id}
 
 
+def _encode_cursor(fecha, tabla: str, gasto_id: int) -> str:
+    raw = f"{fecha}|{tabla}|{gasto_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[date, str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        fecha, tabla, gasto_id = raw.split("|")
+        if tabla not in ("gastos", "gastos_diarios"):
+            raise ValueError(tabla)
+        return date.fromisoformat(fecha), tabla, int(gasto_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"detail": "Cursor inválido", "code": "INVALID_CURSOR"})
+
+
+def _ramas_gastos(restaurante_id: int):
+    """SELECT de gastos y gastos_diarios del restaurante con las mismas columnas."""
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
+    rama_g = select(
+        G.id.label("id"), literal("gastos").label("tabla"), G.fecha.label("fecha"),
+        G.proveedor.label("proveedor"), G.descripcion.label("descripcion"), G.categoria.label("categoria"),
+        G.monto.label("monto"), G.catalogo_cuenta_id.label("catalogo_cuenta_id"),
+    ).where(G.restaurante_id == restaurante_id)
+    rama_gd = select(
+        GD.id.label("id"), literal("gastos_diarios").label("tabla"), CT.fecha.label("fecha"),
+        GD.proveedor.label("proveedor"), GD.descripcion.label("descripcion"), GD.categoria.label("categoria"),
+        GD.monto.label("monto"), GD.catalogo_cuenta_id.label("catalogo_cuenta_id"),
+    ).join(CT, GD.cierre_id == CT.id).where(CT.restaurante_id == restaurante_id)
+    return (rama_g, G.fecha, G.id), (rama_gd, CT.fecha, GD.id)
+
+
+def _pagina_gastos(db: Session, restaurante_id: int, limit: int, offset: int = 0,
+                   despues_de: Optional[tuple] = None) -> list:
+    """
+    Página de Gasto ∪ GastoDiario en orden (fecha desc, tabla, id desc).
+
+    Con despues_de=(fecha, tabla, id) se pagina por llave: cada rama filtra por
+    el cursor y trae a lo más `limit` filas por el índice (restaurante, fecha),
+    así que el costo no crece con la profundidad. offset queda para page=N.
+    """
+    ramas = []
+    for (sel, col_fecha, col_id), tabla in zip(_ramas_gastos(restaurante_id), ("gastos", "gastos_diarios")):
+        if despues_de:
+            f, t, i = despues_de
+            if t == tabla:
+                sel = sel.where(or_(col_fecha < f, and_(col_fecha == f, col_id < i)))
+            elif tabla < t:
+                sel = sel.where(col_fecha < f)
+            else:
+                sel = sel.where(col_fecha <= f)
+        sel = sel.order_by(col_fecha.desc(), col_id.desc())
+        if limit > 0:
+            sel = sel.limit(offset + limit)
+        ramas.append(select(sel.subquery()))
+    u = union_all(*ramas).subquery()
+    q = select(u).order_by(u.c.fecha.desc(), u.c.tabla, u.c.id.desc())
+    if limit > 0:
+        q = q.offset(offset).limit(limit)
+    return db.execute(q).all()
+
+
+def _conteos_gastos(db: Session, restaurante_id: int) -> dict:
+    """{tabla: (total, sin_catalogo)} en una sola consulta agrupada."""
+    ramas = [sel.with_only_columns(sel.selected_columns.tabla, sel.selected_columns.catalogo_cuenta_id)
+             for sel, _f, _i in _ramas_gastos(restaurante_id)]
+    u = union_all(*ramas).subquery()
+    filas = db.execute(
+        select(u.c.tabla, func.count(), func.sum(case((u.c.catalogo_cuenta_id.is_(None), 1), else_=0)))
+        .group_by(u.c.tabla)
+    ).all()
+    return {tabla: (total, sin_cat or 0) for tabla, total, sin_cat in filas}
+
+
 @router.get("/api/gastos/sin-categorizar/{restaurante_id}")
 def gastos_sin_categorizar(
     restaurante_id: int,
@@ -102,6 +178,7 @@ def gastos_sin_categorizar(
     incluir_todos: bool = False,   # retorna TODOS los gastos de ambas tablas
     page: int = 1,                 # página actual (1-based)
     limit: int = 200,              # items por página (0 = sin límite)
+    cursor: Optional[str] = None,  # next_cursor de la página anterior (ignora page)
     db: Session = Depends(get_db),
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
@@ -112,20 +189,16 @@ def gastos_sin_categorizar(
     - incluir_todos=false (default): solo gastos con catalogo_cuenta_id IS NULL
       + opcionalmente los que están en cuenta 6008 (incluir_otros=true).
     - incluir_todos=true: TODOS los gastos de ambas tablas (gastos + gastos_diarios),
-      con paginación (page / limit). Permite revisar y cambiar cualquier categoría.
+      en un solo orden (fecha desc, tabla, id desc). Permite revisar y cambiar
+      cualquier categoría.
 
-    Paginación: page=1, limit=200. limit=0 → sin límite (úsalo con precaución).
+    Paginación: cursor=next_cursor de la respuesta anterior (por llave, costo
+    constante en páginas profundas). page/limit se conservan por compatibilidad.
+    limit=0 → sin límite (úsalo con precaución).
     """
-    from ..services.pl_service import _map_categoria_texto
-
-    # ── Catálogo de cuentas del restaurante ──────────────────────────────
-    cuentas = db.query(models.CatalogoCuenta).filter(
-        models.CatalogoCuenta.restaurante_id == restaurante_id,
-        models.CatalogoCuenta.activo == True,
-    ).all()
-    cuentas_map: dict[int, models.CatalogoCuenta] = {c.id: c for c in cuentas}
-
-    id_otros = next((c.id for c in cuentas if c.codigo == "6008"), None)
+    # ── Índice de sugerencias del catálogo del restaurante (cacheado) ────
+    indice = sugerencias_cuenta.get_indice(db, restaurante_id)
+    id_otros = indice.por_codigo.get("6008")
 
     # ── "En revisión" = catalogo_cuenta_id apunta a cuenta 6008 ─────────
     # Definición simple y consistente entre contador y lista:
@@ -133,110 +206,48 @@ def gastos_sin_categorizar(
     # en el tab "En revisión", independientemente de su categoría operativa.
 
     def _nombre_cuenta(cuenta_id: Optional[int]) -> Optional[str]:
-        if not cuenta_id or cuenta_id not in cuentas_map:
-            return None
-        return cuentas_map[cuenta_id].nombre
-
-    def _sugerir(categoria_texto: Optional[str], cuenta_actual_id: Optional[int]):
-        if not categoria_texto:
+        if not cuenta_id:
             return None
-        txt_lower = categoria_texto.lower().strip()
-        for c in cuentas:
-            if c.nombre.lower().strip() == txt_lower:
-                return {"catalogo_cuenta_id": c.id, "nombre": c.nombre, "confianza": "alta"}
-        for c in cuentas:
-            if txt_lower in c.nombre.lower() or c.nombre.lower() in txt_lower:
-                return {"catalogo_cuenta_id": c.id, "nombre": c.nombre, "confianza": "media"}
-        cat_pl = _map_categoria_texto(categoria_texto)
-        for c in cuentas:
-            if c.categoria_pl == cat_pl:
-                confianza = "alta" if c.id == cuenta_actual_id else "baja"
-                return {"catalogo_cuenta_id": c.id, "nombre": c.nombre, "confianza": confianza}
-        return None
+        return indice.nombres.get(cuenta_id)
 
     # ── Modo incluir_todos: retorna TODOS los gastos con paginación ──────
     if incluir_todos:
-        offset = (page - 1) * limit if limit > 0 else 0
-
         # ── Conteos totales (para paginación y tabs) ─────────────────────
-        total_g = db.query(func.count(models.Gasto.id)).filter(
-            models.Gasto.restaurante_id == restaurante_id
-        ).scalar() or 0
-
-        total_gd = db.query(func.count(models.GastoDiario.id)).join(
-            models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id
-        ).filter(
-            models.CierreTurno.restaurante_id == restaurante_id
-        ).scalar() or 0
-
+        conteos = _conteos_gastos(db, restaurante_id)
+        total_g, null_g = conteos.get("gastos", (0, 0))
+        total_gd, null_gd = conteos.get("gastos_diarios", (0, 0))
         total_global = total_g + total_gd
 
-        # Conteos por estado (sin paginación — van a los tabs)
-        null_g = db.query(func.count(models.Gasto.id)).filter(
-            models.Gasto.restaurante_id == restaurante_id,
-            models.Gasto.catalogo_cuenta_id == None,
-        ).scalar() or 0
-
-        null_gd = db.query(func.count(models.GastoDiario.id)).join(
-            models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id
-        ).filter(
-            models.CierreTurno.restaurante_id == restaurante_id,
-            models.GastoDiario.catalogo_cuenta_id == None,
-        ).scalar() or 0
-
         # "En revisión" = solo gastos sin catalogo_cuenta_id (cuenta 6008 es categoría legítima)
 
         # ── Fetch página de gastos ────────────────────────────────────────
-        items: list[dict] = []
-
-        q_g = db.query(models.Gasto).filter(
-            models.Gasto.restaurante_id == restaurante_id
-        ).order_by(models.Gasto.fecha.desc())
+        # Se pide una fila de más para saber si hay página siguiente
+        pedir = limit + 1 if limit > 0 else 0
+        if cursor:
+            filas = _pagina_gastos(db, restaurante_id, pedir, despues_de=_decode_cursor(cursor))
+        else:
+            offset = (page - 1) * limit if limit > 0 else 0
+            filas = _pagina_gastos(db, restaurante_id, pedir, offset=max(0, offset))
+        hay_mas = limit > 0 and len(filas) > limit
+        if hay_mas:
+            filas = filas[:limit]
 
-        if limit > 0:
-            q_g = q_g.offset(offset).limit(limit)
-
-        for g in q_g.all():
-            ccid = g.catalogo_cuenta_id
+        items: list[dict] = []
+        for f in filas:
+            ccid = f.catalogo_cuenta_id
             items.append({
-                "id": g.id, "tabla": "gastos",
-                "fecha": str(g.fecha), "proveedor": g.proveedor,
-                "descripcion": g.descripcion or "",
-                "categoria_texto": g.categoria, "monto": round(g.monto or 0, 2),
+                "id": f.id, "tabla": f.tabla,
+                "fecha": str(f.fecha), "proveedor": f.proveedor,
+                "descripcion": f.descripcion or "",
+                "categoria_texto": f.categoria, "monto": round(f.monto or 0, 2),
                 "catalogo_cuenta_id": ccid,
                 "cuenta_nombre": _nombre_cuenta(ccid),
                 "es_otros": False,
-                "sugerencia": None,   # omitir en modo todos para performance
+                "sugerencia": indice.sugerir(f.categoria, ccid),
             })
 
-        # Si no llenamos la página con gastos, tomamos gastos_diarios
-        remaining = (limit - len(items)) if limit > 0 else None
-        gd_offset = max(0, offset - total_g) if limit > 0 else 0
-
-        if remaining is None or remaining > 0:
-            q_gd = db.query(models.GastoDiario, models.CierreTurno.fecha).join(
-                models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id
-            ).filter(
-                models.CierreTurno.restaurante_id == restaurante_id
-            ).order_by(models.CierreTurno.fecha.desc())
-
-            if limit > 0:
-                q_gd = q_gd.offset(gd_offset).limit(remaining)
-
-            for gd, fecha in q_gd.all():
-                ccid = gd.catalogo_cuenta_id
-                items.append({
-                    "id": gd.id, "tabla": "gastos_diarios",
-                    "fecha": str(fecha), "proveedor": gd.proveedor,
-                    "descripcion": gd.descripcion or "",
-                    "categoria_texto": gd.categoria, "monto": round(gd.monto or 0, 2),
-                    "catalogo_cuenta_id": ccid,
-                    "cuenta_nombre": _nombre_cuenta(ccid),
-                    "es_otros": False,
-                    "sugerencia": None,
-                })
-
         monto_pag = sum(i["monto"] for i in items)
+        ultimo = filas[-1] if hay_mas else None
 
         return {
             "total": total_global,          # total REAL en ambas tablas
@@ -247,6 +258,7 @@ def gastos_sin_categorizar(
             "monto_total": round(monto_pag, 2),
             "page": page,
             "limit": limit,
+            "next_cursor": _encode_cursor(ultimo.fecha, ultimo.tabla, ultimo.id) if ultimo else None,
             "items": items,
         }
 
@@ -266,7 +278,7 @@ def gastos_sin_categorizar(
             "categoria_texto": g.categoria, "monto": round(g.monto or 0, 2),
             "catalogo_cuenta_id": None, "cuenta_nombre": None,
             "es_otros": False,
-            "sugerencia": _sugerir(g.categoria, None),
+            "sugerencia": indice.sugerir(g.categoria, None),
         })
 
     # gastos en "Otros gastos"
@@ -283,7 +295,7 @@ def gastos_sin_categorizar(
                 "categoria_texto": g.categoria, "monto": round(g.monto or 0, 2),
                 "catalogo_cuenta_id": id_otros, "cuenta_nombre": "Otros gastos",
                 "es_otros": True,
-                "sugerencia": _sugerir(g.categoria, id_otros),
+                "sugerencia": indice.sugerir(g.categoria, id_otros),
             })
 
     # gastos_diarios sin catalogo_cuenta_id
@@ -301,7 +313,7 @@ def gastos_sin_categorizar(
             "categoria_texto": gd.categoria, "monto": round(gd.monto or 0, 2),
             "catalogo_cuenta_id": None, "cuenta_nombre": None,
             "es_otros": False,
-            "sugerencia": _sugerir(gd.categoria, None),
+            "sugerencia": indice.sugerir(gd.categoria, None),
         })
 
     # gastos_diarios en "Otros gastos"
@@ -320,7 +332,7 @@ def gastos_sin_categorizar(
                 "categoria_texto": gd.categoria, "monto": round(gd.monto or 0, 2),
                 "catalogo_cuenta_id": id_otros, "cuenta_nombre": "Otros gastos",
                 "es_otros": True,
-                "sugerencia": _sugerir(gd.categoria, id_otros),
+                "sugerencia": indice.sugerir(gd.categoria, id_otros),
             })
 
     total_sin_cat = sum(1 for i in items if not i["es_otros"] and not i["catalogo_cuenta_id"])
@@ -398,6 +410,46 @@ def _resolver_cuenta_id(db: Session, restaurante_id: int, categoria: Optional[st
     return cuenta.id if cuenta else None
 
 
+def _mapa_cuentas(db: Session, restaurante_id: int, categorias) -> dict:
+    """
+    {categoria: catalogo_cuenta_id} para un conjunto de categorías, con una sola
+    consulta al catálogo (mismo resultado que _resolver_cuenta_id por categoría).
+    """
+    from ..services.pl_service import _map_categoria_texto, _CODIGO_POR_CAT_PL
+    por_codigo: dict[str, int] = {}
+    for cid, codigo in db.query(models.CatalogoCuenta.id, models.CatalogoCuenta.codigo).filter(
+        models.CatalogoCuenta.restaurante_id == restaurante_id,
+        models.CatalogoCuenta.activo == True,
+    ).order_by(models.CatalogoCuenta.id):
+        por_codigo.setdefault(codigo, cid)
+    return {
+        cat: por_codigo.get(_CODIGO_POR_CAT_PL.get(_map_categoria_texto(cat), "6008"))
+        for cat in categorias
+    }
+
+
+def _aplicar_mapa(db: Session, modelo, filtro, destino: dict, chunk_size: int = 500) -> None:
+    """UPDATE ... SET catalogo_cuenta_id por cuenta destino (IN por bloques de categorías)."""
+    por_cuenta: dict = {}
+    for cat, cid in destino.items():
+        por_cuenta.setdefault(cid, []).append(cat)
+    for cid, cats in por_cuenta.items():
+        if cid is None:
+            cambia = modelo.catalogo_cuenta_id.isnot(None)
+        else:
+            cambia = or_(modelo.catalogo_cuenta_id.is_(None), modelo.catalogo_cuenta_id != cid)
+        con_texto = [c for c in cats if c is not None]
+        condiciones = [modelo.categoria.in_(con_texto[x:x + chunk_size])
+                       for x in range(0, len(con_texto), chunk_size)]
+        if None in cats:
+            condiciones.append(modelo.categoria.is_(None))
+        for cond in condiciones:
+            db.execute(
+                update(modelo).where(filtro, cond, cambia).values(catalogo_cuenta_id=cid)
+                .execution_options(synchronize_session=False)
+            )
+
+
 # ── GET /api/categorias/{restaurante_id} ─────────────────────────────────────
 
 @router.get("/api/categorias/{restaurante_id}")
@@ -517,42 +569,38 @@ def recategorizar_gastos(
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
     """
-    Recorre TODOS los gastos del restaurante y actualiza catalogo_cuenta_id
-    basándose en la categoría operativa (texto) actual de cada gasto.
+    Recalcula catalogo_cuenta_id de TODOS los gastos del restaurante a partir
+    de la categoría operativa (texto). Las categorías distintas se resuelven
+    una vez y se aplican con UPDATEs por cuenta destino: el número de
+    consultas no depende del número de gastos.
     Idempotente — se puede llamar múltiples veces sin efectos secundarios.
     Solo SUPER_ADMIN o ADMIN.
     """
     if current_user and current_user.rol not in ("SUPER_ADMIN", "ADMIN"):
         raise HTTPException(status_code=403, detail={"detail": "Solo ADMIN/SUPER_ADMIN", "code": "FORBIDDEN"})
 
-    actualizados_g = 0
-    actualizados_gd = 0
+    # ── Mapa categoría → cuenta: una consulta por tabla para las categorías distintas
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
+    cierres_rest = db.query(CT.id).filter(CT.restaurante_id == restaurante_id).scalar_subquery()
+    grupos_g = db.query(G.categoria, G.catalogo_cuenta_id, func.count()).filter(
+        G.restaurante_id == restaurante_id
+    ).group_by(G.categoria, G.catalogo_cuenta_id).all()
+    grupos_gd = db.query(GD.categoria, GD.catalogo_cuenta_id, func.count()).filter(
+        GD.cierre_id.in_(cierres_rest)
+    ).group_by(GD.categoria, GD.catalogo_cuenta_id).all()
+    destino = _mapa_cuentas(db, restaurante_id, {c for c, _id, _n in grupos_g + grupos_gd})
+
+    # ── Conteos (mismo resumen que antes) a partir de los grupos ──────────
     por_cuenta: dict[str, int] = {}
-
-    # ── Tabla gastos ──────────────────────────────────────────────────────
-    gastos = db.query(models.Gasto).filter(
-        models.Gasto.restaurante_id == restaurante_id
-    ).all()
-    for g in gastos:
-        nuevo_id = _resolver_cuenta_id(db, restaurante_id, g.categoria)
-        if nuevo_id != g.catalogo_cuenta_id:
-            g.catalogo_cuenta_id = nuevo_id
-            actualizados_g += 1
-        key = g.categoria or "SIN_CATEGORIA"
-        por_cuenta[key] = por_cuenta.get(key, 0) + 1
-
-    # ── Tabla gastos_diarios ──────────────────────────────────────────────
-    gd_list = db.query(models.GastoDiario).join(
-        models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id
-    ).filter(
-        models.CierreTurno.restaurante_id == restaurante_id
-    ).all()
-    for gd in gd_list:
-        nuevo_id = _resolver_cuenta_id(db, restaurante_id, gd.categoria)
-        if nuevo_id != gd.catalogo_cuenta_id:
-            gd.catalogo_cuenta_id = nuevo_id
-            actualizados_gd += 1
-
+    for cat, _cid, n in grupos_g:
+        key = cat or "SIN_CATEGORIA"
+        por_cuenta[key] = por_cuenta.get(key, 0) + n
+    actualizados_g = sum(n for cat, cid, n in grupos_g if destino[cat] != cid)
+    actualizados_gd = sum(n for cat, cid, n in grupos_gd if destino[cat] != cid)
+
+    # ── UPDATE por cuenta destino, solo filas que cambian ─────────────────
+    _aplicar_mapa(db, G, G.restaurante_id == restaurante_id, destino)
+    _aplicar_mapa(db, GD, GD.cierre_id.in_(cierres_rest), destino)
     db.commit()
 
     return {
@@ -560,8 +608,8 @@ def recategorizar_gastos(
         "restaurante_id": restaurante_id,
         "gastos_actualizados": actualizados_g,
         "gastos_diarios_actualizados": actualizados_gd,
-        "total_gastos_procesados": len(gastos),
-        "total_gd_procesados": len(gd_list),
+        "total_gastos_procesados": sum(n for _c, _cid, n in grupos_g),
+        "total_gd_procesados": sum(n for _c, _cid, n in grupos_gd),
         "desglose_por_categoria": por_cuenta,
     }
 
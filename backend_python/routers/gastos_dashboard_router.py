@@ -13,12 +13,14 @@ from collections import defaultdict
 from datetime import date, timedelta
 from typing import Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import extract
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import Enum, String, cast, extract, func, literal, select, union_all
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from .. import models
+from ..core import fast_json
+from ..core.etag import etag_guard
 
 router = APIRouter(tags=["gastos-dashboard"])
 
@@ -76,19 +78,61 @@ def _tipo_to_color_key(tipo: Optional[str]) -> str:
     return "operativo"
 
 
+def _rango_mes(mes: int, anio: int) -> tuple[date, date]:
+    """[primer día del mes, primer día del mes siguiente) — filtro por rango, usa el índice de fecha."""
+    ini = date(anio, mes, 1)
+    fin = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return ini, fin
+
+
+def _columna(modelo, nombre: str):
+    col = getattr(modelo, nombre)
+    return (cast(col, String) if isinstance(col.type, Enum) else col).label(nombre)
+
+
+def _ramas_gastos(restaurante_id: int, desde: date, hasta: date, *columnas: str):
+    """
+    SELECT equivalentes sobre gastos y gastos_diarios (fecha del cierre) en [desde, hasta).
+    Cada columna pedida sale con el mismo nombre en ambas ramas, más `tabla` y `fecha`.
+    Las columnas enum salen como texto: gastos_diarios.comprobante es un tipo
+    enum nativo en Postgres y el UNION con el VARCHAR de gastos no compila.
+    """
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
+    rama_g = select(
+        literal("gastos").label("tabla"), G.fecha.label("fecha"), *[_columna(G, c) for c in columnas]
+    ).where(G.restaurante_id == restaurante_id, G.fecha >= desde, G.fecha < hasta)
+    rama_gd = select(
+        literal("gastos_diarios").label("tabla"), CT.fecha.label("fecha"), *[_columna(GD, c) for c in columnas]
+    ).join(CT, GD.cierre_id == CT.id).where(CT.restaurante_id == restaurante_id, CT.fecha >= desde, CT.fecha < hasta)
+    return union_all(rama_g, rama_gd).subquery()
+
+
+def _cat_key(categoria: Optional[str]) -> str:
+    return (categoria or "OTROS").strip().upper()
+
+
 # ── Main endpoint ──────────────────────────────────────────────────────────────
 
-@router.get("/api/gastos/dashboard/{restaurante_id}")
+@router.get("/api/gastos/dashboard/{restaurante_id}", dependencies=[Depends(etag_guard("gastos", "catalogo"))])
 def gastos_dashboard(
     restaurante_id: int,
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
+    max_detalle: int = Query(15, ge=1, le=1000),   # gastos por categoría que muestra la UI
     db: Session = Depends(get_db),
 ):
+    """
+    Totales por categoría, semanas, MP/NMP y comparación con el mes anterior
+    salen de una agregación agrupada que cubre ambos meses; el top de
+    proveedores de otra. Solo se traen como filas los `max_detalle` gastos
+    más recientes de cada categoría (lo que despliega la UI).
+    """
     hoy = date.today()
     mes = mes or hoy.month
     anio = anio or hoy.year
     mes_ant, anio_ant = _prev_mes_anio(mes, anio)
+    ini, fin = _rango_mes(mes, anio)
+    ini_ant, _ = _rango_mes(mes_ant, anio_ant)
 
     # ── Resolver catalogo_cuentas para el restaurante ─────────────────────────
     cuentas_rows = db.query(
@@ -103,157 +147,95 @@ def gastos_dashboard(
         r.id: {"nombre": r.nombre, "tipo": r.tipo} for r in cuentas_rows
     }
 
-    # ── Cargar gastos del período actual ──────────────────────────────────────
-    gastos_act = db.query(models.Gasto).filter(
-        models.Gasto.restaurante_id == restaurante_id,
-        extract("month", models.Gasto.fecha) == mes,
-        extract("year", models.Gasto.fecha) == anio,
+    # ── Agregado de ambos meses: (tabla, fecha, categoria, comprobante) ───────
+    u = _ramas_gastos(restaurante_id, ini_ant, fin, "categoria", "comprobante", "monto", "catalogo_cuenta_id")
+    grupos = db.execute(
+        select(
+            u.c.tabla, u.c.fecha, u.c.categoria, u.c.comprobante,
+            func.sum(u.c.monto), func.count(), func.min(u.c.catalogo_cuenta_id),
+        ).group_by(u.c.tabla, u.c.fecha, u.c.categoria, u.c.comprobante)
     ).all()
 
-    gd_act = (
-        db.query(models.GastoDiario, models.CierreTurno.fecha)
-        .join(models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id)
-        .filter(
-            models.CierreTurno.restaurante_id == restaurante_id,
-            extract("month", models.CierreTurno.fecha) == mes,
-            extract("year", models.CierreTurno.fecha) == anio,
-        )
-        .all()
-    )
-
-    # ── Cargar gastos del período anterior (solo montos por categoría) ─────────
-    def _montos_por_cat_gastos(m, a):
-        rows = db.query(models.Gasto).filter(
-            models.Gasto.restaurante_id == restaurante_id,
-            extract("month", models.Gasto.fecha) == m,
-            extract("year", models.Gasto.fecha) == a,
-        ).all()
-        d: dict[str, float] = defaultdict(float)
-        for g in rows:
-            d[(g.categoria or "OTROS").strip().upper()] += float(g.monto or 0)
-        return d
-
-    def _montos_por_cat_gd(m, a):
-        rows = (
-            db.query(models.GastoDiario)
-            .join(models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id)
-            .filter(
-                models.CierreTurno.restaurante_id == restaurante_id,
-                extract("month", models.CierreTurno.fecha) == m,
-                extract("year", models.CierreTurno.fecha) == a,
-            )
-            .all()
-        )
-        d: dict[str, float] = defaultdict(float)
-        for g in rows:
-            d[(g.categoria or "OTROS").strip().upper()] += float(g.monto or 0)
-        return d
-
-    prev_gastos = _montos_por_cat_gastos(mes_ant, anio_ant)
-    prev_gd = _montos_por_cat_gd(mes_ant, anio_ant)
-    prev_por_cat: dict[str, float] = defaultdict(float)
-    for cat, m in prev_gastos.items():
-        prev_por_cat[cat] += m
-    for cat, m in prev_gd.items():
-        prev_por_cat[cat] += m
+    # ── Top de proveedores del mes actual ─────────────────────────────────────
+    up = _ramas_gastos(restaurante_id, ini, fin, "proveedor", "monto")
+    proveedor_montos: dict[str, float] = defaultdict(float)
+    for proveedor, monto in db.execute(
+        select(up.c.proveedor, func.sum(up.c.monto)).group_by(up.c.proveedor)
+    ).all():
+        if proveedor:
+            proveedor_montos[proveedor.strip().upper()] += float(monto or 0)
 
     # ── Agregar por categoría y calcular métricas ──────────────────────────────
-    # Estructura: cat → {monto, transacciones, cuenta_id, cuenta_nombre, tipo_cuenta, items}
+    # Estructura: cat → {monto, transacciones, cuenta_id, cuenta_nombre, tipo_cuenta}
     por_cat: dict[str, dict] = defaultdict(lambda: {
         "monto": 0.0,
-        "items": [],
+        "transacciones": 0,
         "cuenta_id": None,
         "cuenta_nombre": None,
         "tipo_cuenta": "operativo",
     })
+    prev_por_cat: dict[str, float] = defaultdict(float)
 
     total_transferencia = 0.0
     total_efectivo = 0.0
     total_mp = 0.0
     total_nmp = 0.0
+    num_transacciones = 0
     dia_montos: dict[str, float] = defaultdict(float)
-    proveedor_montos: dict[str, float] = defaultdict(float)
     semana_montos: list[float] = [0.0, 0.0, 0.0, 0.0]
 
-    # Gastos (transferencias/facturas)
-    for g in gastos_act:
-        cat = (g.categoria or "OTROS").strip().upper()
-        monto = float(g.monto or 0)
-        comp = g.comprobante or ""
-        fecha_str = str(g.fecha)
-        dia = g.fecha.day if hasattr(g.fecha, "day") else int(str(g.fecha).split("-")[2])
+    # gastos (transferencias/facturas) antes que gastos_diarios (efectivo) para la cuenta de cada categoría
+    for tabla, fecha, categoria, comp, monto, n, cuenta_id in sorted(grupos, key=lambda g: (g[0], g[1])):
+        cat = _cat_key(categoria)
+        monto = float(monto or 0)
+        if fecha < ini:
+            prev_por_cat[cat] += monto
+            continue
 
-        total_transferencia += monto
-        if _es_mp(comp):
-            total_mp += monto
+        if tabla == "gastos":
+            total_transferencia += monto
         else:
-            total_nmp += monto
-
-        dia_montos[fecha_str] += monto
-        if g.proveedor:
-            proveedor_montos[g.proveedor.strip().upper()] += monto
-        semana_montos[_semana_num(dia)] += monto
-
-        bucket = por_cat[cat]
-        bucket["monto"] += monto
-        if bucket["cuenta_id"] is None and g.catalogo_cuenta_id:
-            info = cuenta_info.get(g.catalogo_cuenta_id, {})
-            bucket["cuenta_id"] = g.catalogo_cuenta_id
-            bucket["cuenta_nombre"] = info.get("nombre")
-            bucket["tipo_cuenta"] = _tipo_to_color_key(info.get("tipo"))
-        bucket["items"].append({
-            "id": g.id,
-            "tabla": "gastos",
-            "fecha": fecha_str,
-            "proveedor": g.proveedor or "",
-            "descripcion": g.descripcion or "",
-            "monto": round(monto, 2),
-            "comprobante": comp,
-        })
-
-    # Gastos diarios (efectivo)
-    for gd, fecha_cierre in gd_act:
-        cat = (gd.categoria or "OTROS").strip().upper()
-        monto = float(gd.monto or 0)
-        comp = str(gd.comprobante.value) if gd.comprobante else ""
-        fecha_str = str(fecha_cierre)
-        dia = fecha_cierre.day if hasattr(fecha_cierre, "day") else int(str(fecha_cierre).split("-")[2])
-
-        total_efectivo += monto
+            total_efectivo += monto
         if _es_mp(comp):
             total_mp += monto
         else:
             total_nmp += monto
+        num_transacciones += n
 
-        dia_montos[fecha_str] += monto
-        if gd.proveedor:
-            proveedor_montos[gd.proveedor.strip().upper()] += monto
-        semana_montos[_semana_num(dia)] += monto
+        dia_montos[str(fecha)] += monto
+        semana_montos[_semana_num(fecha.day)] += monto
 
         bucket = por_cat[cat]
         bucket["monto"] += monto
-        if bucket["cuenta_id"] is None and gd.catalogo_cuenta_id:
-            info = cuenta_info.get(gd.catalogo_cuenta_id, {})
-            bucket["cuenta_id"] = gd.catalogo_cuenta_id
+        bucket["transacciones"] += n
+        if bucket["cuenta_id"] is None and cuenta_id:
+            info = cuenta_info.get(cuenta_id, {})
+            bucket["cuenta_id"] = cuenta_id
             bucket["cuenta_nombre"] = info.get("nombre")
             bucket["tipo_cuenta"] = _tipo_to_color_key(info.get("tipo"))
-        bucket["items"].append({
-            "id": gd.id,
-            "tabla": "gastos_diarios",
-            "fecha": fecha_str,
-            "proveedor": gd.proveedor or "",
-            "descripcion": gd.descripcion or "",
-            "monto": round(monto, 2),
-            "comprobante": comp,
+
+    # ── Detalle: los max_detalle más recientes por categoría ──────────────────
+    ud = _ramas_gastos(restaurante_id, ini, fin, "id", "categoria", "proveedor", "descripcion", "monto", "comprobante")
+    rn = func.row_number().over(partition_by=ud.c.categoria, order_by=(ud.c.fecha.desc(), ud.c.id.desc())).label("rn")
+    ranked = select(ud, rn).subquery()
+    items_por_cat: dict[str, list] = defaultdict(list)
+    for r in db.execute(select(ranked).where(ranked.c.rn <= max_detalle)).all():
+        items_por_cat[_cat_key(r.categoria)].append({
+            "id": r.id,
+            "tabla": r.tabla,
+            "fecha": str(r.fecha),
+            "proveedor": r.proveedor or "",
+            "descripcion": r.descripcion or "",
+            "monto": round(float(r.monto or 0), 2),
+            "comprobante": r.comprobante or "",
         })
 
     # ── Totales generales ──────────────────────────────────────────────────────
     total_gastos = total_transferencia + total_efectivo
-    num_transacciones = len(gastos_act) + len(gd_act)
     dias_distintos = len(dia_montos)
     promedio_diario = (total_gastos / dias_distintos) if dias_distintos > 0 else 0.0
 
-    dia_mas_caro = max(dia_montos.items(), key=lambda x: x[1]) if dia_montos else (None, 0.0)
+    dia_mas_caro = max(sorted(dia_montos.items()), key=lambda x: x[1]) if dia_montos else (None, 0.0)
     proveedor_top = max(proveedor_montos.items(), key=lambda x: x[1]) if proveedor_montos else (None, 0.0)
 
     # ── Construir por_categoria ordenado ──────────────────────────────────────
@@ -262,7 +244,7 @@ def gastos_dashboard(
     for cat, data in sorted(por_cat.items(), key=lambda x: -x[1]["monto"]):
         monto_cat = data["monto"]
         pct = (monto_cat / total_gastos * 100) if total_gastos > 0 else 0.0
-        prom_tx = (monto_cat / len(data["items"])) if data["items"] else 0.0
+        prom_tx = (monto_cat / data["transacciones"]) if data["transacciones"] else 0.0
         prev = prev_por_cat.get(cat, 0.0)
         if prev > 0:
             vs_ant = round((monto_cat - prev) / prev * 100, 1)
@@ -279,8 +261,8 @@ def gastos_dashboard(
                 "mes_anterior": round(prev, 2),
             })
 
-        # Ordenar items de más reciente a más antiguo
-        items_sorted = sorted(data["items"], key=lambda x: x["fecha"], reverse=True)
+        # Ordenar items de más reciente a más antiguo (varias categorías crudas pueden caer en la misma)
+        items_sorted = sorted(items_por_cat.get(cat, []), key=lambda x: (x["fecha"], x["id"]), reverse=True)
 
         categorias_out.append({
             "categoria": cat,
@@ -288,11 +270,11 @@ def gastos_dashboard(
             "tipo_cuenta": data["tipo_cuenta"],
             "monto_total": round(monto_cat, 2),
             "porcentaje": round(pct, 1),
-            "num_transacciones": len(data["items"]),
+            "num_transacciones": data["transacciones"],
             "promedio_transaccion": round(prom_tx, 2),
             "vs_mes_anterior": vs_ant,
             "mes_anterior_monto": round(prev, 2),
-            "gastos": items_sorted,
+            "gastos": items_sorted[:max_detalle],
         })
 
     # ── Tendencia semanal ──────────────────────────────────────────────────────
@@ -333,9 +315,10 @@ def gastos_dashboard(
     }
 
 
-@router.get("/api/gastos-caja/{restaurante_id}")
+@router.get("/api/gastos-caja/{restaurante_id}", dependencies=[Depends(etag_guard("gastos"))])
 def get_gastos_caja(
     restaurante_id: int,
+    response: Response,
     mes: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
     db: Session = Depends(get_db),
@@ -349,51 +332,47 @@ def get_gastos_caja(
     anio = anio or hoy.year
 
     result = []
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
 
     # ── Gasto table (transfers, invoices, quick entries) ──
-    gastos = (
-        db.query(models.Gasto)
-        .filter(
-            models.Gasto.restaurante_id == restaurante_id,
-            extract("month", models.Gasto.fecha) == mes,
-            extract("year", models.Gasto.fecha) == anio,
-        )
-        .all()
+    gastos = db.query(G.id, G.fecha, G.proveedor, G.categoria, G.comprobante, G.descripcion, G.monto).filter(
+        G.restaurante_id == restaurante_id,
+        extract("month", G.fecha) == mes,
+        extract("year", G.fecha) == anio,
     )
-    for g in gastos:
+    for gid, fecha, proveedor, categoria, comprobante, descripcion, monto in gastos:
         result.append({
-            "id": g.id,
+            "id": gid,
             "tabla": "gastos",
-            "fecha": str(g.fecha),
-            "proveedor": g.proveedor or "",
-            "categoria": g.categoria or "",
-            "comprobante": g.comprobante or "SIN_COMPROBANTE",
-            "descripcion": g.descripcion or "",
-            "monto": round(g.monto or 0.0, 2),
+            "fecha": str(fecha),
+            "proveedor": proveedor or "",
+            "categoria": categoria or "",
+            "comprobante": comprobante or "SIN_COMPROBANTE",
+            "descripcion": descripcion or "",
+            "monto": round(monto or 0.0, 2),
         })
 
     # ── GastoDiario + CierreTurno (daily ops from cierre de turno) ──
     rows = (
-        db.query(models.GastoDiario, models.CierreTurno.fecha)
-        .join(models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id)
+        db.query(GD.id, CT.fecha, GD.proveedor, GD.categoria, GD.comprobante, GD.descripcion, GD.monto)
+        .join(CT, GD.cierre_id == CT.id)
         .filter(
-            models.GastoDiario.restaurante_id == restaurante_id,
-            extract("month", models.CierreTurno.fecha) == mes,
-            extract("year", models.CierreTurno.fecha) == anio,
+            GD.restaurante_id == restaurante_id,
+            extract("month", CT.fecha) == mes,
+            extract("year", CT.fecha) == anio,
         )
-        .all()
     )
-    for gd, fecha_cierre in rows:
+    for gid, fecha_cierre, proveedor, categoria, comprobante, descripcion, monto in rows:
         result.append({
-            "id": gd.id,
+            "id": gid,
             "tabla": "gastos_diarios",
             "fecha": str(fecha_cierre),
-            "proveedor": gd.proveedor or "",
-            "categoria": gd.categoria or "",
-            "comprobante": str(gd.comprobante.value) if gd.comprobante else "SIN_COMPROBANTE",
-            "descripcion": gd.descripcion or "",
-            "monto": round(gd.monto or 0.0, 2),
+            "proveedor": proveedor or "",
+            "categoria": categoria or "",
+            "comprobante": str(comprobante.value) if comprobante else "SIN_COMPROBANTE",
+            "descripcion": descripcion or "",
+            "monto": round(monto or 0.0, 2),
         })
 
     result.sort(key=lambda x: (x["fecha"], x["proveedor"]))
-    return result
+    return fast_json.respuesta(result, response)
@@ -9,10 +9,17 @@ from sqlalchemy import func, extract
 from ..database import get_db
 from .. import models
 from ..core.auth import get_optional_user, get_restaurante_id
+from ..core.etag import etag_guard
 from ..services.pl_service import pl_service
+from ..services import kpis_snapshot
 
 router = APIRouter(prefix="/api/pl", tags=["pl"])
 
+# ETag por versión de datos (core/etag.py): 304 sin recalcular si nada cambió
+_ETAG_PL = [Depends(etag_guard("ventas", "gastos", "nomina", "catalogo"))]
+_ETAG_VENTAS = [Depends(etag_guard("ventas"))]
+_ETAG_KPIS = [Depends(etag_guard("ventas", "gastos", "nomina", "catalogo", "alertas"))]
+
 
 # ─────────────────────────────────────────────────────────────────────────────
 # V2 P&L — nueva estructura de grupos y categorías
@@ -275,7 +282,7 @@ def _wrap(data, fecha_inicio, fecha_fin):
     }
 
 
-@router.get("/{restaurante_id}/v2/mes/{anio}/{mes}")
+@router.get("/{restaurante_id}/v2/mes/{anio}/{mes}", dependencies=_ETAG_PL)
 def pl_v2_mes(
     restaurante_id: int, anio: int, mes: int,
     db: Session = Depends(get_db),
@@ -290,7 +297,7 @@ def pl_v2_mes(
     return _build_v2(result, ventas)
 
 
-@router.get("/{restaurante_id}/mes/{anio}/{mes}")
+@router.get("/{restaurante_id}/mes/{anio}/{mes}", dependencies=_ETAG_PL)
 def pl_mes(
     restaurante_id: int, anio: int, mes: int,
     db: Session = Depends(get_db),
@@ -303,7 +310,7 @@ def pl_mes(
     return _wrap(result, result.fecha_inicio, result.fecha_fin)
 
 
-@router.get("/{restaurante_id}/semana/{fecha}")
+@router.get("/{restaurante_id}/semana/{fecha}", dependencies=_ETAG_PL)
 def pl_semana(
     restaurante_id: int, fecha: str,
     db: Session = Depends(get_db),
@@ -318,7 +325,7 @@ def pl_semana(
     return _wrap(result, result.fecha_inicio, result.fecha_fin)
 
 
-@router.get("/{restaurante_id}/ytd/{anio}")
+@router.get("/{restaurante_id}/ytd/{anio}", dependencies=_ETAG_PL)
 def pl_ytd(
     restaurante_id: int, anio: int,
     db: Session = Depends(get_db),
@@ -329,7 +336,7 @@ def pl_ytd(
     return _wrap(result, result.fecha_inicio, result.fecha_fin)
 
 
-@router.get("/{restaurante_id}/comparativo/{anio}/{mes}")
+@router.get("/{restaurante_id}/comparativo/{anio}/{mes}", dependencies=_ETAG_PL)
 def pl_comparativo(
     restaurante_id: int, anio: int, mes: int,
     db: Session = Depends(get_db),
@@ -376,20 +383,13 @@ def pl_comparativo(
     }
 
 
-@router.get("/{restaurante_id}/resumen-semana")
-def pl_resumen_semanas(
-    restaurante_id: int,
-    semanas: int = 8,
-    db: Session = Depends(get_db),
-    current_user: Optional[models.Usuario] = Depends(get_optional_user),
-):
-    _check_tenant_access(restaurante_id, current_user)
-    hoy = date.today()
+def _resumen_semanas(calcular, hoy: date, semanas: int) -> list:
+    """Últimas `semanas` semanas (lunes-domingo); `calcular(ini, fin)` devuelve el PLResult."""
     lunes_actual = hoy - timedelta(days=hoy.weekday())
     resultado = []
     for i in range(semanas):
         lunes = lunes_actual - timedelta(weeks=i)
-        r = pl_service.calcular_pl_semana(db, restaurante_id, lunes)
+        r = calcular(lunes, lunes + timedelta(days=6))
         resultado.append({
             "semana_inicio": str(lunes),
             "semana_fin": str(lunes + timedelta(days=6)),
@@ -400,6 +400,20 @@ def pl_resumen_semanas(
             "dias_con_datos": r.dias_con_datos,
         })
     resultado.reverse()
+    return resultado
+
+
+@router.get("/{restaurante_id}/resumen-semana", dependencies=_ETAG_PL)
+def pl_resumen_semanas(
+    restaurante_id: int,
+    semanas: int = 8,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    resultado = _resumen_semanas(
+        lambda ini, fin: pl_service.calcular_pl(db, restaurante_id, ini, fin), date.today(), semanas,
+    )
     return {"generado_en": datetime.utcnow().isoformat(), "semanas": resultado}
 
 
@@ -512,15 +526,8 @@ def pl_debug(
 # Dashboard analytics — nuevos endpoints para PLDashboard v2
 # ─────────────────────────────────────────────────────────────────────────────
 
-@router.get("/{restaurante_id}/margen-mensual")
-def pl_margen_mensual(
-    restaurante_id: int,
-    db: Session = Depends(get_db),
-    current_user: Optional[models.Usuario] = Depends(get_optional_user),
-):
-    """Retorna margen neto mensual de los últimos 12 meses para el gráfico de tendencia."""
-    _check_tenant_access(restaurante_id, current_user)
-    hoy = date.today()
+def _margen_mensual(calcular, hoy: date) -> list:
+    """Últimos 12 meses (incluye el actual); `calcular(ini, fin)` devuelve el PLResult."""
     MESES_LABEL = ["","Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
     resultado = []
     for i in range(11, -1, -1):
@@ -537,7 +544,7 @@ def pl_margen_mensual(
             fecha_fin = date(a + 1, 1, 1) - timedelta(days=1)
         else:
             fecha_fin = date(a, m + 1, 1) - timedelta(days=1)
-        pl = pl_service.calcular_pl(db, restaurante_id, fecha_inicio, fecha_fin)
+        pl = calcular(fecha_inicio, fecha_fin)
         resultado.append({
             "mes": m,
             "anio": a,
@@ -549,23 +556,24 @@ def pl_margen_mensual(
             "utilidad": round(pl.utilidad_neta, 2),
             "dias_con_datos": pl.dias_con_datos,
         })
-    return {"meses": resultado}
+    return resultado
 
 
-@router.get("/{restaurante_id}/top-platillos")
-def pl_top_platillos(
+@router.get("/{restaurante_id}/margen-mensual", dependencies=_ETAG_PL)
+def pl_margen_mensual(
     restaurante_id: int,
-    mes: Optional[int] = None,
-    anio: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
-    """Top 10 platillos por venta total en el mes seleccionado, con tendencia vs mes anterior."""
+    """Retorna margen neto mensual de los últimos 12 meses para el gráfico de tendencia."""
     _check_tenant_access(restaurante_id, current_user)
-    hoy = date.today()
-    mes = mes or hoy.month
-    anio = anio or hoy.year
+    resultado = _margen_mensual(
+        lambda ini, fin: pl_service.calcular_pl(db, restaurante_id, ini, fin), date.today(),
+    )
+    return {"meses": resultado}
+
 
+def _top_platillos(db: Session, restaurante_id: int, mes: int, anio: int) -> dict:
     rows = (
         db.query(models.VentaPorPlatillo)
         .filter(
@@ -613,28 +621,22 @@ def pl_top_platillos(
     return {"mes": mes, "anio": anio, "platillos": platillos}
 
 
-@router.get("/{restaurante_id}/ventas-diarias-resumen")
-def pl_ventas_diarias_resumen(
+@router.get("/{restaurante_id}/top-platillos", dependencies=_ETAG_VENTAS)
+def pl_top_platillos(
     restaurante_id: int,
+    mes: Optional[int] = None,
+    anio: Optional[int] = None,
     db: Session = Depends(get_db),
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
-    """Resumen de ventas diarias: promedio del mes, esta vs semana pasada, sparkline últimos 7 días."""
+    """Top 10 platillos por venta total en el mes seleccionado, con tendencia vs mes anterior."""
     _check_tenant_access(restaurante_id, current_user)
     hoy = date.today()
-    hace30 = hoy - timedelta(days=29)
+    return _top_platillos(db, restaurante_id, mes or hoy.month, anio or hoy.year)
 
-    cierres = (
-        db.query(models.CierreTurno)
-        .filter(
-            models.CierreTurno.restaurante_id == restaurante_id,
-            models.CierreTurno.fecha >= hace30,
-            models.CierreTurno.fecha <= hoy,
-        )
-        .order_by(models.CierreTurno.fecha)
-        .all()
-    )
 
+def _ventas_diarias_resumen(cierres: list, hoy: date) -> dict:
+    """`cierres`: [(fecha, total_venta)] de los últimos 30 días, ordenados por fecha."""
     if not cierres:
         return {
             "promedio_mes": 0,
@@ -644,7 +646,7 @@ def pl_ventas_diarias_resumen(
             "ultimos_7_dias": [],
         }
 
-    total_ventas = sum(float(c.total_venta or 0) for c in cierres)
+    total_ventas = sum(float(t or 0) for _f, t in cierres)
     promedio_mes = total_ventas / len(cierres)
 
     # Esta semana vs semana pasada
@@ -653,11 +655,11 @@ def pl_ventas_diarias_resumen(
     fin_semana_pasada = inicio_semana - timedelta(days=1)
     inicio_semana_pasada = inicio_semana - timedelta(days=7)
 
-    esta_semana = sum(float(c.total_venta or 0) for c in cierres if c.fecha >= inicio_semana)
+    esta_semana = sum(float(t or 0) for f, t in cierres if f >= inicio_semana)
     semana_pasada = sum(
-        float(c.total_venta or 0)
-        for c in cierres
-        if inicio_semana_pasada <= c.fecha <= fin_semana_pasada
+        float(t or 0)
+        for f, t in cierres
+        if inicio_semana_pasada <= f <= fin_semana_pasada
     )
 
     variacion_pct = (
@@ -666,7 +668,7 @@ def pl_ventas_diarias_resumen(
         else None
     )
 
-    cierre_map = {c.fecha: float(c.total_venta or 0) for c in cierres}
+    cierre_map = {f: float(t or 0) for f, t in cierres}
     ultimos_7 = []
     dias_label = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
     for i in range(6, -1, -1):
@@ -689,54 +691,37 @@ def pl_ventas_diarias_resumen(
     }
 
 
-@router.get("/{restaurante_id}/kpis-hoy")
-def pl_kpis_hoy(
+@router.get("/{restaurante_id}/ventas-diarias-resumen", dependencies=_ETAG_VENTAS)
+def pl_ventas_diarias_resumen(
     restaurante_id: int,
     db: Session = Depends(get_db),
     current_user: Optional[models.Usuario] = Depends(get_optional_user),
 ):
+    """Resumen de ventas diarias: promedio del mes, esta vs semana pasada, sparkline últimos 7 días."""
     _check_tenant_access(restaurante_id, current_user)
     hoy = date.today()
+    hace30 = hoy - timedelta(days=29)
 
-    # Ventas de hoy
-    cierre_hoy = db.query(models.CierreTurno).filter(
-        models.CierreTurno.restaurante_id == restaurante_id,
-        models.CierreTurno.fecha == hoy,
-    ).first()
-    ventas_hoy = cierre_hoy.total_venta if cierre_hoy else None
-
-    # Promedio mismo día de semana últimas 4 semanas
-    dia_semana = hoy.weekday()
-    ventas_semanas_anteriores = []
-    for i in range(1, 5):
-        fecha_ref = hoy - timedelta(weeks=i)
-        c = db.query(models.CierreTurno).filter(
+    cierres = (
+        db.query(models.CierreTurno)
+        .filter(
             models.CierreTurno.restaurante_id == restaurante_id,
-            models.CierreTurno.fecha == fecha_ref,
-        ).first()
-        if c and c.total_venta:
-            ventas_semanas_anteriores.append(c.total_venta)
-    promedio_dia = (sum(ventas_semanas_anteriores) / len(ventas_semanas_anteriores)) if ventas_semanas_anteriores else None
+            models.CierreTurno.fecha >= hace30,
+            models.CierreTurno.fecha <= hoy,
+        )
+        .order_by(models.CierreTurno.fecha)
+        .all()
+    )
 
-    # P&L de hoy
-    pl_hoy = pl_service.calcular_pl(db, restaurante_id, hoy, hoy)
+    return _ventas_diarias_resumen([(c.fecha, c.total_venta) for c in cierres], hoy)
 
-    # Alertas activas
-    alertas_activas = db.query(models.AlertaLog).filter(
-        models.AlertaLog.restaurante_id == restaurante_id,
-        models.AlertaLog.revisada == False,
-    ).order_by(models.AlertaLog.created_at.desc()).limit(5).all()
 
-    return {
-        "generado_en": datetime.utcnow().isoformat(),
-        "fecha": str(hoy),
-        "ventas_hoy": round(ventas_hoy, 2) if ventas_hoy is not None else None,
-        "promedio_dia_semana_4s": round(promedio_dia, 2) if promedio_dia else None,
-        "variacion_vs_promedio_pct": round(((ventas_hoy - promedio_dia) / promedio_dia) * 100, 2) if (ventas_hoy and promedio_dia) else None,
-        "margen_estimado_hoy": round(pl_hoy.utilidad_neta, 2),
-        "food_cost_hoy_pct": round(pl_hoy.food_cost_pct, 2),
-        "alertas_activas": [
-            {"tipo": a.tipo, "mensaje": a.mensaje, "created_at": str(a.created_at)}
-            for a in alertas_activas
-        ],
-    }
+@router.get("/{restaurante_id}/kpis-hoy", dependencies=_ETAG_KPIS)
+def pl_kpis_hoy(
+    restaurante_id: int,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    # Ventas de hoy vs. mismos días de semana, P&L del día y alertas en 2 consultas (memoizado)
+    return kpis_snapshot.get_kpis(db, restaurante_id)
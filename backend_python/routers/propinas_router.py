@@ -4,12 +4,13 @@ Tabulador de Propinas — distribución semanal de propinas entre empleados.
 from datetime import date, datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from ..core import paginacion
 from .. import models
 
 router = APIRouter(prefix="/api/propinas", tags=["propinas"])
@@ -231,15 +232,24 @@ def update_config(restaurante_id: int, data: ConfigUpdate, db: Session = Depends
 @router.get("/semanas/{restaurante_id}")
 def listar_semanas(
     restaurante_id: int,
+    request: Request,
+    response: Response,
     anio: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    incluir_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    q = db.query(models.PropinasSemana).filter(
-        models.PropinasSemana.restaurante_id == restaurante_id
-    )
+    PS = models.PropinasSemana
+    q = db.query(PS).filter(PS.restaurante_id == restaurante_id)
     if anio:
-        q = q.filter(models.PropinasSemana.anio == anio)
-    semanas = q.order_by(models.PropinasSemana.anio.desc(), models.PropinasSemana.numero_semana.desc()).all()
+        q = q.filter(PS.anio == anio)
+    pagina = paginacion.Pagina.de_params("propinas_semanas", cursor, limit, incluir_total)
+    if pagina is None:
+        semanas = q.order_by(PS.anio.desc(), PS.numero_semana.desc()).all()
+    else:
+        semanas = pagina.cerrar(pagina.aplicar(q, (PS.anio, PS.numero_semana, PS.id)).all(), q)
+        response.headers.update(pagina.headers(request))
     return [_serialize_semana(s) for s in semanas]
 
 
@@ -1,105 +1,85 @@
 """
 Proveedores Analytics Router
 Endpoints para estadísticas, alertas, historial y comparativo de proveedores.
+
+Los gastos se agrupan por proveedor_key (clave normalizada persistida e
+indexada, ver models.clave_proveedor). Alertas, estadísticas y comparativo
+solo necesitan totales: salen de un GROUP BY sobre Gasto + GastoDiario, sin
+traer filas. El detalle de transacciones solo lo arma el historial.
 """
 from __future__ import annotations
-import os
-from datetime import date, datetime
-from typing import Optional, List, Dict, Any
+from datetime import date
+from typing import Optional, Dict, Any
 
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from sqlalchemy import func, select, union_all
 
 from ..database import get_db
 from .. import models
+from ..core.etag import etag_guard
 
 router = APIRouter(prefix="/api/proveedores-stats", tags=["proveedores-analytics"])
 
-_USE_PG = bool(os.environ.get("DATABASE_URL"))
-
 _MESES_LABEL = ["Ene","Feb","Mar","Abr","May","Jun","Jul","Ago","Sep","Oct","Nov","Dic"]
 
 
-def _extract_month(col):
-    if _USE_PG:
-        return extract("month", col)
-    else:
-        return func.cast(func.strftime("%m", col), func.Integer() if False else func.String())
+def _rango_mes(mes: int, anio: int) -> tuple:
+    """[primer día del mes, primer día del mes siguiente): comparable contra el índice de fecha."""
+    inicio = date(anio, mes, 1)
+    return inicio, (date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1))
 
 
-def _filter_mes_anio_pg(q, col, mes, anio):
-    if _USE_PG:
-        return q.filter(extract("month", col) == mes, extract("year", col) == anio)
-    else:
-        return q.filter(
-            func.strftime("%m", col) == str(mes).zfill(2),
-            func.strftime("%Y", col) == str(anio),
-        )
+def _movimientos(restaurante_id: int, desde: date, hasta: Optional[date] = None, clave: Optional[str] = None):
+    """
+    Subconsulta (clave, categoria, fecha, descripcion, monto) de Gasto y
+    GastoDiario (fechado por su cierre) del restaurante desde `desde`.
+    """
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
+    q_g = select(G.proveedor_key.label("clave"), G.categoria, G.fecha.label("fecha"), G.descripcion, G.monto).where(
+        G.restaurante_id == restaurante_id, G.proveedor_key.isnot(None), G.fecha >= desde,
+    )
+    q_gd = (
+        select(GD.proveedor_key.label("clave"), GD.categoria, CT.fecha.label("fecha"), GD.descripcion, GD.monto)
+        .join(CT, GD.cierre_id == CT.id)
+        .where(GD.restaurante_id == restaurante_id, GD.proveedor_key.isnot(None), CT.fecha >= desde)
+    )
+    if hasta is not None:
+        q_g, q_gd = q_g.where(G.fecha < hasta), q_gd.where(CT.fecha < hasta)
+    if clave is not None:
+        q_g, q_gd = q_g.where(G.proveedor_key == clave), q_gd.where(GD.proveedor_key == clave)
+    return union_all(q_g, q_gd).subquery("movimientos")
 
 
 def _sumar_por_proveedor(
     db: Session, restaurante_id: int, mes: int, anio: int
 ) -> Dict[str, Dict[str, Any]]:
     """
-    Returns dict keyed by PROVEEDOR.strip().upper() with:
-      { total, categoria, transacciones: [{ fecha, categoria, descripcion, monto }] }
-    Combines both Gasto and GastoDiario tables.
+    Totales del mes por proveedor_key, agrupados en SQL:
+      { total, categoria, transacciones (conteo) }
+    La categoría es la de mayor monto del proveedor en el mes.
     """
-    result: Dict[str, Dict[str, Any]] = {}
-
-    # ── Gasto table ──
-    q_g = db.query(models.Gasto).filter(
-        models.Gasto.restaurante_id == restaurante_id,
-        models.Gasto.proveedor != "",
-        models.Gasto.proveedor != None,
-    )
-    q_g = _filter_mes_anio_pg(q_g, models.Gasto.fecha, mes, anio)
-    gastos = q_g.all()
-    for g in gastos:
-        key = g.proveedor.strip().upper()
-        if not key:
-            continue
-        if key not in result:
-            result[key] = {"total": 0.0, "categoria": g.categoria or "", "transacciones": []}
-        result[key]["total"] += g.monto or 0.0
-        result[key]["transacciones"].append({
-            "fecha": str(g.fecha),
-            "categoria": g.categoria or "",
-            "descripcion": g.descripcion or "",
-            "monto": g.monto or 0.0,
-        })
-
-    # ── GastoDiario joined with CierreTurno ──
-    q_gd = (
-        db.query(models.GastoDiario, models.CierreTurno.fecha)
-        .join(models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id)
-        .filter(
-            models.GastoDiario.restaurante_id == restaurante_id,
-            models.GastoDiario.proveedor != "",
-            models.GastoDiario.proveedor != None,
-        )
-    )
-    q_gd = _filter_mes_anio_pg(q_gd, models.CierreTurno.fecha, mes, anio)
-    gastos_diarios = q_gd.all()
-    for gd, fecha_cierre in gastos_diarios:
-        key = gd.proveedor.strip().upper()
-        if not key:
-            continue
-        if key not in result:
-            result[key] = {"total": 0.0, "categoria": gd.categoria or "", "transacciones": []}
-        result[key]["total"] += gd.monto or 0.0
-        result[key]["transacciones"].append({
-            "fecha": str(fecha_cierre),
-            "categoria": gd.categoria or "",
-            "descripcion": gd.descripcion or "",
-            "monto": gd.monto or 0.0,
-        })
+    mov = _movimientos(restaurante_id, *_rango_mes(mes, anio))
+    filas = db.execute(
+        select(mov.c.clave, mov.c.categoria, func.sum(mov.c.monto), func.count())
+        .group_by(mov.c.clave, mov.c.categoria)
+    ).all()
 
+    result: Dict[str, Dict[str, Any]] = {}
+    mayor_categoria: Dict[str, tuple] = {}
+    for clave, categoria, total, n in filas:
+        total = total or 0.0
+        data = result.setdefault(clave, {"total": 0.0, "categoria": "", "transacciones": 0})
+        data["total"] += total
+        data["transacciones"] += n
+        candidato = (total, categoria or "")
+        if clave not in mayor_categoria or candidato > mayor_categoria[clave]:
+            mayor_categoria[clave] = candidato
+            data["categoria"] = categoria or ""
     return result
 
 
-@router.get("/{restaurante_id}/alertas")
+@router.get("/{restaurante_id}/alertas", dependencies=[Depends(etag_guard("gastos"))])
 def get_alertas_proveedores(
     restaurante_id: int,
     mes: Optional[int] = Query(None),
@@ -134,14 +114,14 @@ def get_alertas_proveedores(
             "mes_anterior": round(mes_anterior_total, 2),
             "variacion_pct": variacion_pct,
             "alerta": alerta,
-            "transacciones_mes": len(data["transacciones"]),
+            "transacciones_mes": data["transacciones"],
         })
 
     items.sort(key=lambda x: x["mes_actual"], reverse=True)
     return items
 
 
-@router.get("/{restaurante_id}/estadisticas")
+@router.get("/{restaurante_id}/estadisticas", dependencies=[Depends(etag_guard("gastos"))])
 def get_estadisticas_proveedores(
     restaurante_id: int,
     mes: Optional[int] = Query(None),
@@ -191,7 +171,7 @@ def get_estadisticas_proveedores(
     }
 
 
-@router.get("/{restaurante_id}/historial/{nombre}")
+@router.get("/{restaurante_id}/historial/{nombre}", dependencies=[Depends(etag_guard("gastos"))])
 def get_historial_proveedor(
     restaurante_id: int,
     nombre: str,
@@ -200,7 +180,7 @@ def get_historial_proveedor(
 ):
     from urllib.parse import unquote
     nombre = unquote(nombre)
-    nombre_upper = nombre.strip().upper()
+    clave = models.clave_proveedor(nombre)
 
     hoy = date.today()
 
@@ -214,73 +194,44 @@ def get_historial_proveedor(
             y -= 1
         periodos.append((m, y))
 
-    # Fetch all transactions
     transacciones = []
+    por_mes: Dict[tuple, float] = {}
+    tendencia_periodos = periodos[-4:] if len(periodos) >= 4 else periodos
 
-    # From Gasto
-    if periodos:
+    if periodos and clave:
         oldest_mes, oldest_anio = periodos[0]
-        oldest_date = date(oldest_anio, oldest_mes, 1)
-
-        q_g = db.query(models.Gasto).filter(
-            models.Gasto.restaurante_id == restaurante_id,
-            func.upper(models.Gasto.proveedor) == nombre_upper,
-            models.Gasto.fecha >= oldest_date,
-        )
-        for g in q_g.all():
-            transacciones.append({
-                "fecha": str(g.fecha),
-                "categoria": g.categoria or "",
-                "descripcion": g.descripcion or "",
-                "monto": g.monto or 0.0,
-            })
-
-        # From GastoDiario
-        q_gd = (
-            db.query(models.GastoDiario, models.CierreTurno.fecha)
-            .join(models.CierreTurno, models.GastoDiario.cierre_id == models.CierreTurno.id)
-            .filter(
-                models.GastoDiario.restaurante_id == restaurante_id,
-                func.upper(models.GastoDiario.proveedor) == nombre_upper,
-                models.CierreTurno.fecha >= oldest_date,
-            )
-        )
-        for gd, fecha_cierre in q_gd.all():
-            transacciones.append({
-                "fecha": str(fecha_cierre),
-                "categoria": gd.categoria or "",
-                "descripcion": gd.descripcion or "",
-                "monto": gd.monto or 0.0,
-            })
-
-    # Sort by fecha desc, limit 50
-    transacciones.sort(key=lambda x: x["fecha"], reverse=True)
-    transacciones = transacciones[:50]
+        mov = _movimientos(restaurante_id, date(oldest_anio, oldest_mes, 1), clave=clave)
+        # Detalle: las 50 más recientes, ordenadas y cortadas en SQL
+        transacciones = [{
+            "fecha": str(fecha),
+            "categoria": categoria or "",
+            "descripcion": descripcion or "",
+            "monto": monto or 0.0,
+        } for fecha, categoria, descripcion, monto in db.execute(
+            select(mov.c.fecha, mov.c.categoria, mov.c.descripcion, mov.c.monto)
+            .order_by(mov.c.fecha.desc()).limit(50)
+        )]
+
+        # Totales por día de los meses de la tendencia (incluye actual y anterior)
+        t_mes, t_anio = tendencia_periodos[0]
+        fin_mes, fin_anio = periodos[-1]
+        mov_t = _movimientos(restaurante_id, date(t_anio, t_mes, 1), _rango_mes(fin_mes, fin_anio)[1], clave)
+        for fecha, total in db.execute(select(mov_t.c.fecha, func.sum(mov_t.c.monto)).group_by(mov_t.c.fecha)):
+            por_mes[(fecha.month, fecha.year)] = por_mes.get((fecha.month, fecha.year), 0.0) + (total or 0.0)
 
     # Build tendencia: last 4 months (including current)
-    tendencia_periodos = periodos[-4:] if len(periodos) >= 4 else periodos
     tendencia = []
     for m, y in tendencia_periodos:
-        data = _sumar_por_proveedor(db, restaurante_id, m, y)
-        total = data.get(nombre_upper, {}).get("total", 0.0)
         tendencia.append({
             "mes_label": _MESES_LABEL[m - 1],
             "mes": m,
             "anio": y,
-            "total": round(total, 2),
+            "total": round(por_mes.get((m, y), 0.0), 2),
         })
 
     # Compute mes_actual and mes_anterior from the last two periods
-    mes_actual_total = 0.0
-    mes_anterior_total = 0.0
-    if len(periodos) >= 1:
-        curr_m, curr_y = periodos[-1]
-        curr_data = _sumar_por_proveedor(db, restaurante_id, curr_m, curr_y)
-        mes_actual_total = curr_data.get(nombre_upper, {}).get("total", 0.0)
-    if len(periodos) >= 2:
-        prev_m, prev_y = periodos[-2]
-        prev_data = _sumar_por_proveedor(db, restaurante_id, prev_m, prev_y)
-        mes_anterior_total = prev_data.get(nombre_upper, {}).get("total", 0.0)
+    mes_actual_total = por_mes.get(periodos[-1], 0.0) if len(periodos) >= 1 else 0.0
+    mes_anterior_total = por_mes.get(periodos[-2], 0.0) if len(periodos) >= 2 else 0.0
 
     if mes_anterior_total > 0:
         variacion_pct = round((mes_actual_total - mes_anterior_total) / mes_anterior_total * 100, 1)
@@ -296,7 +247,7 @@ def get_historial_proveedor(
     }
 
 
-@router.get("/{restaurante_id}/comparativo")
+@router.get("/{restaurante_id}/comparativo", dependencies=[Depends(etag_guard("gastos"))])
 def get_comparativo_proveedores(
     restaurante_id: int,
     mes: Optional[int] = Query(None),
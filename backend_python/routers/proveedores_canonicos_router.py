@@ -0,0 +1,96 @@
+"""
+Revisión de variantes de nombre de proveedor (canonicalización).
+
+GET  /api/proveedores-canonicos/{restaurante_id}/sugerencias?umbral=0.55
+     Grupos de nombres que parecen el mismo proveedor, con el canónico
+     sugerido, similitud, conteo, total y RFCs de cada variante.
+POST /api/proveedores-canonicos/{restaurante_id}/confirmar
+     {"canonico": "LA BUENA TIERRA", "variantes": ["BUENA TIERRA"], "proveedor_id": null}
+     Alias + reescritura de proveedor_key: analytics los suma como uno.
+POST /api/proveedores-canonicos/{restaurante_id}/descartar
+     {"nombres": ["CARNES AVILA", "CARNES ABILA"]} — no volver a sugerirlos juntos.
+
+Ver services/proveedor_canonico.py.
+"""
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from .. import models
+from ..core.auth import get_optional_user
+from ..core.etag import etag_guard
+from ..services import proveedor_canonico
+from .pl_router import _check_tenant_access
+
+router = APIRouter(prefix="/api/proveedores-canonicos", tags=["proveedores-canonicos"])
+
+ROLES_FUSIONAR = ("SUPER_ADMIN", "ADMIN")
+
+
+class ConfirmarFusionBody(BaseModel):
+    canonico: str = Field(min_length=1, max_length=100)
+    variantes: List[str] = Field(min_length=1)
+    proveedor_id: Optional[int] = None
+
+
+class DescartarFusionBody(BaseModel):
+    nombres: List[str] = Field(min_length=2)
+
+
+def _check_rol(user: Optional[models.Usuario]):
+    if user and user.rol not in ROLES_FUSIONAR:
+        raise HTTPException(status_code=403, detail={"detail": "Sin permisos para fusionar proveedores", "code": "FORBIDDEN"})
+
+
+@router.get("/{restaurante_id}/sugerencias", dependencies=[Depends(etag_guard("gastos"))])
+def get_sugerencias(
+    restaurante_id: int,
+    umbral: float = Query(proveedor_canonico.UMBRAL_DEFAULT, ge=0.3, le=1.0),
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    return proveedor_canonico.sugerir(db, restaurante_id, umbral)
+
+
+@router.post("/{restaurante_id}/confirmar")
+def confirmar_fusion(
+    restaurante_id: int,
+    body: ConfirmarFusionBody,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    _check_rol(current_user)
+    try:
+        resultado = proveedor_canonico.confirmar(db, restaurante_id, body.canonico, body.variantes, body.proveedor_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"detail": str(e), "code": "FUSION_INVALIDA"})
+    db.add(models.AuditLog(
+        restaurante_id=restaurante_id,
+        usuario_id=current_user.id if current_user else None,
+        accion="FUSIONAR_PROVEEDOR",
+        tabla_afectada="proveedores",
+        registro_id=resultado["proveedor_id"],
+        detalle=f"{', '.join(resultado['variantes'])} → {resultado['canonico']}"[:1000],
+    ))
+    db.commit()
+    proveedor_canonico.invalidate(restaurante_id)
+    return resultado
+
+
+@router.post("/{restaurante_id}/descartar")
+def descartar_fusion(
+    restaurante_id: int,
+    body: DescartarFusionBody,
+    db: Session = Depends(get_db),
+    current_user: Optional[models.Usuario] = Depends(get_optional_user),
+):
+    _check_tenant_access(restaurante_id, current_user)
+    _check_rol(current_user)
+    nuevos = proveedor_canonico.descartar(db, restaurante_id, body.nombres)
+    db.commit()
+    return {"pares_descartados": nuevos}
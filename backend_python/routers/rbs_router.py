@@ -6,16 +6,21 @@ import json
 import os
 import tempfile
 from datetime import date, datetime
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Query, Request, Response, UploadFile
 from pydantic import BaseModel
-from sqlalchemy import extract
-from sqlalchemy.orm import Session
+from sqlalchemy import extract, or_
+from sqlalchemy.orm import Session, sessionmaker
 
 from ..database import get_db
+from ..core import paginacion
 from .. import models
-from ..services.pdf_parser import InvoiceParser, match_payment_to_invoice, parse_image_with_vision
+from ..services import invoice_batch, proveedor_matcher
+from ..services.parse_executor import ParseTimeoutError, run_parse_cached
+from ..services.pdf_parser import (
+    PARSER_VERSION, match_payment_to_invoice, parse_image_file, parse_invoice_file,
+)
 
 router = APIRouter(prefix="/api/rbs", tags=["rbs"])
 
@@ -119,10 +124,12 @@ async def parse_invoice(
         import traceback as _tb
         try:
             if is_image:
-                result = await parse_image_with_vision(tmp_path, media_type)
+                result = await run_parse_cached("vision-image", PARSER_VERSION, content,
+                                                parse_image_file, tmp_path, media_type)
             else:
-                parser = InvoiceParser()
-                result = parser.parse(tmp_path)
+                result = await run_parse_cached("invoice", PARSER_VERSION, content, parse_invoice_file, tmp_path)
+        except ParseTimeoutError:
+            raise
         except Exception as _parse_err:
             print(f"PARSE ERROR: {_tb.format_exc()}")
             raise HTTPException(status_code=500, detail=f"Error al parsear archivo: {str(_parse_err)}")
@@ -150,6 +157,47 @@ async def parse_invoice(
             pass
 
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Ingesta por lote — también antes de los wildcards
+# ─────────────────────────────────────────────────────────────────────────────
+
+@router.post("/batch-ingest", status_code=202)
+async def batch_ingest(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    restaurante_id: int = Query(...),
+    esperar: bool = Query(False),
+    db: Session = Depends(get_db),
+):
+    """
+    Recibe muchas facturas (PDF/JPG/PNG o un .zip), las parsea en paralelo y crea
+    los GastoTransferencia nuevos deduplicando por folio_fiscal.
+    Responde con job_id; el avance se consulta en GET /batch-ingest/{job_id}.
+    Con esperar=true procesa dentro del request y responde el reporte final.
+    """
+    archivos = [(f.filename or "archivo", await f.read()) for f in files]
+    validos, rechazados = invoice_batch.expandir_archivos(archivos)
+    if not validos and not rechazados:
+        raise HTTPException(status_code=400, detail="No se recibieron archivos")
+
+    job = invoice_batch.crear_job(restaurante_id, len(validos), rechazados)
+    # Sesiones propias para el job, sobre el mismo engine del request
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    if esperar:
+        await invoice_batch.procesar_lote(job["job_id"], restaurante_id, validos, session_factory)
+    else:
+        background_tasks.add_task(invoice_batch.procesar_lote, job["job_id"], restaurante_id, validos, session_factory)
+    return invoice_batch.get_job(job["job_id"])
+
+
+@router.get("/batch-ingest/{job_id}")
+def batch_ingest_status(job_id: str):
+    job = invoice_batch.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return job
+
+
 # ─────────────────────────────────────────────────────────────────────────────
 # CRUD endpoints (wildcards van DESPUÉS de rutas estáticas)
 # ─────────────────────────────────────────────────────────────────────────────
@@ -166,24 +214,39 @@ def listar_pendientes(restaurante_id: int, db: Session = Depends(get_db)):
 @router.get("/{restaurante_id}")
 def listar_rbs(
     restaurante_id: int,
+    request: Request,
+    response: Response,
     estado: Optional[str] = None,
     mes: Optional[int] = None,
     anio: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    incluir_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    q = db.query(models.GastoTransferencia).filter(
-        models.GastoTransferencia.restaurante_id == restaurante_id
-    )
+    GT = models.GastoTransferencia
+    q = db.query(GT).filter(GT.restaurante_id == restaurante_id)
     if mes and anio:
         q = q.filter(
-            extract("month", models.GastoTransferencia.fecha_factura) == mes,
-            extract("year", models.GastoTransferencia.fecha_factura) == anio,
+            extract("month", GT.fecha_factura) == mes,
+            extract("year", GT.fecha_factura) == anio,
         )
-    items = q.order_by(models.GastoTransferencia.fecha_factura.desc()).all()
-    result = [_serialize(g) for g in items]
     if estado:
-        result = [r for r in result if r["estado"] == estado.upper()]
-    return result
+        # Mismo criterio que _serialize: PENDIENTE con vencimiento pasado se muestra como VENCIDO
+        estado = estado.upper()
+        hoy = date.today()
+        if estado == "VENCIDO":
+            q = q.filter(GT.estado == "PENDIENTE", GT.fecha_vencimiento < hoy)
+        elif estado == "PENDIENTE":
+            q = q.filter(GT.estado == "PENDIENTE", or_(GT.fecha_vencimiento.is_(None), GT.fecha_vencimiento >= hoy))
+        else:
+            q = q.filter(GT.estado == estado)
+    pagina = paginacion.Pagina.de_params("rbs", cursor, limit, incluir_total)
+    if pagina is None:
+        return [_serialize(g) for g in q.order_by(GT.fecha_factura.desc()).all()]
+    items = pagina.cerrar(pagina.aplicar(q, (GT.fecha_factura, GT.id)).all(), q)
+    response.headers.update(pagina.headers(request))
+    return [_serialize(g) for g in items]
 
 
 @router.post("/{restaurante_id}", status_code=201)
@@ -206,6 +269,7 @@ def crear_rbs(restaurante_id: int, data: GastoTransferenciaCreate, db: Session =
             items_json=data.items_json,
         )
         db.add(g)
+        proveedor_matcher.aprender_rfc(db, restaurante_id, g.proveedor, data.rfc_emisor)
         db.commit()
         db.refresh(g)
         return _serialize(g)
@@ -123,12 +123,23 @@ class OCRResult(BaseModel):
 class ProveedorCreate(BaseModel):
     nombre: str
     categoria_default: str
+    rfc: Optional[str] = None
 
 class ProveedorResponse(ProveedorCreate):
     id: int
     activo: bool
     model_config = ConfigDict(from_attributes=True)
 
+class ProveedorAliasCreate(BaseModel):
+    alias: str
+    tipo: str = "NOMBRE"
+
+class ProveedorAliasResponse(ProveedorAliasCreate):
+    id: int
+    proveedor_id: int
+    origen: str
+    model_config = ConfigDict(from_attributes=True)
+
 class CuentaPorPagarCreate(BaseModel):
     proveedor_id: int
     monto_total: float = Field(gt=0)
@@ -261,6 +272,9 @@ class MovimientoBancoResponse(BaseModel):
     saldo: Optional[float]
     reconciliado: bool
     gasto_id: Optional[int]
+    conciliacion_tipo: Optional[str] = None
+    conciliacion_ref_id: Optional[int] = None
+    conciliacion_confianza: Optional[float] = None
     model_config = ConfigDict(from_attributes=True)
 
 class PLMensualResponse(BaseModel):
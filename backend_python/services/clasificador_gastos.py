@@ -0,0 +1,303 @@
+"""
+KOI Dashboard — Clasificador aprendido de cuenta contable para gastos.
+
+Las reglas (_CATEGORIA_MAP, MAPEO_CATEGORIAS) dejan en 6008 "Otros gastos"
+todo lo que no reconocen, en espera de revisión manual. Este clasificador
+aprende catalogo_cuenta_id de los gastos ya categorizados de cada restaurante
+a partir de proveedor, descripcion y categoria, y reclasifica esa cola (6008)
+y los gastos sin cuenta. 6008 no se usa como etiqueta de entrenamiento: es
+el "no sé" de las reglas, no una cuenta que el modelo deba predecir.
+
+  - Features: n-gramas (palabras, pares de palabras y trigramas de caracteres)
+    de cada campo, con hashing a N_FEATURES columnas (sin vocabulario).
+  - Modelo: Naive Bayes multinomial sobre features binarias. Entrenar es un
+    bincount; puntuar un lote es gather + reduceat + softmax en NumPy, por
+    bloques para acotar memoria.
+  - Artefactos: un .npz por restaurante en CLASIFICADOR_DIR, cacheado en
+    memoria por mtime para que otros workers vean reentrenamientos.
+
+La matriz dispersa se maneja como CSR "a mano" (indptr, indices) para no
+depender de SciPy.
+"""
+import json
+import os
+import threading
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .importadores import en_bloques
+from .proveedor_matcher import normalizar
+
+N_FEATURES = 1 << 17
+ALPHA = 0.1
+BLOQUE_FILAS = 8192
+MIN_ENTRENAMIENTO = 20
+HOLDOUT = 0.2
+MIN_CONFIANZA = 0.8
+CODIGO_OTROS = "6008"
+VERSION = 2  # 2: sin 6008 entre las clases
+
+_DEFAULT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", ".modelos"
+)
+_MASK = N_FEATURES - 1
+_BIAS = zlib.crc32(b"__bias__") & _MASK
+
+
+# ── Features ─────────────────────────────────────────────────────────────────
+
+@lru_cache(maxsize=200_000)
+def _features_campo(campo: str, texto: Optional[str]) -> tuple:
+    t = normalizar((texto or "").replace("_", " "))
+    if not t:
+        return ()
+    palabras = t.split()
+    feats = {f"{campo}:t:{t}"}
+    for p in palabras:
+        feats.add(f"{campo}:w:{p}")
+        g = f" {p} "
+        for i in range(len(g) - 2):
+            feats.add(f"{campo}:c:{g[i:i + 3]}")
+    for a, b in zip(palabras, palabras[1:]):
+        feats.add(f"{campo}:b:{a} {b}")
+    return tuple({zlib.crc32(f.encode()) & _MASK for f in feats})
+
+
+def vectorizar(filas: Iterable[tuple]) -> tuple[np.ndarray, np.ndarray]:
+    """[(proveedor, descripcion, categoria)] → (indptr, indices) en formato CSR binario."""
+    indices: list[int] = []
+    indptr = [0]
+    for proveedor, descripcion, categoria in filas:
+        fs = {_BIAS}
+        fs.update(_features_campo("p", proveedor))
+        fs.update(_features_campo("d", descripcion))
+        fs.update(_features_campo("c", categoria))
+        indices.extend(fs)
+        indptr.append(len(indices))
+    return np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int64)
+
+
+# ── Modelo ───────────────────────────────────────────────────────────────────
+
+@dataclass
+class ModeloGastos:
+    clases: np.ndarray            # catalogo_cuenta_id de cada columna
+    log_prior: np.ndarray         # (C,)
+    log_prob: np.ndarray          # (N_FEATURES, C) float32
+    n_entrenamiento: int = 0
+    entrenado_en: str = ""
+    metricas: dict = field(default_factory=dict)
+
+    def probabilidades(self, indptr: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        n = len(indptr) - 1
+        out = np.empty((n, len(self.clases)), dtype=np.float32)
+        for ini in range(0, n, BLOQUE_FILAS):
+            fin = min(n, ini + BLOQUE_FILAS)
+            a, b = indptr[ini], indptr[fin]
+            # Cada fila tiene al menos el bias, así que reduceat no ve segmentos vacíos
+            s = np.add.reduceat(self.log_prob[indices[a:b]], indptr[ini:fin] - a, axis=0)
+            s += self.log_prior
+            s -= s.max(axis=1, keepdims=True)
+            np.exp(s, out=s)
+            s /= s.sum(axis=1, keepdims=True)
+            out[ini:fin] = s
+        return out
+
+    def predecir(self, filas: Iterable[tuple]) -> tuple[np.ndarray, np.ndarray]:
+        """(catalogo_cuenta_id, confianza) por fila en una sola pasada vectorizada."""
+        p = self.probabilidades(*vectorizar(filas))
+        if not len(p):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        mejor = p.argmax(axis=1)
+        return self.clases[mejor], p[np.arange(len(p)), mejor]
+
+
+def entrenar(filas: list[tuple], etiquetas: Iterable[int], alpha: float = ALPHA) -> ModeloGastos:
+    clases, y = np.unique(np.asarray(list(etiquetas), dtype=np.int64), return_inverse=True)
+    if len(clases) < 2:
+        raise ValueError("Se necesitan al menos dos cuentas distintas para entrenar")
+    indptr, indices = vectorizar(filas)
+    c = len(clases)
+    y_por_feature = np.repeat(y, np.diff(indptr))
+    conteo = np.bincount(indices * c + y_por_feature, minlength=N_FEATURES * c).reshape(N_FEATURES, c)
+    log_prob = np.log(conteo + alpha) - np.log(conteo.sum(axis=0) + alpha * N_FEATURES)
+    log_prior = np.log(np.bincount(y, minlength=c) / len(y))
+    return ModeloGastos(
+        clases=clases, log_prior=log_prior.astype(np.float32), log_prob=log_prob.astype(np.float32),
+        n_entrenamiento=len(y), entrenado_en=datetime.utcnow().isoformat(timespec="seconds"),
+    )
+
+
+def evaluar(modelo: ModeloGastos, filas: list[tuple], etiquetas: Iterable[int],
+            min_confianza: float = MIN_CONFIANZA) -> dict:
+    y = np.asarray(list(etiquetas), dtype=np.int64)
+    pred, conf = modelo.predecir(filas)
+    if not len(y):
+        return {"n": 0}
+    seguros = conf >= min_confianza
+    return {
+        "n": int(len(y)),
+        "accuracy": round(float((pred == y).mean()), 4),
+        "min_confianza": min_confianza,
+        "cobertura": round(float(seguros.mean()), 4),
+        "accuracy_confiables": round(float((pred[seguros] == y[seguros]).mean()), 4) if seguros.any() else None,
+    }
+
+
+# ── Artefactos por restaurante ───────────────────────────────────────────────
+
+def _directorio(directorio: Optional[str]) -> str:
+    return directorio or os.environ.get("CLASIFICADOR_DIR", _DEFAULT_DIR)
+
+
+def ruta_modelo(restaurante_id: int, directorio: Optional[str] = None) -> str:
+    return os.path.join(_directorio(directorio), f"gastos_{restaurante_id}.npz")
+
+
+def guardar(modelo: ModeloGastos, restaurante_id: int, directorio: Optional[str] = None) -> str:
+    path = ruta_modelo(restaurante_id, directorio)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    meta = {"version": VERSION, "n_features": N_FEATURES, "n_entrenamiento": modelo.n_entrenamiento,
+            "entrenado_en": modelo.entrenado_en, "metricas": modelo.metricas}
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, clases=modelo.clases, log_prior=modelo.log_prior,
+                        log_prob=modelo.log_prob, meta=np.array(json.dumps(meta)))
+    os.replace(tmp, path)  # atómico: los workers nunca leen un archivo a medias
+    with _cache_lock:
+        _cache.pop(path, None)
+    return path
+
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def cargar(restaurante_id: int, directorio: Optional[str] = None) -> Optional[ModeloGastos]:
+    """Modelo del restaurante o None si no hay uno vigente (no entrenado o de otra versión)."""
+    path = ruta_modelo(restaurante_id, directorio)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        hit = _cache.get(path)
+        if hit and hit[0] == mtime:
+            return hit[1]
+    with np.load(path) as z:
+        meta = json.loads(str(z["meta"]))
+        if meta.get("version") != VERSION or meta.get("n_features") != N_FEATURES:
+            return None
+        modelo = ModeloGastos(
+            clases=z["clases"], log_prior=z["log_prior"], log_prob=z["log_prob"],
+            n_entrenamiento=meta["n_entrenamiento"], entrenado_en=meta["entrenado_en"],
+            metricas=meta.get("metricas") or {},
+        )
+    with _cache_lock:
+        _cache[path] = (mtime, modelo)
+    return modelo
+
+
+# ── Datos del restaurante ────────────────────────────────────────────────────
+
+def _consultas(db: Session, restaurante_id: int, *columnas_extra):
+    G, GD, CT = models.Gasto, models.GastoDiario, models.CierreTurno
+    q_g = db.query(G.id, G.proveedor, G.descripcion, G.categoria, *[getattr(G, c) for c in columnas_extra]).filter(
+        G.restaurante_id == restaurante_id)
+    q_gd = db.query(GD.id, GD.proveedor, GD.descripcion, GD.categoria, *[getattr(GD, c) for c in columnas_extra]).join(
+        CT, GD.cierre_id == CT.id).filter(CT.restaurante_id == restaurante_id)
+    return (G, q_g), (GD, q_gd)
+
+
+def _cuenta_otros(db: Session, restaurante_id: int) -> Optional[int]:
+    return db.query(models.CatalogoCuenta.id).filter(
+        models.CatalogoCuenta.restaurante_id == restaurante_id,
+        models.CatalogoCuenta.codigo == CODIGO_OTROS,
+    ).order_by(models.CatalogoCuenta.id).limit(1).scalar()
+
+
+def cargar_etiquetados(db: Session, restaurante_id: int) -> tuple[list[tuple], list[int]]:
+    """Gastos de ambas tablas con cuenta asignada del catálogo del propio restaurante, salvo 6008."""
+    cuentas = {cid for (cid,) in db.query(models.CatalogoCuenta.id).filter(
+        models.CatalogoCuenta.restaurante_id == restaurante_id,
+        models.CatalogoCuenta.activo == True,
+        models.CatalogoCuenta.codigo != CODIGO_OTROS,
+    )}
+    filas, etiquetas = [], []
+    for modelo, q in _consultas(db, restaurante_id, "catalogo_cuenta_id"):
+        for _id, proveedor, descripcion, categoria, cuenta_id in q.filter(modelo.catalogo_cuenta_id != None):
+            if cuenta_id in cuentas:
+                filas.append((proveedor, descripcion, categoria))
+                etiquetas.append(cuenta_id)
+    return filas, etiquetas
+
+
+def entrenar_restaurante(db: Session, restaurante_id: int, holdout: float = HOLDOUT,
+                         directorio: Optional[str] = None, semilla: int = 0) -> dict:
+    """
+    Evalúa con un holdout aleatorio (semilla fija), reentrena con todo y
+    guarda el artefacto con las métricas del holdout.
+    """
+    filas, etiquetas = cargar_etiquetados(db, restaurante_id)
+    if len(filas) < MIN_ENTRENAMIENTO:
+        raise ValueError(f"Solo {len(filas)} gastos categorizados (mínimo {MIN_ENTRENAMIENTO})")
+    y = np.asarray(etiquetas, dtype=np.int64)
+    orden = np.random.default_rng(semilla).permutation(len(filas))
+    n_test = int(len(filas) * holdout)
+    test, train = orden[:n_test], orden[n_test:]
+    metricas = {}
+    if n_test:
+        parcial = entrenar([filas[i] for i in train], y[train])
+        metricas = evaluar(parcial, [filas[i] for i in test], y[test])
+    modelo = entrenar(filas, y)
+    modelo.metricas = metricas
+    path = guardar(modelo, restaurante_id, directorio)
+    return {"restaurante_id": restaurante_id, "n_entrenamiento": len(filas),
+            "clases": int(len(modelo.clases)), "holdout": metricas, "artefacto": path}
+
+
+def predecir_pendientes(db: Session, restaurante_id: int, min_confianza: float = MIN_CONFIANZA,
+                        aplicar: bool = False, directorio: Optional[str] = None) -> dict:
+    """
+    Predice la cuenta de los gastos pendientes del restaurante: sin
+    catalogo_cuenta_id o en 6008 "Otros gastos" (la cola de revisión).
+    Con aplicar=True escribe las predicciones con confianza >= min_confianza;
+    las demás se quedan como estaban.
+    """
+    modelo = cargar(restaurante_id, directorio)
+    if modelo is None:
+        raise ValueError(f"No hay modelo entrenado para restaurante_id={restaurante_id}")
+    otros_id = _cuenta_otros(db, restaurante_id)
+    resumen = {"restaurante_id": restaurante_id, "pendientes": 0, "sin_cuenta": 0, "en_otros": 0,
+               "confiables": 0, "aplicados": 0, "por_cuenta": {}}
+    for tabla, q in _consultas(db, restaurante_id, "catalogo_cuenta_id"):
+        pendiente = tabla.catalogo_cuenta_id == None
+        if otros_id is not None:
+            pendiente = or_(pendiente, tabla.catalogo_cuenta_id == otros_id)
+        filas = q.filter(pendiente).all()
+        if not filas:
+            continue
+        pred, conf = modelo.predecir([(f.proveedor, f.descripcion, f.categoria) for f in filas])
+        seguros = np.flatnonzero(conf >= min_confianza)
+        resumen["pendientes"] += len(filas)
+        en_otros = sum(1 for f in filas if f.catalogo_cuenta_id is not None)
+        resumen["en_otros"] += en_otros
+        resumen["sin_cuenta"] += len(filas) - en_otros
+        resumen["confiables"] += len(seguros)
+        for cuenta_id in pred[seguros].tolist():
+            resumen["por_cuenta"][cuenta_id] = resumen["por_cuenta"].get(cuenta_id, 0) + 1
+        if aplicar and len(seguros):
+            cambios = [{"id": filas[i].id, "catalogo_cuenta_id": int(pred[i])} for i in seguros.tolist()]
+            for bloque in en_bloques(cambios, 500):
+                db.execute(update(tabla).execution_options(restaurante_id=restaurante_id), bloque)
+            resumen["aplicados"] += len(cambios)
+    if aplicar:
+        db.commit()
+    return resumen
@@ -0,0 +1,273 @@
+"""
+KOI Dashboard — Conciliación bancaria automática.
+
+Empata los CARGOS de movimientos_banco contra Gasto, GastoTransferencia y
+CuentaPorPagar. Los candidatos se ordenan una vez por monto en centavos; cada
+movimiento busca con bisect solo los candidatos dentro de la tolerancia de
+monto, así que el costo es O((n+m) log m) en vez de comparar todo contra todo.
+
+Cada par recibe una confianza (0-1) a partir de:
+  - cercanía del monto          (45%)
+  - cercanía de fechas          (25%)
+  - folio / tokens de proveedor y descripción en referencia+concepto (30%)
+
+La asignación es greedy por confianza: cada movimiento y cada documento se
+usan a lo más una vez.
+"""
+import re
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .importadores import en_bloques
+from .proveedor_matcher import normalizar
+
+TOLERANCIA_PESOS = 1.0
+VENTANA_DIAS = 45
+CONFIANZA_MINIMA = 0.5
+
+TIPO_GASTO = "GASTO"
+TIPO_TRANSFERENCIA = "TRANSFERENCIA"
+TIPO_CXP = "CXP"
+
+_PESO_MONTO, _PESO_FECHA, _PESO_TEXTO = 0.45, 0.25, 0.30
+
+# Palabras que aparecen en casi todo concepto bancario y no distinguen nada
+_STOPWORDS = {
+    "SA", "CV", "DE", "RL", "SAPI", "SC", "LA", "EL", "LOS", "LAS", "DEL", "POR", "PARA", "CON",
+    "PAGO", "SPEI", "TRANSFERENCIA", "TRASPASO", "ENVIADO", "RECIBIDO", "FACTURA", "CARGO", "ABONO",
+}
+
+
+def a_centavos(monto: float) -> int:
+    return int(round((monto or 0) * 100))
+
+
+def tokens(*textos: Optional[str]) -> set:
+    out = set()
+    for t in textos:
+        for tok in re.split(r"[^A-Z0-9]+", normalizar(t or "")):
+            if len(tok) >= 3 and tok not in _STOPWORDS:
+                out.add(tok)
+    return out
+
+
+def candidato(tipo: str, ref_id: int, monto: float, fecha: Optional[date], proveedor: Optional[str] = None,
+              descripcion: Optional[str] = None, folios: Iterable[Optional[str]] = ()) -> dict:
+    return {
+        "tipo": tipo, "id": ref_id, "monto": monto, "centavos": a_centavos(monto), "fecha": fecha,
+        "proveedor": proveedor, "descripcion": descripcion,
+        "tokens": tokens(proveedor, descripcion),
+        "folios": {normalizar(f).replace(" ", "") for f in folios if f and len(str(f).strip()) >= 3},
+    }
+
+
+class IndiceMontos:
+    """Candidatos ordenados por monto en centavos para consultas por rango."""
+
+    def __init__(self, candidatos: list[dict]):
+        self._items = sorted(candidatos, key=lambda c: c["centavos"])
+        self._keys = [c["centavos"] for c in self._items]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def rango(self, centavos: int, tolerancia: int) -> list[dict]:
+        lo = bisect_left(self._keys, centavos - tolerancia)
+        hi = bisect_right(self._keys, centavos + tolerancia)
+        return self._items[lo:hi]
+
+
+def puntuar(mov: dict, cand: dict, tolerancia: int, ventana_dias: int) -> Optional[float]:
+    """Confianza del par (0-1), o None si está fuera de la ventana de fechas."""
+    dias = abs((mov["fecha"] - cand["fecha"]).days) if cand["fecha"] else ventana_dias
+    if dias > ventana_dias:
+        return None
+    diff = abs(mov["centavos"] - cand["centavos"])
+    s_monto = 1.0 - diff / (tolerancia + 1)
+    s_fecha = 1.0 - dias / (ventana_dias + 1)
+    texto_compacto = mov["texto"].replace(" ", "")
+    if any(f in texto_compacto for f in cand["folios"]):
+        s_texto = 1.0
+    elif cand["tokens"]:
+        s_texto = len(cand["tokens"] & mov["tokens"]) / len(cand["tokens"])
+    else:
+        s_texto = 0.0
+    return round(_PESO_MONTO * s_monto + _PESO_FECHA * s_fecha + _PESO_TEXTO * s_texto, 3)
+
+
+def emparejar(movimientos: list[dict], candidatos: list[dict], tolerancia_pesos: float = TOLERANCIA_PESOS,
+              ventana_dias: int = VENTANA_DIAS, confianza_minima: float = CONFIANZA_MINIMA) -> list[dict]:
+    """
+    movimientos: [{"id", "monto", "fecha", "referencia", "concepto"}].
+    Retorna [{"movimiento_id", "tipo", "ref_id", "confianza", ...}] sin repetir movimiento ni documento.
+    """
+    indice = IndiceMontos(candidatos)
+    tolerancia = a_centavos(tolerancia_pesos)
+    pares = []
+    for m in movimientos:
+        mov = {**m, "centavos": a_centavos(m["monto"]),
+               "texto": normalizar(f"{m.get('referencia') or ''} {m.get('concepto') or ''}")}
+        mov["tokens"] = tokens(mov["texto"])
+        for c in indice.rango(mov["centavos"], tolerancia):
+            score = puntuar(mov, c, tolerancia, ventana_dias)
+            if score is not None and score >= confianza_minima:
+                pares.append((score, -abs(mov["centavos"] - c["centavos"]), mov, c))
+
+    pares.sort(key=lambda p: (p[0], p[1]), reverse=True)
+    usados_mov, usados_doc = set(), set()
+    resultado = []
+    for score, _d, mov, c in pares:
+        clave_doc = (c["tipo"], c["id"])
+        if mov["id"] in usados_mov or clave_doc in usados_doc:
+            continue
+        usados_mov.add(mov["id"])
+        usados_doc.add(clave_doc)
+        resultado.append({
+            "movimiento_id": mov["id"], "fecha_movimiento": mov["fecha"].isoformat(),
+            "monto_movimiento": mov["monto"], "concepto": mov.get("concepto"),
+            "tipo": c["tipo"], "ref_id": c["id"], "proveedor": c["proveedor"],
+            "monto_documento": c["monto"], "fecha_documento": c["fecha"].isoformat() if c["fecha"] else None,
+            "confianza": score,
+        })
+    resultado.sort(key=lambda r: (-r["confianza"], r["movimiento_id"]))
+    return resultado
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Carga desde la base
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _rango_mes(mes: int, anio: int) -> tuple[date, date]:
+    return date(anio, mes, 1), date(anio, mes, monthrange(anio, mes)[1])
+
+
+def cargar_movimientos(db: Session, restaurante_id: int, desde: date, hasta: date) -> list[dict]:
+    MB = models.MovimientoBanco
+    rows = db.query(MB.id, MB.fecha, MB.monto, MB.referencia, MB.concepto).filter(
+        MB.restaurante_id == restaurante_id,
+        MB.tipo == models.TipoMovimientoBanco.CARGO,
+        MB.reconciliado == False,
+        MB.fecha >= desde, MB.fecha <= hasta,
+    ).all()
+    return [{"id": r.id, "fecha": r.fecha, "monto": r.monto, "referencia": r.referencia, "concepto": r.concepto}
+            for r in rows]
+
+
+def cargar_candidatos(db: Session, restaurante_id: int, desde: date, hasta: date) -> list[dict]:
+    """Documentos aún no conciliados con fecha en [desde, hasta]."""
+    MB = models.MovimientoBanco
+    ligados = db.query(MB.conciliacion_tipo, MB.conciliacion_ref_id).filter(
+        MB.restaurante_id == restaurante_id, MB.conciliacion_ref_id.isnot(None),
+    ).all()
+    ligados = {(t, i) for t, i in ligados}
+    gastos_ligados = {g for (g,) in db.query(MB.gasto_id).filter(
+        MB.restaurante_id == restaurante_id, MB.gasto_id.isnot(None)).all()}
+
+    out = []
+    G = models.Gasto
+    for g in db.query(G.id, G.monto, G.fecha, G.proveedor, G.descripcion).filter(
+        G.restaurante_id == restaurante_id,
+        G.metodo_pago != models.MetodoPago.EFECTIVO,
+        G.fecha >= desde, G.fecha <= hasta,
+    ):
+        if g.id not in gastos_ligados and (TIPO_GASTO, g.id) not in ligados:
+            out.append(candidato(TIPO_GASTO, g.id, g.monto, g.fecha, g.proveedor, g.descripcion))
+
+    GT = models.GastoTransferencia
+    for t in db.query(GT.id, GT.monto, GT.fecha_factura, GT.fecha_pago, GT.proveedor, GT.descripcion,
+                      GT.folio, GT.folio_fiscal).filter(
+        GT.restaurante_id == restaurante_id,
+        GT.fecha_factura >= desde - timedelta(days=VENTANA_DIAS), GT.fecha_factura <= hasta,
+    ):
+        if (TIPO_TRANSFERENCIA, t.id) not in ligados:
+            out.append(candidato(TIPO_TRANSFERENCIA, t.id, t.monto, t.fecha_pago or t.fecha_factura,
+                                 t.proveedor, t.descripcion, (t.folio, t.folio_fiscal)))
+
+    CxP = models.CuentaPorPagar
+    P = models.Proveedor
+    for c in db.query(CxP.id, CxP.monto_total, CxP.fecha_vencimiento, CxP.descripcion, P.nombre).outerjoin(
+        P, P.id == CxP.proveedor_id
+    ).filter(
+        CxP.restaurante_id == restaurante_id,
+        CxP.fecha_vencimiento >= desde, CxP.fecha_vencimiento <= hasta,
+    ):
+        if (TIPO_CXP, c.id) not in ligados:
+            out.append(candidato(TIPO_CXP, c.id, c.monto_total, c.fecha_vencimiento, c.nombre, c.descripcion))
+    return out
+
+
+def sugerencias_mes(db: Session, restaurante_id: int, mes: int, anio: int,
+                    tolerancia_pesos: float = TOLERANCIA_PESOS,
+                    confianza_minima: float = CONFIANZA_MINIMA) -> dict:
+    inicio, fin = _rango_mes(mes, anio)
+    movimientos = cargar_movimientos(db, restaurante_id, inicio, fin)
+    candidatos = cargar_candidatos(db, restaurante_id, inicio - timedelta(days=VENTANA_DIAS),
+                                   fin + timedelta(days=VENTANA_DIAS))
+    pares = emparejar(movimientos, candidatos, tolerancia_pesos, VENTANA_DIAS, confianza_minima)
+    return {
+        "mes": mes, "anio": anio,
+        "movimientos_sin_conciliar": len(movimientos),
+        "documentos_candidatos": len(candidatos),
+        "sugerencias": pares,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Aceptar en bloque
+# ─────────────────────────────────────────────────────────────────────────────
+
+def aceptar(db: Session, restaurante_id: int, matches: list[dict]) -> dict:
+    """
+    Marca los movimientos como conciliados y los documentos como pagados,
+    con UPDATEs por lote. Ignora pares cuyo movimiento no es del restaurante,
+    ya está conciliado, repite documento o apunta a un documento ajeno. Hace commit.
+    """
+    MB = models.MovimientoBanco
+    ids = [m["movimiento_id"] for m in matches]
+    movs = {r.id: r for r in db.query(MB.id, MB.fecha, MB.reconciliado).filter(
+        MB.restaurante_id == restaurante_id, MB.id.in_(ids)).all()} if ids else {}
+
+    modelos_doc = {TIPO_GASTO: models.Gasto, TIPO_TRANSFERENCIA: models.GastoTransferencia,
+                   TIPO_CXP: models.CuentaPorPagar}
+    validos = set()
+    for tipo, modelo in modelos_doc.items():
+        ref_ids = [m["ref_id"] for m in matches if m["tipo"] == tipo]
+        if ref_ids:
+            validos |= {(tipo, i) for (i,) in db.query(modelo.id).filter(
+                modelo.restaurante_id == restaurante_id, modelo.id.in_(ref_ids)).all()}
+
+    filas_mov, gastos, transferencias, cxps = [], [], [], []
+    vistos_mov, vistos_doc = set(), set()
+    rechazados = []
+    for m in matches:
+        mov = movs.get(m["movimiento_id"])
+        tipo, ref_id = m["tipo"], m["ref_id"]
+        if (mov is None or mov.reconciliado or mov.id in vistos_mov or (tipo, ref_id) in vistos_doc
+                or (tipo, ref_id) not in validos):
+            rechazados.append(m["movimiento_id"])
+            continue
+        vistos_mov.add(mov.id)
+        vistos_doc.add((tipo, ref_id))
+        filas_mov.append({
+            "id": mov.id, "reconciliado": True, "conciliacion_tipo": tipo, "conciliacion_ref_id": ref_id,
+            "conciliacion_confianza": m.get("confianza"), "gasto_id": ref_id if tipo == TIPO_GASTO else None,
+        })
+        if tipo == TIPO_GASTO:
+            gastos.append({"id": ref_id, "estado": models.EstadoPago.PAGADO})
+        elif tipo == TIPO_TRANSFERENCIA:
+            transferencias.append({"id": ref_id, "estado": "PAGADO", "fecha_pago": mov.fecha})
+        else:
+            cxps.append({"id": ref_id, "estado_pago": models.EstadoPago.PAGADO})
+
+    for modelo, filas in ((MB, filas_mov), (models.Gasto, gastos),
+                          (models.GastoTransferencia, transferencias), (models.CuentaPorPagar, cxps)):
+        for bloque in en_bloques(filas, 500):
+            db.execute(update(modelo).execution_options(restaurante_id=restaurante_id), bloque)
+    db.commit()
+    return {"aceptados": len(filas_mov), "rechazados": rechazados}
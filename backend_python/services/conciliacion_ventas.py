@@ -0,0 +1,215 @@
+"""
+KOI Dashboard — Conciliación de ventas con tarjeta/plataformas contra depósitos.
+
+Las ventas por terminal, Uber Eats y Rappi de cierres_turno deben llegar al
+banco como ABONOS netos de comisión (comisiones_config) después de unos días
+de liquidación. Por canal:
+
+  1. Ventas diarias y depósitos del canal (por palabras clave del concepto)
+     ordenados por fecha.
+  2. Dos apuntadores: el día de venta más antiguo sin liquidar y el siguiente
+     depósito. Con sumas prefijas se prueban ventanas de días consecutivos
+     (un depósito del lunes cubre viernes-domingo) hasta que el neto esperado
+     alcance al depósito; las ventanas están acotadas por max_dias, así que
+     el trabajo por depósito es constante.
+  3. Resultado por día: CONCILIADO, CORTO (llegó menos de lo esperado),
+     FALTANTE (venció el plazo sin depósito) o PENDIENTE (aún en plazo).
+
+El neto esperado es un rango: comisión mínima configurada del canal hasta la
+máxima más IVA sobre la comisión. Todo es lineal en días + depósitos.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from .proveedor_matcher import normalizar
+
+IVA_COMISION = 1.16
+TOLERANCIA_RELATIVA = 0.005
+TOLERANCIA_MINIMA = 1.0
+
+
+@dataclass(frozen=True)
+class Canal:
+    nombre: str
+    columnas: tuple            # columnas de CierreTurno que suman el bruto
+    palabras: tuple            # palabras clave del concepto del depósito
+    tipo_comision: str         # ComisionConfig.tipo
+    nombre_comision: tuple     # ComisionConfig.nombre debe contener alguna (vacío = todas del tipo)
+    lag_min: int               # días mínimos entre venta y depósito
+    lag_max: int               # días máximos antes de considerarlo faltante
+    max_dias: int              # días de venta que puede agrupar un depósito
+
+
+CANALES = (
+    Canal("TERMINALES", ("ventas_terminales", "propinas_terminales"),
+          ("TPV", "TERMINAL", "CLIP", "GETNET", "PARROT", "AMEX", "LIQUIDACION", "VENTAS TDC", "VENTAS TDD"),
+          "BANCARIA", (), 1, 4, 4),
+    Canal("UBER", ("ventas_uber",), ("UBER",), "PLATAFORMA", ("UBER",), 2, 10, 8),
+    Canal("RAPPI", ("ventas_rappi",), ("RAPPI",), "PLATAFORMA", ("RAPPI",), 2, 17, 16),
+)
+
+
+def rango_comision(canal: Canal, configs: list) -> tuple[float, float]:
+    """(fracción mínima, fracción máxima con IVA) de comisión para el canal."""
+    pcts = [
+        c.porcentaje for c in configs
+        if c.activo and c.tipo == canal.tipo_comision
+        and (not canal.nombre_comision or any(n in normalizar(c.nombre) for n in canal.nombre_comision))
+    ]
+    if not pcts:
+        return 0.0, 0.0
+    return min(pcts) / 100, max(pcts) / 100 * IVA_COMISION
+
+
+def _tolerancia(bruto: float) -> float:
+    return max(TOLERANCIA_MINIMA, bruto * TOLERANCIA_RELATIVA)
+
+
+def conciliar_canal(canal: Canal, ventas: list[tuple[date, float]], depositos: list[dict],
+                    comision: tuple[float, float], hoy: date) -> dict:
+    """
+    ventas: [(fecha, bruto)] con bruto > 0; depositos: [{"id", "fecha", "monto", "concepto"}].
+    """
+    ventas = sorted(ventas)
+    depositos = sorted(depositos, key=lambda d: (d["fecha"], d["id"]))
+    pmin, pmax = comision
+    pref = [0.0]
+    for _f, bruto in ventas:
+        pref.append(pref[-1] + bruto)
+
+    def esperado(i: int, k: int) -> tuple[float, float, float]:
+        bruto = pref[k + 1] - pref[i]
+        tol = _tolerancia(bruto)
+        return bruto, bruto * (1 - pmax) - tol, bruto * (1 - pmin) + tol
+
+    def grupo(i: int, k: int, estado: str, dep: Optional[dict]) -> dict:
+        bruto, lo, hi = esperado(i, k)
+        neto = round(bruto * (1 - (pmin + pmax) / 2), 2)
+        out = {"estado": estado, "dias": [ventas[x][0].isoformat() for x in range(i, k + 1)],
+               "bruto": round(bruto, 2), "neto_esperado": neto}
+        if dep:
+            out.update({"deposito_id": dep["id"], "fecha_deposito": dep["fecha"].isoformat(),
+                        "deposito": dep["monto"], "diferencia": round(dep["monto"] - neto, 2)})
+        return out
+
+    grupos, sin_venta = [], []
+    i = j = 0
+    n, m = len(ventas), len(depositos)
+    while i < n and j < m:
+        fecha_venta, dep = ventas[i][0], depositos[j]
+        if dep["fecha"] < fecha_venta + timedelta(days=canal.lag_min):
+            # Depósito anterior a cualquier liquidación posible de esta venta
+            sin_venta.append(dep)
+            j += 1
+            continue
+        if dep["fecha"] > fecha_venta + timedelta(days=canal.lag_max):
+            grupos.append(grupo(i, i, "FALTANTE", None))
+            i += 1
+            continue
+        # Ventanas ini..k de días ya liquidables a la fecha del depósito. Se prefiere
+        # la que empieza en i; si el depósito corresponde a una ventana posterior,
+        # los días saltados nunca se depositaron.
+        limite = dep["fecha"] - timedelta(days=canal.lag_min)
+        corto = exacto = None
+        for ini in range(i, min(n, i + canal.max_dias)):
+            if ventas[ini][0] > limite:
+                break
+            for k in range(ini, min(n, ini + canal.max_dias)):
+                if ventas[k][0] > limite:
+                    break
+                _b, lo, hi = esperado(ini, k)
+                if lo <= dep["monto"] <= hi:
+                    exacto = (ini, k)
+                    break
+                if dep["monto"] < lo:
+                    if ini == i:
+                        corto = (i, k)
+                    break
+            if exacto:
+                break
+        if exacto:
+            ini, k = exacto
+            for x in range(i, ini):
+                grupos.append(grupo(x, x, "FALTANTE", None))
+            grupos.append(grupo(ini, k, "CONCILIADO", dep))
+        elif corto:
+            k = corto[1]
+            grupos.append(grupo(i, k, "CORTO", dep))
+        else:
+            # Depósito mayor que cualquier ventana posible: no se explica con estas ventas
+            sin_venta.append(dep)
+            j += 1
+            continue
+        i, j = k + 1, j + 1
+
+    for x in range(i, n):
+        vencido = ventas[x][0] + timedelta(days=canal.lag_max) < hoy
+        grupos.append(grupo(x, x, "FALTANTE" if vencido else "PENDIENTE", None))
+    sin_venta.extend(depositos[j:])
+
+    resumen = {e: 0 for e in ("CONCILIADO", "CORTO", "FALTANTE", "PENDIENTE")}
+    montos = {e: 0.0 for e in resumen}
+    for g in grupos:
+        resumen[g["estado"]] += len(g["dias"])
+        montos[g["estado"]] += g["bruto"]
+    return {
+        "canal": canal.nombre,
+        "comision_min_pct": round(pmin * 100, 3), "comision_max_pct": round(pmax * 100, 3),
+        "dias": resumen,
+        "bruto": {e: round(v, 2) for e, v in montos.items()},
+        "grupos": grupos,
+        "alertas": [g for g in grupos if g["estado"] in ("CORTO", "FALTANTE")],
+        "depositos_sin_venta": [
+            {"id": d["id"], "fecha": d["fecha"].isoformat(), "monto": d["monto"], "concepto": d["concepto"]}
+            for d in sin_venta
+        ],
+    }
+
+
+def _canal_de(concepto: str) -> Optional[Canal]:
+    texto = normalizar(concepto)
+    # Plataformas primero: "UBER" puede venir por terminal bancaria en el concepto
+    for canal in sorted(CANALES, key=lambda c: c.tipo_comision != "PLATAFORMA"):
+        if any(p in texto for p in canal.palabras):
+            return canal
+    return None
+
+
+def conciliar_depositos(db: Session, restaurante_id: int, desde: date, hasta: date,
+                        hoy: Optional[date] = None) -> dict:
+    hoy = hoy or date.today()
+    CT = models.CierreTurno
+    columnas = sorted({c for canal in CANALES for c in canal.columnas})
+    cierres = db.query(CT.fecha, *[getattr(CT, c) for c in columnas]).filter(
+        CT.restaurante_id == restaurante_id, CT.fecha >= desde, CT.fecha <= hasta,
+    ).all()
+
+    MB = models.MovimientoBanco
+    lag_max = max(c.lag_max for c in CANALES)
+    abonos = db.query(MB.id, MB.fecha, MB.monto, MB.concepto, MB.referencia).filter(
+        MB.restaurante_id == restaurante_id,
+        MB.tipo == models.TipoMovimientoBanco.ABONO,
+        MB.fecha >= desde, MB.fecha <= hasta + timedelta(days=lag_max),
+    ).all()
+    por_canal: dict = {c.nombre: [] for c in CANALES}
+    for a in abonos:
+        canal = _canal_de(f"{a.concepto or ''} {a.referencia or ''}")
+        if canal:
+            por_canal[canal.nombre].append({"id": a.id, "fecha": a.fecha, "monto": a.monto, "concepto": a.concepto})
+
+    configs = db.query(models.ComisionConfig).filter(models.ComisionConfig.restaurante_id == restaurante_id).all()
+    canales = []
+    for canal in CANALES:
+        ventas = []
+        for row in cierres:
+            bruto = sum(getattr(row, c) or 0.0 for c in canal.columnas)
+            if bruto > 0:
+                ventas.append((row.fecha, bruto))
+        canales.append(conciliar_canal(canal, ventas, por_canal[canal.nombre],
+                                       rango_comision(canal, configs), hoy))
+    return {"restaurante_id": restaurante_id, "desde": desde.isoformat(), "hasta": hasta.isoformat(),
+            "canales": canales}
@@ -0,0 +1,231 @@
+"""
+KOI Dashboard — Versiones de datos por restaurante y dominio.
+
+Cada transacción que escribe en una tabla fuente sube en 1 la versión de
+sus dominios (ventas, gastos, nómina, catálogo, alertas) para los
+restaurantes afectados, en el mismo commit que la escritura: si la
+transacción hace rollback, la versión no cambia.
+
+  - Escrituras por unidad de trabajo del ORM (add/modify/delete + flush):
+    evento after_flush de la sesión.
+  - Escrituras masivas por la sesión (insert()/update()/delete() sobre
+    modelos, query().update()): evento do_orm_execute. El restaurante sale de
+    execution_options(restaurante_id=x), de las filas o del WHERE
+    (restaurante_id = x / IN); si no se puede saber se sube la versión comodín
+    (restaurante_id=0), que entra en el ETag de todos los restaurantes. Los
+    UPDATE masivos por llave primaria (db.execute(update(M), [{"id": ...}]))
+    no traen restaurante: quien los hace pasa la opción.
+  - Scripts que escriben por Connection (sin sesión) llaman bump_conexion().
+  - Otros módulos se enteran de cada subida con al_subir_versiones(fn): fn
+    corre en la misma transacción (services/eventos.py publica "P&L
+    invalidado" así).
+
+Los GET de analytics derivan su ETag de estas versiones (ver core/etag.py) y
+contestan 304 sin tocar las tablas de hechos. Los caches en memoria
+(kpis_snapshot, resumen_dashboard, sugerencias_cuenta) guardan su resultado
+junto con clave(): una escritura confirmada en cualquier worker lo invalida.
+"""
+import hashlib
+from datetime import date, datetime
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+
+DOMINIOS = ("ventas", "gastos", "nomina", "catalogo", "alertas")
+TODOS = 0  # restaurante comodín para escrituras sin restaurante identificable
+
+_DOMINIOS_POR_TABLA: dict[str, tuple] = {
+    # Los gastos diarios se fechan por su cierre: un cierre también cambia "gastos"
+    "cierres_turno": ("ventas", "gastos"),
+    "ventas_diarias": ("ventas",),
+    "ventas_por_platillo": ("ventas",),
+    "propinas_diarias": ("ventas",),
+    "gastos": ("gastos",),
+    "gastos_diarios": ("gastos",),
+    "gastos_transferencia": ("gastos",),
+    "proveedores": ("gastos",),
+    "proveedor_aliases": ("gastos",),
+    "proveedor_fusiones_descartadas": ("gastos",),
+    "cuentas_por_pagar": ("gastos",),
+    "nomina_pagos": ("nomina",),
+    "empleados": ("nomina",),
+    "catalogo_cuentas": ("catalogo",),
+    "alertas_log": ("alertas",),
+    "alertas_config": ("alertas",),
+}
+
+
+_OYENTES: list = []
+
+
+# ── Escritura ─────────────────────────────────────────────────────────────────
+
+def al_subir_versiones(fn):
+    """Registra fn(conn, pares) para que corra después de cada bump_conexion."""
+    _OYENTES.append(fn)
+    return fn
+
+
+def bump_conexion(conn, pares: Iterable[tuple], avisar: bool = True) -> None:
+    """
+    Sube la versión de cada (restaurante_id, dominio) en la transacción de `conn`.
+    avisar=False no corre los oyentes (quien llama publica sus propios eventos).
+    """
+    pares = sorted({(TODOS if rid is None else rid, dom) for rid, dom in pares})
+    if not pares:
+        return
+    _upsert_versiones(conn, pares)
+    if avisar:
+        for fn in _OYENTES:
+            fn(conn, pares)
+
+
+def _upsert_versiones(conn, pares: list) -> None:
+    tabla = models.DataVersion.__table__
+    ahora = datetime.utcnow()
+    dialecto = conn.dialect.name
+    if dialecto in ("postgresql", "sqlite"):
+        if dialecto == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(tabla).values([
+            {"restaurante_id": rid, "dominio": dom, "version": 1, "updated_at": ahora} for rid, dom in pares
+        ])
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["restaurante_id", "dominio"],
+            set_={"version": tabla.c.version + 1, "updated_at": ahora},
+        ))
+        return
+    for rid, dom in pares:
+        res = conn.execute(update(tabla).where(tabla.c.restaurante_id == rid, tabla.c.dominio == dom)
+                           .values(version=tabla.c.version + 1, updated_at=ahora))
+        if not res.rowcount:
+            conn.execute(tabla.insert().values(restaurante_id=rid, dominio=dom, version=1, updated_at=ahora))
+
+
+def _pendientes(session: Session) -> set:
+    return session.info.setdefault("_data_versions", set())
+
+
+def _after_flush(session: Session, _flush_context) -> None:
+    pares = _pendientes(session)
+    cierres_por_resolver: set = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        dominios = _DOMINIOS_POR_TABLA.get(getattr(obj, "__tablename__", None))
+        if not dominios or (obj in session.dirty and not session.is_modified(obj, include_collections=False)):
+            continue
+        rid = getattr(obj, "restaurante_id", None)
+        if rid is None and getattr(obj, "cierre_id", None):
+            cierres_por_resolver.add(obj.cierre_id)  # gasto diario sin restaurante: el de su cierre
+            continue
+        pares.update((rid, d) for d in dominios)
+    if cierres_por_resolver:
+        CT = models.CierreTurno
+        for (rid,) in session.connection().execute(
+            select(CT.restaurante_id).where(CT.id.in_(cierres_por_resolver)).distinct()
+        ):
+            pares.add((rid, "gastos"))
+
+
+def _do_orm_execute(state) -> None:
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    tabla = getattr(state.statement, "table", None)
+    dominios = _DOMINIOS_POR_TABLA.get(getattr(tabla, "name", None))
+    if not dominios:
+        return
+    explicito = state.execution_options.get("restaurante_id")
+    if explicito is not None:
+        _pendientes(state.session).update((explicito, d) for d in dominios)
+        return
+    params = state.parameters
+    filas = params if isinstance(params, list) else ([params] if params else [])
+    rids = {f.get("restaurante_id") for f in filas} if filas else set()
+    if not rids or None in rids:
+        rids.discard(None)
+        rids.update(_rids_del_where(state.statement, tabla) or {None})
+    _pendientes(state.session).update((rid, d) for rid in rids for d in dominios)
+
+
+def _rids_del_where(stmt, tabla) -> set:
+    """restaurante_id fijado en el WHERE de un UPDATE/DELETE masivo (col == valor o col IN (...))."""
+    where = getattr(stmt, "whereclause", None)
+    col = tabla.c.get("restaurante_id") if tabla is not None else None
+    if where is None or col is None:
+        return set()
+    rids: set = set()
+    for cond in [where] + list(getattr(where, "clauses", [])):
+        izq, der = getattr(cond, "left", None), getattr(cond, "right", None)
+        if izq is None or not col.compare(izq):
+            continue
+        op = getattr(cond.operator, "__name__", "")
+        if op == "eq" and hasattr(der, "value"):
+            rids.add(der.value)
+        elif op == "in_op" and isinstance(getattr(der, "value", None), (list, tuple)):
+            rids.update(der.value)
+    return rids
+
+
+def _before_commit(session: Session) -> None:
+    session.flush()  # para que after_flush registre lo pendiente antes de subir versiones
+    pares = session.info.pop("_data_versions", None)
+    if pares:
+        bump_conexion(session.connection(), pares)
+
+
+def _after_rollback(session: Session, _previous_transaction=None) -> None:
+    session.info.pop("_data_versions", None)
+
+
+# Se acumula por sesión y se sube una vez por commit (un solo upsert aunque la
+# transacción haga muchos flushes o UPDATEs en bloques)
+event.listen(Session, "after_flush", _after_flush)
+event.listen(Session, "do_orm_execute", _do_orm_execute)
+event.listen(Session, "before_commit", _before_commit)
+event.listen(Session, "after_soft_rollback", _after_rollback)
+
+
+# ── Lectura ───────────────────────────────────────────────────────────────────
+
+def versiones(db: Session, restaurante_id: int, dominios: Iterable[str]) -> dict:
+    """{(restaurante_id, dominio): version} del restaurante y del comodín."""
+    DV = models.DataVersion
+    filas = db.execute(
+        select(DV.restaurante_id, DV.dominio, DV.version)
+        .where(DV.restaurante_id.in_((restaurante_id, TODOS)), DV.dominio.in_(list(dominios)))
+    ).all()
+    return {(rid, dom): v for rid, dom, v in filas}
+
+
+def clave(db: Session, restaurante_id: Optional[int], dominios: Iterable[str]) -> tuple:
+    """
+    Versiones de `dominios` como clave de memoización. Cambia en el commit de
+    cualquier escritura que los afecte, no antes. Con restaurante_id None
+    (vistas de todos los restaurantes) suma las versiones de todos.
+    """
+    dominios = sorted(set(dominios))
+    if restaurante_id is not None:
+        return tuple(sorted(versiones(db, restaurante_id, dominios).items()))
+    DV = models.DataVersion
+    return tuple(sorted(db.execute(
+        select(DV.dominio, func.sum(DV.version)).where(DV.dominio.in_(dominios)).group_by(DV.dominio)
+    ).all()))
+
+
+def etag(db: Session, restaurante_id: int, dominios: Iterable[str], recurso: str = "",
+         hoy: Optional[date] = None) -> str:
+    """
+    ETag débil de un recurso de analytics: versiones de sus dominios + recurso
+    (path y query) + fecha (los endpoints "de hoy" cambian al cambiar el día).
+    """
+    dominios = sorted(set(dominios))
+    vers = versiones(db, restaurante_id, dominios)
+    base = "|".join([str(restaurante_id), (hoy or date.today()).isoformat(), recurso] + [
+        f"{d}:{vers.get((restaurante_id, d), 0)}:{vers.get((TODOS, d), 0)}" for d in dominios
+    ])
+    return 'W/"' + hashlib.sha1(base.encode()).hexdigest()[:20] + '"'
@@ -0,0 +1,282 @@
+"""
+KOI Dashboard — Eventos de cambio en vivo (canal SSE por restaurante).
+
+Qué se publica (JSON compacto, un evento por cambio):
+  - cierre  {"accion": "creado" | "actualizado" | "eliminado", "id", "fecha"}
+  - alerta  {"accion": "creada", "id", "tipo", "severidad", "mensaje"}
+  - pl      {"accion": "invalidado", "dominios": [...]} — cualquier escritura
+            en ventas, gastos, nómina o catálogo (vía data_versions, también
+            las de scripts por Connection).
+
+Cómo viaja:
+  1. La escritura inserta sus eventos en eventos_cambio en la misma
+     transacción: si hace rollback no hay evento.
+  2. Cada worker tiene un lector (una tarea asyncio que solo corre mientras
+     haya suscriptores) que lee eventos_cambio por id > último visto cada
+     EVENTOS_POLL_SEGUNDOS y los reparte en memoria a las colas de los
+     suscriptores del restaurante. Así un cierre guardado en otro worker o en
+     un script llega a todos. Un commit en el mismo worker despierta al
+     lector sin esperar el intervalo.
+  3. Cada conexión SSE es una cola acotada en el loop, sin hilo ni conexión a
+     la base: miles de clientes ociosos cuestan una consulta por intervalo
+     por worker y un heartbeat por conexión.
+  - Los ids son crecientes: el cliente reconecta con Last-Event-ID y recibe
+    lo que se perdió (retención EVENTOS_RETENCION_MINUTOS).
+  - Cola llena (cliente lento) o demasiados eventos perdidos: se manda
+    "resync" para que el cliente recargue todo.
+"""
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from itertools import chain
+from typing import Optional
+
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import data_versions
+from .data_versions import TODOS
+
+POLL_SEGUNDOS = float(os.environ.get("EVENTOS_POLL_SEGUNDOS", "1"))
+RETENCION_MINUTOS = int(os.environ.get("EVENTOS_RETENCION_MINUTOS", "60"))
+COLA_MAX = 100
+LOTE_MAX = 500
+_PURGA_CADA = timedelta(minutes=5)
+# Ids que faltan en una lectura pueden ser transacciones aún abiertas (las
+# secuencias de Postgres no respetan el orden de commit): se reintentan un rato
+_HUECO_SEGUNDOS = 10
+_HUECOS_MAX = 1000
+
+_DOMINIOS_PL = ("ventas", "gastos", "nomina", "catalogo")
+RESYNC = "event: resync\ndata: {}\n\n"
+
+_local = threading.local()
+
+
+# ── Escritura (dentro de la transacción) ──────────────────────────────────────
+
+def _fila(restaurante_id: Optional[int], tipo: str, datos: dict) -> dict:
+    return {
+        "restaurante_id": TODOS if restaurante_id is None else restaurante_id,
+        "tipo": tipo,
+        "datos": json.dumps(datos, separators=(",", ":"), ensure_ascii=False, default=str),
+        "created_at": datetime.utcnow(),
+    }
+
+
+def registrar(conn, filas: list) -> None:
+    """Inserta eventos en la transacción de `conn`; se publican al hacer commit."""
+    if filas:
+        conn.execute(insert(models.EventoCambio.__table__), filas)
+        _local.despertar = True
+
+
+@data_versions.al_subir_versiones
+def pl_invalidado(conn, pares) -> None:
+    """Un evento "pl" invalidado por restaurante cuyos dominios del P&L cambiaron."""
+    por_restaurante: dict = {}
+    for rid, dominio in pares:
+        if dominio in _DOMINIOS_PL:
+            por_restaurante.setdefault(rid, []).append(dominio)
+    registrar(conn, [_fila(rid, "pl", {"accion": "invalidado", "dominios": sorted(doms)})
+                     for rid, doms in sorted(por_restaurante.items())])
+
+
+def _after_flush(session: Session, _flush_context) -> None:
+    pendientes = session.info.setdefault("_eventos", [])
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.CierreTurno):
+            if obj in session.new:
+                accion = "creado"
+            elif obj in session.deleted:
+                accion = "eliminado"
+            elif session.is_modified(obj, include_collections=False):
+                accion = "actualizado"
+            else:
+                continue
+            pendientes.append(_fila(obj.restaurante_id, "cierre", {"accion": accion, "id": obj.id, "fecha": obj.fecha}))
+        elif isinstance(obj, models.AlertaLog) and obj in session.new:
+            pendientes.append(_fila(obj.restaurante_id, "alerta", {
+                "accion": "creada", "id": obj.id, "tipo": obj.tipo, "severidad": obj.severidad,
+                "mensaje": (obj.mensaje or "")[:200],
+            }))
+
+
+def _before_commit(session: Session) -> None:
+    session.flush()
+    filas = session.info.pop("_eventos", None)
+    if filas:
+        # Un cierre modificado en varios flushes de la misma transacción: un evento
+        unicas = {(f["restaurante_id"], f["tipo"], f["datos"]): f for f in filas}
+        registrar(session.connection(), list(unicas.values()))
+
+
+def _after_commit(session: Session) -> None:
+    if getattr(_local, "despertar", False):
+        _local.despertar = False
+        for canal in list(_CANALES.values()):
+            canal.despertar()
+
+
+def _after_rollback(session: Session, _previous_transaction=None) -> None:
+    session.info.pop("_eventos", None)
+    _local.despertar = False
+
+
+event.listen(Session, "after_flush", _after_flush)
+event.listen(Session, "before_commit", _before_commit)
+event.listen(Session, "after_commit", _after_commit)
+event.listen(Session, "after_soft_rollback", _after_rollback)
+
+
+# ── Lectura ───────────────────────────────────────────────────────────────────
+
+def formato_sse(evento) -> str:
+    eid, _rid, tipo, datos = evento
+    return f"id: {eid}\nevent: {tipo}\ndata: {datos}\n\n"
+
+
+def _columnas():
+    EC = models.EventoCambio
+    return select(EC.id, EC.restaurante_id, EC.tipo, EC.datos)
+
+
+def perdidos(bind, restaurante_id: int, desde_id: int) -> Optional[list]:
+    """Eventos del restaurante (y comodín) con id > desde_id; None si son más de LOTE_MAX."""
+    EC = models.EventoCambio
+    with bind.connect() as conn:
+        filas = conn.execute(
+            _columnas().where(EC.id > desde_id, EC.restaurante_id.in_((restaurante_id, TODOS)))
+            .order_by(EC.id).limit(LOTE_MAX + 1)
+        ).all()
+    return None if len(filas) > LOTE_MAX else [tuple(f) for f in filas]
+
+
+class Suscripcion:
+    def __init__(self, restaurante_id: int):
+        self.restaurante_id = restaurante_id
+        self.cola: asyncio.Queue = asyncio.Queue(maxsize=COLA_MAX)
+
+    def entregar(self, evento) -> None:
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se tira lo pendiente y se le pide recargar (None = resync)
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+
+class Canal:
+    """Lector de eventos_cambio de una base y reparto a las suscripciones de este worker."""
+
+    def __init__(self, bind):
+        self.bind = bind
+        self._subs: dict[int, set] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._despierta: Optional[asyncio.Event] = None
+        self._tarea: Optional[asyncio.Task] = None
+        self._ultimo = 0
+        self._huecos: dict[int, datetime] = {}
+        self._purga = datetime.min
+
+    def suscribir(self, restaurante_id: int) -> Suscripcion:
+        """Llamar desde el loop del servidor; arranca el lector si no está corriendo."""
+        sub = Suscripcion(restaurante_id)
+        self._subs.setdefault(restaurante_id, set()).add(sub)
+        loop = asyncio.get_running_loop()
+        if self._tarea is None or self._tarea.done() or self._loop is not loop:
+            self._loop, self._despierta = loop, asyncio.Event()
+            self._tarea = loop.create_task(self._leer_siempre())
+        return sub
+
+    def cancelar(self, sub: Suscripcion) -> None:
+        subs = self._subs.get(sub.restaurante_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.restaurante_id]
+        if not self._subs and self._despierta is not None:
+            self._despierta.set()  # que el lector termine ya
+
+    def suscriptores(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    def despertar(self) -> None:
+        """Seguro desde cualquier hilo (los commits corren en el threadpool)."""
+        loop, despierta = self._loop, self._despierta
+        if loop is None or despierta is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(despierta.set)
+        except RuntimeError:  # loop cerrándose
+            pass
+
+    async def _leer_siempre(self) -> None:
+        self._ultimo = await asyncio.to_thread(self._max_id)
+        self._huecos.clear()
+        while self._subs:
+            try:
+                await asyncio.wait_for(self._despierta.wait(), timeout=POLL_SEGUNDOS)
+            except asyncio.TimeoutError:
+                pass
+            self._despierta.clear()
+            if not self._subs:
+                break
+            try:
+                filas = await asyncio.to_thread(self._leer)
+            except Exception as e:
+                print(f"[WARN] eventos: no se pudo leer eventos_cambio: {e}")
+                continue
+            self._avanzar(filas)
+
+    def _max_id(self) -> int:
+        with self.bind.connect() as conn:
+            return conn.execute(select(func.max(models.EventoCambio.id))).scalar() or 0
+
+    def _leer(self) -> list:
+        EC = models.EventoCambio
+        ahora = datetime.utcnow()
+        if ahora - self._purga >= _PURGA_CADA:
+            self._purga = ahora
+            with self.bind.begin() as conn:
+                conn.execute(delete(EC).where(EC.created_at < ahora - timedelta(minutes=RETENCION_MINUTOS)))
+        condicion = EC.id > self._ultimo
+        if self._huecos:
+            condicion = or_(condicion, EC.id.in_(list(self._huecos)))
+        with self.bind.connect() as conn:
+            return [tuple(f) for f in conn.execute(_columnas().where(condicion).order_by(EC.id).limit(LOTE_MAX))]
+
+    def _avanzar(self, filas: list) -> None:
+        ahora = datetime.utcnow()
+        for evento in filas:
+            eid = evento[0]
+            if self._huecos.pop(eid, None) is None:
+                if eid <= self._ultimo:
+                    continue
+                if eid - self._ultimo - 1 <= _HUECOS_MAX:
+                    self._huecos.update((i, ahora) for i in range(self._ultimo + 1, eid))
+                self._ultimo = eid
+            self._repartir(evento)
+        limite = ahora - timedelta(seconds=_HUECO_SEGUNDOS)
+        self._huecos = {i: t for i, t in self._huecos.items() if t >= limite}
+
+    def _repartir(self, evento) -> None:
+        rid = evento[1]
+        destinos = chain.from_iterable(self._subs.values()) if rid == TODOS else self._subs.get(rid, ())
+        for sub in list(destinos):
+            sub.entregar(evento)
+
+
+_CANALES: dict = {}
+
+
+def canal_para(bind) -> Canal:
+    """Un canal (y un lector) por base de datos en este worker."""
+    canal = _CANALES.get(bind)
+    if canal is None:
+        canal = _CANALES[bind] = Canal(bind)
+    return canal
@@ -0,0 +1,411 @@
+"""
+KOI Dashboard — Parsers de PDFs de gastos (OCR de factura y bitácora de caja).
+Funciones puras sobre bytes: corren en el pool de services.parse_executor.
+Los errores se reportan como ValueError (HTTPException no es picklable).
+"""
+import re as _re
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+
+from .pdf_document import PDFDocument
+from .proveedor_matcher import ProveedorMatcher, default_matcher
+
+# Subir cuando cambie la lógica de parse_ocr_pdf — invalida el cache de resultados
+OCR_PARSER_VERSION = "1"
+
+# Respaldo cuando el restaurante no tiene proveedores capturados
+PROV_MAP = {
+    "BUENA TIERRA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS"},
+    "CESAR HUMBERTO CARRANZA": {"nombre": "LA BUENA TIERRA", "categoria": "VEGETALES_FRUTAS"},
+    "COMERCIAL TOYO": {"nombre": "TOYO", "categoria": "PRODUCTOS_ASIATICOS"},
+    "TOYO": {"nombre": "TOYO", "categoria": "PRODUCTOS_ASIATICOS"},
+    "EL NAVEGANTE": {"nombre": "EL NAVEGANTE", "categoria": "PROTEINA"},
+    "MARIA ISABEL HERNANDEZ": {"nombre": "EL NAVEGANTE", "categoria": "PROTEINA"},
+    "VACA NEGRA": {"nombre": "VACA NEGRA", "categoria": "PROTEINA"},
+    "ALIMENTOS Y CARNES": {"nombre": "VACA NEGRA", "categoria": "PROTEINA"},
+    "KUME": {"nombre": "KUME", "categoria": "PRODUCTOS_ASIATICOS"},
+    "KUME IMPORTACIONES": {"nombre": "KUME", "categoria": "PRODUCTOS_ASIATICOS"},
+    "FREKO": {"nombre": "FREKO", "categoria": "ABARROTES"},
+    "WALMART": {"nombre": "WALMART", "categoria": "ABARROTES"},
+    "SAMS": {"nombre": "SAMS", "categoria": "ABARROTES"},
+    "COSTCO": {"nombre": "COSTCO", "categoria": "ABARROTES"},
+    "AMAZON": {"nombre": "AMAZON", "categoria": "DESECHABLES_EMPAQUES"},
+    "MERCADO LIBRE": {"nombre": "MERCADO LIBRE", "categoria": "EQUIPO"},
+    "FEMSA": {"nombre": "FEMSA", "categoria": "BEBIDAS"},
+}
+
+
+def ocr_cache_version(matcher: Optional[ProveedorMatcher] = None) -> str:
+    return f"{OCR_PARSER_VERSION}:{(matcher or default_matcher(PROV_MAP)).fingerprint}"
+
+
+def parse_ocr_pdf(contents: bytes, matcher: Optional[ProveedorMatcher] = None) -> dict:
+    """Extrae proveedor, total, fecha e items de una factura PDF con texto."""
+    # Intentar con pdfplumber — un solo PDFDocument para texto y tablas
+    doc = None
+    try:
+        doc = PDFDocument(contents)
+        full_text = doc.text_with_tables()
+        
+        if len(full_text.strip()) < 20:
+            raise ValueError("El PDF no contiene texto extraible. Sube un PDF con texto, no una imagen escaneada.")
+
+        proveedor = None
+        categoria = "OTROS"
+        info = (matcher or default_matcher(PROV_MAP)).match(full_text)
+        if info:
+            proveedor = info["nombre"]
+            categoria = info["categoria"]
+        
+        # Extraer total
+        total = None
+        for pattern in [r"TOTAL[:\s]*\$?\s*([\d,]+\.\d{2})", r"Total[:\s]*\$?\s*([\d,]+\.\d{2})", r"TOTAL\s+\$([\d,]+\.\d{2})"]:
+            m = _re.search(pattern, full_text)
+            if m:
+                total = float(m.group(1).replace(",", ""))
+                break
+        
+        # Extraer fecha
+        fecha = None
+        for pattern in [r"(\d{4}-\d{2}-\d{2})", r"(\d{1,2}/\d{1,2}/\d{4})", r"Fecha[:\s]*(\d{4}-\d{2}-\d{2})"]:
+            m = _re.search(pattern, full_text)
+            if m:
+                d = m.group(1)
+                if "-" in d and len(d) == 10:
+                    fecha = d
+                elif "/" in d:
+                    parts = d.split("/")
+                    if len(parts) == 3 and len(parts[2]) == 4:
+                        fecha = f"{parts[2]}-{parts[1].zfill(2)}-{parts[0].zfill(2)}"
+                break
+        
+        # Extraer descripcion de conceptos
+        lines = [l.strip() for l in full_text.split("\n") if len(l.strip()) > 5]
+        keywords = ["SALMON","CARNE","NEW YORK","ATUN","CAMARON","SAKE","MIRIN","NARANJA","AGUACATE","LIMON","PEPINO","NORI","SESAME","ZANAHORIA","CEBOLL"]
+        desc_items = [l for l in lines if any(kw in l.upper() for kw in keywords)]
+        descripcion = "; ".join(desc_items[:3]) if desc_items else None
+        
+        # Extraer items individuales de la tabla
+        items = []
+        for line in full_text.split("\n"):
+            # Buscar patron: cantidad + unidad + descripcion + precio + importe
+            import re as _re2
+            m = _re2.match(r"^\s*(\d+(?:\.\d+)?)\s+(?:KGM|KG|H87|PZA|Pieza|L)\s+(.+?)\s+(\d[\d,]*\.\d{2})\s*$", line.strip())
+            if m:
+                cant = m.group(1)
+                desc = m.group(2).strip()
+                # Quitar ClaveProdServ
+                desc = _re.sub(r"ClaveProdServ\s*-\s*\d+", "", desc).strip()
+                importe = float(m.group(3).replace(",",""))
+                if importe > 0 and len(desc) > 2:
+                    items.append({"descripcion": desc, "monto": importe, "categoria": categoria})
+        
+        # Si no encontramos items con regex, reusar las tablas ya extraídas
+        if not items:
+            try:
+                for i in range(len(doc)):
+                    for table in doc.tables(i):
+                        for row in table:
+                            if row and len(row) >= 4:
+                                try:
+                                    last_val = str(row[-1] or "").replace(",","").replace("$","").strip()
+                                    importe = float(last_val)
+                                    desc_parts = [str(c) for c in row[1:-1] if c and not str(c).replace(".","").replace(",","").isdigit()]
+                                    desc = " ".join(desc_parts).strip()
+                                    desc = _re.sub(r"ClaveProdServ\s*-\s*\d+", "", desc).strip()
+                                    if importe > 0 and len(desc) > 2 and importe < (total or 999999):
+                                        items.append({"descripcion": desc, "monto": importe, "categoria": categoria})
+                                except:
+                                    pass
+            except:
+                pass
+        
+        return {
+            "fecha": fecha,
+            "proveedor": proveedor,
+            "categoria": categoria,
+            "total": total,
+            "descripcion": descripcion,
+            "confianza": 0.8 if proveedor else 0.3,
+            "items": items,
+        }
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Error procesando PDF: {str(e)}")
+    finally:
+        if doc is not None:
+            doc.close()
+
+
+def parse_bitacora_pdf(contents: bytes) -> dict:
+    """Extrae los gastos y el cierre del día de la bitácora de caja (páginas 1-2)."""
+    # Solo se usan las dos primeras páginas
+    try:
+        doc = PDFDocument(contents, max_pages=2)
+    except Exception as e:
+        raise ValueError(f"Error leyendo PDF: {str(e)}")
+    try:
+        return _parse_bitacora_doc(doc)
+    finally:
+        doc.close()
+
+
+def _parse_bitacora_doc(doc: PDFDocument) -> dict:
+    try:
+        pagina_p1 = doc.page(0)
+        texto_p1 = doc.text(0)
+        texto_p2 = doc.text(1)
+        texto_completo = texto_p1 + "\n" + texto_p2
+    except Exception as e:
+        raise ValueError(f"Error leyendo PDF: {str(e)}")
+
+    # ── Metadata from text ────────────────────────────────────────────────
+    responsable = "Sin responsable"
+    fecha = None
+    MESES_NUM = {"ENERO":"01","FEBRERO":"02","MARZO":"03","ABRIL":"04","MAYO":"05",
+                 "JUNIO":"06","JULIO":"07","AGOSTO":"08","SEPTIEMBRE":"09",
+                 "OCTUBRE":"10","NOVIEMBRE":"11","DICIEMBRE":"12"}
+    for ln in texto_p1.split("\n")[:10]:
+        lu = ln.strip().upper()
+        if "RESPONSABLE:" in lu:
+            responsable = ln.split(":", 1)[-1].strip()
+        elif "FECHA:" in lu:
+            fm = _re.search(r"FECHA[:\s]*\w+\s+(\d{1,2})\s+(\w+)\s+(\d{4})", lu)
+            if fm:
+                dia, mes_txt, anio = fm.group(1).zfill(2), fm.group(2), fm.group(3)
+                fecha = f"{anio}-{MESES_NUM.get(mes_txt,'01')}-{dia}"
+
+    # ── Category helpers ──────────────────────────────────────────────────
+    CATEGORIAS_KOI = [
+        "COMIDA PERSONAL", "ENTREGA DE UTILIDADES", "PRODUCTOS ASIATICOS",
+        "DESECHABLES EMPAQUES", "VEGETALES FRUTAS", "LIMPIEZA MANTTO",
+        "COMISIONES BANCARIAS", "COMISIONES PLATAFORMAS", "ABARROTES",
+        "BEBIDAS", "PERSONAL", "PROPINAS", "PROTEINA", "MARKETING",
+        "MANTENIMIENTO", "SERVICIOS", "PAPELERIA", "EQUIPO", "OTROS",
+        "ESTACIONAMIENTO", "LUZ", "NOMINA", "RENTA",
+    ]
+    CAT_MAP = {
+        "COMISIONES PLATAFORMAS": "COMISIONES_PLATAFORMAS",
+        "COMISIONES BANCARIAS":   "COMISIONES_BANCARIAS",
+        "ENTREGA DE UTILIDADES":  "OTROS",
+        "DESECHABLES EMPAQUES":   "DESECHABLES_EMPAQUES",
+        "VEGETALES FRUTAS":       "VEGETALES_FRUTAS",
+        "PRODUCTOS ASIATICOS":    "PRODUCTOS_ASIATICOS",
+        "COMIDA PERSONAL":        "PERSONAL",
+        "LIMPIEZA MANTTO":        "LIMPIEZA_MANTTO",
+        "ESTACIONAMIENTO":        "SERVICIOS",
+        "MANTENIMIENTO":          "LIMPIEZA_MANTTO",
+        "ABARROTES":              "ABARROTES",
+        "PROTEINA":               "PROTEINA",
+        "BEBIDAS":                "BEBIDAS",
+        "PROPINAS":               "PROPINAS",
+        "MARKETING":              "MARKETING",
+        "SERVICIOS":              "SERVICIOS",
+        "PERSONAL":               "PERSONAL",
+        "PAPELERIA":              "PAPELERIA",
+        "EQUIPO":                 "EQUIPO",
+        "NOMINA":                 "NOMINA",
+        "IMPUESTOS":              "IMPUESTOS",
+        "RENTA":                  "RENTA",
+        "LUZ":                    "LUZ",
+        "SOFTWARE":               "SOFTWARE",
+        "OTROS":                  "OTROS",
+    }
+
+    def extraer_categoria(texto: str) -> str:
+        t = texto.upper()
+        for cat in sorted(CATEGORIAS_KOI, key=len, reverse=True):
+            if cat in t:
+                return cat
+        return "OTROS"
+
+    def map_categoria(raw: str) -> str:
+        return CAT_MAP.get(raw, "OTROS")
+
+    def limpiar_monto(s: str) -> float:
+        try:
+            return float(str(s or "").replace("$", "").replace(",", "").strip())
+        except Exception:
+            return 0.0
+
+    def make_gasto(proveedor: str, clase: str, categoria_raw: str,
+                   comprobante: str, descripcion: str, monto: float) -> dict:
+        proveedor = _re.sub(r"\s*\(.*?\)\s*", " ", proveedor).strip().strip("/, ").upper()
+        proveedor = " ".join(proveedor.split())
+        INVALID = {"MP", "NMP", "TICKET", "VALE", "TOTAL", ""}
+        valido = bool(proveedor) and proveedor not in INVALID and len(proveedor.split()) <= 5
+        return {
+            "fecha":              fecha or str(date.today()),
+            "proveedor":          proveedor[:80] or "DESCONOCIDO",
+            "clase":              clase if clase in ("MP", "NMP") else "NMP",
+            "categoria":          map_categoria(categoria_raw),
+            "categoria_bitacora": categoria_raw,
+            "monto":              monto,
+            "metodo_pago":        "EFECTIVO",
+            "comprobante":        comprobante if comprobante in ("TICKET","VALE","FACTURA","TRANSFERENCIA","RECIBO") else "VALE",
+            "descripcion":        str(descripcion or "")[:200],
+            "valido":             valido,
+            "advertencias":       [] if valido else ["Proveedor no identificado"],
+        }
+
+    # ── INTENTO 1: extract_table() automático ─────────────────────────────
+    gastos_parsed: list = []
+    total_pdf = 0.0
+    tabla_ok = False
+
+    if pagina_p1:
+        for strategy in [None, {"vertical_strategy": "lines", "horizontal_strategy": "lines"}]:
+            tabla = doc.table(0, strategy)
+            if not tabla:
+                continue
+
+            # Find header row
+            enc_idx = None
+            for ri, row in enumerate(tabla):
+                row_str = " ".join(str(c or "").lower() for c in row)
+                if "proveedor" in row_str and "clase" in row_str:
+                    enc_idx = ri
+                    break
+            if enc_idx is None:
+                continue
+
+            enc = [str(c or "").lower().strip() for c in tabla[enc_idx]]
+            ci = lambda kw, default: next((i for i, c in enumerate(enc) if kw in c), default)
+            c_prov = ci("proveedor", 0); c_cls = ci("clase", 1)
+            c_cat  = ci("categ", 2);     c_cmp = ci("comprobante", 3)
+            c_desc = ci("descrip", 4);   c_mnt = ci("monto", 5)
+
+            def gc(row, idx):
+                return str(row[idx]).strip() if idx < len(row) and row[idx] else ""
+
+            for row in tabla[enc_idx + 1:]:
+                if not row or all(not (c or "").strip() for c in row):
+                    continue
+                prov = gc(row, c_prov)
+                if not prov or prov.upper() in ("PROVEEDOR",):
+                    continue
+                if "TOTAL" in prov.upper():
+                    m = _re.search(r"\$?([\d,]+)", gc(row, c_mnt) or prov)
+                    if m:
+                        total_pdf = float(m.group(1).replace(",", ""))
+                    break
+                monto = limpiar_monto(gc(row, c_mnt))
+                if monto <= 0:
+                    continue
+                cat_raw = extraer_categoria(gc(row, c_cat))
+                gastos_parsed.append(make_gasto(
+                    proveedor   = prov,
+                    clase       = gc(row, c_cls).upper(),
+                    categoria_raw = cat_raw,
+                    comprobante = gc(row, c_cmp).upper(),
+                    descripcion = gc(row, c_desc),
+                    monto       = monto,
+                ))
+
+            if gastos_parsed:
+                tabla_ok = True
+                break
+
+    # ── INTENTO 2: extract_words() por coordenadas x ──────────────────────
+    if not tabla_ok and pagina_p1:
+        words = doc.words(0)
+
+        # Calibrate column x-positions from header words
+        header_x: dict = {}
+        for kw, key in [("proveedor","prov"),("clase","cls"),("categ","cat"),
+                        ("comprobante","cmp"),("descrip","desc"),("monto","mnt")]:
+            for w in words:
+                if kw in w["text"].lower() and key not in header_x:
+                    header_x[key] = w["x0"]
+
+        if len(header_x) >= 4:
+            col_keys  = ["prov","cls","cat","cmp","desc","mnt"]
+            col_x     = [header_x.get(k, 0) for k in col_keys]
+
+            def get_col(x: float) -> int:
+                best = 0
+                for ci2, cx in enumerate(col_x[1:], 1):
+                    if x >= cx:
+                        best = ci2
+                return best
+
+            y_inicio = max((w["top"] for w in words if "proveedor" in w["text"].lower()), default=0)
+            y_fin    = min((w["top"] for w in words if w["text"].upper() == "TOTAL"), default=pagina_p1.height)
+
+            filas: dict = defaultdict(lambda: defaultdict(list))
+            for w in words:
+                if w["top"] <= y_inicio or w["top"] >= y_fin:
+                    continue
+                y_key = round(w["top"] / 4) * 4
+                filas[y_key][get_col(w["x0"])].append(w["text"])
+
+            gasto_raw: dict = defaultdict(list)
+            for y_key in sorted(filas.keys()):
+                fila = filas[y_key]
+                # New gasto starts when col 0 (proveedor) AND col 1 (clase) have content
+                if 0 in fila and 1 in fila:
+                    if gasto_raw:
+                        prov  = " ".join(gasto_raw[0])
+                        cls_  = " ".join(gasto_raw[1]).upper()
+                        cat_t = " ".join(gasto_raw[2])
+                        cmp_  = " ".join(gasto_raw[3]).upper()
+                        desc  = " ".join(gasto_raw[4])
+                        mnt   = limpiar_monto(" ".join(gasto_raw[5]))
+                        if mnt > 0 and prov.upper() not in ("PROVEEDOR",):
+                            gastos_parsed.append(make_gasto(prov, cls_, extraer_categoria(cat_t), cmp_, desc, mnt))
+                    gasto_raw = defaultdict(list)
+                for col, ws in fila.items():
+                    gasto_raw[col].extend(ws)
+
+            # Flush last block
+            if gasto_raw:
+                prov  = " ".join(gasto_raw[0])
+                cls_  = " ".join(gasto_raw[1]).upper()
+                cat_t = " ".join(gasto_raw[2])
+                cmp_  = " ".join(gasto_raw[3]).upper()
+                desc  = " ".join(gasto_raw[4])
+                mnt   = limpiar_monto(" ".join(gasto_raw[5]))
+                if mnt > 0 and "TOTAL" not in prov.upper() and prov.upper() not in ("PROVEEDOR",):
+                    gastos_parsed.append(make_gasto(prov, cls_, extraer_categoria(cat_t), cmp_, desc, mnt))
+
+        # total_pdf from text if not found
+        m_tot = _re.search(r"\bTOTAL\b[^\d]*\$?([\d,]+)", texto_p1, _re.IGNORECASE)
+        if m_tot:
+            total_pdf = float(m_tot.group(1).replace(",", ""))
+
+    # ── Cierre del día ────────────────────────────────────────────────────
+    def _ev(pat: str) -> float:
+        m = _re.search(pat, texto_completo, _re.IGNORECASE)
+        return float(m.group(1).replace(",", "")) if m else 0.0
+
+    cierre_data = {
+        "saldo_inicial":       _ev(r"Saldo Inicial[:\s]*\$?([\d,]+)"),
+        "total_gastos":        _ev(r"Total Gastos[:\s]*\$?([\d,]+)"),
+        "ventas_efectivo":     _ev(r"Ventas en Efectivo[:\s]*\$?([\d,]+)"),
+        "saldo_final_esperado":_ev(r"Saldo Final Esperado[:\s]*\$?([\d,]+)"),
+        "efectivo_fisico":     _ev(r"Efectivo F[ií]sico[:\s]*\$?([\d,]+)"),
+        "diferencia":          _ev(r"Diferencia[:\s]*\$?([\d,]+)"),
+    }
+    if not any(cierre_data.values()):
+        cierre_data = None
+
+    if not total_pdf:
+        m_tot2 = _re.search(r"\bTOTAL\b[^\d]*\$?([\d,]+)", texto_completo, _re.IGNORECASE)
+        if m_tot2:
+            total_pdf = float(m_tot2.group(1).replace(",", ""))
+
+    total_extraido = round(sum(g["monto"] for g in gastos_parsed), 2)
+    coincide_total = abs(total_extraido - total_pdf) < 2.0 if total_pdf > 0 else None
+
+    return {
+        "fecha":          fecha,
+        "responsable":    responsable,
+        "gastos":         gastos_parsed,
+        "total_gastos":   total_extraido,
+        "total_pdf":      total_pdf,
+        "coincide_total": coincide_total,
+        "cierre":         cierre_data,
+        "gastos_count":   len(gastos_parsed),
+    }
@@ -0,0 +1,238 @@
+"""
+KOI Dashboard — Importadores masivos (estados de cuenta, ventas históricas).
+
+Los archivos se recorren página por página (PDF) o renglón por renglón (CSV)
+con generadores y se escriben en bloques (INSERT/UPDATE por lote) en vez de
+un objeto ORM y una consulta por renglón.
+
+Estados de cuenta: los duplicados se descartan en la base con ON CONFLICT DO
+NOTHING sobre una llave natural, así que reimportar no duplica movimientos.
+Ventas: las fechas existentes se leen en una sola consulta y el lote se
+divide en inserciones y actualizaciones por id.
+"""
+import codecs
+import csv
+import hashlib
+import re
+from datetime import date, datetime
+from typing import IO, Iterable, Iterator, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .pdf_document import PDFDocument
+
+CHUNK_SIZE = 500
+
+
+def parse_money(value: str) -> float:
+    if not value or value.strip() == "-":
+        return 0.0
+    cleaned = re.sub(r'[$,\s"]', '', value.strip())
+    try:
+        return float(cleaned)
+    except ValueError:
+        return 0.0
+
+
+def dialect_insert(db: Session, table):
+    """INSERT con soporte de ON CONFLICT del motor en uso (PostgreSQL o SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def en_bloques(items: Iterable, size: int) -> Iterator[list]:
+    bloque = []
+    for item in items:
+        bloque.append(item)
+        if len(bloque) >= size:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Estados de cuenta bancarios
+# ─────────────────────────────────────────────────────────────────────────────
+
+def hash_movimiento(restaurante_id: Optional[int], fecha: date, referencia: Optional[str],
+                    monto: float, saldo: Optional[float]) -> str:
+    """Llave natural de un movimiento: (restaurante, fecha, referencia, monto, saldo)."""
+    saldo_txt = "" if saldo is None else f"{saldo:.2f}"
+    base = f"{restaurante_id or ''}|{fecha.isoformat()}|{(referencia or '').strip().upper()}|{monto:.2f}|{saldo_txt}"
+    return hashlib.sha1(base.encode()).hexdigest()
+
+
+def _movimiento(fecha: date, referencia, concepto, cargo: float, abono: float, saldo) -> Optional[dict]:
+    if cargo > 0:
+        monto, tipo = cargo, models.TipoMovimientoBanco.CARGO
+    elif abono > 0:
+        monto, tipo = abono, models.TipoMovimientoBanco.ABONO
+    else:
+        return None
+    return {"fecha": fecha, "referencia": referencia or None, "concepto": concepto or "",
+            "monto": monto, "tipo": tipo, "saldo": saldo}
+
+
+def iter_movimientos_pdf(source) -> Iterator[dict]:
+    """Movimientos de un PDF Santander, una página a la vez."""
+    with PDFDocument(source) as pdf:
+        for i in range(len(pdf)):
+            for row in pdf.table(i) or []:
+                if not row or len(row) < 8:
+                    continue
+                # Limpiar saltos de linea en todas las celdas
+                row = [(c or "").replace("\n", "").replace("\r", "").strip() for c in row]
+                # Col 0=Cuenta, 1=Fecha, 2=Hora, 3=Sucursal, 4=Desc, 5=Cargo, 6=Abono, 7=Saldo, 8=Ref, 9=Concepto, 10=DescLarga
+                fecha_raw = row[1].replace(" ", "")
+                # Saltar header
+                if not fecha_raw or "echa" in fecha_raw.lower():
+                    continue
+                # Fecha viene como DDMMYYYY (8 digitos) ej: 03022026
+                digits = re.sub(r"[^0-9]", "", fecha_raw)
+                if len(digits) < 8:
+                    continue
+                try:
+                    dia, mes_num, anio_num = int(digits[:2]), int(digits[2:4]), int(digits[4:8])
+                    if anio_num < 2000 or anio_num > 2099:
+                        continue
+                    fecha = date(anio_num, mes_num, dia)
+                except ValueError:
+                    continue
+                descripcion = row[4]
+                mov = _movimiento(
+                    fecha,
+                    row[8] if len(row) > 8 else None,
+                    row[9] if len(row) > 9 else descripcion,
+                    parse_money(row[5]), parse_money(row[6]), parse_money(row[7]),
+                )
+                if mov:
+                    yield mov
+            # Ya no se necesita la página: liberar objetos de pdfplumber
+            pdf.release(i)
+
+
+def iter_movimientos_csv(stream: IO[bytes]) -> Iterator[dict]:
+    """Movimientos de un CSV (fecha, referencia, concepto, cargo, abono, saldo), renglón por renglón."""
+    lineas = codecs.iterdecode(stream, "utf-8", errors="replace")
+    for row in csv.reader(lineas):
+        if len(row) < 4:
+            continue
+        fecha = None
+        for fmt in ["%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"]:
+            try:
+                fecha = datetime.strptime(row[0].strip(), fmt).date()
+                break
+            except ValueError:
+                continue
+        if not fecha:
+            continue
+        mov = _movimiento(
+            fecha,
+            row[1].strip(),
+            row[2].strip(),
+            parse_money(row[3]),
+            parse_money(row[4]) if len(row) > 4 else 0.0,
+            parse_money(row[5]) if len(row) > 5 else None,
+        )
+        if mov:
+            yield mov
+
+
+def importar_movimientos(db: Session, movimientos: Iterable[dict], restaurante_id: Optional[int] = None,
+                         chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Inserta movimientos en bloques; los que ya existen (misma llave natural)
+    se omiten. Hace commit. Retorna {"leidos", "importados", "duplicados"}.
+    """
+    table = models.MovimientoBanco.__table__
+    leidos = importados = 0
+    for bloque in en_bloques(movimientos, chunk_size):
+        filas = []
+        vistos = set()
+        for m in bloque:
+            h = hash_movimiento(restaurante_id, m["fecha"], m["referencia"], m["monto"], m["saldo"])
+            if h in vistos:
+                continue
+            vistos.add(h)
+            filas.append({**m, "restaurante_id": restaurante_id, "hash_natural": h,
+                          "reconciliado": False, "created_at": datetime.utcnow()})
+        leidos += len(bloque)
+        stmt = dialect_insert(db, table).values(filas).on_conflict_do_nothing(index_elements=["hash_natural"])
+        importados += db.execute(stmt).rowcount
+    db.commit()
+    return {"leidos": leidos, "importados": importados, "duplicados": leidos - importados}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Ventas diarias (CSV histórico)
+# ─────────────────────────────────────────────────────────────────────────────
+
+_CAMPOS_VENTA = ["efectivo", "prop_ef", "pay", "prop_pa", "terminales", "prop_te", "uber_eats",
+                 "rappi", "cortesias", "otros_ingresos", "total_venta", "total_propina"]
+
+
+def parse_ventas_csv(stream: IO[bytes]) -> tuple[list[dict], int]:
+    """
+    Renglones del detalle diario (después del header FECHA). Retorna
+    (ventas, saltados); si una fecha se repite gana el último renglón.
+    Lanza ValueError si no hay sección de detalle.
+    """
+    reader = csv.reader(codecs.iterdecode(stream, "utf-8"))
+    for row in reader:
+        if len(row) > 0 and row[0].strip() == "FECHA":
+            break
+    else:
+        raise ValueError("No se encontro la seccion de detalle diario")
+    por_fecha: dict = {}
+    saltados = 0
+    for row in reader:
+        if len(row) < 15:
+            continue
+        fecha_str = row[0].strip()
+        if not fecha_str or fecha_str == "-":
+            continue
+        try:
+            fecha = datetime.strptime(fecha_str, "%d-%b-%Y").date()
+        except ValueError:
+            continue
+        if all(v.strip() in ("-", "") for v in row[3:15]):
+            saltados += 1
+            continue
+        venta = {"fecha": fecha, "mes": row[1].strip().lower(),
+                 "semana": int(row[2].strip()) if row[2].strip().isdigit() else 0}
+        venta.update({campo: parse_money(row[3 + i]) for i, campo in enumerate(_CAMPOS_VENTA)})
+        por_fecha[fecha] = venta
+    return list(por_fecha.values()), saltados
+
+
+def importar_ventas(db: Session, ventas: list[dict], restaurante_id: Optional[int] = None,
+                    chunk_size: int = CHUNK_SIZE) -> dict:
+    """
+    Upsert por fecha (y restaurante si se indica): una consulta para las fechas
+    existentes y escrituras por bloque. Hace commit. Retorna {"creados", "actualizados"}.
+    """
+    if not ventas:
+        return {"creados": 0, "actualizados": 0}
+    V = models.VentaDiaria
+    fechas = [v["fecha"] for v in ventas]
+    q = db.query(V.id, V.fecha).filter(V.fecha >= min(fechas), V.fecha <= max(fechas))
+    if restaurante_id is not None:
+        q = q.filter(V.restaurante_id == restaurante_id)
+    existentes: dict = {}
+    for vid, fecha in q.order_by(V.id).all():
+        existentes.setdefault(fecha, vid)
+
+    nuevas = [{**v, "restaurante_id": restaurante_id} for v in ventas if v["fecha"] not in existentes]
+    cambios = [{**v, "id": existentes[v["fecha"]]} for v in ventas if v["fecha"] in existentes]
+    for bloque in en_bloques(nuevas, chunk_size):
+        db.execute(insert(V), bloque)
+    for bloque in en_bloques(cambios, chunk_size):
+        db.execute(update(V).execution_options(restaurante_id=restaurante_id), bloque)
+    db.commit()
+    return {"creados": len(nuevas), "actualizados": len(cambios)}
@@ -0,0 +1,250 @@
+"""
+KOI Dashboard — Ingesta de facturas por lote.
+
+Cierre de mes: 80–150 facturas de proveedores. En vez de parsearlas una por una,
+el lote se parsea en paralelo en el pool de parse_executor y las filas de
+GastoTransferencia se crean en un solo commit, deduplicando por folio_fiscal
+(contra la BD y dentro del mismo lote).
+
+Los jobs viven en memoria del proceso: el progreso se consulta con get_job().
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import date, datetime
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from .parse_executor import ParseTimeoutError, run_parse_cached
+from .pdf_parser import PARSER_VERSION, parse_image_file, parse_invoice_file
+
+MAX_FILE_BYTES = 10 * 1024 * 1024
+MAX_FILES = 300
+_MAX_JOBS = 50
+
+_EXTENSIONES = {".pdf": "application/pdf", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+
+_jobs: dict = {}
+_jobs_lock = threading.Lock()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Entrada: archivos sueltos o .zip
+# ─────────────────────────────────────────────────────────────────────────────
+
+def expandir_archivos(archivos: list[tuple[str, bytes]]) -> tuple[list[tuple[str, bytes]], list[dict]]:
+    """
+    Expande los .zip y filtra extensiones no soportadas.
+    Retorna (archivos_validos, reportes_rechazados).
+    """
+    validos: list[tuple[str, bytes]] = []
+    rechazados: list[dict] = []
+
+    def _agregar(nombre: str, contenido: bytes):
+        ext = os.path.splitext(nombre)[1].lower()
+        if ext not in _EXTENSIONES:
+            rechazados.append({"archivo": nombre, "status": "rechazado", "error": "Formato no soportado"})
+        elif len(contenido) > MAX_FILE_BYTES:
+            rechazados.append({"archivo": nombre, "status": "rechazado", "error": "Archivo demasiado grande (máximo 10MB)"})
+        elif len(validos) >= MAX_FILES:
+            rechazados.append({"archivo": nombre, "status": "rechazado", "error": f"Máximo {MAX_FILES} archivos por lote"})
+        else:
+            validos.append((nombre, contenido))
+
+    for nombre, contenido in archivos:
+        if nombre.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+                    for info in zf.infolist():
+                        base = os.path.basename(info.filename)
+                        if info.is_dir() or not base or base.startswith("."):
+                            continue
+                        if info.file_size > MAX_FILE_BYTES:
+                            rechazados.append({"archivo": base, "status": "rechazado",
+                                               "error": "Archivo demasiado grande (máximo 10MB)"})
+                            continue
+                        _agregar(base, zf.read(info))
+            except zipfile.BadZipFile:
+                rechazados.append({"archivo": nombre, "status": "rechazado", "error": "ZIP inválido"})
+        else:
+            _agregar(nombre, contenido)
+    return validos, rechazados
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def crear_job(restaurante_id: int, total: int, rechazados: list[dict]) -> dict:
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "restaurante_id": restaurante_id,
+        "estado": "EN_PROCESO",
+        "total": total,
+        "procesados": 0,
+        "creados": 0,
+        "duplicados": 0,
+        "errores": len(rechazados),
+        "archivos": list(rechazados),
+        "created_at": datetime.utcnow().isoformat(),
+        "finished_at": None,
+    }
+    with _jobs_lock:
+        _jobs[job["job_id"]] = job
+        if len(_jobs) > _MAX_JOBS:
+            for viejo in sorted(_jobs.values(), key=lambda j: j["created_at"])[: len(_jobs) - _MAX_JOBS]:
+                _jobs.pop(viejo["job_id"], None)
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, "archivos": list(job["archivos"]),
+                "progreso": round(job["procesados"] / job["total"], 4) if job["total"] else 1.0}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Parseo en paralelo
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def _parsear_archivo(nombre: str, contenido: bytes) -> dict:
+    ext = os.path.splitext(nombre)[1].lower()
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
+        tmp.write(contenido)
+        tmp_path = tmp.name
+    try:
+        if ext == ".pdf":
+            return await run_parse_cached("invoice", PARSER_VERSION, contenido, parse_invoice_file, tmp_path)
+        return await run_parse_cached("vision-image", PARSER_VERSION, contenido,
+                                      parse_image_file, tmp_path, _EXTENSIONES[ext])
+    finally:
+        try:
+            os.unlink(tmp_path)
+        except Exception:
+            pass
+
+
+def _parse_fecha(valor) -> Optional[date]:
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except ValueError:
+        return None
+
+
+def _fila_desde_parseo(restaurante_id: int, nombre: str, contenido: bytes, data: dict):
+    """Convierte el resultado del parser en GastoTransferencia, o (None, motivo) si no aplica."""
+    if data.get("tipo_parser") == "comprobante_pago":
+        return None, "Es un comprobante de pago, no una factura"
+    if data.get("error"):
+        return None, data["error"]
+    proveedor = (data.get("proveedor") or "").strip()
+    try:
+        monto = float(data.get("total") or 0)
+    except (TypeError, ValueError):
+        monto = 0.0
+    if not proveedor or monto <= 0:
+        return None, "No se detectó proveedor o total"
+
+    ext = os.path.splitext(nombre)[1].lower().lstrip(".")
+    folio_fiscal = (data.get("folio_fiscal") or "").strip().upper() or None
+    return models.GastoTransferencia(
+        restaurante_id=restaurante_id,
+        proveedor=proveedor[:100],
+        categoria=(data.get("categoria_sugerida") or "OTROS")[:50],
+        descripcion=", ".join((i.get("descripcion") or "") for i in (data.get("items") or [])[:5])[:255] or None,
+        monto=monto,
+        fecha_factura=_parse_fecha(data.get("fecha")) or date.today(),
+        estado="PENDIENTE",
+        folio=(str(data.get("folio")) if data.get("folio") else None),
+        folio_fiscal=folio_fiscal,
+        rfc_emisor=data.get("rfc_emisor"),
+        items_json=json.dumps(data.get("items") or [], ensure_ascii=False),
+        factura_url=f"data:application/{ext};base64,{base64.b64encode(contenido).decode()}",
+        factura_nombre=nombre,
+    ), None
+
+
+async def procesar_lote(job_id: str, restaurante_id: int, archivos: list[tuple[str, bytes]],
+                        session_factory: Callable[[], Session]) -> None:
+    """Parsea todos los archivos en paralelo y crea las facturas nuevas en un solo commit."""
+    job = _jobs[job_id]
+
+    async def _uno(nombre: str, contenido: bytes):
+        try:
+            data = await _parsear_archivo(nombre, contenido)
+        except ParseTimeoutError as e:
+            data = {"error": str(e)}
+        except Exception as e:
+            data = {"error": f"Error al parsear archivo: {e}"}
+        with _jobs_lock:
+            job["procesados"] += 1
+        return nombre, contenido, data
+
+    resultados = await asyncio.gather(*[_uno(n, c) for n, c in archivos])
+
+    db = session_factory()
+    try:
+        folios = {
+            (d.get("folio_fiscal") or "").strip().upper()
+            for _n, _c, d in resultados if d.get("folio_fiscal")
+        }
+        existentes = set()
+        if folios:
+            existentes = {
+                (f or "").upper() for (f,) in db.query(models.GastoTransferencia.folio_fiscal).filter(
+                    models.GastoTransferencia.restaurante_id == restaurante_id,
+                    models.GastoTransferencia.folio_fiscal.in_(folios),
+                ).all()
+            }
+
+        reportes: list[dict] = []
+        nuevos: list[tuple[dict, models.GastoTransferencia]] = []
+        for nombre, contenido, data in resultados:
+            fila, motivo = _fila_desde_parseo(restaurante_id, nombre, contenido, data)
+            if fila is None:
+                reportes.append({"archivo": nombre, "status": "error", "error": motivo})
+                continue
+            if fila.folio_fiscal and fila.folio_fiscal in existentes:
+                reportes.append({"archivo": nombre, "status": "duplicado", "folio_fiscal": fila.folio_fiscal})
+                continue
+            if fila.folio_fiscal:
+                existentes.add(fila.folio_fiscal)
+            reporte = {"archivo": nombre, "status": "creado", "proveedor": fila.proveedor,
+                       "monto": fila.monto, "folio_fiscal": fila.folio_fiscal}
+            reportes.append(reporte)
+            nuevos.append((reporte, fila))
+
+        if nuevos:
+            db.add_all([f for _r, f in nuevos])
+            db.commit()
+            for reporte, fila in nuevos:
+                reporte["id"] = fila.id
+
+        with _jobs_lock:
+            job["archivos"].extend(reportes)
+            job["creados"] = sum(1 for r in reportes if r["status"] == "creado")
+            job["duplicados"] = sum(1 for r in reportes if r["status"] == "duplicado")
+            job["errores"] += sum(1 for r in reportes if r["status"] == "error")
+            job["estado"] = "COMPLETADO"
+    except Exception as e:
+        db.rollback()
+        with _jobs_lock:
+            job["estado"] = "ERROR"
+            job["error"] = str(e)
+    finally:
+        db.close()
+        with _jobs_lock:
+            job["finished_at"] = datetime.utcnow().isoformat()
@@ -0,0 +1,157 @@
+"""
+KOI Dashboard — Snapshot de KPIs del día (/api/pl/{restaurante_id}/kpis-hoy).
+
+Dos consultas por restaurante:
+  1. Un UNION ALL con las ventas de hoy y de los 4 mismos días de semana
+     anteriores (un solo fecha IN (...) sobre cierres_turno), los gastos de hoy
+     agregados por cuenta/categoría (gastos_diarios + gastos) y la nómina
+     pagada hoy. Con eso se arma el P&L del día sin cargar filas individuales.
+  2. Las alertas activas más recientes.
+
+El snapshot se memoiza por restaurante junto con las versiones de datos de
+sus dominios (services/data_versions.py): la siguiente escritura confirmada,
+en cualquier worker, cambia la clave y el snapshot se recalcula. Comprobarlo
+cuesta una lectura de data_versions.
+"""
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, Float, Integer, String, and_, cast, func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import data_versions
+from .pl_service import PLResult, _accumulate_gasto, _calcular_derivados, _map_categoria_texto
+
+SEMANAS_COMPARACION = 4
+DOMINIOS = ("ventas", "gastos", "nomina", "catalogo", "alertas")
+
+
+def _nulo(tipo):
+    return cast(null(), tipo)
+
+
+def _consulta_base(restaurante_id: int, hoy: date, fechas: list):
+    CT, GD, G, CC, NP = (models.CierreTurno, models.GastoDiario, models.Gasto,
+                         models.CatalogoCuenta, models.NominaPago)
+
+    ventas = select(
+        literal("venta").label("origen"), CT.fecha.label("fecha"), _nulo(Integer).label("cuenta_id"),
+        _nulo(String).label("categoria_pl"), _nulo(String).label("categoria"),
+        func.coalesce(CT.total_venta, 0.0).label("monto"),
+        (func.coalesce(CT.ventas_efectivo, 0.0) + func.coalesce(CT.ventas_parrot, 0.0) +
+         func.coalesce(CT.ventas_terminales, 0.0) + func.coalesce(CT.ventas_uber, 0.0) +
+         func.coalesce(CT.ventas_rappi, 0.0) + func.coalesce(CT.otros_ingresos, 0.0)).label("ventas_netas"),
+    ).where(CT.restaurante_id == restaurante_id, CT.fecha.in_(fechas))
+
+    def _gastos(modelo, *filtros, join=None):
+        # Igual que calcular_pl: solo cuentas activas del restaurante cuentan como catálogo
+        cuenta = and_(CC.id == modelo.catalogo_cuenta_id, CC.restaurante_id == restaurante_id, CC.activo == True)
+        q = select(
+            literal("gasto"), _nulo(Date), CC.id, CC.categoria_pl, modelo.categoria,
+            func.sum(modelo.monto), _nulo(Float),
+        ).select_from(modelo)
+        if join is not None:
+            q = q.join(*join)
+        return q.outerjoin(CC, cuenta).where(*filtros).group_by(CC.id, CC.categoria_pl, modelo.categoria)
+
+    diarios = _gastos(GD, CT.restaurante_id == restaurante_id, CT.fecha == hoy, join=(CT, CT.id == GD.cierre_id))
+    gastos = _gastos(G, G.restaurante_id == restaurante_id, G.fecha == hoy)
+
+    nomina = select(
+        literal("nomina"), _nulo(Date), _nulo(Integer), literal("nomina"), literal("NOMINA"),
+        func.coalesce(func.sum(NP.neto_pagado), 0.0), _nulo(Float),
+    ).where(NP.restaurante_id == restaurante_id, NP.fecha_pago == hoy)
+
+    return union_all(ventas, diarios, gastos, nomina)
+
+
+def calcular_kpis(db: Session, restaurante_id: int, hoy: Optional[date] = None) -> dict:
+    hoy = hoy or date.today()
+    fechas = [hoy - timedelta(weeks=i) for i in range(SEMANAS_COMPARACION + 1)]
+
+    # ── 1. Ventas de los 5 días + P&L de hoy ──────────────────────────────────
+    pl = PLResult(fecha_inicio=hoy, fecha_fin=hoy)
+    venta_por_fecha: dict = {}
+    for origen, fecha, cuenta_id, cat_pl, categoria, monto, ventas_netas in db.execute(
+        _consulta_base(restaurante_id, hoy, fechas)
+    ):
+        monto = monto or 0.0
+        if origen == "venta":
+            venta_por_fecha[fecha] = monto
+            if fecha == hoy:
+                pl.dias_con_datos = 1
+                pl.ventas_netas = ventas_netas or 0.0
+        elif origen == "nomina":
+            pl.gastos_nomina += monto
+        else:
+            _accumulate_gasto(pl, cat_pl if cuenta_id is not None else _map_categoria_texto(categoria), monto)
+    _calcular_derivados(pl)
+
+    # ── 2. Alertas activas ────────────────────────────────────────────────────
+    A = models.AlertaLog
+    alertas = db.execute(
+        select(A.tipo, A.mensaje, A.created_at)
+        .where(A.restaurante_id == restaurante_id, A.revisada == False)
+        .order_by(A.created_at.desc()).limit(5)
+    ).all()
+
+    return armar_kpis(hoy, venta_por_fecha, pl, alertas)
+
+
+def armar_kpis(hoy: date, venta_por_fecha: dict, pl: PLResult, alertas: list) -> dict:
+    """
+    Payload de kpis-hoy. `venta_por_fecha` debe cubrir hoy y los mismos días
+    de semana anteriores; `alertas` son las (tipo, mensaje, created_at) más
+    recientes no revisadas.
+    """
+    fechas = [hoy - timedelta(weeks=i) for i in range(1, SEMANAS_COMPARACION + 1)]
+    ventas_hoy = venta_por_fecha.get(hoy)
+    anteriores = [venta_por_fecha[f] for f in fechas if venta_por_fecha.get(f)]
+    promedio_dia = (sum(anteriores) / len(anteriores)) if anteriores else None
+
+    return {
+        "generado_en": datetime.utcnow().isoformat(),
+        "fecha": str(hoy),
+        "ventas_hoy": round(ventas_hoy, 2) if ventas_hoy is not None else None,
+        "promedio_dia_semana_4s": round(promedio_dia, 2) if promedio_dia else None,
+        "variacion_vs_promedio_pct": round(((ventas_hoy - promedio_dia) / promedio_dia) * 100, 2) if (ventas_hoy and promedio_dia) else None,
+        "margen_estimado_hoy": round(pl.utilidad_neta, 2),
+        "food_cost_hoy_pct": round(pl.food_cost_pct, 2),
+        "alertas_activas": [
+            {"tipo": tipo, "mensaje": mensaje, "created_at": str(created_at)}
+            for tipo, mensaje, created_at in alertas[:5]
+        ],
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def get_kpis(db: Session, restaurante_id: int) -> dict:
+    hoy = date.today()
+    key = (restaurante_id, hoy)
+    # Versiones leídas antes de calcular: si algo se confirma en medio, la
+    # siguiente lectura ve otra versión y recalcula
+    version = data_versions.clave(db, restaurante_id, DOMINIOS)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == version:
+            return hit[1]
+    kpis = calcular_kpis(db, restaurante_id, hoy)
+    with _cache_lock:
+        _cache[key] = (version, kpis)
+    return kpis
+
+
+def invalidate(restaurante_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if restaurante_id is None:
+            _cache.clear()
+        else:
+            for k in [k for k in _cache if k[0] == restaurante_id]:
+                _cache.pop(k, None)
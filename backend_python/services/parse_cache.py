@@ -0,0 +1,168 @@
+"""
+KOI Dashboard — Cache de resultados de parseo (facturas, comprobantes, OCR).
+
+El mismo CFDI suele subirse varias veces (parse-invoice, parse-factura, ocr).
+Cada resultado se guarda bajo SHA-256(namespace + versión + bytes del archivo):
+  - Capa en memoria (LRU) para re-subidas dentro del mismo proceso.
+  - Capa en disco (un JSON por entrada) compartida entre workers y reinicios.
+
+Subir la versión de un parser invalida sus entradas sin borrar nada a mano.
+get/set trabajan con copias: los routers agregan campos por request
+(match_sugerido, match_error) al resultado y no deben llegar a otros hits.
+"""
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+_DEFAULT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads", ".parse_cache"
+)
+
+
+class ParseCache:
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = 2000, memory_entries: int = 256):
+        self.directory = directory or os.environ.get("PARSE_CACHE_DIR", _DEFAULT_DIR)
+        self.max_entries = int(os.environ.get("PARSE_CACHE_MAX_ENTRIES", max_entries))
+        self.memory_entries = memory_entries
+        self._mem: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._writes = 0
+
+    # ── Claves ────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def make_key(namespace: str, version: str, data: bytes) -> str:
+        h = hashlib.sha256()
+        h.update(f"{namespace}:{version}:".encode())
+        h.update(data)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    # ── Lectura / escritura ───────────────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self._hits += 1
+                return copy.deepcopy(self._mem[key])
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path, None)  # marca de uso para la evicción LRU en disco
+        except (OSError, ValueError):
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+            self._disk_hits += 1
+            self._remember(key, copy.deepcopy(value))
+        return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._remember(key, copy.deepcopy(value))
+            self._writes += 1
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, default=str)
+            os.replace(tmp, path)
+        except OSError:
+            return  # la capa en memoria sigue funcionando aunque el disco falle
+        if self._writes % 50 == 0:
+            self.evict()
+
+    def _remember(self, key: str, value: dict) -> None:
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def get_or_parse(self, namespace: str, version: str, data: bytes, parse_fn: Callable[[], dict],
+                     cacheable: Callable[[dict], bool] = lambda r: not r.get("error")) -> dict:
+        """Devuelve el resultado cacheado o ejecuta parse_fn y lo guarda si es cacheable."""
+        key = self.make_key(namespace, version, data)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        result = parse_fn()
+        if isinstance(result, dict) and cacheable(result):
+            self.set(key, result)
+        return result
+
+    # ── Mantenimiento ─────────────────────────────────────────────────────────
+
+    def evict(self) -> int:
+        """Elimina las entradas en disco menos usadas por encima de max_entries."""
+        entries = []
+        try:
+            for root, _dirs, files in os.walk(self.directory):
+                for name in files:
+                    if name.endswith(".json"):
+                        p = os.path.join(root, name)
+                        try:
+                            entries.append((os.path.getmtime(p), p))
+                        except OSError:
+                            pass
+        except OSError:
+            return 0
+        sobrantes = len(entries) - self.max_entries
+        if sobrantes <= 0:
+            return 0
+        entries.sort()
+        removed = 0
+        for _mtime, p in entries[:sobrantes]:
+            try:
+                os.remove(p)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    try:
+                        os.remove(os.path.join(root, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / total, 4) if total else 0.0,
+                "writes": self._writes,
+                "evictions": self._evictions,
+                "memory_entries": len(self._mem),
+                "max_entries": self.max_entries,
+            }
+
+
+parse_cache = ParseCache()
@@ -0,0 +1,149 @@
+"""
+KOI Dashboard — Executor de parseo fuera del event loop.
+
+pdfplumber, las regex de facturas y pdftoppm son CPU/bloqueantes. Los endpoints
+async los mandan a un pool de procesos acotado y esperan el resultado con
+timeout por trabajo, así una factura de 10 páginas no congela al resto de
+requests.
+
+Un trabajo que excede el timeout se corta: el pool se recicla y sus procesos
+se terminan, para que PDFs colgados no ocupen workers y dejen a los demás
+parseos esperando en cola. Los trabajos que compartían ese pool reciben
+BrokenProcessPool y se reintentan en el pool nuevo dentro de su propio plazo
+(un worker que muere por su cuenta — OOM, segfault — solo da un reintento). Con PARSE_EXECUTOR=thread no hay forma de cortar el hilo.
+
+Configuración:
+  PARSE_WORKERS          tamaño del pool (default: min(4, CPUs))
+  PARSE_TIMEOUT_SECONDS  timeout por trabajo (default: 90)
+  PARSE_EXECUTOR         "process" (default) o "thread"
+"""
+import asyncio
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from .parse_cache import parse_cache
+
+MAX_WORKERS = int(os.environ.get("PARSE_WORKERS", min(4, os.cpu_count() or 1)))
+JOB_TIMEOUT = float(os.environ.get("PARSE_TIMEOUT_SECONDS", "90"))
+EXECUTOR_KIND = os.environ.get("PARSE_EXECUTOR", "process")
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+_cortados: "weakref.WeakSet[Executor]" = weakref.WeakSet()  # pools reciclados por un timeout
+_plazo = threading.local()
+
+
+class ParseTimeoutError(TimeoutError):
+    """El trabajo de parseo excedió PARSE_TIMEOUT_SECONDS."""
+
+
+def job_deadline() -> Optional[float]:
+    """time.time() en que vence el trabajo en curso; None fuera de run_parse."""
+    return getattr(_plazo, "deadline", None)
+
+
+def _con_plazo(deadline: float, fn: Callable, *args):
+    # Corre en el worker: fn puede acotar sus esperas con job_deadline()
+    _plazo.deadline = deadline
+    try:
+        return fn(*args)
+    finally:
+        _plazo.deadline = None
+
+
+def _get_pool() -> Executor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if EXECUTOR_KIND == "thread":
+                _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="parse")
+            else:
+                from . import vision_client
+                # El semáforo de vision se crea aquí y cada worker lo recibe al arrancar
+                _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=vision_client.init_worker,
+                                            initargs=(vision_client.slots(),))
+        return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _recycle_pool(stale: Executor, cortado: bool = False) -> None:
+    """
+    Saca `stale` de servicio y termina sus procesos. Si otro trabajo ya lo
+    recicló, el pool vigente no se toca. Sin cancel_futures: los trabajos en
+    cola reciben BrokenProcessPool (reintentable) en vez de CancelledError.
+    """
+    global _pool
+    if not isinstance(stale, ProcessPoolExecutor):
+        return
+    with _pool_lock:
+        if cortado:
+            _cortados.add(stale)
+        if _pool is stale:
+            _pool = None
+    procesos = list((getattr(stale, "_processes", None) or {}).values())
+    stale.shutdown(wait=False)
+    for p in procesos:
+        if p.is_alive():
+            p.terminate()
+
+
+def shutdown() -> None:
+    """Cierra el pool (shutdown de la app)."""
+    _reset_pool()
+
+
+async def run_parse(fn: Callable, *args, timeout: Optional[float] = None):
+    """
+    Ejecuta fn(*args) en el pool y espera el resultado sin bloquear el loop.
+    fn debe ser una función top-level (picklable) y no lanzar HTTPException.
+    """
+    loop = asyncio.get_running_loop()
+    limit = timeout if timeout is not None else JOB_TIMEOUT
+    deadline = loop.time() + limit
+    fallas = 0
+    while True:
+        restante = deadline - loop.time()
+        if restante <= 0:
+            break
+        pool = _get_pool()
+        try:
+            fut = loop.run_in_executor(pool, _con_plazo, time.time() + restante, fn, *args)
+            return await asyncio.wait_for(fut, timeout=restante)
+        except asyncio.TimeoutError:
+            # Cortar el trabajo: el worker colgado no debe seguir ocupando el pool
+            _recycle_pool(pool, cortado=True)
+            break
+        except BrokenProcessPool:
+            # Si el pool se recicló por el timeout de otro trabajo, este no tuvo la culpa.
+            # Si un worker murió (OOM, segfault en un PDF corrupto): un solo reintento.
+            if pool not in _cortados:
+                fallas += 1
+                if fallas > 1:
+                    raise
+            _recycle_pool(pool)
+    raise ParseTimeoutError(f"El parseo excedió {limit:.0f}s")
+
+
+async def run_parse_cached(namespace: str, version: str, data: bytes, fn: Callable, *args,
+                           timeout: Optional[float] = None) -> dict:
+    """Como run_parse, pero consulta/llena parse_cache en el proceso principal."""
+    key = parse_cache.make_key(namespace, version, data)
+    cached = parse_cache.get(key)
+    if cached is not None:
+        return cached
+    result = await run_parse(fn, *args, timeout=timeout)
+    if isinstance(result, dict) and not result.get("error"):
+        parse_cache.set(key, result)
+    return result
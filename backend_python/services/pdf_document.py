@@ -0,0 +1,102 @@
+"""
+KOI Dashboard — Documento PDF de una sola pasada.
+
+Todos los parsers (InvoiceParser, factura_parser, OCR de gastos, bitácora,
+estado de cuenta) comparten este objeto: el PDF se abre una vez y el texto,
+las tablas y las palabras de cada página se extraen la primera vez que se
+piden y se reutilizan después. max_pages limita el trabajo (p. ej. bitácora
+solo usa las primeras dos páginas).
+"""
+import io
+import json
+from typing import IO, List, Optional, Union
+
+import pdfplumber
+
+
+class PDFDocument:
+
+    def __init__(self, source: Union[bytes, str, IO[bytes]], max_pages: Optional[int] = None):
+        fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+        self._pdf = pdfplumber.open(fp)
+        pages = self._pdf.pages
+        self.pages = pages[:max_pages] if max_pages else pages
+        self._text: dict = {}
+        self._words: dict = {}
+        self._found: dict = {}
+
+    def __enter__(self) -> "PDFDocument":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pdf.close()
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    # ── Extracción por página (lazy + cache) ─────────────────────────────────
+
+    def page(self, i: int):
+        return self.pages[i] if 0 <= i < len(self.pages) else None
+
+    def text(self, i: int) -> str:
+        if i not in self._text:
+            p = self.page(i)
+            self._text[i] = (p.extract_text() or "") if p is not None else ""
+        return self._text[i]
+
+    def words(self, i: int) -> list:
+        if i not in self._words:
+            p = self.page(i)
+            self._words[i] = (p.extract_words() or []) if p is not None else []
+        return self._words[i]
+
+    def _find_tables(self, i: int, settings: Optional[dict]) -> list:
+        key = (i, json.dumps(settings, sort_keys=True) if settings else None)
+        if key not in self._found:
+            p = self.page(i)
+            self._found[key] = p.find_tables(settings) if p is not None else []
+        return self._found[key]
+
+    def tables(self, i: int, settings: Optional[dict] = None) -> List[list]:
+        """Equivalente a page.extract_tables(settings), cacheado."""
+        return [t.extract() for t in self._find_tables(i, settings)]
+
+    def table(self, i: int, settings: Optional[dict] = None) -> Optional[list]:
+        """Equivalente a page.extract_table(settings): la tabla con más celdas."""
+        found = self._find_tables(i, settings)
+        if not found:
+            return None
+        return min(found, key=lambda t: (-len(t.cells), t.bbox[1], t.bbox[0])).extract()
+
+    def release(self, i: int) -> None:
+        """Libera lo cacheado de la página i (recorridos página por página de PDFs largos)."""
+        for cache in (self._text, self._words):
+            cache.pop(i, None)
+        for key in [k for k in self._found if k[0] == i]:
+            del self._found[key]
+        p = self.page(i)
+        if p is not None:
+            p.close()
+
+    # ── Vistas de documento completo ─────────────────────────────────────────
+
+    @property
+    def full_text(self) -> str:
+        return "\n".join(self.text(i) for i in range(len(self.pages)))
+
+    def text_with_tables(self) -> str:
+        """Texto de cada página seguido de sus filas de tabla (formato de factura_parser/OCR)."""
+        out = ""
+        for i in range(len(self.pages)):
+            t = self.text(i)
+            if t:
+                out += t + "\n"
+            for table in self.tables(i):
+                for row in table:
+                    if row:
+                        out += " ".join([str(c) for c in row if c]) + "\n"
+        return out
@@ -2,20 +2,16 @@
 KOI Dashboard — PDF Invoice & Payment Parser
 Soporta: CFDI estándar, KUME Importaciones, comprobantes bancarios, PDFs escaneados (vision).
 """
-import base64
-import glob
-import json
-import os
 import re
-import subprocess
-import tempfile
 from datetime import datetime, timedelta
 from pathlib import Path
 
-import httpx
-import pdfplumber
+from . import vision_client
+from .parse_cache import parse_cache
+from .pdf_document import PDFDocument
 
-ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+# Subir cuando cambie la lógica de parseo — invalida el cache de resultados
+PARSER_VERSION = "1"
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -26,6 +22,15 @@ class InvoiceParser:
 
     def parse(self, pdf_path: str) -> dict:
         """Entry point — detecta tipo de documento y despacha al parser correcto."""
+        try:
+            with open(pdf_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return self.parse_uncached(pdf_path)
+        return parse_cache.get_or_parse("invoice", PARSER_VERSION, data,
+                                        lambda: self.parse_uncached(pdf_path))
+
+    def parse_uncached(self, pdf_path: str) -> dict:
         text = self._extract_text(pdf_path)
 
         if self._is_payment_receipt(text):
@@ -50,8 +55,8 @@ class InvoiceParser:
 
     def _extract_text(self, pdf_path: str) -> str:
         try:
-            with pdfplumber.open(pdf_path) as pdf:
-                return "\n".join(page.extract_text() or "" for page in pdf.pages)
+            with PDFDocument(pdf_path) as doc:
+                return doc.full_text
         except Exception:
             return ""
 
@@ -214,26 +219,6 @@ class InvoiceParser:
     # ── Vision fallback (Claude) ──────────────────────────────────────────────
 
     def _parse_with_vision(self, pdf_path: str, mode: str = "factura") -> dict:
-        if not ANTHROPIC_API_KEY:
-            return {"error": "ANTHROPIC_API_KEY no configurada"}
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            out_prefix = f"{tmpdir}/page"
-            try:
-                subprocess.run(
-                    ["pdftoppm", "-jpeg", "-r", "150", "-f", "1", "-l", "1", pdf_path, out_prefix],
-                    check=True, capture_output=True, timeout=30
-                )
-            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-                return {"error": "pdftoppm no disponible o falló la conversión"}
-
-            imgs = sorted(glob.glob(f"{out_prefix}*.jpg"))
-            if not imgs:
-                return {"error": "No se pudo convertir el PDF a imagen"}
-
-            with open(imgs[0], "rb") as f:
-                img_b64 = base64.b64encode(f.read()).decode()
-
         if mode == "comprobante":
             prompt = (
                 'Extrae los datos de este comprobante de pago bancario y responde SOLO con JSON válido, sin markdown:\n'
@@ -248,32 +233,7 @@ class InvoiceParser:
                 '"subtotal":0.00,"descuento":0.00,"iva":0.00,"iva_tasa":16,"total":0.00,"metodo_pago":null}'
             )
 
-        try:
-            resp = httpx.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": ANTHROPIC_API_KEY,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": "claude-opus-4-5",
-                    "max_tokens": 2000,
-                    "messages": [{
-                        "role": "user",
-                        "content": [
-                            {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": img_b64}},
-                            {"type": "text", "text": prompt},
-                        ],
-                    }],
-                },
-                timeout=45,
-            )
-            raw_text = resp.json()["content"][0]["text"]
-            clean = re.sub(r"```json|```", "", raw_text).strip()
-            return json.loads(clean)
-        except Exception as e:
-            return {"error": f"Vision parse falló: {e}"}
+        return vision_client.get_client().extract_pdf(pdf_path, prompt, mode=mode)
 
     # ── Normalize ─────────────────────────────────────────────────────────────
 
@@ -286,7 +246,7 @@ class InvoiceParser:
         ).lower()
         categoria = _suggest_category(all_desc or (raw.get("proveedor") or "").lower())
 
-        return {
+        result = {
             "tipo_parser": tipo,
             "proveedor": raw.get("proveedor"),
             "rfc_emisor": raw.get("rfc_emisor"),
@@ -303,6 +263,14 @@ class InvoiceParser:
             "categoria_sugerida": categoria,
             "raw_text": raw.get("raw_text"),
         }
+        if raw.get("error"):
+            result["error"] = raw["error"]  # fallo de vision: se reporta y no se cachea
+        return result
+
+
+def parse_invoice_file(pdf_path: str) -> dict:
+    """Parseo sin cache, top-level para poder correr en el pool de procesos."""
+    return InvoiceParser().parse_uncached(pdf_path)
 
 
 # ─────────────────────────────────────────────────────────────────────────────
@@ -396,16 +364,15 @@ def _fmt_fecha(s: str) -> str | None:
 # Image → Vision parser (JPEG/PNG directo, sin pdfplumber)
 # ─────────────────────────────────────────────────────────────────────────────
 
-async def parse_image_with_vision(image_path: str, media_type: str) -> dict:
+def parse_image_file(image_path: str, media_type: str) -> dict:
     """
-    Manda una imagen (JPEG o PNG) directamente a Claude Vision.
+    Manda una imagen (JPEG o PNG) a vision (vision_client: límite de concurrencia,
+    reintentos y cache por hash de imagen).
     Retorna el mismo schema que InvoiceParser.parse() para comprobantes y facturas.
+    Síncrona y top-level para poder correr en el pool de parseo.
     """
-    if not ANTHROPIC_API_KEY:
-        return {"error": "ANTHROPIC_API_KEY no configurada", "tipo_parser": "vision"}
-
     with open(image_path, "rb") as f:
-        img_b64 = base64.b64encode(f.read()).decode()
+        image_bytes = f.read()
 
     prompt = """Analiza este documento. Puede ser una factura, nota de compra,
 o comprobante de pago bancario (transferencia SPEI, etc).
@@ -445,40 +412,9 @@ Si es FACTURA O NOTA DE COMPRA, usa este schema:
   "metodo_pago": "PUE/PPD/etc o null"
 }"""
 
-    try:
-        resp = httpx.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": ANTHROPIC_API_KEY,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json",
-            },
-            json={
-                "model": "claude-opus-4-5",
-                "max_tokens": 2000,
-                "messages": [{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": img_b64,
-                            },
-                        },
-                        {"type": "text", "text": prompt},
-                    ],
-                }],
-            },
-            timeout=30,
-        )
-        resp.raise_for_status()
-        raw_text = resp.json()["content"][0]["text"]
-        clean = re.sub(r"```json|```", "", raw_text).strip()
-        parsed = json.loads(clean)
-    except Exception as e:
-        return {"error": str(e), "tipo_parser": "vision"}
+    parsed = vision_client.get_client().extract(image_bytes, media_type, prompt, mode="auto")
+    if parsed.get("error"):
+        return {"error": parsed["error"], "tipo_parser": "vision"}
 
     tipo = parsed.get("tipo_documento", "")
     if tipo == "comprobante_pago":
@@ -496,6 +432,12 @@ Si es FACTURA O NOTA DE COMPRA, usa este schema:
         return parsed
 
 
+async def parse_image_with_vision(image_path: str, media_type: str) -> dict:
+    """Versión async de parse_image_file: corre en un thread para no bloquear el event loop."""
+    import asyncio
+    return await asyncio.to_thread(parse_image_file, image_path, media_type)
+
+
 def _suggest_category(desc: str) -> str:
     rules = [
         (["soya", "mirin", "nori", "yuzu", "edamame", "wakame", "ramune",
@@ -0,0 +1,154 @@
+"""
+Rollup diario del P&L — carga un rango de fechas de un restaurante una sola vez
+y calcula el P&L de cualquier sub-período (día, semana, mes) en memoria.
+
+Dos consultas por rango:
+  1. Cierres de turno (ingresos y propinas por día).
+  2. UNION ALL de gastos_diarios + gastos agrupados por (fecha, cuenta,
+     categoría) y nómina agrupada por fecha de pago.
+
+`RollupDiario.pl(desde, hasta)` aplica exactamente las reglas de
+`PLService.calcular_pl` (cuentas activas del restaurante primero, luego texto
+de categoría) sobre las filas agregadas, así que el resultado es el mismo que
+calcular el período directo contra las tablas fuente.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+from sqlalchemy import and_, case, func, literal, null, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+from .pl_service import (
+    PLResult, _accumulate_gasto, _calcular_derivados, _desglose_y_advertencias, _map_categoria_texto,
+)
+
+_CAMPOS_VENTA = ("ventas_efectivo", "ventas_parrot", "ventas_terminales", "ventas_uber", "ventas_rappi",
+                 "otros_ingresos")
+_CAMPOS_PROPINA = ("propinas_efectivo", "propinas_parrot", "propinas_terminales")
+
+
+class RollupDiario:
+
+    def __init__(self, desde: date, hasta: date, cierres: list, diarios: list, gastos: list, nomina: list):
+        self.desde, self.hasta = desde, hasta
+        # Listas ordenadas por fecha + índice de fechas para cortar rangos con bisect
+        self._cierres = cierres
+        self._f_cierres = [c[0] for c in cierres]
+        self._diarios = diarios
+        self._f_diarios = [g[0] for g in diarios]
+        self._gastos = gastos
+        self._f_gastos = [g[0] for g in gastos]
+        self._nomina = nomina
+        self._f_nomina = [n[0] for n in nomina]
+        self.ventas_por_fecha = {c[0]: c[-1] for c in cierres}
+
+    @classmethod
+    def cargar(cls, db: Session, restaurante_id: int, desde: date, hasta: date) -> "RollupDiario":
+        CT, GD, G, CC, NP = (models.CierreTurno, models.GastoDiario, models.Gasto,
+                             models.CatalogoCuenta, models.NominaPago)
+
+        cierres = db.execute(
+            select(CT.fecha, *(getattr(CT, c) for c in _CAMPOS_VENTA + _CAMPOS_PROPINA), CT.total_venta)
+            .where(CT.restaurante_id == restaurante_id, CT.fecha >= desde, CT.fecha <= hasta)
+            .order_by(CT.fecha)
+        ).all()
+
+        def _gastos(origen, modelo, fecha, *filtros, join=None):
+            # Igual que calcular_pl: solo cuentas activas del restaurante cuentan como catálogo
+            cuenta = and_(CC.id == modelo.catalogo_cuenta_id, CC.restaurante_id == restaurante_id,
+                          CC.activo == True)
+            q = select(
+                literal(origen).label("origen"), fecha.label("fecha"), func.min(modelo.id).label("primer_id"),
+                CC.id.label("cuenta_id"),
+                CC.categoria_pl.label("categoria_pl"), CC.nombre.label("cuenta_nombre"),
+                modelo.categoria.label("categoria"),
+                func.sum(case((modelo.catalogo_cuenta_id.is_(None), 1), else_=0)).label("sin_cuenta"),
+                func.sum(modelo.monto).label("monto"),
+            ).select_from(modelo)
+            if join is not None:
+                q = q.join(*join)
+            return (q.outerjoin(CC, cuenta).where(*filtros)
+                    .group_by(fecha, CC.id, CC.categoria_pl, CC.nombre, modelo.categoria))
+
+        diarios = _gastos("gasto_diario", GD, CT.fecha, CT.restaurante_id == restaurante_id, CT.fecha >= desde,
+                          CT.fecha <= hasta, join=(CT, CT.id == GD.cierre_id))
+        gastos = _gastos("gasto", G, G.fecha, G.restaurante_id == restaurante_id, G.fecha >= desde, G.fecha <= hasta)
+        nomina = select(
+            literal("nomina"), NP.fecha_pago, null(), null(), null(), null(), null(), literal(0),
+            func.sum(NP.neto_pagado),
+        ).where(
+            NP.restaurante_id == restaurante_id, NP.fecha_pago >= desde, NP.fecha_pago <= hasta,
+        ).group_by(NP.fecha_pago)
+
+        filas: dict = {"gasto_diario": [], "gasto": [], "nomina": []}
+        for origen, fecha, primer_id, *resto in db.execute(union_all(diarios, gastos, nomina)):
+            if origen == "nomina":
+                filas["nomina"].append((fecha, resto[-1] or 0.0))
+            else:
+                filas[origen].append((fecha, primer_id, *resto))
+        # Mismo orden que calcular_pl (fecha, id): el primer gasto de cada
+        # categoría fija su categoria_pl en el desglose
+        for lista in filas.values():
+            lista.sort(key=lambda f: (f[0], f[1]))
+        return cls(desde, hasta, [tuple(c) for c in cierres], filas["gasto_diario"], filas["gasto"],
+                   filas["nomina"])
+
+    @staticmethod
+    def _rango(filas: list, fechas: list, desde: date, hasta: date) -> list:
+        return filas[bisect_left(fechas, desde):bisect_right(fechas, hasta)]
+
+    def pl(self, desde: date, hasta: date) -> PLResult:
+        if desde < self.desde or hasta > self.hasta:
+            raise ValueError(f"Período {desde}..{hasta} fuera del rollup {self.desde}..{self.hasta}")
+        result = PLResult(fecha_inicio=desde, fecha_fin=hasta)
+        cat_raw: dict[str, dict] = {}
+
+        def _track(key: str, cat_pl: str, monto: float):
+            if key not in cat_raw:
+                cat_raw[key] = {"monto": 0.0, "categoria_pl": cat_pl}
+            cat_raw[key]["monto"] += monto
+
+        # 1. INGRESOS
+        cierres = self._rango(self._cierres, self._f_cierres, desde, hasta)
+        result.dias_con_datos = len(cierres)
+        for _f, efectivo, parrot, terminales, uber, rappi, otros, p_ef, p_pa, p_te, _total in cierres:
+            result.ventas_efectivo += efectivo or 0
+            result.ventas_parrot += parrot or 0
+            result.ventas_terminales += terminales or 0
+            result.ventas_uber += uber or 0
+            result.ventas_rappi += rappi or 0
+            result.ventas_otros += otros or 0
+            result.propinas_totales += (p_ef or 0) + (p_pa or 0) + (p_te or 0)
+        result.ventas_netas = (
+            result.ventas_efectivo + result.ventas_parrot +
+            result.ventas_terminales + result.ventas_uber +
+            result.ventas_rappi + result.ventas_otros
+        )
+
+        # 2-3. GASTOS DIARIOS, luego GASTOS (ya agregados por cuenta y categoría)
+        filas = (self._rango(self._diarios, self._f_diarios, desde, hasta) +
+                 self._rango(self._gastos, self._f_gastos, desde, hasta))
+        for _f, _id, cuenta_id, cat_pl_cuenta, cuenta_nombre, categoria, sin_cuenta, monto in filas:
+            monto = monto or 0
+            if cuenta_id is not None:
+                cat_pl = cat_pl_cuenta
+                key = categoria.upper().strip() if categoria else cuenta_nombre.upper().strip()
+            else:
+                cat_pl = _map_categoria_texto(categoria)
+                key = categoria.upper().strip() if categoria else "OTROS"
+                result.gastos_sin_categorizar += sin_cuenta or 0
+            _accumulate_gasto(result, cat_pl, monto)
+            _track(key, cat_pl, monto)
+
+        # 4. NÓMINA
+        nomina_total = sum(m for _f, m in self._rango(self._nomina, self._f_nomina, desde, hasta))
+        result.gastos_nomina += nomina_total
+        if nomina_total > 0:
+            _track("NOMINA", "nomina", nomina_total)
+
+        _calcular_derivados(result)
+        _desglose_y_advertencias(result, cat_raw)
+        return result
@@ -268,6 +268,59 @@ def _accumulate_gasto(result: PLResult, categoria_pl: str, monto: float):
         result.gastos_otros += monto
 
 
+def _calcular_derivados(result: PLResult):
+    """Totales, utilidades y ratios a partir de las líneas ya acumuladas."""
+    result.total_costo_ventas = result.costo_alimentos + result.costo_bebidas
+    result.utilidad_bruta = result.ventas_netas - result.total_costo_ventas
+    result.margen_bruto_pct = _safe_pct(result.utilidad_bruta, result.ventas_netas)
+
+    result.total_gastos_operativos = (
+        result.gastos_nomina + result.gastos_renta + result.gastos_servicios +
+        result.gastos_mantenimiento + result.gastos_limpieza + result.gastos_marketing +
+        result.gastos_admin + result.gastos_otros
+    )
+
+    result.ebitda = result.utilidad_bruta - result.total_gastos_operativos
+    result.margen_ebitda_pct = _safe_pct(result.ebitda, result.ventas_netas)
+    result.utilidad_neta = result.ebitda - result.impuestos_estimados
+    result.margen_neto_pct = _safe_pct(result.utilidad_neta, result.ventas_netas)
+
+    result.food_cost_pct = _safe_pct(result.total_costo_ventas, result.ventas_netas)
+    result.nomina_pct = _safe_pct(result.gastos_nomina, result.ventas_netas)
+
+
+def _desglose_y_advertencias(result: PLResult, cat_raw: dict[str, dict]):
+    """Desglose por categoría ({texto: {monto, categoria_pl}}) y advertencias del período."""
+    # 6. DESGLOSE POR CATEGORÍA
+    ventas = result.ventas_netas
+    result.gastos_por_categoria = sorted(
+        [
+            {
+                "categoria": cat,
+                "categoria_pl": info["categoria_pl"],
+                "monto": round(info["monto"], 2),
+                "pct_ventas": round(info["monto"] / ventas * 100, 1) if ventas > 0 else 0,
+            }
+            for cat, info in cat_raw.items()
+            if info["monto"] > 0
+        ],
+        key=lambda x: -x["monto"],
+    )
+
+    # 7. METADATA / ADVERTENCIAS
+    result.tiene_datos_incompletos = result.gastos_sin_categorizar > 0
+    if result.gastos_sin_categorizar > 0:
+        result.advertencias.append(
+            f"{result.gastos_sin_categorizar} gastos sin categoría contable — sumados a 'otros'"
+        )
+    if result.dias_con_datos == 0:
+        result.advertencias.append("Sin cierres de turno registrados en el período")
+    if result.food_cost_pct > 40:
+        result.advertencias.append(f"Food cost alto: {round(result.food_cost_pct, 1)}%")
+    if result.nomina_pct > 40:
+        result.advertencias.append(f"Nómina alta: {round(result.nomina_pct, 1)}%")
+
+
 class PLService:
 
     def calcular_pl(
@@ -328,9 +381,13 @@ class PLService:
         # 2. GASTOS DIARIOS (gastos_diarios vinculados a cierres_turno)
         cierre_ids = [c.id for c in cierres]
         if cierre_ids:
-            gastos_diarios = db.query(models.GastoDiario).filter(
-                models.GastoDiario.cierre_id.in_(cierre_ids)
-            ).all()
+            # Orden determinista (fecha del cierre, id): el primer gasto de cada
+            # categoría fija su categoria_pl en el desglose
+            fecha_cierre = {c.id: c.fecha for c in cierres}
+            gastos_diarios = sorted(
+                db.query(models.GastoDiario).filter(models.GastoDiario.cierre_id.in_(cierre_ids)).all(),
+                key=lambda g: (fecha_cierre[g.cierre_id], g.id),
+            )
             for g in gastos_diarios:
                 monto = g.monto or 0
                 if g.catalogo_cuenta_id and g.catalogo_cuenta_id in catalogo_map:
@@ -349,7 +406,7 @@ class PLService:
             models.Gasto.restaurante_id == restaurante_id,
             models.Gasto.fecha >= fecha_inicio,
             models.Gasto.fecha <= fecha_fin,
-        ).all()
+        ).order_by(models.Gasto.fecha, models.Gasto.id).all()
         for g in gastos:
             monto = g.monto or 0
             if g.catalogo_cuenta_id and g.catalogo_cuenta_id in catalogo_map:
@@ -374,52 +431,10 @@ class PLService:
             _track("NOMINA", "nomina", nomina_total)
 
         # 5. CÁLCULOS DERIVADOS
-        result.total_costo_ventas = result.costo_alimentos + result.costo_bebidas
-        result.utilidad_bruta = result.ventas_netas - result.total_costo_ventas
-        result.margen_bruto_pct = _safe_pct(result.utilidad_bruta, result.ventas_netas)
-
-        result.total_gastos_operativos = (
-            result.gastos_nomina + result.gastos_renta + result.gastos_servicios +
-            result.gastos_mantenimiento + result.gastos_limpieza + result.gastos_marketing +
-            result.gastos_admin + result.gastos_otros
-        )
-
-        result.ebitda = result.utilidad_bruta - result.total_gastos_operativos
-        result.margen_ebitda_pct = _safe_pct(result.ebitda, result.ventas_netas)
-        result.utilidad_neta = result.ebitda - result.impuestos_estimados
-        result.margen_neto_pct = _safe_pct(result.utilidad_neta, result.ventas_netas)
-
-        result.food_cost_pct = _safe_pct(result.total_costo_ventas, result.ventas_netas)
-        result.nomina_pct = _safe_pct(result.gastos_nomina, result.ventas_netas)
-
-        # 6. DESGLOSE POR CATEGORÍA
-        ventas = result.ventas_netas
-        result.gastos_por_categoria = sorted(
-            [
-                {
-                    "categoria": cat,
-                    "categoria_pl": info["categoria_pl"],
-                    "monto": round(info["monto"], 2),
-                    "pct_ventas": round(info["monto"] / ventas * 100, 1) if ventas > 0 else 0,
-                }
-                for cat, info in _cat_raw.items()
-                if info["monto"] > 0
-            ],
-            key=lambda x: -x["monto"],
-        )
+        _calcular_derivados(result)
 
-        # 7. METADATA / ADVERTENCIAS
-        result.tiene_datos_incompletos = result.gastos_sin_categorizar > 0
-        if result.gastos_sin_categorizar > 0:
-            result.advertencias.append(
-                f"{result.gastos_sin_categorizar} gastos sin categoría contable — sumados a 'otros'"
-            )
-        if result.dias_con_datos == 0:
-            result.advertencias.append("Sin cierres de turno registrados en el período")
-        if result.food_cost_pct > 40:
-            result.advertencias.append(f"Food cost alto: {round(result.food_cost_pct, 1)}%")
-        if result.nomina_pct > 40:
-            result.advertencias.append(f"Nómina alta: {round(result.nomina_pct, 1)}%")
+        # 6-7. DESGLOSE POR CATEGORÍA + ADVERTENCIAS
+        _desglose_y_advertencias(result, _cat_raw)
 
         return result
 
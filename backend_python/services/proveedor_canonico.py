@@ -0,0 +1,410 @@
+"""
+KOI Dashboard — Canonicalización de proveedores por restaurante.
+
+El mismo proveedor aparece como "LA BUENA TIERRA", "Buena Tierra",
+"BUENA TIERRA SA DE CV"... en gastos, gastos_diarios y gastos_transferencia,
+y analytics lo cuenta como proveedores distintos.
+
+sugerir(db, restaurante_id)
+  1. Nombres distintos (proveedor_key) con conteo, total y RFC de las tres
+     tablas y del catálogo de proveedores, agrupados en SQL.
+  2. Forma comparable: sin acentos, puntuación, artículos ni razón social
+     (SA DE CV, S DE RL...). Nombres con la misma forma van juntos directo.
+  3. Trigramas por palabra (como pg_trgm) y firma MinHash de 60 valores. LSH
+     con 20 bandas de 3 solo compara los pares que comparten alguna banda
+     (similitud ≳ 0.4), no los n² pares.
+  4. Los candidatos se verifican con Jaccard exacto de trigramas y se unen
+     (union-find, de mayor a menor similitud) si pasan el umbral. El mismo
+     RFC une siempre; RFCs distintos o un par descartado en revisión no se
+     unen nunca.
+  10k nombres distintos se agrupan en ~1 s (scripts/bench_canonicalizacion.py).
+
+confirmar(...) registra las variantes como ProveedorAlias del proveedor
+canónico (lo crea si no existe) y reescribe proveedor_key de los gastos ya
+guardados. De ahí en adelante un gasto nuevo o editado con una variante
+confirmada se guarda con la clave canónica (evento before_flush).
+"""
+import hashlib
+import re
+import struct
+import threading
+import time
+from functools import lru_cache
+from itertools import chain, combinations
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..models import clave_proveedor
+from .proveedor_matcher import normalizar, registrar_alias
+
+CACHE_TTL_SECONDS = 300
+UMBRAL_DEFAULT = 0.55
+_N_BANDAS, _FILAS_BANDA = 20, 3
+_N_HASHES = _N_BANDAS * _FILAS_BANDA
+_BANDA_MAX = 100  # banda compartida por demasiados nombres: no discrimina, se ignora
+# Contra encadenamiento (A~B, B~C, A≁C): al unir dos grupos, sus representantes
+# también deben parecerse al menos umbral * _FACTOR_REPRESENTANTES
+_FACTOR_REPRESENTANTES = 0.75
+
+_ARTICULOS = {"LA", "EL", "LOS", "LAS", "DE", "DEL", "Y", "E", "THE"}
+_RAZON_SOCIAL = {
+    "S", "A", "C", "V", "SA", "CV", "RL", "SAPI", "SAB", "SC", "SRL", "SPR", "AC", "SAS", "CIA", "CO", "INC",
+    "SOCIEDAD", "ANONIMA", "CAPITAL", "VARIABLE", "RESPONSABILIDAD", "LIMITADA",
+}
+_NO_ALFANUMERICO = re.compile(r"[^A-Z0-9 ]+")
+
+
+# ── Similitud ─────────────────────────────────────────────────────────────────
+
+def forma(nombre: str) -> str:
+    """Nombre comparable: sin acentos, puntuación, artículos ni razón social."""
+    texto = _NO_ALFANUMERICO.sub(" ", normalizar(nombre))
+    return " ".join(p for p in texto.split() if p not in _ARTICULOS and p not in _RAZON_SOCIAL)
+
+
+def trigramas(texto: str) -> frozenset:
+    """Trigramas por palabra con relleno, como pg_trgm ("  ab", " ab", "ab ")."""
+    salida = set()
+    for palabra in texto.split():
+        p = f"  {palabra} "
+        salida.update(p[i:i + 3] for i in range(len(p) - 2))
+    return frozenset(salida)
+
+
+def similitud(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    comunes = len(a & b)
+    return comunes / (len(a) + len(b) - comunes)
+
+
+@lru_cache(maxsize=65536)
+def _firma_trigrama(trigrama: str) -> tuple:
+    # 60 hashes independientes de 32 bits de una sola llamada (SHAKE como XOF)
+    return struct.unpack(f"<{_N_HASHES}I", hashlib.shake_128(trigrama.encode()).digest(4 * _N_HASHES))
+
+
+def firma_minhash(tris: Iterable[str]) -> tuple:
+    """Mínimo por posición de las firmas de sus trigramas (las de cada trigrama se memoizan)."""
+    return tuple(map(min, zip(*(_firma_trigrama(t) for t in tris))))
+
+
+def _pares_candidatos(firmas: list) -> set:
+    cubetas: dict = {}
+    for idx, f in enumerate(firmas):
+        for banda in range(_N_BANDAS):
+            inicio = banda * _FILAS_BANDA
+            cubetas.setdefault((banda, f[inicio:inicio + _FILAS_BANDA]), []).append(idx)
+    pares = set()
+    for miembros in cubetas.values():
+        if 1 < len(miembros) <= _BANDA_MAX:
+            pares.update(combinations(miembros, 2))
+    return pares
+
+
+class _Grupos:
+    """
+    Union-find con restricciones: RFCs distintos o pares descartados no se
+    unen; por similitud solo se unen grupos cuyos representantes se parecen.
+    """
+
+    def __init__(self, claves: Iterable[str], rfcs: dict, descartados: dict, tris: dict):
+        self.padre = {c: c for c in claves}
+        self.miembros = {c: {c} for c in self.padre}
+        self.rfcs = {c: set(rfcs.get(c, ())) for c in self.padre}
+        self.descartados = descartados
+        self.tris = tris
+
+    def raiz(self, c: str) -> str:
+        while self.padre[c] != c:
+            self.padre[c] = self.padre[self.padre[c]]
+            c = self.padre[c]
+        return c
+
+    def unir(self, a: str, b: str, forzar_rfc: bool = False, minimo: Optional[float] = None) -> bool:
+        ra, rb = self.raiz(a), self.raiz(b)
+        if ra == rb:
+            return True
+        if not forzar_rfc and self.rfcs[ra] and self.rfcs[rb] and not (self.rfcs[ra] & self.rfcs[rb]):
+            return False
+        if minimo is not None and similitud(self.tris.get(ra, frozenset()), self.tris.get(rb, frozenset())) < minimo:
+            return False
+        chico, grande = (ra, rb) if len(self.miembros[ra]) < len(self.miembros[rb]) else (rb, ra)
+        if any(self.descartados.get(m, set()) & self.miembros[grande] for m in self.miembros[chico]):
+            return False
+        self.padre[chico] = grande  # el representante del grupo es la raíz
+        self.miembros[grande] |= self.miembros.pop(chico)
+        self.rfcs[grande] |= self.rfcs.pop(chico)
+        return True
+
+
+def agrupar(nombres: dict, umbral: float = UMBRAL_DEFAULT, descartados: Optional[dict] = None) -> list:
+    """
+    nombres: {clave: {"rfcs", "transacciones", "total", "proveedor_id"}}.
+    Regresa los grupos de 2+ claves: {"canonico", "variantes": [(clave, similitud)]}.
+    """
+    descartados = descartados or {}
+    por_forma: dict = {}
+    for clave in nombres:
+        f = forma(clave)
+        if f:
+            por_forma.setdefault(f, []).append(clave)
+    formas = list(por_forma)
+    tris = [trigramas(f) for f in formas]
+    firmas = [firma_minhash(t) for t in tris]
+
+    pares = []  # (similitud, clave_a, clave_b) entre representantes de cada forma
+    for i, j in _pares_candidatos(firmas):
+        s = similitud(tris[i], tris[j])
+        if s >= umbral:
+            pares.append((s, por_forma[formas[i]][0], por_forma[formas[j]][0]))
+
+    indice = dict(zip(formas, tris))
+    tri_por_clave = {c: indice[f] for f, cs in por_forma.items() for c in cs}
+    rfcs = {c: info.get("rfcs", ()) for c, info in nombres.items()}
+    grupos = _Grupos(nombres, rfcs, descartados, tri_por_clave)
+    for claves in por_forma.values():
+        for otra in claves[1:]:
+            grupos.unir(claves[0], otra)
+    por_rfc: dict = {}
+    for clave, rs in rfcs.items():
+        for rfc in rs:
+            por_rfc.setdefault(rfc, []).append(clave)
+    for claves in por_rfc.values():
+        for otra in claves[1:]:
+            grupos.unir(claves[0], otra, forzar_rfc=True)
+    minimo = umbral * _FACTOR_REPRESENTANTES
+    for _s, a, b in sorted(pares, reverse=True):
+        grupos.unir(a, b, minimo=minimo)
+
+    resultado = []
+    for miembros in grupos.miembros.values():
+        if len(miembros) < 2:
+            continue
+        # Canónico sugerido: el que ya es proveedor del catálogo, si no el más usado
+        canonico = max(miembros, key=lambda c: (nombres[c].get("proveedor_id") is not None,
+                                                nombres[c].get("transacciones", 0), nombres[c].get("total", 0.0), c))
+        t_canonico = tri_por_clave.get(canonico, frozenset())
+        variantes = sorted(((c, round(similitud(t_canonico, tri_por_clave.get(c, frozenset())), 3))
+                            for c in miembros if c != canonico), key=lambda x: (-x[1], x[0]))
+        resultado.append({"canonico": canonico, "variantes": variantes})
+    return resultado
+
+
+# ── Mapa confirmado (variante → canónico) ─────────────────────────────────────
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def mapa_canonico(db: Session, restaurante_id: int) -> dict:
+    """{proveedor_key variante: proveedor_key canónica} de los alias NOMBRE del restaurante."""
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(restaurante_id)
+        if hit and now - hit[0] < CACHE_TTL_SECONDS:
+            return hit[1]
+    P, PA = models.Proveedor, models.ProveedorAlias
+    directo = {}
+    with db.no_autoflush:
+        for alias, nombre in db.query(PA.alias, P.nombre).join(P, PA.proveedor_id == P.id).filter(
+            P.restaurante_id == restaurante_id, PA.tipo != "RFC",
+        ):
+            variante, canonica = clave_proveedor(alias), clave_proveedor(nombre)
+            if variante and canonica and variante != canonica:
+                directo[variante] = canonica
+    mapa = {}
+    for variante in directo:
+        # Un canónico que después se fusionó en otro: seguir la cadena (sin ciclos)
+        destino, vistos = directo[variante], {variante}
+        while destino in directo and destino not in vistos:
+            vistos.add(destino)
+            destino = directo[destino]
+        if destino != variante:
+            mapa[variante] = destino
+    with _cache_lock:
+        _cache[restaurante_id] = (now, mapa)
+    return mapa
+
+
+def invalidate(restaurante_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if restaurante_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(restaurante_id, None)
+
+
+def _on_change(_mapper, _connection, target) -> None:
+    invalidate(getattr(target, "restaurante_id", None))
+
+
+for _model in (models.Proveedor, models.ProveedorAlias):
+    for _evt in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _evt, _on_change)
+
+
+def _before_flush(session: Session, _flush_context, _instances) -> None:
+    # Gastos nuevos o editados con una variante confirmada se guardan con la clave canónica
+    for obj in chain(session.new, session.dirty):
+        if not isinstance(obj, (models.Gasto, models.GastoDiario)) or not obj.proveedor_key:
+            continue
+        rid = obj.restaurante_id
+        if rid is None and getattr(obj, "cierre_id", None):
+            with session.no_autoflush:  # gasto diario sin restaurante: el de su cierre
+                cierre = session.get(models.CierreTurno, obj.cierre_id)
+            rid = cierre.restaurante_id if cierre else None
+        if rid is None:
+            continue
+        canonica = mapa_canonico(session, rid).get(obj.proveedor_key)
+        if canonica:
+            obj.proveedor_key = canonica
+
+
+event.listen(Session, "before_flush", _before_flush)
+
+
+# ── Sugerencias y revisión ────────────────────────────────────────────────────
+
+def _nombres(db: Session, restaurante_id: int) -> dict:
+    """{clave: {transacciones, total, rfcs, proveedor_id}} de gastos, gastos diarios, RBS y catálogo."""
+    G, GD, GT, P, PA = models.Gasto, models.GastoDiario, models.GastoTransferencia, models.Proveedor, models.ProveedorAlias
+    nombres: dict = {}
+
+    def _info(clave: str) -> dict:
+        return nombres.setdefault(clave, {"transacciones": 0, "total": 0.0, "rfcs": set(), "proveedor_id": None})
+
+    for modelo in (G, GD):
+        for clave, n, total in db.query(modelo.proveedor_key, func.count(), func.sum(modelo.monto)).filter(
+            modelo.restaurante_id == restaurante_id, modelo.proveedor_key.isnot(None),
+        ).group_by(modelo.proveedor_key):
+            info = _info(clave)
+            info["transacciones"] += n
+            info["total"] += total or 0.0
+
+    mapa = mapa_canonico(db, restaurante_id)
+    for proveedor, rfc, n, total in db.query(GT.proveedor, GT.rfc_emisor, func.count(), func.sum(GT.monto)).filter(
+        GT.restaurante_id == restaurante_id,
+    ).group_by(GT.proveedor, GT.rfc_emisor):
+        clave = clave_proveedor(proveedor)
+        if not clave:
+            continue
+        info = _info(mapa.get(clave, clave))
+        info["transacciones"] += n
+        info["total"] += total or 0.0
+        if rfc and rfc.strip():
+            info["rfcs"].add(rfc.strip().upper())
+
+    por_id = {}
+    for p in db.query(P).filter(P.restaurante_id == restaurante_id, P.activo == True):
+        clave = clave_proveedor(p.nombre)
+        if not clave:
+            continue
+        info = _info(clave)
+        info["proveedor_id"] = p.id
+        por_id[p.id] = info
+        if p.rfc:
+            info["rfcs"].add(p.rfc.strip().upper())
+    for proveedor_id, alias in db.query(PA.proveedor_id, PA.alias).filter(
+        PA.restaurante_id == restaurante_id, PA.tipo == "RFC",
+    ):
+        if proveedor_id in por_id:
+            por_id[proveedor_id]["rfcs"].add(alias.strip().upper())
+    return nombres
+
+
+def _descartados(db: Session, restaurante_id: int) -> dict:
+    D = models.ProveedorFusionDescartada
+    salida: dict = {}
+    for a, b in db.query(D.clave_a, D.clave_b).filter(D.restaurante_id == restaurante_id):
+        salida.setdefault(a, set()).add(b)
+        salida.setdefault(b, set()).add(a)
+    return salida
+
+
+def sugerir(db: Session, restaurante_id: int, umbral: float = UMBRAL_DEFAULT) -> dict:
+    inicio = time.perf_counter()
+    nombres = _nombres(db, restaurante_id)
+    grupos = agrupar(nombres, umbral, _descartados(db, restaurante_id))
+
+    def _fila(clave: str, sim: Optional[float] = None) -> dict:
+        info = nombres[clave]
+        fila = {"nombre": clave, "transacciones": info["transacciones"], "total": round(info["total"], 2),
+                "rfcs": sorted(info["rfcs"]), "proveedor_id": info["proveedor_id"]}
+        if sim is not None:
+            fila["similitud"] = sim
+        return fila
+
+    sugerencias = [{
+        "canonico": _fila(g["canonico"]),
+        "variantes": [_fila(c, s) for c, s in g["variantes"]],
+        "total": round(sum(nombres[c]["total"] for c in [g["canonico"]] + [c for c, _ in g["variantes"]]), 2),
+    } for g in grupos]
+    sugerencias.sort(key=lambda s: s["total"], reverse=True)
+    return {
+        "sugerencias": sugerencias,
+        "nombres_distintos": len(nombres),
+        "umbral": umbral,
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+    }
+
+
+def confirmar(db: Session, restaurante_id: int, canonico: str, variantes: list,
+              proveedor_id: Optional[int] = None) -> dict:
+    """
+    Fusiona `variantes` en el proveedor canónico: alias NOMBRE + proveedor_key
+    de los gastos existentes. Crea el Proveedor si no existe. No hace commit.
+    """
+    P, G, GD = models.Proveedor, models.Gasto, models.GastoDiario
+    if proveedor_id is not None:
+        prov = db.query(P).filter(P.id == proveedor_id, P.restaurante_id == restaurante_id).first()
+        if prov is None:
+            raise ValueError("Proveedor no encontrado")
+    else:
+        clave = clave_proveedor(canonico)
+        if not clave:
+            raise ValueError("Nombre canónico vacío")
+        prov = next((p for p in db.query(P).filter(P.restaurante_id == restaurante_id)
+                     if clave_proveedor(p.nombre) == clave), None)
+    canonica = clave_proveedor(prov.nombre if prov else canonico)
+    claves = {c for c in (clave_proveedor(v) for v in variantes) if c and c != canonica}
+    if not claves:
+        raise ValueError("Sin variantes distintas del canónico")
+
+    if prov is None:
+        categoria = db.query(G.categoria).filter(
+            G.restaurante_id == restaurante_id, G.proveedor_key.in_(claves | {canonica}),
+        ).group_by(G.categoria).order_by(func.count().desc()).limit(1).scalar()
+        prov = P(nombre=" ".join(canonico.split())[:100], categoria_default=categoria or "SIN_CATEGORIA",
+                 restaurante_id=restaurante_id)
+        db.add(prov)
+        db.flush()
+    for clave in sorted(claves):
+        registrar_alias(db, prov, clave, tipo="NOMBRE", origen="MANUAL")
+
+    # Claves que ya apuntaban a una variante (fusiones previas) también pasan al canónico
+    previas = {v for v, destino in mapa_canonico(db, restaurante_id).items() if destino in claves}
+    reescribir = list(claves | previas)
+    actualizados = 0
+    for modelo in (G, GD):
+        actualizados += db.execute(
+            update(modelo).where(modelo.restaurante_id == restaurante_id, modelo.proveedor_key.in_(reescribir))
+            .values(proveedor_key=canonica).execution_options(synchronize_session=False)
+        ).rowcount or 0
+    invalidate(restaurante_id)
+    return {"proveedor_id": prov.id, "canonico": canonica, "variantes": sorted(claves),
+            "gastos_actualizados": actualizados}
+
+
+def descartar(db: Session, restaurante_id: int, nombres: list) -> int:
+    """Marca cada par de `nombres` como proveedores distintos. No hace commit."""
+    D = models.ProveedorFusionDescartada
+    claves = sorted({c for c in (clave_proveedor(n) for n in nombres) if c})
+    existentes = set(db.query(D.clave_a, D.clave_b).filter(D.restaurante_id == restaurante_id,
+                                                            D.clave_a.in_(claves), D.clave_b.in_(claves)))
+    nuevos = [(a, b) for a, b in combinations(claves, 2) if (a, b) not in existentes]
+    db.add_all([D(restaurante_id=restaurante_id, clave_a=a, clave_b=b) for a, b in nuevos])
+    return len(nuevos)
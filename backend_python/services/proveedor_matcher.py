@@ -0,0 +1,247 @@
+"""
+KOI Dashboard — Detección de proveedor en texto de facturas.
+
+Un autómata Aho-Corasick compilado con los nombres, alias aprendidos y RFCs
+de los proveedores del restaurante (más los mapas fijos de cada parser como
+respaldo). El texto del documento se recorre una sola vez sin importar cuántos
+proveedores haya.
+
+Los matchers por restaurante se cachean y se invalidan cuando cambia un
+Proveedor o ProveedorAlias (eventos del ORM) o al vencer CACHE_TTL_SECONDS,
+para que otros workers también vean los cambios.
+"""
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import deque
+from typing import Iterable, Optional
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from .. import models
+
+CACHE_TTL_SECONDS = 300
+
+# Prioridad al resolver varios matches: RFC > proveedor/alias del restaurante > mapa fijo
+_RANK = {"rfc": 0, "nombre": 1, "alias": 1, "default": 2}
+
+
+def normalizar(texto: str) -> str:
+    """Mayúsculas, sin acentos y con espacios colapsados."""
+    if not texto:
+        return ""
+    nfkd = unicodedata.normalize("NFKD", texto)
+    sin_acentos = "".join(c for c in nfkd if not unicodedata.combining(c))
+    return " ".join(sin_acentos.upper().split())
+
+
+class ProveedorMatcher:
+    """
+    Autómata multi-patrón. Cada patrón lleva un payload (dict) con al menos
+    `nombre` y `categoria`. Es picklable para correr en el pool de parseo.
+    """
+
+    def __init__(self, entries: Iterable[tuple[str, dict, str]]):
+        # entries: (patron, payload, via) — el orden define el desempate
+        self._goto: list[dict] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[int]] = [[]]
+        self._patterns: list[tuple[int, dict, str, int]] = []  # (longitud, payload, via, orden)
+        vistos = set()
+        h = hashlib.sha256()
+        for orden, (patron, payload, via) in enumerate(entries):
+            p = normalizar(patron)
+            if len(p) < 2 or (p, via) in vistos:
+                continue
+            vistos.add((p, via))
+            self._add(p, len(self._patterns))
+            self._patterns.append((len(p), payload, via, orden))
+            h.update(f"{p}|{payload.get('nombre')}|{payload.get('categoria')}|{via};".encode())
+        self._build()
+        # Identifica el contenido del autómata (entra en la clave del cache de parseo)
+        self.fingerprint = h.hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    # ── Construcción ──────────────────────────────────────────────────────────
+
+    def _add(self, patron: str, idx: int) -> None:
+        node = 0
+        for ch in patron:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(idx)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    # ── Búsqueda ──────────────────────────────────────────────────────────────
+
+    def _scan(self, t: str) -> list[tuple[int, int]]:
+        """Recorre el texto normalizado una vez: [(posición_inicio, índice_patrón)]."""
+        n = len(t)
+        goto, fail, out, pats = self._goto, self._fail, self._out, self._patterns
+        node = 0
+        found = []
+        for i, ch in enumerate(t):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for idx in out[node]:
+                ini = i - pats[idx][0] + 1
+                # Palabra completa: "TOYO" no debe matchear dentro de "TOYOTA"
+                if (ini == 0 or not t[ini - 1].isalnum()) and (i + 1 == n or not t[i + 1].isalnum()):
+                    found.append((ini, idx))
+        return found
+
+    def find_all(self, texto: str) -> list[tuple[int, dict, str]]:
+        """Todos los matches: (posición_inicio, payload, via)."""
+        return [(ini, self._patterns[idx][1], self._patterns[idx][2]) for ini, idx in self._scan(normalizar(texto))]
+
+    def match(self, texto: str) -> Optional[dict]:
+        """El mejor proveedor del texto, o None. Agrega `via` al payload."""
+        best_key = None
+        best = None
+        for _ini, idx in self._scan(normalizar(texto)):
+            largo, payload, via, orden = self._patterns[idx]
+            key = (_RANK.get(via, 3), orden, -largo)
+            if best_key is None or key < best_key:
+                best_key, best = key, {**payload, "via": via}
+        return best
+
+
+def build_matcher(proveedores: Iterable, aliases: Iterable = (), defaults: Optional[dict] = None) -> ProveedorMatcher:
+    """
+    Compila el autómata. `proveedores`: filas Proveedor; `aliases`: filas ProveedorAlias;
+    `defaults`: mapa fijo {patron: payload} del parser que se usa como respaldo.
+    """
+    por_id = {}
+    entries: list[tuple[str, dict, str]] = []
+    for p in proveedores:
+        payload = {"proveedor_id": p.id, "nombre": p.nombre, "categoria": p.categoria_default}
+        por_id[p.id] = payload
+        if getattr(p, "rfc", None):
+            entries.append((p.rfc, payload, "rfc"))
+        entries.append((p.nombre, payload, "nombre"))
+    for a in aliases:
+        payload = por_id.get(a.proveedor_id)
+        if payload:
+            entries.append((a.alias, payload, "rfc" if a.tipo == "RFC" else "alias"))
+    for patron, payload in (defaults or {}).items():
+        entries.append((patron, dict(payload), "default"))
+    return ProveedorMatcher(entries)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Alias aprendidos
+# ─────────────────────────────────────────────────────────────────────────────
+
+def registrar_alias(db: Session, proveedor, alias: str, tipo: str = "NOMBRE", origen: str = "APRENDIDO"):
+    """Agrega un alias (o RFC) al proveedor si no existe. No hace commit."""
+    tipo = "RFC" if (tipo or "").upper() == "RFC" else "NOMBRE"
+    alias = " ".join((alias or "").split()).upper()
+    existente = db.query(models.ProveedorAlias).filter(
+        models.ProveedorAlias.proveedor_id == proveedor.id,
+        models.ProveedorAlias.alias == alias,
+    ).first()
+    if existente:
+        return existente
+    nuevo = models.ProveedorAlias(
+        restaurante_id=proveedor.restaurante_id, proveedor_id=proveedor.id,
+        alias=alias, tipo=tipo, origen=origen,
+    )
+    db.add(nuevo)
+    return nuevo
+
+
+def aprender_rfc(db: Session, restaurante_id: int, nombre_proveedor: str, rfc: Optional[str]) -> None:
+    """Al capturar una factura con RFC, lo asocia al proveedor del mismo nombre. No hace commit."""
+    if not rfc or not nombre_proveedor:
+        return
+    prov = db.query(models.Proveedor).filter(
+        models.Proveedor.restaurante_id == restaurante_id,
+        func.upper(models.Proveedor.nombre) == nombre_proveedor.strip().upper(),
+    ).first()
+    if not prov:
+        return
+    rfc = rfc.strip().upper()
+    if not prov.rfc:
+        prov.rfc = rfc
+    elif prov.rfc.upper() != rfc:
+        registrar_alias(db, prov, rfc, tipo="RFC")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cache por restaurante
+# ─────────────────────────────────────────────────────────────────────────────
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+_defaults_cache: dict = {}
+
+
+def default_matcher(defaults: dict) -> ProveedorMatcher:
+    """Matcher solo con el mapa fijo (sin restaurante). Cacheado por identidad del mapa."""
+    key = id(defaults)
+    m = _defaults_cache.get(key)
+    if m is None:
+        m = _defaults_cache[key] = build_matcher((), (), defaults)
+    return m
+
+
+def get_matcher(db: Session, restaurante_id: int, defaults: Optional[dict] = None) -> ProveedorMatcher:
+    key = (restaurante_id, id(defaults) if defaults else None)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and now - hit[0] < CACHE_TTL_SECONDS:
+            return hit[1]
+
+    proveedores = db.query(models.Proveedor).filter(
+        models.Proveedor.restaurante_id == restaurante_id,
+        models.Proveedor.activo == True,
+    ).all()
+    aliases = db.query(models.ProveedorAlias).filter(
+        models.ProveedorAlias.restaurante_id == restaurante_id,
+    ).all()
+    matcher = build_matcher(proveedores, aliases, defaults)
+    with _cache_lock:
+        _cache[key] = (now, matcher)
+    return matcher
+
+
+def invalidate(restaurante_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if restaurante_id is None:
+            _cache.clear()
+        else:
+            for k in [k for k in _cache if k[0] == restaurante_id]:
+                _cache.pop(k, None)
+
+
+def _on_change(_mapper, _connection, target) -> None:
+    invalidate(getattr(target, "restaurante_id", None))
+
+
+for _model in (models.Proveedor, models.ProveedorAlias):
+    for _evt in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _evt, _on_change)
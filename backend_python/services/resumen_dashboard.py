@@ -0,0 +1,112 @@
+"""
+KOI Dashboard — Resumen de la pantalla de inicio (/api/dashboard/resumen).
+
+Dos consultas por restaurante:
+  1. Ventas de hoy, ayer, semana, semana anterior (mismo tramo) y mes con un
+     solo SUM(CASE WHEN ...) sobre el rango de fechas que cubre todas las
+     ventanas (índice restaurante_id, fecha de ventas_diarias).
+  2. Cuentas por pagar pendientes y el último cierre de turno en una fila.
+
+El resultado se cachea por restaurante junto con las versiones de ventas y
+gastos (services/data_versions.py) y se recalcula cuando cambian, es decir
+al confirmarse una escritura en cualquier worker.
+"""
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, literal, select, true
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import data_versions
+
+# VentaDiaria y CierreTurno → ventas; CuentaPorPagar y CierreTurno → gastos
+DOMINIOS = ("ventas", "gastos")
+
+
+def _pct(actual: float, anterior: float) -> Optional[float]:
+    return ((actual - anterior) / anterior * 100) if anterior > 0 else None
+
+
+def calcular_resumen(db: Session, restaurante_id: Optional[int], hoy: Optional[date] = None) -> dict:
+    hoy = hoy or date.today()
+    ayer = hoy - timedelta(days=1)
+    ini_semana = hoy - timedelta(days=hoy.weekday())
+    ini_semana_ant, hoy_semana_ant = ini_semana - timedelta(days=7), hoy - timedelta(days=7)
+    ini_mes = hoy.replace(day=1)
+
+    # ── 1. Ventanas de ventas en una pasada ───────────────────────────────────
+    V = models.VentaDiaria
+    f, total = V.fecha, func.coalesce(V.total_venta, 0.0)
+
+    def _ventana(desde: date, hasta: date):
+        return func.coalesce(func.sum(case((f.between(desde, hasta), total), else_=0.0)), 0.0)
+
+    q = select(
+        _ventana(hoy, hoy), _ventana(ayer, ayer), _ventana(ini_semana, hoy),
+        _ventana(ini_semana_ant, hoy_semana_ant), _ventana(ini_mes, hoy),
+    ).where(f >= min(ini_mes, ini_semana_ant, ayer), f <= hoy)
+    if restaurante_id is not None:
+        q = q.where(V.restaurante_id == restaurante_id)
+    vh, va, vs, vsa, vm = db.execute(q).one()
+
+    # ── 2. Pendientes + último cierre en una fila ─────────────────────────────
+    CxP, CT = models.CuentaPorPagar, models.CierreTurno
+    pendientes = select(func.count(CxP.id)).where(CxP.estado_pago == models.EstadoPago.PENDIENTE)
+    ultimo = select(CT.fecha, CT.estado, CT.diferencia).order_by(CT.fecha.desc()).limit(1)
+    if restaurante_id is not None:
+        pendientes = pendientes.where(CxP.restaurante_id == restaurante_id)
+        ultimo = ultimo.where(CT.restaurante_id == restaurante_id)
+    ultimo = ultimo.subquery()
+    base = select(literal(1).label("uno")).subquery()
+    fila = db.execute(
+        select(pendientes.scalar_subquery(), ultimo.c.fecha, ultimo.c.estado, ultimo.c.diferencia)
+        .select_from(base.outerjoin(ultimo, true()))
+    ).one()
+    gp, fecha_cierre, estado, diferencia = fila
+
+    ec = None
+    ua = None
+    if fecha_cierre:
+        if estado:
+            ec = estado.value
+            if estado != models.EstadoArqueo.CUADRADA and diferencia:
+                ec += f" ({'+' if diferencia > 0 else ''}{diferencia:.2f})"
+        ua = str(fecha_cierre)
+
+    return {
+        "ventas_hoy": vh, "ventas_semana": vs, "ventas_mes": vm,
+        "cambio_vs_ayer": _pct(vh, va), "cambio_vs_semana_anterior": _pct(vs, vsa),
+        "gastos_pendientes": gp or 0, "estado_caja": ec, "ultimo_arqueo": ua,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def get_resumen(db: Session, restaurante_id: Optional[int]) -> dict:
+    hoy = date.today()
+    key = (restaurante_id, hoy)
+    version = data_versions.clave(db, restaurante_id, DOMINIOS)
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit and hit[0] == version:
+            return hit[1]
+    resumen = calcular_resumen(db, restaurante_id, hoy)
+    with _cache_lock:
+        _cache[key] = (version, resumen)
+    return resumen
+
+
+def invalidate(restaurante_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if restaurante_id is None:
+            _cache.clear()
+        else:
+            # El resumen global (restaurante_id=None) también incluye a este restaurante
+            for k in [k for k in _cache if k[0] in (restaurante_id, None)]:
+                _cache.pop(k, None)
@@ -0,0 +1,100 @@
+"""
+KOI Dashboard — Sugerencia de cuenta contable para la pantalla de categorización.
+
+Dado el texto de la categoría operativa de un gasto se sugiere una cuenta del
+catálogo del restaurante, en este orden:
+  1. nombre de cuenta igual al texto                 → confianza alta
+  2. nombre contenido en el texto o viceversa        → media
+  3. misma categoria_pl que _map_categoria_texto     → alta si ya es la cuenta actual, si no baja
+
+El índice se arma una vez por versión del catálogo del restaurante (dominio
+"catalogo" de services/data_versions.py, así otros workers ven los cambios en
+cuanto se confirman) y memoiza cada texto normalizado en un LRU de
+MEMO_MAX_TEXTOS entradas: un gasto cuesta un lookup, no recorridos del
+catálogo.
+"""
+import threading
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import data_versions
+from .pl_service import _map_categoria_texto
+
+MEMO_MAX_TEXTOS = 4096
+
+
+class IndiceSugerencias:
+    def __init__(self, cuentas: list):
+        # (id, nombre, nombre en minúsculas, categoria_pl) en el orden del catálogo
+        self._cuentas = [(c.id, c.nombre, c.nombre.lower(), c.categoria_pl) for c in cuentas]
+        self._exacto: dict[str, tuple] = {}
+        self._por_pl: dict[str, tuple] = {}
+        for cid, nombre, lower, cat_pl in self._cuentas:
+            self._exacto.setdefault(lower.strip(), (cid, nombre))
+            self._por_pl.setdefault(cat_pl, (cid, nombre))
+        self.nombres: dict[int, str] = {c.id: c.nombre for c in cuentas}
+        self.por_codigo: dict[str, int] = {}
+        for c in cuentas:
+            self.por_codigo.setdefault(c.codigo, c.id)
+        self._memo = lru_cache(maxsize=MEMO_MAX_TEXTOS)(self._resolver)
+
+    def __len__(self) -> int:
+        return len(self._cuentas)
+
+    def _resolver(self, txt: str) -> Optional[tuple]:
+        """(cuenta_id, nombre, regla) para un texto ya normalizado."""
+        hit = self._exacto.get(txt)
+        if hit:
+            return hit + ("alta",)
+        for cid, nombre, lower, _pl in self._cuentas:
+            if txt in lower or lower in txt:
+                return cid, nombre, "media"
+        hit = self._por_pl.get(_map_categoria_texto(txt))
+        if hit:
+            return hit + ("pl",)
+        return None
+
+    def sugerir(self, categoria_texto: Optional[str], cuenta_actual_id: Optional[int] = None) -> Optional[dict]:
+        if not categoria_texto:
+            return None
+        r = self._memo(categoria_texto.lower().strip())
+        if r is None:
+            return None
+        cid, nombre, regla = r
+        if regla == "pl":
+            regla = "alta" if cid == cuenta_actual_id else "baja"
+        return {"catalogo_cuenta_id": cid, "nombre": nombre, "confianza": regla}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+
+_cache: dict = {}
+_cache_lock = threading.Lock()
+
+
+def get_indice(db: Session, restaurante_id: int) -> IndiceSugerencias:
+    version = data_versions.clave(db, restaurante_id, ("catalogo",))
+    with _cache_lock:
+        hit = _cache.get(restaurante_id)
+        if hit and hit[0] == version:
+            return hit[1]
+
+    cuentas = db.query(models.CatalogoCuenta).filter(
+        models.CatalogoCuenta.restaurante_id == restaurante_id,
+        models.CatalogoCuenta.activo == True,
+    ).all()
+    indice = IndiceSugerencias(cuentas)
+    with _cache_lock:
+        _cache[restaurante_id] = (version, indice)
+    return indice
+
+
+def invalidate(restaurante_id: Optional[int] = None) -> None:
+    with _cache_lock:
+        if restaurante_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(restaurante_id, None)
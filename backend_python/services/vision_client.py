@@ -0,0 +1,308 @@
+"""
+KOI Dashboard — Cliente de vision para PDFs escaneados e imágenes.
+
+Centraliza lo que antes hacía cada parser por su cuenta:
+  - Rasterizado (pdftoppm, o pypdfium2 vía pdfplumber si no está instalado)
+    y reducción de la imagen antes de mandarla.
+  - Límite de llamadas simultáneas compartido por los workers del pool de
+    parseo (semáforo creado en el proceso principal y entregado a cada worker
+    por el initializer del pool) con espera máxima: una ráfaga de tickets
+    escaneados no acapara todos los workers esperando a la API.
+  - Reintentos con backoff para 429/5xx y timeout por llamada.
+  - Espera de turno, timeout y reintentos acotados por lo que le queda al
+    trabajo de parseo (parse_executor.job_deadline): el worker devuelve un
+    error a tiempo en vez de seguir ocupado después del 504.
+  - Cache por hash de imagen + modo (parse_cache).
+  - Backend intercambiable: "anthropic" (API real) o "stub" (determinista,
+    sin red — tests y benchmarks de carga).
+
+Configuración:
+  VISION_BACKEND             anthropic (default) | stub
+  VISION_MAX_CONCURRENCY     llamadas simultáneas (default 2)
+  VISION_QUEUE_TIMEOUT       segundos máximos esperando turno (default 60; nunca
+                             más de lo que le queda al trabajo de parseo)
+  VISION_TIMEOUT_SECONDS     timeout por llamada HTTP (default 45)
+  VISION_MAX_RETRIES         reintentos ante 429/5xx/timeout (default 2)
+  VISION_MAX_EDGE            lado mayor de la imagen enviada, px (default 1568)
+"""
+import abc
+import base64
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+from . import parse_executor
+from .parse_cache import parse_cache
+
+VISION_VERSION = "1"
+MAX_CONCURRENCY = int(os.environ.get("VISION_MAX_CONCURRENCY", "2"))
+QUEUE_TIMEOUT = float(os.environ.get("VISION_QUEUE_TIMEOUT", "60"))
+CALL_TIMEOUT = float(os.environ.get("VISION_TIMEOUT_SECONDS", "45"))
+MAX_RETRIES = int(os.environ.get("VISION_MAX_RETRIES", "2"))
+MAX_EDGE = int(os.environ.get("VISION_MAX_EDGE", "1568"))
+
+MIN_CALL_SECONDS = 2.0  # no vale la pena empezar una llamada con menos tiempo que esto
+
+# Semáforo entre procesos. Lo crea el proceso principal (slots()) y llega a los
+# workers por init_worker — con spawn/forkserver un semáforo creado al importar
+# sería uno distinto en cada worker.
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def slots():
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = multiprocessing.BoundedSemaphore(MAX_CONCURRENCY)
+        return _slots
+
+
+def init_worker(semaforo) -> None:
+    """Initializer del pool de parseo: usar el semáforo del proceso principal."""
+    global _slots
+    _slots = semaforo
+
+
+def _restante(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else deadline - time.time()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Rasterizado y reducción
+# ─────────────────────────────────────────────────────────────────────────────
+
+def rasterize_pdf(pdf_path: str, dpi: int = 150) -> Optional[bytes]:
+    """Primera página del PDF como JPEG. None si no se pudo convertir."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out_prefix = f"{tmpdir}/page"
+        try:
+            subprocess.run(
+                ["pdftoppm", "-jpeg", "-r", str(dpi), "-f", "1", "-l", "1", pdf_path, out_prefix],
+                check=True, capture_output=True, timeout=30
+            )
+            imgs = sorted(glob.glob(f"{out_prefix}*.jpg"))
+            if imgs:
+                with open(imgs[0], "rb") as f:
+                    return f.read()
+        except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
+            pass
+
+    # Respaldo sin binarios del sistema: pypdfium2 (dependencia de pdfplumber)
+    try:
+        import pdfplumber
+        with pdfplumber.open(pdf_path) as pdf:
+            if not pdf.pages:
+                return None
+            img = pdf.pages[0].to_image(resolution=dpi).original
+            buf = io.BytesIO()
+            img.convert("RGB").save(buf, format="JPEG", quality=85)
+            return buf.getvalue()
+    except Exception:
+        return None
+
+
+def downscale(image_bytes: bytes, media_type: str, max_edge: int = MAX_EDGE) -> tuple[bytes, str]:
+    """Reduce la imagen si excede max_edge (la API la reescala de todos modos)."""
+    try:
+        from PIL import Image
+        img = Image.open(io.BytesIO(image_bytes))
+        if max(img.size) <= max_edge:
+            return image_bytes, media_type
+        img.thumbnail((max_edge, max_edge))
+        buf = io.BytesIO()
+        img.convert("RGB").save(buf, format="JPEG", quality=85)
+        return buf.getvalue(), "image/jpeg"
+    except Exception:
+        return image_bytes, media_type
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Backends
+# ─────────────────────────────────────────────────────────────────────────────
+
+class VisionBackend(abc.ABC):
+    name = "base"
+
+    @abc.abstractmethod
+    def extract(self, image_bytes: bytes, media_type: str, prompt: str, mode: str,
+                deadline: Optional[float] = None) -> dict:
+        """JSON extraído de la imagen, o {"error": ...}. deadline: time.time() límite."""
+
+
+class AnthropicVisionBackend(VisionBackend):
+    name = "anthropic"
+
+    def __init__(self, api_key: Optional[str] = None, model: str = "claude-opus-4-5"):
+        self.api_key = api_key if api_key is not None else os.getenv("ANTHROPIC_API_KEY")
+        self.model = model
+
+    def extract(self, image_bytes: bytes, media_type: str, prompt: str, mode: str,
+                deadline: Optional[float] = None) -> dict:
+        if not self.api_key:
+            return {"error": "ANTHROPIC_API_KEY no configurada"}
+        payload = {
+            "model": self.model,
+            "max_tokens": 2000,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {"type": "image", "source": {"type": "base64", "media_type": media_type,
+                                                 "data": base64.b64encode(image_bytes).decode()}},
+                    {"type": "text", "text": prompt},
+                ],
+            }],
+        }
+        headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json",
+        }
+        ultimo_error = "sin respuesta"
+        for intento in range(MAX_RETRIES + 1):
+            restante = _restante(deadline)
+            if restante is not None and restante < MIN_CALL_SECONDS:
+                if not intento:
+                    ultimo_error = "sin tiempo para llamar"
+                break
+            try:
+                resp = httpx.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload,
+                                  timeout=CALL_TIMEOUT if restante is None else min(CALL_TIMEOUT, restante))
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    ultimo_error = f"HTTP {resp.status_code}"
+                else:
+                    resp.raise_for_status()
+                    raw_text = resp.json()["content"][0]["text"]
+                    clean = re.sub(r"```json|```", "", raw_text).strip()
+                    return json.loads(clean)
+            except httpx.TimeoutException:
+                ultimo_error = "timeout"
+            except Exception as e:
+                return {"error": f"Vision parse falló: {e}"}
+            if intento < MAX_RETRIES:
+                espera = min(8.0, 0.5 * 2 ** intento)
+                restante = _restante(deadline)
+                if restante is not None and restante - espera < MIN_CALL_SECONDS:
+                    break
+                time.sleep(espera)
+        return {"error": f"Vision parse falló: {ultimo_error}"}
+
+
+class StubVisionBackend(VisionBackend):
+    """Respuesta determinista derivada del hash de la imagen. Sin red."""
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def extract(self, image_bytes: bytes, media_type: str, prompt: str, mode: str,
+                deadline: Optional[float] = None) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        h = hashlib.sha256(image_bytes).hexdigest()
+        monto = round(100 + int(h[:6], 16) % 900000 / 100, 2)
+        if mode == "comprobante":
+            return {"banco": "STUB", "monto": monto, "concepto": f"PAGO {h[:6].upper()}",
+                    "fecha": "2026-01-15", "referencia": h[:10], "cuenta_origen": None,
+                    "cuenta_destino": None, "beneficiario": "PROVEEDOR STUB"}
+        subtotal = round(monto / 1.16, 2)
+        data = {
+            "proveedor": "PROVEEDOR STUB", "rfc_emisor": None, "folio": f"STUB-{h[:6].upper()}",
+            "folio_fiscal": f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:32]}".upper(),
+            "fecha": "2026-01-15",
+            "items": [{"descripcion": "ARTICULO STUB", "cantidad": 1.0, "unidad": "PZA",
+                       "precio_unitario": subtotal, "importe": subtotal}],
+            "subtotal": subtotal, "descuento": 0.0, "iva": round(monto - subtotal, 2),
+            "iva_tasa": 16, "total": monto, "metodo_pago": None,
+        }
+        if mode == "auto":
+            data["tipo_documento"] = "factura"
+        return data
+
+
+_BACKENDS = {"anthropic": AnthropicVisionBackend, "stub": StubVisionBackend}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cliente
+# ─────────────────────────────────────────────────────────────────────────────
+
+class VisionClient:
+
+    def __init__(self, backend: Optional[VisionBackend] = None, queue_timeout: float = QUEUE_TIMEOUT):
+        self.backend = backend or _BACKENDS.get(os.environ.get("VISION_BACKEND", "anthropic"), AnthropicVisionBackend)()
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._stats = {"llamadas": 0, "cache_hits": 0, "errores": 0, "rechazadas": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "backend": self.backend.name}
+
+    def extract(self, image_bytes: bytes, media_type: str, prompt: str, mode: str = "factura") -> dict:
+        """Extrae JSON de la imagen. Respuestas exitosas se cachean por hash de imagen + modo + prompt."""
+        version = f"{VISION_VERSION}:{self.backend.name}:{mode}:{hashlib.sha256(prompt.encode()).hexdigest()[:12]}"
+        key = parse_cache.make_key("vision", version, image_bytes)
+        cached = parse_cache.get(key)
+        if cached is not None:
+            self._count("cache_hits")
+            return dict(cached)
+
+        image_bytes, media_type = downscale(image_bytes, media_type)
+        # Dentro del pool de parseo la espera no pasa del plazo del trabajo,
+        # dejando al menos MIN_CALL_SECONDS para la llamada misma
+        deadline = parse_executor.job_deadline()
+        restante = _restante(deadline)
+        espera = self.queue_timeout if restante is None else min(self.queue_timeout, restante - MIN_CALL_SECONDS)
+        semaforo = slots()
+        if espera < 0 or not semaforo.acquire(timeout=espera):
+            self._count("rechazadas")
+            return {"error": "Servicio de vision saturado, intenta de nuevo en unos minutos"}
+        try:
+            self._count("llamadas")
+            result = self.backend.extract(image_bytes, media_type, prompt, mode, deadline=deadline)
+        finally:
+            semaforo.release()
+
+        if not isinstance(result, dict) or result.get("error"):
+            self._count("errores")
+            return result if isinstance(result, dict) else {"error": "Respuesta de vision inválida"}
+        parse_cache.set(key, result)
+        return dict(result)
+
+    def extract_pdf(self, pdf_path: str, prompt: str, mode: str = "factura", dpi: int = 150) -> dict:
+        img = rasterize_pdf(pdf_path, dpi=dpi)
+        if not img:
+            return {"error": "No se pudo convertir el PDF a imagen"}
+        return self.extract(img, "image/jpeg", prompt, mode)
+
+
+_client: Optional[VisionClient] = None
+
+
+def get_client() -> VisionClient:
+    global _client
+    if _client is None:
+        _client = VisionClient()
+    return _client
+
+
+def set_backend(backend: VisionBackend) -> None:
+    """Reemplaza el backend del cliente global (tests / benchmarks)."""
+    global _client
+    _client = VisionClient(backend=backend)
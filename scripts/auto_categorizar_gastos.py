@@ -1,33 +1,52 @@
 """
 auto_categorizar_gastos.py
 ==========================
-Categoriza automáticamente todos los gastos históricos de un restaurante
-asignando catalogo_cuenta_id basado en el texto de la columna `categoria`.
+Categoriza automáticamente los gastos históricos asignando catalogo_cuenta_id
+basado en el texto de la columna `categoria`.
 
 Uso:
-  DATABASE_URL="postgresql://..." python3 scripts/auto_categorizar_gastos.py [restaurante_id]
-
-Predeterminado: restaurante_id = 6 (KOI)
+  python3 scripts/auto_categorizar_gastos.py [restaurante_id ...] [--workers 4] [--chunk 5000]
+                                             [--checkpoint-dir DIR] [--reiniciar] [--dry-run] [--detalle]
+
+Sin restaurante_id se procesan todos los restaurantes con catálogo de cuentas.
+Base de datos: --database-url, DATABASE_URL o la SQLite local (backend_python/koi.db).
+Funciona con PostgreSQL y SQLite.
+
+- Streaming: las filas pendientes se leen con cursor del lado del servidor
+  (stream_results) en orden de id y se actualizan por bloques de --chunk, un
+  UPDATE por cuenta destino y commit por bloque.
+- Reanudable: después de cada bloque se guarda el último id procesado por
+  tabla en --checkpoint-dir/restaurante_<id>.json; una corrida interrumpida
+  continúa desde ahí (--reiniciar lo ignora). Al terminar todas las tablas
+  sin error el checkpoint se borra: la siguiente corrida vuelve a revisar
+  los pendientes que quedaron (p. ej. sin cuenta 6008 en el catálogo).
+- Cada bloque sube la versión de datos "gastos" del restaurante y publica
+  "P&L invalidado" a los clientes SSE, en el mismo commit.
+- Paralelo: un proceso por restaurante hasta --workers.
 
 Idempotente: solo actualiza registros donde catalogo_cuenta_id IS NULL.
-Nunca borra datos. Usa transacción — si algo falla, rollback completo.
+Nunca borra datos.
 """
 
+import argparse
+import json
 import os
 import sys
+import time
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 
-import psycopg2
-from psycopg2.extras import execute_values
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# ── Configuración ─────────────────────────────────────────────────────────────
+from sqlalchemy import bindparam, create_engine, event, text
 
-RESTAURANTE_ID = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+from backend_python.services import data_versions, eventos
+
+# ── Configuración ─────────────────────────────────────────────────────────────
 
-DATABASE_URL = os.environ.get("DATABASE_URL")
-if not DATABASE_URL:
-    print("ERROR: Falta variable de entorno DATABASE_URL")
-    sys.exit(1)
+CHUNK_SIZE = 5000
+CHECKPOINT_DIR = ".auto_categorizar"
 
 # Mapeo texto → codigo de cuenta (códigos del catálogo de KOI)
 # Se aplica substring match (no exact): si el KEY está CONTENIDO en la categoría → match
@@ -153,10 +172,12 @@ def normalizar(texto: str) -> str:
     return sin_acentos.lower().strip().replace("-", "_")
 
 
+@lru_cache(maxsize=65536)
 def buscar_codigo(categoria: str | None) -> tuple[str, bool]:
     """
     Retorna (codigo, es_match_exacto).
     Si no hay match → ("6008", False) = Otros gastos.
+    Memoizado: las categorías se repiten mucho entre filas.
     """
     if not categoria:
         return ("6008", False)
@@ -176,182 +197,240 @@ def buscar_codigo(categoria: str | None) -> tuple[str, bool]:
     return ("6008", False)
 
 
-def run():
-    conn = psycopg2.connect(DATABASE_URL)
-    conn.autocommit = False
-    cur = conn.cursor()
+# ── Base de datos ─────────────────────────────────────────────────────────────
+
+SQL_PENDIENTES = {
+    "gastos": """
+        SELECT id, categoria, monto FROM gastos
+        WHERE restaurante_id = :rid AND catalogo_cuenta_id IS NULL AND id > :desde
+        ORDER BY id
+    """,
+    "gastos_diarios": """
+        SELECT gd.id, gd.categoria, gd.monto
+        FROM gastos_diarios gd
+        JOIN cierres_turno ct ON ct.id = gd.cierre_id
+        WHERE ct.restaurante_id = :rid AND gd.catalogo_cuenta_id IS NULL AND gd.id > :desde
+        ORDER BY gd.id
+    """,
+}
 
-    try:
-        # 1. Resolver catalogo_cuenta_id por codigo para este restaurante
-        cur.execute(
-            "SELECT codigo, id FROM catalogo_cuentas WHERE restaurante_id = %s",
-            (RESTAURANTE_ID,)
-        )
-        codigo_a_id: dict[str, int] = {row[0]: row[1] for row in cur.fetchall()}
+SQL_ACTUALIZAR = {
+    tabla: text(
+        f"UPDATE {tabla} SET catalogo_cuenta_id = :cid WHERE id IN :ids AND catalogo_cuenta_id IS NULL"
+    ).bindparams(bindparam("ids", expanding=True))
+    for tabla in SQL_PENDIENTES
+}
 
-        if not codigo_a_id:
-            print(f"ERROR: No hay catálogo de cuentas para restaurante_id={RESTAURANTE_ID}")
-            conn.rollback()
-            return
 
-        print(f"Catálogo cargado: {len(codigo_a_id)} cuentas para restaurante_id={RESTAURANTE_ID}")
-        for cod, cid in sorted(codigo_a_id.items()):
-            print(f"  {cod} → id={cid}")
+def database_url(explicita: str | None = None) -> str:
+    url = explicita or os.environ.get("DATABASE_URL")
+    if url:
+        return url
+    from backend_python.database import engine
+    return engine.url.render_as_string(hide_password=False)
+
+
+def crear_engine(url: str):
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    engine = create_engine(url, connect_args={"timeout": 60})
+
+    @event.listens_for(engine, "connect")
+    def _wal(dbapi_connection, _record):
+        # WAL: el cursor de lectura no bloquea los commits por bloque
+        cur = dbapi_connection.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.close()
+
+    return engine
+
+
+def listar_restaurantes(engine) -> list[int]:
+    with engine.connect() as conn:
+        return [r[0] for r in conn.execute(text(
+            "SELECT DISTINCT restaurante_id FROM catalogo_cuentas ORDER BY restaurante_id"
+        ))]
+
+
+# ── Checkpoint ────────────────────────────────────────────────────────────────
+
+class Checkpoint:
+    """Último id procesado por tabla para un restaurante; escritura atómica."""
+
+    def __init__(self, directorio: str | None, restaurante_id: int, reiniciar: bool = False):
+        self.path = os.path.join(directorio, f"restaurante_{restaurante_id}.json") if directorio else None
+        self.data: dict = {}
+        if self.path and not reiniciar:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError):
+                self.data = {}
 
+    def ultimo_id(self, tabla: str) -> int:
+        return int(self.data.get(tabla, 0))
+
+    def borrar(self) -> None:
+        self.data = {}
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def avanzar(self, tabla: str, ultimo_id: int) -> None:
+        self.data[tabla] = ultimo_id
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.data, f)
+        os.replace(tmp, self.path)
+
+
+# ── Proceso por restaurante ───────────────────────────────────────────────────
+
+def _aplicar_bloque(conn, tabla: str, restaurante_id: int, bloque: list, codigo_a_id: dict, id_otros, stats: dict,
+                    dry_run: bool):
+    por_cuenta: dict[int, list[int]] = {}
+    for gasto_id, categoria, monto in bloque:
+        codigo, es_match = buscar_codigo(categoria)
+        cat_id = codigo_a_id.get(codigo, id_otros)
+        if not cat_id:
+            stats["sin_cuenta"] += 1
+            continue
+        por_cuenta.setdefault(cat_id, []).append(gasto_id)
+        if es_match and codigo != "6008":
+            stats["match"] += 1
+        else:
+            stats["otros"] += 1
+        n, total = stats["por_codigo"].get(codigo, (0, 0.0))
+        stats["por_codigo"][codigo] = (n + 1, total + float(monto or 0))
+    if dry_run:
+        return
+    for cat_id, ids in por_cuenta.items():
+        conn.execute(SQL_ACTUALIZAR[tabla], {"cid": cat_id, "ids": ids})
+    if por_cuenta:
+        # Mismo commit que el bloque: los ETags de analytics del restaurante caducan
+        # y los clientes SSE reciben "P&L invalidado"
+        pares = [(restaurante_id, "gastos")]
+        data_versions.bump_conexion(conn, pares, avisar=False)
+        eventos.pl_invalidado(conn, pares)
+
+
+def procesar_restaurante(url: str, restaurante_id: int, chunk: int = CHUNK_SIZE,
+                         checkpoint_dir: str | None = CHECKPOINT_DIR, reiniciar: bool = False,
+                         dry_run: bool = False) -> dict:
+    """Categoriza los pendientes de un restaurante. Corre en su propio proceso."""
+    inicio = time.monotonic()
+    engine = crear_engine(url)
+    stats = {"restaurante_id": restaurante_id, "filas": 0, "match": 0, "otros": 0, "sin_cuenta": 0,
+             "bloques": 0, "por_codigo": {}, "error": None}
+    checkpoint = Checkpoint(None if dry_run else checkpoint_dir, restaurante_id, reiniciar)
+    try:
+        with engine.connect() as conn:
+            codigo_a_id = dict(conn.execute(
+                text("SELECT codigo, id FROM catalogo_cuentas WHERE restaurante_id = :rid"),
+                {"rid": restaurante_id},
+            ).fetchall())
+        if not codigo_a_id:
+            stats["error"] = "sin catálogo de cuentas"
+            return stats
         id_otros = codigo_a_id.get("6008")
-        if not id_otros:
-            print("WARNING: No se encontró cuenta 6008 (Otros gastos). Usando None para no-match.")
-
-        # ── Tabla: gastos ──────────────────────────────────────────────────
-        cur.execute(
-            "SELECT id, categoria, monto FROM gastos WHERE restaurante_id = %s AND catalogo_cuenta_id IS NULL",
-            (RESTAURANTE_ID,)
-        )
-        gastos_rows = cur.fetchall()
-
-        gastos_updates: list[tuple[int, int]] = []  # (catalogo_cuenta_id, gasto_id)
-        gastos_otros = 0
-        gastos_match = 0
-        gastos_por_codigo: dict[str, list[float]] = {}
-
-        for gasto_id, categoria, monto in gastos_rows:
-            codigo, es_match = buscar_codigo(categoria)
-            cat_id = codigo_a_id.get(codigo, id_otros)
-            if cat_id:
-                gastos_updates.append((cat_id, gasto_id))
-                if es_match and codigo != "6008":
-                    gastos_match += 1
-                else:
-                    gastos_otros += 1
-                gastos_por_codigo.setdefault(codigo, []).append(float(monto or 0))
-
-        if gastos_updates:
-            execute_values(
-                cur,
-                "UPDATE gastos SET catalogo_cuenta_id = data.cat_id FROM (VALUES %s) AS data(cat_id, id) WHERE gastos.id = data.id",
-                gastos_updates
-            )
-
-        # ── Tabla: gastos_diarios ──────────────────────────────────────────
-        # Buscar gastos_diarios ligados a cierres de este restaurante
-        cur.execute(
-            """
-            SELECT gd.id, gd.categoria, gd.monto
-            FROM gastos_diarios gd
-            JOIN cierres_turno ct ON ct.id = gd.cierre_id
-            WHERE ct.restaurante_id = %s AND gd.catalogo_cuenta_id IS NULL
-            """,
-            (RESTAURANTE_ID,)
-        )
-        gd_rows = cur.fetchall()
-
-        gd_updates: list[tuple[int, int]] = []
-        gd_otros = 0
-        gd_match = 0
-        gd_por_codigo: dict[str, list[float]] = {}
-
-        for gd_id, categoria, monto in gd_rows:
-            codigo, es_match = buscar_codigo(categoria)
-            cat_id = codigo_a_id.get(codigo, id_otros)
-            if cat_id:
-                gd_updates.append((cat_id, gd_id))
-                if es_match and codigo != "6008":
-                    gd_match += 1
-                else:
-                    gd_otros += 1
-                gd_por_codigo.setdefault(codigo, []).append(float(monto or 0))
-
-        if gd_updates:
-            execute_values(
-                cur,
-                "UPDATE gastos_diarios SET catalogo_cuenta_id = data.cat_id FROM (VALUES %s) AS data(cat_id, id) WHERE gastos_diarios.id = data.id",
-                gd_updates
-            )
-
-        conn.commit()
-
-        # ── Reporte ────────────────────────────────────────────────────────
-        print()
-        print("=" * 50)
-        print("=== AUTO-CATEGORIZACIÓN COMPLETADA ===")
-        print("=" * 50)
-        print(f"gastos tabla:        {len(gastos_updates):>4} procesados  "
-              f"({gastos_match} con match, {gastos_otros} asignados a 'otros')")
-        print(f"gastos_diarios tabla:{len(gd_updates):>4} procesados  "
-              f"({gd_match} con match, {gd_otros} asignados a 'otros')")
-        total = len(gastos_updates) + len(gd_updates)
-        total_match = gastos_match + gd_match
-        total_otros = gastos_otros + gd_otros
-        print(f"Total: {total_match}/{total} categorizados con match")
-        print(f"       {total_otros}/{total} asignados a 'otros' (requieren revisión manual)")
-
-        # Mapa nombre de cuenta para reporte legible
-        cur.execute(
-            "SELECT codigo, nombre FROM catalogo_cuentas WHERE restaurante_id = %s",
-            (RESTAURANTE_ID,)
-        )
-        nombre_por_codigo = {row[0]: row[1] for row in cur.fetchall()}
-
-        # Combinar ambas tablas por código
-        combined: dict[str, tuple[int, float]] = {}
-        for tabla_dict in [gastos_por_codigo, gd_por_codigo]:
-            for codigo, montos in tabla_dict.items():
-                prev_count, prev_sum = combined.get(codigo, (0, 0.0))
-                combined[codigo] = (prev_count + len(montos), prev_sum + sum(montos))
-
-        print()
-        print("Por categoría:")
-        for codigo in sorted(combined.keys()):
-            count, total_monto = combined[codigo]
-            nombre = nombre_por_codigo.get(codigo, codigo)
-            print(f"  {codigo} {nombre:<22}: {count:>4} registros  ${total_monto:>12,.2f}")
-
-        # Verificar que quedaron 0 sin categorizar
-        cur.execute(
-            "SELECT COUNT(*) FROM gastos WHERE restaurante_id=%s AND catalogo_cuenta_id IS NULL",
-            (RESTAURANTE_ID,)
-        )
-        restantes_g = cur.fetchone()[0]
-        cur.execute(
-            """
-            SELECT COUNT(*) FROM gastos_diarios gd
-            JOIN cierres_turno ct ON ct.id = gd.cierre_id
-            WHERE ct.restaurante_id=%s AND gd.catalogo_cuenta_id IS NULL
-            """,
-            (RESTAURANTE_ID,)
-        )
-        restantes_gd = cur.fetchone()[0]
-        print()
-        print(f"Verificación post-update:")
-        print(f"  gastos sin catalogo_cuenta_id:         {restantes_g}")
-        print(f"  gastos_diarios sin catalogo_cuenta_id: {restantes_gd}")
-
-        # ── Detectar categorías que fueron a 'otros' para revisión ────────
-        cur.execute(
-            """
-            SELECT g.categoria, COUNT(*) as cnt, SUM(g.monto) as total
-            FROM gastos g
-            JOIN catalogo_cuentas cc ON cc.id = g.catalogo_cuenta_id
-            WHERE g.restaurante_id = %s AND cc.codigo = '6008'
-            GROUP BY g.categoria
-            ORDER BY SUM(g.monto) DESC
-            """,
-            (RESTAURANTE_ID,)
-        )
-        en_otros = cur.fetchall()
-        if en_otros:
-            print()
-            print("⚠️  Categorías asignadas a 'Otros gastos' (revisar si necesitan cuenta propia):")
-            for cat, cnt, tot in en_otros:
-                print(f"  {cat:<25}: {cnt:>3} registros  ${float(tot):>10,.2f}")
 
+        for tabla, sql in SQL_PENDIENTES.items():
+            # Lectura en streaming por una conexión; escritura y commits por otra
+            with engine.connect() as lectura, engine.connect() as escritura:
+                filas = lectura.execution_options(stream_results=True, yield_per=chunk).execute(
+                    text(sql), {"rid": restaurante_id, "desde": checkpoint.ultimo_id(tabla)}
+                )
+                for particion in filas.partitions(chunk):
+                    _aplicar_bloque(escritura, tabla, restaurante_id, particion, codigo_a_id, id_otros, stats, dry_run)
+                    escritura.commit()
+                    checkpoint.avanzar(tabla, particion[-1][0])
+                    stats["filas"] += len(particion)
+                    stats["bloques"] += 1
+        # Todo confirmado: la próxima corrida empieza de cero
+        checkpoint.borrar()
     except Exception as e:
-        conn.rollback()
-        print(f"\nERROR — rollback completo: {e}")
-        raise
+        # El checkpoint conserva lo ya confirmado; la siguiente corrida reanuda
+        stats["error"] = f"{type(e).__name__}: {e}"
     finally:
-        cur.close()
-        conn.close()
+        engine.dispose()
+        stats["segundos"] = time.monotonic() - inicio
+    return stats
+
+
+# ── Reporte ───────────────────────────────────────────────────────────────────
+
+def _imprimir(stats: dict, detalle: bool) -> None:
+    rid, seg = stats["restaurante_id"], stats["segundos"]
+    if stats["error"] and not stats["filas"]:
+        print(f"restaurante {rid}: ERROR — {stats['error']}")
+        return
+    velocidad = stats["filas"] / seg if seg else 0
+    print(f"restaurante {rid}: {stats['filas']:>8} filas en {stats['bloques']} bloques  "
+          f"{stats['match']} con match, {stats['otros']} a 'otros', {stats['sin_cuenta']} sin cuenta  "
+          f"({seg:.1f}s, {velocidad:,.0f} filas/s)")
+    if stats["error"]:
+        print(f"  ERROR — {stats['error']} (reanudable desde el checkpoint)")
+    if detalle:
+        for codigo in sorted(stats["por_codigo"]):
+            n, total = stats["por_codigo"][codigo]
+            print(f"  {codigo}: {n:>8} registros  ${total:>14,.2f}")
+
+
+def run(argv=None) -> list[dict]:
+    parser = argparse.ArgumentParser(description="Auto-categorización de gastos por texto de categoría")
+    parser.add_argument("restaurantes", type=int, nargs="*", help="IDs de restaurante (default: todos)")
+    parser.add_argument("--database-url")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--checkpoint-dir", default=CHECKPOINT_DIR)
+    parser.add_argument("--reiniciar", action="store_true", help="Ignora checkpoints previos")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reporta, no escribe")
+    parser.add_argument("--detalle", action="store_true", help="Desglose por código de cuenta")
+    args = parser.parse_args(argv)
+
+    url = database_url(args.database_url)
+    restaurantes = args.restaurantes
+    if not restaurantes:
+        engine = crear_engine(url)
+        restaurantes = listar_restaurantes(engine)
+        engine.dispose()
+    if not restaurantes:
+        print("ERROR: No hay restaurantes con catálogo de cuentas")
+        return []
+
+    opciones = {"chunk": args.chunk, "checkpoint_dir": args.checkpoint_dir,
+                "reiniciar": args.reiniciar, "dry_run": args.dry_run}
+    print(f"Auto-categorización: {len(restaurantes)} restaurante(s), {args.workers} worker(s), "
+          f"bloques de {args.chunk}{' [dry-run]' if args.dry_run else ''}")
+    inicio = time.monotonic()
+    resultados = []
+    if args.workers <= 1 or len(restaurantes) == 1:
+        for rid in restaurantes:
+            resultados.append(procesar_restaurante(url, rid, **opciones))
+            _imprimir(resultados[-1], args.detalle)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futuros = [pool.submit(procesar_restaurante, url, rid, **opciones) for rid in restaurantes]
+            for futuro in as_completed(futuros):
+                resultados.append(futuro.result())
+                _imprimir(resultados[-1], args.detalle)
+
+    duracion = time.monotonic() - inicio
+    filas = sum(r["filas"] for r in resultados)
+    errores = [r["restaurante_id"] for r in resultados if r["error"]]
+    print()
+    print("=" * 50)
+    print(f"Total: {filas} filas en {duracion:.1f}s ({filas / duracion if duracion else 0:,.0f} filas/s)")
+    print(f"       {sum(r['match'] for r in resultados)} con match, "
+          f"{sum(r['otros'] for r in resultados)} a 'otros' (requieren revisión manual)")
+    if errores:
+        print(f"       restaurantes con error: {errores}")
+    return resultados
 
 
 if __name__ == "__main__":
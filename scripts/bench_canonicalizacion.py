@@ -0,0 +1,123 @@
+"""
+bench_canonicalizacion.py
+=========================
+Tiempo de agrupar nombres de proveedor (services/proveedor_canonico.agrupar)
+sobre nombres sintéticos con variantes conocidas.
+
+Uso:
+  python3 scripts/bench_canonicalizacion.py [--nombres 10000] [--umbral 0.55] [--semilla 7]
+
+Genera proveedores base (giro o nombre común + nombres propios) y variantes como las que llegan de
+captura: artículo ("LA ..."), razón social ("... SA DE CV"), palabra de
+menos, errores de dedo y acentos. Reporta el tiempo, los pares comparados
+contra n²/2 y qué tan bien se recuperan los grupos reales:
+  - pureza: grupos sugeridos que solo tienen variantes de un mismo proveedor
+  - cobertura: variantes que quedaron en el grupo de su proveedor
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend_python.services import proveedor_canonico
+
+_PALABRAS = (
+    "BUENA TIERRA CARNES AVILA POLLOS VALLE PESCADOS GOLFO ABARROTES CENTRAL DISTRIBUIDORA NORTE SUR "
+    "FRUTAS VERDURAS LACTEOS QUESOS CREMERIA PANADERIA HARINAS MOLINO GAS NIETO HIELO CRISTAL AGUA "
+    "PURIFICADORA LIMPIEZA QUIMICOS EMPAQUES DESECHABLES PAPELERIA COMERCIAL INDUSTRIAL MARISCOS PACIFICO "
+    "CARNICERIA RES CERDO CORDERO HUEVO GRANJA ESPECIAS CHILES SECOS SALSAS MAYOREO BEBIDAS REFRESCOS "
+    "CERVEZA VINOS LICORES CAFE TOSTADORES TORTILLERIA MAIZ ARROZ FRIJOL ACEITES GRASAS CONGELADOS "
+    "CESAR HUMBERTO CARRANZA MARIA GUADALUPE HERNANDEZ JOSE LUIS MARTINEZ ROSA ELENA GARCIA JUAN LOPEZ "
+    "TOYO FOODS NIPPON KIKKOMAN ORIENTE ASIA IMPORTADORA EXPORTADORA SERVICIOS MANTENIMIENTO REFRIGERACION"
+).split()
+
+
+def _error_de_dedo(palabra: str, rnd: random.Random) -> str:
+    if len(palabra) < 4:
+        return palabra
+    i = rnd.randrange(1, len(palabra) - 1)
+    return palabra[:i] + palabra[i + 1:] if rnd.random() < 0.5 else palabra[:i] + palabra[i + 1] + palabra[i] + palabra[i + 2:]
+
+
+def _variante(base: str, rnd: random.Random) -> str:
+    palabras = base.split()
+    tipo = rnd.randrange(5)
+    if tipo == 0:
+        return "LA " + base
+    if tipo == 1:
+        return base + rnd.choice((" SA DE CV", " S.A. DE C.V.", " S DE RL DE CV"))
+    if tipo == 2 and len(palabras) > 2:
+        palabras.pop(rnd.randrange(len(palabras)))
+        return " ".join(palabras)
+    if tipo == 3:
+        i = rnd.randrange(len(palabras))
+        palabras[i] = _error_de_dedo(palabras[i], rnd)
+        return " ".join(palabras)
+    return base.replace("A", "Á", 1).title()
+
+
+_SILABAS = "BA BE BI BO CA CE CI CO DA DE DO FA FE GA GO LA LE LI LO MA ME MI MO NA NE NO PA PE PO RA RE RI RO SA SE SO TA TE TO VA VE ZA ZO".split()
+
+
+def _apellido(rnd: random.Random) -> str:
+    return "".join(rnd.choice(_SILABAS) for _ in range(rnd.randint(2, 4))) + rnd.choice(("", "S", "Z", "N", "R"))
+
+
+def generar(n: int, semilla: int) -> tuple:
+    """({clave: info}, {clave: id del proveedor real})."""
+    rnd = random.Random(semilla)
+    nombres, real = {}, {}
+    base_id = 0
+    while len(nombres) < n:
+        # Giro o nombre de pila común + uno o dos nombres propios (lo que distingue al proveedor)
+        base = " ".join(rnd.sample(_PALABRAS, rnd.randint(1, 2)) + [_apellido(rnd) for _ in range(rnd.randint(1, 2))])
+        base_id += 1
+        for texto in [base] + [_variante(base, rnd) for _ in range(rnd.randint(0, 3))]:
+            clave = proveedor_canonico.clave_proveedor(texto)
+            if clave and clave not in nombres and len(nombres) < n:
+                nombres[clave] = {"transacciones": rnd.randint(1, 50), "total": 0.0, "rfcs": set(), "proveedor_id": None}
+                real[clave] = base_id
+    return nombres, real
+
+
+def run(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Benchmark de canonicalización de proveedores")
+    parser.add_argument("--nombres", type=int, default=10_000)
+    parser.add_argument("--umbral", type=float, default=proveedor_canonico.UMBRAL_DEFAULT)
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    nombres, real = generar(args.nombres, args.semilla)
+    proveedor_canonico._firma_trigrama.cache_clear()  # medir en frío
+    inicio = time.perf_counter()
+    grupos = proveedor_canonico.agrupar(nombres, args.umbral)
+    segundos = time.perf_counter() - inicio
+
+    formas = [proveedor_canonico.trigramas(f) for f in {proveedor_canonico.forma(c) for c in nombres}]
+    candidatos = len(proveedor_canonico._pares_candidatos([proveedor_canonico.firma_minhash(t) for t in formas]))
+    puros = sum(1 for g in grupos if len({real[g["canonico"]]} | {real[c] for c, _ in g["variantes"]}) == 1)
+    tam_real = Counter(real.values())
+    con_variantes = sum(n for n in tam_real.values() if n > 1)
+    recuperadas = 0
+    for g in grupos:
+        ids = Counter([real[g["canonico"]]] + [real[c] for c, _ in g["variantes"]])
+        recuperadas += sum(n for i, n in ids.items() if n > 1 and tam_real[i] > 1)
+    resultado = {
+        "nombres": len(nombres), "segundos": segundos, "grupos": len(grupos),
+        "pureza": puros / len(grupos) if grupos else 1.0,
+        "cobertura": recuperadas / con_variantes if con_variantes else 1.0,
+    }
+    print(f"{len(nombres):,} nombres distintos, umbral {args.umbral}")
+    print(f"  agrupar: {segundos * 1000:,.0f} ms   pares comparados {candidatos:,} "
+          f"(vs {len(formas) * (len(formas) - 1) // 2:,} todos contra todos)")
+    print(f"  {len(grupos):,} grupos sugeridos   pureza {resultado['pureza']:.1%}   cobertura {resultado['cobertura']:.1%}")
+    return resultado
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,136 @@
+"""
+bench_compresion.py
+===================
+Bytes en la red con y sin compresión, para respuestas JSON grandes y para
+el build del SPA.
+
+Uso:
+  python3 scripts/bench_compresion.py [--filas 10000] [--dist dist]
+                                      [--mbps 1.6] [--rtt-ms 150]
+
+1. JSON: siembra una SQLite en memoria y pide /api/gastos y el P&L v2 a la app
+   real (middleware incluido) con Accept-Encoding identity / gzip / br.
+2. SPA: ruta crítica del primer render (index.html + JS/CSS que referencia)
+   sin comprimir vs. las variantes .br/.gz que genera `npm run build`.
+   El tiempo al primer render se estima con un enlace de --mbps y --rtt-ms
+   (HTML → JS/CSS en paralelo → render); no incluye el tiempo de parseo.
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_python import models
+from backend_python.core import compresion
+from backend_python.database import get_db
+from backend_python.main import app
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _sembrar(Session, filas: int) -> int:
+    db = Session()
+    r = models.Restaurante(nombre="Bench", slug="bench", plan="basico")
+    db.add(r)
+    db.flush()
+    hoy, ahora = date.today(), datetime.utcnow()
+    db.execute(insert(models.Gasto), [{
+        "fecha": hoy - timedelta(days=i % 28), "proveedor": f"Proveedor {i % 97}", "categoria": "PROTEINA",
+        "monto": 100.0 + i, "metodo_pago": models.MetodoPago.TRANSFERENCIA, "comprobante": "FACTURA",
+        "descripcion": "compra semanal" if i % 2 else None, "restaurante_id": r.id, "created_at": ahora,
+    } for i in range(filas)])
+    db.commit()
+    rid = r.id
+    db.close()
+    return rid
+
+
+def _medir_json(client: TestClient, urls: list) -> None:
+    codificaciones = ["identity", "gzip"] + (["br"] if compresion.brotli else [])
+    print(f"JSON (umbral {compresion.COMPRESION_MIN_BYTES} bytes)")
+    for url in urls:
+        base = None
+        for cod in codificaciones:
+            inicio = time.perf_counter()
+            # iter_raw: el cuerpo tal como viaja, sin decodificar
+            with client.stream("GET", url, headers={"Accept-Encoding": cod}) as resp:
+                crudo = b"".join(resp.iter_raw())
+            ms = (time.perf_counter() - inicio) * 1000
+            base = base or len(crudo)
+            print(f"  {url[:48]:<48} {cod:<8} {len(crudo):>10,} bytes  {len(crudo) / base:>6.1%}  {ms:>7.1f} ms")
+
+
+def _ruta_critica(dist: str) -> list:
+    index = os.path.join(dist, "index.html")
+    with open(index, encoding="utf-8") as f:
+        html = f.read()
+    refs = re.findall(r'(?:src|href)="/?(assets/[^"]+\.(?:js|css))"', html)
+    return [index] + [os.path.join(dist, r) for r in refs]
+
+
+def _tam(ruta: str, ext: str = "") -> int:
+    return os.path.getsize(ruta + ext) if os.path.isfile(ruta + ext) else os.path.getsize(ruta)
+
+
+def _medir_spa(dist: str, mbps: float, rtt_ms: float) -> None:
+    if not os.path.isfile(os.path.join(dist, "index.html")):
+        print(f"SPA: no hay build en {dist} (correr `npm run build`)")
+        return
+    archivos = _ruta_critica(dist)
+    bytes_por_ms = mbps * 1_000_000 / 8 / 1000
+    print(f"SPA — ruta crítica ({len(archivos)} archivos), enlace {mbps} Mbps / RTT {rtt_ms:.0f} ms")
+    for etiqueta, ext in (("sin comprimir", ""), ("gzip", ".gz"), ("brotli", ".br")):
+        html, resto = _tam(archivos[0], ext), sum(_tam(a, ext) for a in archivos[1:])
+        # HTML (1 RTT + transferencia) → JS/CSS en paralelo (1 RTT + transferencia)
+        estimado = 2 * rtt_ms + (html + resto) / bytes_por_ms
+        print(f"  {etiqueta:<14} {html + resto:>10,} bytes   primer render ≈ {estimado:>7.0f} ms")
+
+
+def run(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de compresión de respuestas y estáticos")
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--dist", default=os.path.join(RAIZ, "dist"))
+    parser.add_argument("--mbps", type=float, default=1.6, help="Ancho de banda (default: 4G lenta)")
+    parser.add_argument("--rtt-ms", type=float, default=150)
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    rid = _sembrar(Session, args.filas)
+
+    def _db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = _db
+    try:
+        hoy = date.today()
+        _medir_json(TestClient(app), [f"/api/gastos?restaurante_id={rid}",
+                                      f"/api/pl/{rid}/v2/mes/{hoy.year}/{hoy.month}"])
+    finally:
+        if previo:
+            app.dependency_overrides[get_db] = previo
+        else:
+            app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+    print()
+    _medir_spa(args.dist, args.mbps, args.rtt_ms)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,125 @@
+"""
+bench_parseo.py
+===============
+Latencia de un request no relacionado mientras se parsean PDFs en paralelo.
+
+Uso:
+  python3 scripts/bench_parseo.py [--pdfs 10] [--paginas 40] [--modo pool|inline|ambos]
+
+Sube --pdfs facturas sintéticas a la vez a POST /api/gastos/parse-factura de
+la app real y, mientras tanto, pide GET /api/parse-cache/stats en serie.
+  - pool:   el parseo va a services/parse_executor (como corre en producción)
+  - inline: el parseo corre dentro del event loop (como antes del executor)
+Reporta p50/p95/máx de la latencia del request ligero y el tiempo total del
+lote. Cada corrida usa PDFs distintos y un directorio de cache temporal, así
+que no hay hits de parse_cache.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["PARSE_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_parseo_")
+
+import httpx
+
+from backend_python.main import app
+from backend_python.services import parse_executor
+
+PAUSA = 0.02
+
+
+def _pdf(paginas: int, marca: str) -> bytes:
+    """Factura de texto plano (Helvetica) con conceptos en cada página."""
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(paginas))
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {paginas} >>")
+    font_id = 3 + 2 * paginas
+    for i in range(paginas):
+        lineas = [f"COMERCIAL TOYO SA DE CV {marca}", "Fecha: 2026-03-02"]
+        lineas += [f"{j + 1} KG NORI PREMIUM {i * 100 + j}.00" for j in range(45)]
+        lineas.append("TOTAL: $1,160.00")
+        ops = "BT /F1 9 Tf 40 770 Td 11 TL " + " ".join(f"({l}) Tj T*" for l in lineas) + " ET"
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                    f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objs.append(f"<< /Length {len(ops)} >>\nstream\n{ops}\nendstream")
+    objs.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for k, o in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{k} 0 obj\n{o}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n" + "".join(f"{x:010d} 00000 n \n" for x in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+async def _inline(fn, *args, timeout=None):
+    return fn(*args)
+
+
+async def _medir(modo: str, pdfs: int, paginas: int) -> dict:
+    original = parse_executor.run_parse
+    if modo == "inline":
+        parse_executor.run_parse = _inline
+    try:
+        transporte = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as client:
+            await client.get("/api/parse-cache/stats")  # calentar
+            archivos = [_pdf(paginas, f"{modo}-{i}-{time.time_ns()}") for i in range(pdfs)]
+            inicio = time.perf_counter()
+            subidas = [asyncio.ensure_future(client.post(
+                "/api/gastos/parse-factura", files={"file": (f"f{i}.pdf", contenido, "application/pdf")},
+            )) for i, contenido in enumerate(archivos)]
+            latencias = []
+            while not all(s.done() for s in subidas):
+                # Un request cada PAUSA: lo que tarde de más es tiempo con el loop ocupado
+                t0 = time.perf_counter()
+                await asyncio.sleep(PAUSA)
+                await client.get("/api/parse-cache/stats")
+                latencias.append((time.perf_counter() - t0 - PAUSA) * 1000)
+            respuestas = await asyncio.gather(*subidas)
+            total = time.perf_counter() - inicio
+    finally:
+        parse_executor.run_parse = original
+    assert all(r.status_code == 200 for r in respuestas), [r.status_code for r in respuestas]
+    latencias.sort()
+    return {
+        "modo": modo, "segundos": total, "requests": len(latencias),
+        "p50": statistics.median(latencias),
+        "p95": latencias[math.ceil(len(latencias) * 0.95) - 1],
+        "max": latencias[-1],
+    }
+
+
+def run(argv=None) -> list:
+    parser = argparse.ArgumentParser(description="Latencia de requests durante parseo de PDFs")
+    parser.add_argument("--pdfs", type=int, default=10)
+    parser.add_argument("--paginas", type=int, default=40)
+    parser.add_argument("--modo", choices=("pool", "inline", "ambos"), default="ambos")
+    args = parser.parse_args(argv)
+
+    modos = ("inline", "pool") if args.modo == "ambos" else (args.modo,)
+    print(f"{args.pdfs} PDFs de {args.paginas} páginas en paralelo, "
+          f"pool de {parse_executor.MAX_WORKERS} workers ({parse_executor.EXECUTOR_KIND})")
+    resultados = []
+    try:
+        for modo in modos:
+            r = asyncio.run(_medir(modo, args.pdfs, args.paginas))
+            resultados.append(r)
+            print(f"  {modo:<7} lote {r['segundos']:6.2f} s   GET ligero ({r['requests']} requests): "
+                  f"p50 {r['p50']:7.1f} ms   p95 {r['p95']:7.1f} ms   máx {r['max']:7.1f} ms")
+    finally:
+        parse_executor.shutdown()
+    return resultados
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,106 @@
+"""
+bench_serializacion.py
+======================
+Compara el tiempo de serializar listas grandes con response_model (objetos
+ORM → Pydantic → JSON) contra core/fast_json (tuplas → orjson).
+
+Uso:
+  python3 scripts/bench_serializacion.py [--filas 10000] [--repeticiones 5]
+
+Corre sobre una SQLite en memoria con datos sintéticos; no toca koi.db.
+Mide solo consulta + serialización (lo que cambia entre los dos caminos),
+y reporta la mediana de las repeticiones.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from backend_python import models, schemas
+from backend_python.core import fast_json
+
+
+def _sembrar(db, filas: int) -> None:
+    ahora = datetime.utcnow()
+    hoy = date.today()
+    db.execute(insert(models.Gasto), [{
+        "fecha": hoy - timedelta(days=i % 365), "proveedor": f"Proveedor {i % 97}", "categoria": "PROTEINA",
+        "monto": 100.0 + i, "metodo_pago": models.MetodoPago.TRANSFERENCIA, "comprobante": "FACTURA",
+        "descripcion": "compra semanal" if i % 2 else None, "restaurante_id": 1, "created_at": ahora,
+    } for i in range(filas)])
+    db.execute(insert(models.MovimientoBanco), [{
+        "fecha": hoy - timedelta(days=i % 365), "concepto": f"SPEI {i}", "monto": -50.0 - i,
+        "tipo": models.TipoMovimientoBanco.CARGO, "reconciliado": bool(i % 3), "restaurante_id": 1,
+        "created_at": ahora,
+    } for i in range(filas)])
+    db.commit()
+
+
+def _pydantic(db, modelo, schema) -> bytes:
+    # Lo que hace FastAPI con response_model=List[schema]
+    objetos = db.query(modelo).order_by(modelo.fecha.desc()).all()
+    adapter = TypeAdapter(List[schema])
+    contenido = adapter.dump_python(adapter.validate_python(objetos, from_attributes=True), mode="json")
+    return json.dumps(contenido, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _rapido(db, modelo, schema) -> bytes:
+    return fast_json.dumps(fast_json.filas(db.query(modelo).order_by(modelo.fecha.desc()), schema))
+
+
+def _medir(Session, fn, modelo, schema, repeticiones: int) -> tuple:
+    tiempos = []
+    for _ in range(repeticiones):
+        db = Session()  # sesión nueva: sin identity map caliente
+        try:
+            inicio = time.perf_counter()
+            cuerpo = fn(db, modelo, schema)
+            tiempos.append(time.perf_counter() - inicio)
+        finally:
+            db.close()
+    return statistics.median(tiempos), cuerpo
+
+
+def run(argv=None) -> list[dict]:
+    parser = argparse.ArgumentParser(description="Benchmark de serialización de listas grandes")
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    _sembrar(db, args.filas)
+    db.close()
+
+    print(f"Serialización de {args.filas:,} filas (mediana de {args.repeticiones}), "
+          f"{'orjson' if fast_json.orjson else 'json (sin orjson)'}")
+    resultados = []
+    for modelo, schema in ((models.Gasto, schemas.GastoResponse),
+                           (models.MovimientoBanco, schemas.MovimientoBancoResponse)):
+        antes, cuerpo_antes = _medir(Session, _pydantic, modelo, schema, args.repeticiones)
+        despues, cuerpo_despues = _medir(Session, _rapido, modelo, schema, args.repeticiones)
+        assert json.loads(cuerpo_antes) == json.loads(cuerpo_despues), f"{schema.__name__}: salida distinta"
+        resultados.append({"schema": schema.__name__, "antes_ms": antes * 1000, "despues_ms": despues * 1000,
+                           "bytes": len(cuerpo_despues)})
+        print(f"  {schema.__name__:<26} response_model {antes * 1000:>8.1f} ms   "
+              f"fast_json {despues * 1000:>8.1f} ms   x{antes / despues:>4.1f}   {len(cuerpo_despues):,} bytes")
+    engine.dispose()
+    return resultados
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+clasificador_gastos.py
+======================
+Entrena y aplica el clasificador de cuenta contable por restaurante
+(backend_python/services/clasificador_gastos.py).
+
+Uso:
+  python3 scripts/clasificador_gastos.py train   [--restaurante ID ...] [--holdout 0.2]
+  python3 scripts/clasificador_gastos.py predict [--restaurante ID ...] [--min-confianza 0.8] [--aplicar]
+
+Sin --restaurante se procesan todos los restaurantes con catálogo de cuentas.
+predict sin --aplicar solo reporta; con --aplicar escribe catalogo_cuenta_id en
+los gastos sin cuenta o en 6008 "Otros gastos" cuya predicción supere
+--min-confianza.
+Usa DATABASE_URL (o la base local) vía backend_python.database.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend_python.database import SessionLocal
+from backend_python import models
+from backend_python.services import clasificador_gastos as clf
+
+
+def _restaurantes(db, ids):
+    if ids:
+        return ids
+    return [rid for (rid,) in db.query(models.CatalogoCuenta.restaurante_id).distinct().order_by(
+        models.CatalogoCuenta.restaurante_id)]
+
+
+def cmd_train(db, args):
+    for rid in _restaurantes(db, args.restaurante):
+        inicio = time.monotonic()
+        try:
+            r = clf.entrenar_restaurante(db, rid, holdout=args.holdout)
+        except ValueError as e:
+            print(f"restaurante {rid}: omitido — {e}")
+            continue
+        h = r["holdout"]
+        print(f"restaurante {rid}: {r['n_entrenamiento']} gastos, {r['clases']} cuentas "
+              f"({time.monotonic() - inicio:.1f}s) → {r['artefacto']}")
+        if h.get("n"):
+            confiables = h["accuracy_confiables"]
+            print(f"  holdout n={h['n']}  accuracy={h['accuracy']:.1%}  "
+                  f"cobertura@{h['min_confianza']}={h['cobertura']:.1%}  "
+                  f"accuracy@{h['min_confianza']}={'-' if confiables is None else f'{confiables:.1%}'}")
+
+
+def cmd_predict(db, args):
+    for rid in _restaurantes(db, args.restaurante):
+        inicio = time.monotonic()
+        try:
+            r = clf.predecir_pendientes(db, rid, min_confianza=args.min_confianza, aplicar=args.aplicar)
+        except ValueError as e:
+            print(f"restaurante {rid}: omitido — {e}")
+            continue
+        duracion = time.monotonic() - inicio
+        velocidad = r["pendientes"] / duracion if duracion else 0
+        print(f"restaurante {rid}: {r['pendientes']} pendientes ({r['sin_cuenta']} sin cuenta, "
+              f"{r['en_otros']} en 6008), {r['confiables']} con confianza "
+              f">= {args.min_confianza}, {r['aplicados']} aplicados ({duracion:.1f}s, {velocidad:,.0f} filas/s)")
+        if r["por_cuenta"]:
+            nombres = dict(db.query(models.CatalogoCuenta.id, models.CatalogoCuenta.codigo).filter(
+                models.CatalogoCuenta.id.in_(list(r["por_cuenta"]))).all())
+            for cuenta_id, n in sorted(r["por_cuenta"].items(), key=lambda kv: -kv[1]):
+                print(f"  {nombres.get(cuenta_id, cuenta_id)}: {n}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clasificador de cuenta contable para gastos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p_train = sub.add_parser("train", help="Entrena y guarda un modelo por restaurante")
+    p_train.add_argument("--restaurante", type=int, action="append")
+    p_train.add_argument("--holdout", type=float, default=clf.HOLDOUT)
+    p_pred = sub.add_parser("predict", help="Predice la cuenta de los gastos sin cuenta o en 6008")
+    p_pred.add_argument("--restaurante", type=int, action="append")
+    p_pred.add_argument("--min-confianza", type=float, default=clf.MIN_CONFIANZA)
+    p_pred.add_argument("--aplicar", action="store_true")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        {"train": cmd_train, "predict": cmd_predict}[args.comando](db, args)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
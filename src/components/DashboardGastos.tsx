@@ -718,9 +718,9 @@ export const DashboardGastos = ({ restauranteIdOverride }: Props) => {
                       </span>
                     </div>
                   ))}
-                  {catActiva.gastos.length > 15 && (
+                  {catActiva.num_transacciones > catActiva.gastos.length && (
                     <div style={{ padding: "10px 20px", background: "#F9FAFB", fontSize: "11px", color: "#9CA3AF", textAlign: "center" as const }}>
-                      Mostrando 15 de {catActiva.gastos.length} transacciones
+                      Mostrando {catActiva.gastos.length} de {catActiva.num_transacciones} transacciones
                     </div>
                   )}
                 </div>
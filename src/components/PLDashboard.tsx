@@ -194,29 +194,20 @@ export const PLDashboard = ({ restauranteIdOverride }: PLDashboardProps = {}) =>
       };
       const base = (window as any).__API_BASE__ || "";
 
-      // Fetch adicionales (no-críticos)
-      await Promise.allSettled([
-        // P&L v2
-        fetch(`${base}/api/pl/${restauranteId}/v2/mes/${anio}/${m}`, { headers: authHeader })
-          .then(r => r.ok ? r.json() : null)
-          .then(d => d && setPlV2(d))
-          .catch(() => {}),
-        // Margen mensual (12 meses)
-        fetch(`${base}/api/pl/${restauranteId}/margen-mensual`, { headers: authHeader })
-          .then(r => r.ok ? r.json() : null)
-          .then(d => d?.meses && setMargenMensual(d.meses))
-          .catch(() => {}),
-        // Top platillos del mes
-        fetch(`${base}/api/pl/${restauranteId}/top-platillos?mes=${m}&anio=${anio}`, { headers: authHeader })
-          .then(r => r.ok ? r.json() : null)
-          .then(d => d?.platillos && setPlatillos(d.platillos))
-          .catch(() => {}),
-        // Ventas diarias resumen (sparkline)
-        fetch(`${base}/api/pl/${restauranteId}/ventas-diarias-resumen`, { headers: authHeader })
-          .then(r => r.ok ? r.json() : null)
-          .then(d => d && setVentasDiarias(d))
-          .catch(() => {}),
-      ]);
+      // Widgets adicionales (no-críticos) en una sola llamada: el bundle
+      // carga cierres/gastos del restaurante una vez para todos
+      const bundle = await fetch(
+        `${base}/api/dashboard/${restauranteId}/bundle?mes=${m}&anio=${anio}` +
+          `&widgets=pl_v2,margen_mensual,top_platillos,ventas_diarias`,
+        { headers: authHeader }
+      )
+        .then(r => r.ok ? r.json() : null)
+        .catch(() => null);
+      const w = bundle?.widgets ?? {};
+      if (w.pl_v2) setPlV2(w.pl_v2);
+      if (w.margen_mensual?.meses) setMargenMensual(w.margen_mensual.meses);
+      if (w.top_platillos?.platillos) setPlatillos(w.top_platillos.platillos);
+      if (w.ventas_diarias) setVentasDiarias(w.ventas_diarias);
     } catch (e: any) {
       console.error("[PLDashboard] fetch falló:", e);
       setError({ message: `Error de red: ${e?.message ?? "desconocido"}` });
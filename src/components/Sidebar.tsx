@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useStore } from '../store/useStore';
 import { LayoutDashboard, ClipboardList, Receipt, Wallet, FileText, Users, BarChart3, Tag, LogOut, Building2, Plus, Calculator, ChefHat } from 'lucide-react';
-import { api } from '../services/api';
+import { api, suscribirEventos } from '../services/api';
 
 /** Semáforo color based on active alertas */
 function getSemaforoColor(alertas: any[]): string {
@@ -67,12 +67,23 @@ export const Sidebar = () => {
   }, [isSuperAdmin]);
 
   // Cargar badge de gastos sin categorizar (solo para usuarios regulares)
+  const [versionGastos, setVersionGastos] = useState(0);
   useEffect(() => {
     if (isSuperAdmin) return;
     api.get(`/api/gastos/sin-categorizar/${restauranteId}`)
       .then(d => setSinCatCount(d.total || 0))
       .catch(() => {});
-  }, [currentRoute, isSuperAdmin, restauranteId]);
+  }, [currentRoute, isSuperAdmin, restauranteId, versionGastos]);
+
+  // Recargar el badge cuando cambian los gastos (eventos en vivo, sin polling)
+  useEffect(() => {
+    if (isSuperAdmin) return;
+    const recargar = () => setVersionGastos(v => v + 1);
+    return suscribirEventos(restauranteId, {
+      pl: (d: any) => { if (d.dominios?.includes('gastos')) recargar(); },
+      resync: recargar,
+    });
+  }, [isSuperAdmin, restauranteId]);
 
   const handleLogout = async () => {
     try { await api.post('/api/auth/logout', {}); } catch {}
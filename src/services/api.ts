@@ -77,3 +77,23 @@ export const api = {
     return res.json();
   },
 };
+
+export type TipoEvento = 'cierre' | 'alerta' | 'pl' | 'resync';
+
+/**
+ * Eventos en vivo del restaurante (SSE): reemplaza el polling de KPIs,
+ * alertas y cierres. El navegador reconecta solo y recupera lo perdido.
+ * Regresa la función para cerrar la conexión (usar en el cleanup del useEffect).
+ */
+export function suscribirEventos(
+  restauranteId: number,
+  handlers: Partial<Record<TipoEvento, (datos: any) => void>>,
+): () => void {
+  const token = getToken();
+  const qs = token ? `?token=${encodeURIComponent(token)}` : '';
+  const es = new EventSource(`${API_BASE}/api/eventos/${restauranteId}${qs}`);
+  (Object.keys(handlers) as TipoEvento[]).forEach(tipo => {
+    es.addEventListener(tipo, (e: MessageEvent) => handlers[tipo]?.(JSON.parse(e.data || '{}')));
+  });
+  return () => es.close();
+}
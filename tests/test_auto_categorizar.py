@@ -0,0 +1,121 @@
+"""
+Tests del CLI de auto-categorización multi-restaurante (scripts/auto_categorizar_gastos.py)
+"""
+import json
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, func, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python import models
+from scripts import auto_categorizar_gastos as auto
+
+DB_PATH = "./test_auto_categorizar.db"
+SQLALCHEMY_TEST_URL = f"sqlite:///{DB_PATH}"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+CATEGORIAS = ["PROTEINA", "Bebidas", "LUZ", "renta", "Desechables Empaques", "texto raro", ""]
+N_POR_RESTAURANTE = 3000
+RESTAURANTES = []
+
+
+@pytest.fixture(autouse=True)
+def setup_db():
+    Base.metadata.create_all(bind=engine_test)
+    db = TestingSessionLocal()
+    RESTAURANTES.clear()
+    ahora = datetime.utcnow()
+    for i in range(3):
+        r = models.Restaurante(nombre=f"Auto {i}", slug=f"auto-{i}", plan="basico")
+        db.add(r)
+        db.flush()
+        RESTAURANTES.append(r.id)
+        codigos = ("5001", "5002", "6002", "6003", "6005", "6008") if i < 2 else ()
+        db.add_all([models.CatalogoCuenta(restaurante_id=r.id, codigo=c, nombre=c, tipo="GASTO", categoria_pl=c)
+                    for c in codigos])
+        cierre = models.CierreTurno(fecha=date(2026, 1, 1 + i), responsable="x", elaborado_por="x",
+                                    saldo_inicial=0, restaurante_id=r.id)
+        db.add(cierre)
+        db.flush()
+        db.execute(insert(models.Gasto), [
+            {"fecha": date(2026, 1, 1), "proveedor": "P", "categoria": CATEGORIAS[k % len(CATEGORIAS)],
+             "monto": 2.0, "metodo_pago": models.MetodoPago.EFECTIVO, "restaurante_id": r.id, "created_at": ahora}
+            for k in range(N_POR_RESTAURANTE)
+        ])
+        db.execute(insert(models.GastoDiario), [
+            {"cierre_id": cierre.id, "proveedor": "P", "categoria": c or "OTROS", "comprobante": "TICKET",
+             "descripcion": "d", "monto": 1.0, "created_at": ahora, "clase": "NMP"}
+            for c in CATEGORIAS
+        ])
+    db.commit()
+    db.close()
+    yield
+    Base.metadata.drop_all(bind=engine_test)
+
+
+def _pendientes(rid):
+    db = TestingSessionLocal()
+    try:
+        return db.query(func.count(models.Gasto.id)).filter(
+            models.Gasto.restaurante_id == rid, models.Gasto.catalogo_cuenta_id == None).scalar()
+    finally:
+        db.close()
+
+
+def test_todos_los_restaurantes_en_paralelo(tmp_path, capsys):
+    db = TestingSessionLocal()
+    ultimo_evento = db.query(func.max(models.EventoCambio.id)).scalar() or 0
+    db.close()
+    resultados = auto.run(["--database-url", SQLALCHEMY_TEST_URL, "--workers", "2", "--chunk", "700",
+                           "--checkpoint-dir", str(tmp_path)])
+    por_rid = {r["restaurante_id"]: r for r in resultados}
+    con_catalogo, sin_catalogo = RESTAURANTES[:2], RESTAURANTES[2]
+    assert set(por_rid) == set(con_catalogo)  # solo restaurantes con catálogo
+    for rid in con_catalogo:
+        assert por_rid[rid]["filas"] == N_POR_RESTAURANTE + len(CATEGORIAS)
+        assert por_rid[rid]["error"] is None
+        assert _pendientes(rid) == 0
+    assert _pendientes(sin_catalogo) == N_POR_RESTAURANTE
+
+    db = TestingSessionLocal()
+    eventos = db.query(models.EventoCambio.restaurante_id, models.EventoCambio.tipo).filter(
+        models.EventoCambio.id > ultimo_evento).distinct().all()
+    db.close()
+    assert set(eventos) == {(rid, "pl") for rid in con_catalogo}
+
+    db = TestingSessionLocal()
+    proteina = db.query(models.Gasto).filter(models.Gasto.restaurante_id == con_catalogo[0],
+                                             models.Gasto.categoria == "PROTEINA").first()
+    assert db.get(models.CatalogoCuenta, proteina.catalogo_cuenta_id).codigo == "5001"
+    db.close()
+    assert "filas/s" in capsys.readouterr().out
+
+
+def test_reanuda_desde_checkpoint(tmp_path):
+    rid = RESTAURANTES[0]
+    db = TestingSessionLocal()
+    ids = [i for (i,) in db.query(models.Gasto.id).filter(models.Gasto.restaurante_id == rid)
+           .order_by(models.Gasto.id)]
+    db.close()
+    # Corrida previa "interrumpida" después de confirmar la primera mitad
+    (tmp_path / f"restaurante_{rid}.json").write_text(json.dumps({"gastos": ids[1499]}))
+
+    r = auto.procesar_restaurante(SQLALCHEMY_TEST_URL, rid, chunk=500, checkpoint_dir=str(tmp_path))
+    assert r["filas"] == 1500 + len(CATEGORIAS) and r["error"] is None
+    assert _pendientes(rid) == 1500
+    assert not (tmp_path / f"restaurante_{rid}.json").exists()  # terminó sin error: se borra
+
+    r = auto.procesar_restaurante(SQLALCHEMY_TEST_URL, rid, chunk=500, checkpoint_dir=str(tmp_path),
+                                  reiniciar=True)
+    assert r["filas"] == 1500 and _pendientes(rid) == 0
+
+
+def test_dry_run_no_escribe(tmp_path):
+    rid = RESTAURANTES[1]
+    r = auto.procesar_restaurante(SQLALCHEMY_TEST_URL, rid, chunk=1000, checkpoint_dir=str(tmp_path), dry_run=True)
+    assert r["filas"] == N_POR_RESTAURANTE + len(CATEGORIAS)
+    assert r["match"] + r["otros"] == r["filas"]
+    assert _pendientes(rid) == N_POR_RESTAURANTE
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,126 @@
+"""
+Tests del clasificador aprendido de cuenta contable
+"""
+import random
+import time
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python import models
+from backend_python.services import clasificador_gastos as clf, data_versions
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_clasificador.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+# cuenta → (proveedores, palabras de descripción, categorías operativas)
+PERFILES = {
+    5001: (["TOYO FOODS", "KUME PESCADOS", "SUPERAMA", "CARNES FINAS SA"], ["salmon", "arroz", "atun", "pepino"],
+           ["PROTEINA", "ABARROTES", "Vegetales Frutas", "OTROS"]),
+    5002: (["COCA COLA FEMSA", "LA EUROPEA", "CERVECERIA MODELO"], ["refrescos", "sake", "cerveza", "agua"],
+           ["BEBIDAS", "OTROS"]),
+    6003: (["CFE SUMINISTRADOR", "GAS NATURAL FENOSA", "TELMEX"], ["recibo luz", "gas", "internet"],
+           ["SERVICIOS", "OTROS"]),
+    6005: (["COSTCO", "DESECHABLES DEL CENTRO", "LIMPIEZA TOTAL"], ["jabon", "cloro", "bolsas", "charolas"],
+           ["LIMPIEZA", "DESECHABLES_EMPAQUES", "OTROS"]),
+}
+
+
+def _sinteticos(n, semilla):
+    rnd = random.Random(semilla)
+    filas, etiquetas = [], []
+    cuentas = list(PERFILES)
+    for _ in range(n):
+        cuenta = rnd.choice(cuentas)
+        provs, palabras, cats = PERFILES[cuenta]
+        if rnd.random() < 0.05:  # ruido: otra cuenta con su texto
+            provs, palabras, cats = PERFILES[rnd.choice(cuentas)]
+        filas.append((rnd.choice(provs), f"{rnd.choice(palabras)} {rnd.randint(1, 99)} kg", rnd.choice(cats)))
+        etiquetas.append(cuenta)
+    return filas, etiquetas
+
+
+def test_holdout_y_lote_de_100k():
+    filas, etiquetas = _sinteticos(20_000, 1)
+    modelo = clf.entrenar(filas[:16_000], etiquetas[:16_000])
+    metricas = clf.evaluar(modelo, filas[16_000:], etiquetas[16_000:])
+    assert metricas["accuracy"] > 0.9
+    assert metricas["accuracy_confiables"] >= metricas["accuracy"]
+
+    lote, _ = _sinteticos(100_000, 2)
+    inicio = time.monotonic()
+    pred, conf = modelo.predecir(lote)
+    assert time.monotonic() - inicio < 10
+    assert pred.shape == conf.shape == (100_000,)
+    assert set(pred.tolist()) <= set(PERFILES)
+    assert np.all((conf > 0) & (conf <= 1.0001))
+
+
+def test_texto_nunca_visto_y_filas_vacias():
+    filas, etiquetas = _sinteticos(500, 3)
+    modelo = clf.entrenar(filas, etiquetas)
+    pred, conf = modelo.predecir([(None, None, None), ("ZZZ", "", "")])
+    assert len(pred) == 2
+    assert modelo.predecir([])[0].shape == (0,)
+    with pytest.raises(ValueError):
+        clf.entrenar(filas, [5001] * len(filas))
+
+
+def test_entrenar_guardar_y_aplicar_por_restaurante(tmp_path):
+    Base.metadata.create_all(bind=engine_test)
+    db = TestingSessionLocal()
+    try:
+        r = models.Restaurante(nombre="Clf Test", slug="clf-test", plan="basico")
+        db.add(r)
+        db.flush()
+        cuentas = {}
+        for codigo in list(PERFILES) + [6008]:
+            c = models.CatalogoCuenta(restaurante_id=r.id, codigo=str(codigo), nombre=str(codigo),
+                                      tipo="GASTO", categoria_pl="x")
+            db.add(c)
+            db.flush()
+            cuentas[codigo] = c.id
+        filas, etiquetas = _sinteticos(2_000, 4)
+        ahora = datetime.utcnow()
+        base = {"fecha": date(2026, 1, 1), "monto": 1.0, "metodo_pago": models.MetodoPago.TRANSFERENCIA,
+                "restaurante_id": r.id, "created_at": ahora}
+        db.execute(insert(models.Gasto), [
+            {**base, "proveedor": p, "descripcion": d, "categoria": c, "catalogo_cuenta_id": cuentas[e]}
+            for (p, d, c), e in zip(filas, etiquetas)
+        ])
+        db.execute(insert(models.Gasto), [
+            {**base, "proveedor": "KUME PESCADOS", "descripcion": "salmon fresco", "categoria": "OTROS"},
+            {**base, "proveedor": "TELMEX", "descripcion": "internet fibra", "categoria": "OTROS"},
+            # Lo que las reglas dejaron en "Otros gastos": no es etiqueta, es la cola a reclasificar
+            {**base, "proveedor": "LA EUROPEA", "descripcion": "sake botella", "categoria": "OTROS",
+             "catalogo_cuenta_id": cuentas[6008]},
+            {**base, "proveedor": "COSTCO", "descripcion": "cloro galon", "categoria": "OTROS",
+             "catalogo_cuenta_id": cuentas[6008]},
+        ])
+        db.commit()
+
+        with pytest.raises(ValueError):
+            clf.predecir_pendientes(db, r.id, directorio=str(tmp_path))
+        reporte = clf.entrenar_restaurante(db, r.id, directorio=str(tmp_path))
+        assert reporte["n_entrenamiento"] == 2_000 and reporte["holdout"]["n"] == 400
+        assert cuentas[6008] not in clf.cargar(r.id, str(tmp_path)).clases.tolist()
+        assert reporte["holdout"]["accuracy"] > 0.9
+        assert clf.cargar(r.id, str(tmp_path)).metricas == reporte["holdout"]
+
+        versiones = data_versions.versiones(db, r.id, ["gastos"])
+        res = clf.predecir_pendientes(db, r.id, min_confianza=0.5, aplicar=True, directorio=str(tmp_path))
+        assert (res["pendientes"], res["sin_cuenta"], res["en_otros"], res["aplicados"]) == (4, 2, 2, 4)
+        despues = data_versions.versiones(db, r.id, ["gastos"])
+        assert despues.get((r.id, "gastos"), 0) == versiones.get((r.id, "gastos"), 0) + 1
+        assert despues.get((data_versions.TODOS, "gastos"), 0) == versiones.get((data_versions.TODOS, "gastos"), 0)
+        asignadas = dict(db.query(models.Gasto.proveedor, models.Gasto.catalogo_cuenta_id).filter(
+            models.Gasto.descripcion.in_(["salmon fresco", "internet fibra", "sake botella", "cloro galon"])).all())
+        assert asignadas == {"KUME PESCADOS": cuentas[5001], "TELMEX": cuentas[6003],
+                             "LA EUROPEA": cuentas[5002], "COSTCO": cuentas[6005]}
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine_test)
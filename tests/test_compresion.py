@@ -0,0 +1,114 @@
+"""
+Tests de compresión de respuestas y estáticos precomprimidos (core/compresion.py)
+"""
+import gzip
+import json
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from backend_python.core import compresion
+from backend_python.core.compresion import CompresionMiddleware, elegir_codificacion, respuesta_estatica
+from backend_python.main import app as app_principal
+
+app = FastAPI()
+app.add_middleware(CompresionMiddleware, minimum_size=1024)
+
+FILAS = [{"id": i, "proveedor": f"Proveedor {i % 7}", "monto": i * 1.5} for i in range(500)]
+
+
+@app.get("/grande")
+def grande():
+    return FILAS
+
+
+@app.get("/chica")
+def chica():
+    return {"ok": True}
+
+
+@app.get("/eventos")
+def eventos():
+    return StreamingResponse(iter([b"data: 1\n\n" * 200, b"data: 2\n\n"]), media_type="text/event-stream")
+
+
+@app.get("/flujo")
+def flujo():
+    return StreamingResponse(iter([json.dumps(FILAS[:250]).encode(), b" " * 10]), media_type="application/json")
+
+
+client = TestClient(app)
+
+
+def _crudo(url, accept):
+    with client.stream("GET", url, headers={"Accept-Encoding": accept}) as resp:
+        return resp, b"".join(resp.iter_raw())
+
+
+def test_json_grande_se_comprime_y_chico_no():
+    resp, cuerpo = _crudo("/grande", "gzip, deflate")
+    assert resp.headers["content-encoding"] == "gzip"
+    assert int(resp.headers["content-length"]) == len(cuerpo)
+    assert "Accept-Encoding" in resp.headers["vary"]
+    assert json.loads(gzip.decompress(cuerpo)) == FILAS
+    assert len(cuerpo) < len(json.dumps(FILAS)) / 4
+
+    resp, cuerpo = _crudo("/chica", "gzip")
+    assert "content-encoding" not in resp.headers and json.loads(cuerpo) == {"ok": True}
+
+    for accept in ("identity", "gzip;q=0, identity", ""):
+        resp, cuerpo = _crudo("/grande", accept)
+        assert "content-encoding" not in resp.headers and json.loads(cuerpo) == FILAS
+
+
+def test_streaming_json_comprimido_y_eventos_sin_comprimir():
+    resp, cuerpo = _crudo("/flujo", "gzip")
+    assert resp.headers["content-encoding"] == "gzip" and "content-length" not in resp.headers
+    assert json.loads(zlib.decompress(cuerpo, 16 + zlib.MAX_WBITS)) == FILAS[:250]
+
+    resp, cuerpo = _crudo("/eventos", "gzip, br")
+    assert "content-encoding" not in resp.headers and cuerpo.startswith(b"data: 1")
+
+
+def test_negociacion():
+    assert elegir_codificacion("gzip, deflate, br", ("br", "gzip")) == "br"
+    assert elegir_codificacion("br;q=0.5, gzip;q=0.8", ("br", "gzip")) == "gzip"
+    assert elegir_codificacion("*", ("gzip",)) == "gzip"
+    assert elegir_codificacion("br;q=0, identity", ("br",)) is None
+    assert elegir_codificacion(None, ("gzip",)) is None
+    if compresion.brotli is None:
+        assert elegir_codificacion("br") is None  # sin paquete brotli el middleware solo ofrece gzip
+
+
+def test_estaticos_precomprimidos_y_cache(tmp_path):
+    assets = tmp_path / "assets"
+    assets.mkdir()
+    js = assets / "index-3f2a9c1b.js"
+    js.write_bytes(b"console.log('koi');" * 100)
+    (assets / "index-3f2a9c1b.js.br").write_bytes(b"BR")
+    (assets / "index-3f2a9c1b.js.gz").write_bytes(gzip.compress(js.read_bytes()))
+    index = tmp_path / "index.html"
+    index.write_text("<html></html>")
+
+    r = respuesta_estatica(str(js), "gzip, deflate, br")
+    assert r.path.endswith(".js.br") and r.headers["content-encoding"] == "br"
+    assert r.media_type in ("application/javascript", "text/javascript")
+    assert r.headers["cache-control"] == compresion.CACHE_INMUTABLE
+
+    r = respuesta_estatica(str(js), "gzip")
+    assert r.path.endswith(".js.gz") and r.headers["content-encoding"] == "gzip"
+
+    r = respuesta_estatica(str(js), None)
+    assert r.path == str(js) and "content-encoding" not in r.headers
+
+    r = respuesta_estatica(str(index), "gzip, br")
+    assert r.path == str(index) and r.headers["cache-control"] == compresion.CACHE_REVALIDAR
+    # Un archivo de public/ con guion en el nombre no es un asset con hash
+    assert compresion.CACHE_INMUTABLE != respuesta_estatica(str(tmp_path / "logo-principal.svg"), None) \
+        .headers["cache-control"]
+
+
+def test_app_principal_usa_el_middleware():
+    assert CompresionMiddleware in [m.cls for m in app_principal.user_middleware]
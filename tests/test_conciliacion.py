@@ -0,0 +1,177 @@
+"""
+Tests de conciliación bancaria automática
+"""
+import random
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import data_versions
+from backend_python.services.conciliacion import candidato, emparejar, puntuar, tokens
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_conciliacion.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+REST_ID = None
+OTRO_ID = None
+IDS = {}
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Conc Test", slug="conc-test", plan="basico")
+    otro = models.Restaurante(nombre="Conc Otro", slug="conc-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    prov = models.Proveedor(nombre="Gas Natural Fenosa", categoria_default="SERVICIOS", restaurante_id=REST_ID)
+    db.add(prov)
+    db.flush()
+    gt = models.GastoTransferencia(restaurante_id=REST_ID, proveedor="TOYO", categoria="ABARROTES",
+                                   monto=5800.0, fecha_factura=date(2026, 2, 25), folio="A-7781")
+    gasto = models.Gasto(fecha=date(2026, 3, 3), proveedor="CFE", categoria="SERVICIOS", monto=3200.50,
+                         metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID)
+    efectivo = models.Gasto(fecha=date(2026, 3, 3), proveedor="MERCADO", categoria="VEGETALES", monto=999.0,
+                            metodo_pago=models.MetodoPago.EFECTIVO, restaurante_id=REST_ID)
+    cxp = models.CuentaPorPagar(proveedor_id=prov.id, monto_total=1450.0, fecha_vencimiento=date(2026, 3, 15),
+                                restaurante_id=REST_ID)
+    ajeno = models.Gasto(fecha=date(2026, 3, 3), proveedor="CFE", categoria="SERVICIOS", monto=3200.50,
+                         metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=OTRO_ID)
+    db.add_all([gt, gasto, efectivo, cxp, ajeno])
+    db.flush()
+    C, A = models.TipoMovimientoBanco.CARGO, models.TipoMovimientoBanco.ABONO
+    movs = {
+        "toyo": models.MovimientoBanco(fecha=date(2026, 3, 2), referencia="A7781", concepto="SPEI TOYO A-7781",
+                                       monto=5800.0, tipo=C, restaurante_id=REST_ID),
+        "cfe": models.MovimientoBanco(fecha=date(2026, 3, 4), referencia="991", concepto="PAGO CFE SUMINISTRO",
+                                      monto=3200.0, tipo=C, restaurante_id=REST_ID),
+        "gas": models.MovimientoBanco(fecha=date(2026, 3, 14), referencia="X", concepto="GAS NATURAL",
+                                      monto=1450.0, tipo=C, restaurante_id=REST_ID),
+        "mercado": models.MovimientoBanco(fecha=date(2026, 3, 3), referencia="", concepto="RETIRO",
+                                          monto=999.0, tipo=C, restaurante_id=REST_ID),
+        "abono": models.MovimientoBanco(fecha=date(2026, 3, 3), referencia="", concepto="DEPOSITO",
+                                        monto=5800.0, tipo=A, restaurante_id=REST_ID),
+    }
+    db.add_all(movs.values())
+    db.commit()
+    IDS.update({k: m.id for k, m in movs.items()})
+    IDS.update({"gt": gt.id, "gasto": gasto.id, "cxp": cxp.id, "ajeno": ajeno.id})
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _fuerza_bruta(movimientos, candidatos, tol=100, ventana=45, minimo=0.5):
+    mejores = set()
+    for m in movimientos:
+        mov = {**m, "centavos": round(m["monto"] * 100), "texto": m["concepto"]}
+        mov["tokens"] = tokens(mov["texto"])
+        for c in candidatos:
+            if abs(mov["centavos"] - c["centavos"]) <= tol:
+                s = puntuar(mov, c, tol, ventana)
+                if s is not None and s >= minimo:
+                    mejores.add((m["id"], c["id"]))
+    return mejores
+
+
+def test_indice_encuentra_los_mismos_pares_que_fuerza_bruta():
+    rnd = random.Random(3)
+    base = date(2026, 3, 1)
+    cands = [candidato("GASTO", i, round(rnd.uniform(50, 3000), 2), base + timedelta(days=rnd.randint(-20, 40)),
+                       rnd.choice(["TOYO", "KUME", "CFE"])) for i in range(400)]
+    movs = [{"id": i, "monto": c["monto"] + rnd.choice([0, 0.4, -0.9, 3.0]),
+             "fecha": c["fecha"] + timedelta(days=rnd.randint(0, 5)), "referencia": "",
+             "concepto": f"PAGO {c['proveedor']}"} for i, c in enumerate(rnd.sample(cands, 300))]
+    pares = emparejar(movs, cands)
+    posibles = _fuerza_bruta(movs, cands)
+    assert {(p["movimiento_id"], p["ref_id"]) for p in pares} <= posibles
+    assert len({p["movimiento_id"] for p in pares}) == len(pares)
+    assert len({p["ref_id"] for p in pares}) == len(pares)
+    # Casi todo movimiento con algún candidato posible recibe sugerencia
+    assert len(pares) >= 0.9 * len({m for m, _ in posibles})
+
+
+def test_escala_a_miles_de_movimientos():
+    rnd = random.Random(5)
+    base = date(2026, 1, 1)
+    cands = [candidato("GASTO", i, round(rnd.uniform(50, 50000), 2), base + timedelta(days=rnd.randint(0, 60)),
+                       "PROVEEDOR") for i in range(20000)]
+    movs = [{"id": i, "monto": c["monto"], "fecha": c["fecha"], "referencia": "", "concepto": "PAGO PROVEEDOR"}
+            for i, c in enumerate(cands)]
+    inicio = time.monotonic()
+    pares = emparejar(movs, cands)
+    assert time.monotonic() - inicio < 10
+    assert len(pares) > 19000
+
+
+def test_sugerencias_del_mes():
+    resp = client.get(f"/api/conciliacion/{REST_ID}/sugerencias?mes=3&anio=2026")
+    assert resp.status_code == 200
+    data = resp.json()
+    por_mov = {s["movimiento_id"]: s for s in data["sugerencias"]}
+    assert por_mov[IDS["toyo"]]["tipo"] == "TRANSFERENCIA" and por_mov[IDS["toyo"]]["ref_id"] == IDS["gt"]
+    assert por_mov[IDS["toyo"]]["confianza"] > 0.9
+    assert por_mov[IDS["cfe"]]["tipo"] == "GASTO" and por_mov[IDS["cfe"]]["ref_id"] == IDS["gasto"]
+    assert por_mov[IDS["gas"]]["tipo"] == "CXP"
+    # Gastos en efectivo, abonos y documentos de otro restaurante no participan
+    assert IDS["mercado"] not in por_mov and IDS["abono"] not in por_mov
+    assert all(s["ref_id"] != IDS["ajeno"] for s in data["sugerencias"])
+
+
+def test_aceptar_en_bloque():
+    ajeno = client.post(f"/api/conciliacion/{REST_ID}/aceptar", json={"matches": [
+        {"movimiento_id": IDS["cfe"], "tipo": "GASTO", "ref_id": IDS["ajeno"]},
+    ]}).json()
+    assert ajeno == {"aceptados": 0, "rechazados": [IDS["cfe"]]}
+
+    db = TestingSessionLocal()
+    versiones = data_versions.versiones(db, REST_ID, ["gastos"])
+    db.close()
+    resp = client.post(f"/api/conciliacion/{REST_ID}/aceptar", json={"mes": 3, "anio": 2026, "min_confianza": 0.5})
+    assert resp.json()["aceptados"] == 3
+
+    db = TestingSessionLocal()
+    # Los UPDATE por llave primaria suben solo la versión del restaurante, no la comodín
+    despues = data_versions.versiones(db, REST_ID, ["gastos"])
+    assert despues.get((REST_ID, "gastos"), 0) == versiones.get((REST_ID, "gastos"), 0) + 1
+    assert despues.get((data_versions.TODOS, "gastos"), 0) == versiones.get((data_versions.TODOS, "gastos"), 0)
+    toyo = db.get(models.MovimientoBanco, IDS["toyo"])
+    assert toyo.reconciliado and toyo.conciliacion_tipo == "TRANSFERENCIA" and toyo.conciliacion_ref_id == IDS["gt"]
+    assert db.get(models.MovimientoBanco, IDS["cfe"]).gasto_id == IDS["gasto"]
+    gt = db.get(models.GastoTransferencia, IDS["gt"])
+    assert gt.estado == "PAGADO" and gt.fecha_pago == date(2026, 3, 2)
+    assert db.get(models.Gasto, IDS["gasto"]).estado == models.EstadoPago.PAGADO
+    assert db.get(models.CuentaPorPagar, IDS["cxp"]).estado_pago == models.EstadoPago.PAGADO
+    db.close()
+
+    # Ya conciliados: no vuelven a sugerirse
+    data = client.get(f"/api/conciliacion/{REST_ID}/sugerencias?mes=3&anio=2026").json()
+    assert data["sugerencias"] == []
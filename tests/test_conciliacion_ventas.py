@@ -0,0 +1,134 @@
+"""
+Tests de conciliación de ventas con tarjeta/plataformas contra depósitos
+"""
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services.conciliacion_ventas import CANALES, conciliar_canal
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_conciliacion_ventas.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+TERMINALES, UBER, _RAPPI = CANALES
+INICIO = date(2025, 1, 6)  # lunes
+REST_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Depositos Test", slug="depositos-test", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    db.add_all([
+        models.ComisionConfig(restaurante_id=REST_ID, tipo="BANCARIA", nombre="Terminal Banorte", porcentaje=2.5),
+        models.ComisionConfig(restaurante_id=REST_ID, tipo="PLATAFORMA", nombre="Uber Eats", porcentaje=30.0),
+        models.ComisionConfig(restaurante_id=REST_ID, tipo="PLATAFORMA", nombre="Rappi", porcentaje=25.0),
+    ])
+    C = models.TipoMovimientoBanco.ABONO
+    uber_semana = 0.0
+    for d in range(364):
+        fecha = INICIO + timedelta(days=d)
+        terminales = 8000 + (d % 7) * 500
+        db.add(models.CierreTurno(
+            fecha=fecha, responsable="x", elaborado_por="x", saldo_inicial=0, restaurante_id=REST_ID,
+            ventas_terminales=terminales, ventas_uber=1000.0,
+        ))
+        # Terminal: depósito al día siguiente neto de 2.5%
+        if d != 200:  # un día sin depósito
+            monto = round(terminales * 0.975, 2) if d != 100 else 5000.0  # un depósito corto
+            db.add(models.MovimientoBanco(fecha=fecha + timedelta(days=1), concepto="DEPOSITO TPV BANORTE",
+                                          referencia=f"T{d}", monto=monto, tipo=C, restaurante_id=REST_ID))
+        # Uber: depósito semanal (lunes a domingo, pagado el miércoles siguiente) neto de 30% + IVA
+        uber_semana += 1000.0
+        if fecha.weekday() == 6:
+            db.add(models.MovimientoBanco(fecha=fecha + timedelta(days=3), concepto="UBER EATS MEXICO PAGO",
+                                          referencia=f"U{d}", monto=round(uber_semana * (1 - 0.30 * 1.16), 2),
+                                          tipo=C, restaurante_id=REST_ID))
+            uber_semana = 0.0
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _dep(i, fecha, monto):
+    return {"id": i, "fecha": fecha, "monto": monto, "concepto": "TPV"}
+
+
+def test_fin_de_semana_agrupado_en_un_deposito():
+    vie = date(2026, 3, 6)
+    ventas = [(vie, 1000.0), (vie + timedelta(days=1), 2000.0), (vie + timedelta(days=2), 3000.0)]
+    r = conciliar_canal(TERMINALES, ventas, [_dep(1, vie + timedelta(days=3), 6000 * 0.975)],
+                        (0.025, 0.025 * 1.16), hoy=date(2026, 4, 1))
+    assert [g["estado"] for g in r["grupos"]] == ["CONCILIADO"]
+    assert len(r["grupos"][0]["dias"]) == 3
+    assert r["alertas"] == [] and r["depositos_sin_venta"] == []
+
+
+def test_corto_faltante_pendiente_y_sin_venta():
+    d0 = date(2026, 3, 2)
+    ventas = [(d0, 1000.0), (d0 + timedelta(days=1), 1000.0), (d0 + timedelta(days=10), 1000.0),
+              (d0 + timedelta(days=29), 1000.0)]
+    depositos = [
+        _dep(1, d0 - timedelta(days=5), 900.0),            # anterior a toda venta
+        _dep(2, d0 + timedelta(days=1), 800.0),            # corto
+        _dep(3, d0 + timedelta(days=11), 975.0),           # conciliado (el día 2 nunca llegó)
+    ]
+    r = conciliar_canal(TERMINALES, ventas, depositos, (0.025, 0.029), hoy=d0 + timedelta(days=30))
+    estados = [(g["dias"][0], g["estado"]) for g in r["grupos"]]
+    assert estados == [
+        (d0.isoformat(), "CORTO"),
+        ((d0 + timedelta(days=1)).isoformat(), "FALTANTE"),
+        ((d0 + timedelta(days=10)).isoformat(), "CONCILIADO"),
+        ((d0 + timedelta(days=29)).isoformat(), "PENDIENTE"),
+    ]
+    assert [d["id"] for d in r["depositos_sin_venta"]] == [1]
+    assert r["grupos"][0]["diferencia"] < 0
+
+
+def test_un_anio_por_restaurante():
+    inicio = time.monotonic()
+    resp = client.get(f"/api/conciliacion/{REST_ID}/depositos?desde={INICIO}&hasta={INICIO + timedelta(days=363)}")
+    assert time.monotonic() - inicio < 5
+    assert resp.status_code == 200
+    canales = {c["canal"]: c for c in resp.json()["canales"]}
+
+    term = canales["TERMINALES"]
+    assert term["dias"]["CORTO"] == 1 and term["dias"]["FALTANTE"] == 1
+    assert term["dias"]["CONCILIADO"] == 362
+    assert {a["dias"][0] for a in term["alertas"]} == {(INICIO + timedelta(days=100)).isoformat(),
+                                                       (INICIO + timedelta(days=200)).isoformat()}
+
+    uber = canales["UBER"]
+    assert uber["dias"]["CONCILIADO"] == 364 and uber["alertas"] == []
+    assert canales["RAPPI"]["grupos"] == []
@@ -0,0 +1,208 @@
+"""
+Tests del endpoint compuesto del dashboard (/api/dashboard/{restaurante_id}/bundle)
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import kpis_snapshot
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_dashboard_bundle.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+CATEGORIAS = ["PROTEINA", "Bebidas ", "GAS", "renta", "", "texto raro"]
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    kpis_snapshot.invalidate()
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Bundle Test", slug="bundle-test", plan="basico")
+    otro = models.Restaurante(nombre="Bundle Otro", slug="bundle-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID = r.id
+    activa = models.CatalogoCuenta(restaurante_id=REST_ID, codigo="5001", nombre="Alimentos",
+                                   tipo="COSTO", categoria_pl="costo_alimentos")
+    inactiva = models.CatalogoCuenta(restaurante_id=REST_ID, codigo="6002", nombre="Renta local",
+                                     tipo="GASTO", categoria_pl="renta", activo=False)
+    db.add_all([activa, inactiva])
+    db.flush()
+    rnd = random.Random(4)
+    ahora = datetime.utcnow()
+    gastos = []
+    for d in range(400):
+        fecha = HOY - timedelta(days=d)
+        if d % 9 == 4:
+            continue  # días sin cierre
+        cierre = models.CierreTurno(fecha=fecha, responsable="x", elaborado_por="x", saldo_inicial=0,
+                                    restaurante_id=REST_ID, ventas_efectivo=rnd.uniform(2000, 5000),
+                                    ventas_parrot=rnd.uniform(3000, 9000), ventas_uber=rnd.uniform(0, 800),
+                                    propinas_parrot=rnd.uniform(0, 300), total_venta=rnd.uniform(6000, 15000))
+        db.add(cierre)
+        db.flush()
+        db.add(models.GastoDiario(cierre_id=cierre.id, proveedor="Mercado", categoria=rnd.choice(CATEGORIAS) or "X",
+                                  comprobante="TICKET", descripcion="caja", monto=rnd.uniform(50, 400),
+                                  catalogo_cuenta_id=activa.id if d % 3 == 0 else None))
+        for _ in range(2):
+            gastos.append({"fecha": fecha, "proveedor": "Toyo", "categoria": rnd.choice(CATEGORIAS),
+                           "monto": rnd.uniform(100, 2000), "metodo_pago": models.MetodoPago.TRANSFERENCIA,
+                           "restaurante_id": REST_ID, "created_at": ahora,
+                           "catalogo_cuenta_id": rnd.choice([activa.id, inactiva.id, None, None])})
+    db.execute(insert(models.Gasto), gastos)
+    db.execute(insert(models.Gasto), [{**gastos[0], "restaurante_id": otro.id}])
+    emp = models.Empleado(nombre="E", puesto="Cocina", salario_base=1.0, fecha_ingreso=HOY, restaurante_id=REST_ID)
+    db.add(emp)
+    db.flush()
+    db.add_all([models.NominaPago(empleado_id=emp.id, periodo_inicio=HOY, periodo_fin=HOY, salario_base=1.0,
+                                  neto_pagado=9000.0, fecha_pago=HOY - timedelta(days=15 * k),
+                                  restaurante_id=REST_ID) for k in range(26)])
+    for mes_offset in (0, 1):
+        m, a = HOY.month - mes_offset, HOY.year
+        if m == 0:
+            m, a = 12, a - 1
+        db.add_all([models.VentaPorPlatillo(restaurante_id=REST_ID, mes=m, anio=a, nombre_parrot=f"P{i}",
+                                            cantidad_vendida=10 + i * (mes_offset + 1), venta_total=100.0 * i,
+                                            precio_promedio=10.0) for i in range(12)])
+    db.add_all([models.AlertaLog(restaurante_id=REST_ID, tipo="T", mensaje=f"m{i}", severidad=sev,
+                                 created_at=datetime(2026, 1, 1) + timedelta(hours=i))
+                for i, sev in enumerate(["INFO", "CRITICAL", "WARNING", "INFO", "CRITICAL", "WARNING", "INFO"])])
+    db.commit()
+    db.close()
+    yield
+    kpis_snapshot.invalidate()
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _sin_generado(d):
+    if isinstance(d, dict):
+        return {k: _sin_generado(v) for k, v in d.items() if k != "generado_en"}
+    return d
+
+
+def _contar(fn):
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:  # lectura del ETag (core/etag.py)
+            sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        return fn(), len(sentencias)
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+
+
+def test_bundle_igual_a_endpoints_individuales_con_muchas_menos_consultas():
+    m, a = HOY.month, HOY.year
+    base = f"/api/pl/{REST_ID}"
+    urls = {
+        "pl_mes": f"{base}/mes/{a}/{m}",
+        "pl_v2": f"{base}/v2/mes/{a}/{m}",
+        "resumen_semana": f"{base}/resumen-semana",
+        "margen_mensual": f"{base}/margen-mensual",
+        "ventas_diarias": f"{base}/ventas-diarias-resumen",
+        "top_platillos": f"{base}/top-platillos?mes={m}&anio={a}",
+        "alertas": f"/api/alertas/{REST_ID}/activas",
+        "gastos": f"/api/gastos/dashboard/{REST_ID}?mes={m}&anio={a}",
+        "kpis_hoy": f"{base}/kpis-hoy",
+    }
+    kpis_snapshot.invalidate()
+    individuales, n_individual = _contar(lambda: {k: client.get(u).json() for k, u in urls.items()})
+    resp, n_bundle = _contar(lambda: client.get(f"/api/dashboard/{REST_ID}/bundle?mes={m}&anio={a}"))
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["errores"] == {}
+    assert n_bundle <= 9 and n_individual >= 10 * n_bundle
+
+    widgets = data["widgets"]
+    assert set(widgets) == set(urls)
+    for nombre, esperado in individuales.items():
+        obtenido = widgets[nombre]
+        if nombre in ("resumen_semana", "margen_mensual", "pl_mes", "kpis_hoy"):
+            esperado, obtenido = _sin_generado(esperado), _sin_generado(obtenido)
+        assert obtenido == pytest.approx(esperado) if not isinstance(esperado, (dict, list)) else \
+            _aprox(obtenido, esperado), nombre
+    assert [x["mensaje"] for x in widgets["alertas"]][:2] == ["m4", "m1"]
+    assert set(data["tiempos_ms"]) >= set(urls) | {"carga_compartida", "total"}
+
+
+def _aprox(a, b) -> bool:
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_aprox(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_aprox(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return a == pytest.approx(b, abs=0.02)
+    return a == b
+
+
+def test_widget_gastos_compila_para_postgres():
+    # Las pruebas corren en SQLite; en Postgres un UNION de VARCHAR con un enum nativo
+    # falla y el bundle lo esconde en errores["gastos"]. Se revisa lo que ejecuta el widget.
+    from sqlalchemy import Enum
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.sql import visitors
+    from sqlalchemy.sql.selectable import CompoundSelect
+
+    sentencias = []
+
+    def capturar(conn, clauseelement, multiparams, params, execution_options):
+        sentencias.append(clauseelement)
+
+    event.listen(engine_test, "before_execute", capturar)
+    try:
+        data = client.get(f"/api/dashboard/{REST_ID}/bundle?widgets=gastos").json()
+    finally:
+        event.remove(engine_test, "before_execute", capturar)
+    assert data["errores"] == {} and data["widgets"]["gastos"]["por_categoria"]
+
+    uniones = [e for stmt in sentencias for e in visitors.iterate(stmt) if isinstance(e, CompoundSelect)]
+    assert uniones
+    for union in uniones:
+        for columnas in zip(*(rama.selected_columns for rama in union.selects)):
+            tipos = {type(c.type) for c in columnas}
+            assert len(tipos) == 1 or not any(issubclass(t, Enum) for t in tipos), \
+                [str(c) for c in columnas]
+    for stmt in sentencias:
+        stmt.compile(dialect=postgresql.dialect())
+
+
+def test_subconjunto_de_widgets_y_validacion():
+    data = client.get(f"/api/dashboard/{REST_ID}/bundle?widgets=top_platillos,alertas").json()
+    assert list(data["widgets"]) == ["top_platillos", "alertas"]
+    assert "carga_compartida" not in data["tiempos_ms"]
+    assert len(data["widgets"]["top_platillos"]["platillos"]) == 10
+
+    resp = client.get(f"/api/dashboard/{REST_ID}/bundle?widgets=pl_mes,nada")
+    assert resp.status_code == 400 and resp.json()["detail"]["code"] == "INVALID_WIDGET"
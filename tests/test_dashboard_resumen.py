@@ -0,0 +1,147 @@
+"""
+Tests del resumen de inicio por restaurante (/api/dashboard/resumen)
+"""
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import resumen_dashboard
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_dashboard_resumen.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+OTRO_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _venta(d: date) -> float:
+    return 1000.0 + d.toordinal() % 17 * 10
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    resumen_dashboard.invalidate()
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Resumen Test", slug="resumen-test", plan="basico")
+    otro = models.Restaurante(nombre="Resumen Otro", slug="resumen-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    for rid, factor in ((REST_ID, 1), (OTRO_ID, 100)):
+        db.add_all([
+            models.VentaDiaria(fecha=HOY - timedelta(days=d), mes="X", semana=0,
+                               total_venta=_venta(HOY - timedelta(days=d)) * factor, restaurante_id=rid)
+            for d in range(366)
+        ])
+    prov = models.Proveedor(nombre="P", categoria_default="OTROS", restaurante_id=REST_ID)
+    db.add(prov)
+    db.flush()
+    db.add_all([
+        models.CuentaPorPagar(proveedor_id=prov.id, monto_total=1.0, fecha_vencimiento=HOY, restaurante_id=REST_ID),
+        models.CuentaPorPagar(proveedor_id=prov.id, monto_total=1.0, fecha_vencimiento=HOY, restaurante_id=REST_ID,
+                              estado_pago=models.EstadoPago.PAGADO),
+        models.CuentaPorPagar(proveedor_id=prov.id, monto_total=1.0, fecha_vencimiento=HOY, restaurante_id=OTRO_ID),
+    ])
+    db.add_all([
+        models.CierreTurno(fecha=HOY - timedelta(days=2), responsable="x", elaborado_por="x", saldo_inicial=0,
+                           restaurante_id=REST_ID, estado=models.EstadoArqueo.FALTANTE, diferencia=-50.0),
+        models.CierreTurno(fecha=HOY - timedelta(days=1), responsable="x", elaborado_por="x", saldo_inicial=0,
+                           restaurante_id=OTRO_ID, estado=models.EstadoArqueo.CUADRADA),
+    ])
+    db.commit()
+    db.close()
+    yield
+    resumen_dashboard.invalidate()
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _suma(desde: date, hasta: date) -> float:
+    total, d = 0.0, desde
+    while d <= hasta:
+        total += _venta(d)
+        d += timedelta(days=1)
+    return total
+
+
+def test_resumen_por_restaurante_en_dos_consultas():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:  # clave del cache (services/data_versions.py)
+            sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        data = client.get(f"/api/dashboard/resumen?restaurante_id={REST_ID}").json()
+        client.get(f"/api/dashboard/resumen?restaurante_id={REST_ID}")  # cacheado
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert len(sentencias) == 2
+
+    ini_semana = HOY - timedelta(days=HOY.weekday())
+    assert data["ventas_hoy"] == pytest.approx(_venta(HOY))
+    assert data["ventas_semana"] == pytest.approx(_suma(ini_semana, HOY))
+    assert data["ventas_mes"] == pytest.approx(_suma(HOY.replace(day=1), HOY))
+    ayer = _venta(HOY - timedelta(days=1))
+    assert data["cambio_vs_ayer"] == pytest.approx((_venta(HOY) - ayer) / ayer * 100)
+    semana_ant = _suma(ini_semana - timedelta(days=7), HOY - timedelta(days=7))
+    assert data["cambio_vs_semana_anterior"] == pytest.approx((data["ventas_semana"] - semana_ant) / semana_ant * 100)
+    assert data["gastos_pendientes"] == 1
+    assert data["estado_caja"] == "FALTANTE (-50.00)"
+    assert data["ultimo_arqueo"] == str(HOY - timedelta(days=2))
+
+
+def test_cache_se_invalida_con_escrituras_y_sin_datos():
+    antes = client.get(f"/api/dashboard/resumen?restaurante_id={OTRO_ID}").json()
+    assert antes["estado_caja"] == "CUADRADA" and antes["gastos_pendientes"] == 1
+    db = TestingSessionLocal()
+    db.query(models.VentaDiaria).filter(models.VentaDiaria.restaurante_id == OTRO_ID,
+                                        models.VentaDiaria.fecha == HOY).one().total_venta = 0.0
+    db.commit()
+    db.close()
+    despues = client.get(f"/api/dashboard/resumen?restaurante_id={OTRO_ID}").json()
+    assert despues["ventas_hoy"] == 0.0
+
+    vacio = resumen_dashboard.calcular_resumen(TestingSessionLocal(), 999_999)
+    assert vacio["ventas_mes"] == 0.0 and vacio["ultimo_arqueo"] is None and vacio["cambio_vs_ayer"] is None
+
+
+def test_un_anio_de_datos_en_milisegundos():
+    db = TestingSessionLocal()
+    try:
+        tiempos = []
+        for _ in range(5):
+            inicio = time.perf_counter()
+            resumen_dashboard.calcular_resumen(db, REST_ID)
+            tiempos.append(time.perf_counter() - inicio)
+    finally:
+        db.close()
+    assert min(tiempos) < 0.02
@@ -0,0 +1,174 @@
+"""
+Tests de versiones de datos y ETag / 304 en analytics
+"""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, update
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import data_versions, kpis_snapshot
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_data_versions.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+OTRO_ID = None
+CIERRE_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID, CIERRE_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    kpis_snapshot.invalidate()
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Versiones Test", slug="versiones-test", plan="basico")
+    otro = models.Restaurante(nombre="Versiones Otro", slug="versiones-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    cierre = models.CierreTurno(fecha=HOY, responsable="x", elaborado_por="x", saldo_inicial=0,
+                                restaurante_id=REST_ID, ventas_efectivo=5000.0, total_venta=5000.0)
+    db.add(cierre)
+    db.add(models.Gasto(fecha=HOY, proveedor="Toyo", categoria="PROTEINA", monto=800.0,
+                        metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID))
+    db.commit()
+    CIERRE_ID = cierre.id
+    db.close()
+    yield
+    kpis_snapshot.invalidate()
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _version(rid, dominio):
+    db = TestingSessionLocal()
+    try:
+        return data_versions.versiones(db, rid, [dominio]).get((rid, dominio), 0)
+    finally:
+        db.close()
+
+
+def _contar(fn):
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        return fn(), sentencias
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+
+
+def test_304_sin_consultar_tablas_de_hechos():
+    url = f"/api/pl/{REST_ID}/mes/{HOY.year}/{HOY.month}"
+    resp = client.get(url)
+    assert resp.status_code == 200
+    etag = resp.headers["etag"]
+    assert etag.startswith('W/"') and "no-cache" in resp.headers["cache-control"]
+
+    resp2, sentencias = _contar(lambda: client.get(url, headers={"If-None-Match": etag}))
+    assert resp2.status_code == 304 and resp2.content == b""
+    assert resp2.headers["etag"] == etag
+    assert len(sentencias) == 1 and "data_versions" in sentencias[0]
+
+    # Otro recurso del mismo restaurante tiene su propio ETag
+    assert client.get(f"/api/pl/{REST_ID}/resumen-semana").headers["etag"] != etag
+    # Un ETag viejo o de otro recurso no da 304
+    assert client.get(url, headers={"If-None-Match": 'W/"otro"'}).status_code == 200
+
+
+def test_escritura_cambia_etag_solo_del_restaurante_y_dominio():
+    url = f"/api/gastos/dashboard/{REST_ID}"
+    url_otro = f"/api/gastos/dashboard/{OTRO_ID}"
+    url_ventas = f"/api/pl/{REST_ID}/ventas-diarias-resumen"
+    etag, etag_otro, etag_ventas = (client.get(u).headers["etag"] for u in (url, url_otro, url_ventas))
+    antes = _version(REST_ID, "gastos")
+
+    db = TestingSessionLocal()
+    db.add(models.GastoDiario(cierre_id=CIERRE_ID, proveedor="Mercado", categoria="GAS", comprobante="TICKET",
+                              descripcion="caja", monto=120.0))
+    db.commit()
+    db.close()
+
+    assert _version(REST_ID, "gastos") == antes + 1  # sin restaurante_id: se resuelve por el cierre
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["etag"] != etag
+    assert client.get(url_otro, headers={"If-None-Match": etag_otro}).status_code == 304
+    assert client.get(url_ventas, headers={"If-None-Match": etag_ventas}).status_code == 304
+
+
+def test_rollback_no_sube_version_y_masivas_si():
+    antes = _version(REST_ID, "gastos")
+    db = TestingSessionLocal()
+    db.add(models.Gasto(fecha=HOY, proveedor="X", categoria="GAS", monto=1.0,
+                        metodo_pago=models.MetodoPago.EFECTIVO, restaurante_id=REST_ID))
+    db.flush()
+    db.rollback()
+    db.close()
+    assert _version(REST_ID, "gastos") == antes
+
+    db = TestingSessionLocal()
+    db.execute(insert(models.Gasto), [{"fecha": HOY, "proveedor": "Y", "categoria": "GAS", "monto": 2.0,
+                                       "metodo_pago": models.MetodoPago.EFECTIVO, "restaurante_id": REST_ID}])
+    db.commit()
+    assert _version(REST_ID, "gastos") == antes + 1
+
+    # UPDATE masivo sin restaurante identificable: versión comodín (todos los restaurantes)
+    comodin = _version(data_versions.TODOS, "gastos")
+    db.execute(update(models.Gasto).where(models.Gasto.proveedor == "Y").values(monto=3.0))
+    db.commit()
+    assert _version(data_versions.TODOS, "gastos") == comodin + 1
+
+    # Con restaurante_id en el WHERE: solo ese restaurante, una vez por commit
+    antes = _version(REST_ID, "gastos")
+    for monto in (4.0, 5.0):
+        db.execute(update(models.Gasto).where(models.Gasto.restaurante_id == REST_ID,
+                                              models.Gasto.proveedor == "Y").values(monto=monto))
+    db.commit()
+    db.close()
+    assert _version(REST_ID, "gastos") == antes + 1
+    assert _version(data_versions.TODOS, "gastos") == comodin + 1
+
+
+def test_update_por_llave_primaria_no_sube_el_comodin():
+    # db.execute(update(M), [{"id": ...}]) no trae restaurante_id: el importador lo pasa como opción
+    from backend_python.services.importadores import importar_ventas
+
+    comodin = _version(data_versions.TODOS, "ventas")
+    antes = _version(REST_ID, "ventas")
+    ventas = [{"fecha": date(2001, 1, d), "mes": "enero", "semana": 1, "efectivo": 100.0 * d} for d in (1, 2)]
+    db = TestingSessionLocal()
+    try:
+        assert importar_ventas(db, ventas, REST_ID)["creados"] == 2
+        assert importar_ventas(db, ventas, REST_ID)["actualizados"] == 2
+    finally:
+        db.close()
+    assert _version(REST_ID, "ventas") == antes + 2
+    assert _version(data_versions.TODOS, "ventas") == comodin
+    assert _version(OTRO_ID, "ventas") == 0
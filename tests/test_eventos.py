@@ -0,0 +1,154 @@
+"""
+Tests del canal de eventos en vivo (services/eventos.py, /api/eventos)
+"""
+import asyncio
+import json
+from datetime import date, timedelta
+from itertools import count
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.core.auth import create_access_token, get_password_hash
+from backend_python.routers import eventos_router
+from backend_python.services import eventos
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_eventos.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+OTRO_ID = None
+TOKEN_OTRO = None
+_DIAS = count()  # cierres_turno.fecha es única
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID, TOKEN_OTRO
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r1 = models.Restaurante(nombre="Eventos", slug="eventos", plan="basico")
+    r2 = models.Restaurante(nombre="Otro", slug="eventos-otro", plan="basico")
+    db.add_all([r1, r2])
+    db.flush()
+    REST_ID, OTRO_ID = r1.id, r2.id
+    u = models.Usuario(email="eventos@test.com", hashed_password=get_password_hash("x"), nombre="Otro",
+                       rol="ADMIN", restaurante_id=OTRO_ID)
+    db.add(u)
+    db.commit()
+    TOKEN_OTRO = create_access_token({"sub": str(u.id)})
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _ultimo_id() -> int:
+    db = TestingSessionLocal()
+    try:
+        return db.query(models.EventoCambio.id).order_by(models.EventoCambio.id.desc()).limit(1).scalar() or 0
+    finally:
+        db.close()
+
+
+def _eventos_desde(desde: int) -> list:
+    db = TestingSessionLocal()
+    try:
+        filas = db.query(models.EventoCambio).filter(models.EventoCambio.id > desde).order_by(models.EventoCambio.id)
+        return [(e.restaurante_id, e.tipo, json.loads(e.datos)) for e in filas]
+    finally:
+        db.close()
+
+
+def _capturar_cierre(rid: int) -> tuple:
+    db = TestingSessionLocal()
+    try:
+        fecha = HOY - timedelta(days=next(_DIAS))
+        cierre = models.CierreTurno(fecha=fecha, responsable="Ana", elaborado_por="Luis", restaurante_id=rid,
+                                    saldo_inicial=0.0, ventas_efectivo=1000.0)
+        db.add(cierre)
+        db.add(models.AlertaLog(restaurante_id=rid, tipo="VENTA_BAJA", mensaje="Venta baja", severidad="CRITICAL"))
+        db.commit()
+        return cierre.id, str(fecha)
+    finally:
+        db.close()
+
+
+def test_eventos_en_la_transaccion_de_la_escritura():
+    desde = _ultimo_id()
+    cierre_id, fecha = _capturar_cierre(REST_ID)
+    registrados = _eventos_desde(desde)
+    assert (REST_ID, "cierre", {"accion": "creado", "id": cierre_id, "fecha": fecha}) in registrados
+    assert any(t == "alerta" and d["severidad"] == "CRITICAL" for _, t, d in registrados)
+    assert (REST_ID, "pl", {"accion": "invalidado", "dominios": ["gastos", "ventas"]}) in registrados
+
+    desde = _ultimo_id()
+    db = TestingSessionLocal()
+    cierre = db.get(models.CierreTurno, cierre_id)
+    cierre.notas = "sin commit"
+    db.flush()
+    db.rollback()
+    db.close()
+    assert _eventos_desde(desde) == []  # rollback: ni versión ni evento
+
+
+def test_reparto_en_vivo_solo_al_restaurante():
+    async def escenario():
+        canal = eventos.canal_para(engine_test)
+        propio, ajeno = canal.suscribir(REST_ID), canal.suscribir(OTRO_ID)
+        try:
+            await asyncio.sleep(0.05)  # el lector toma el último id
+            cierre = await asyncio.to_thread(_capturar_cierre, REST_ID)
+            recibidos = []
+            while len(recibidos) < 3:
+                recibidos.append(await asyncio.wait_for(propio.cola.get(), timeout=5))
+            assert ajeno.cola.empty()
+            return cierre, [(tipo, json.loads(datos)) for _, _, tipo, datos in recibidos]
+        finally:
+            canal.cancelar(propio)
+            canal.cancelar(ajeno)
+
+    (cierre_id, fecha), recibidos = asyncio.run(escenario())
+    assert ("cierre", {"accion": "creado", "id": cierre_id, "fecha": fecha}) in recibidos
+    assert {t for t, _ in recibidos} == {"cierre", "alerta", "pl"}
+
+
+def test_stream_sse_con_last_event_id(monkeypatch):
+    monkeypatch.setattr(eventos_router, "VIDA_SEGUNDOS", 0.3)
+    desde = _ultimo_id()
+    _capturar_cierre(REST_ID)
+    _capturar_cierre(OTRO_ID)
+
+    resp = client.get(f"/api/eventos/{REST_ID}", headers={"Last-Event-ID": str(desde)})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in resp.headers  # no se comprime ni se bufferea
+    bloques = [b for b in resp.text.split("\n\n") if b.startswith("id: ")]
+    assert len(bloques) == 3  # cierre, alerta y pl del restaurante; nada del otro
+    assert [int(b.split("\n")[0][4:]) for b in bloques] == sorted(int(b.split("\n")[0][4:]) for b in bloques)
+    assert resp.text.startswith("retry: ")
+
+    assert client.get(f"/api/eventos/{REST_ID}?token={TOKEN_OTRO}").status_code == 403
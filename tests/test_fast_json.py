@@ -0,0 +1,142 @@
+"""
+Tests de la serialización rápida de listas (core/fast_json.py)
+"""
+import json
+from datetime import date, timedelta
+from typing import List
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models, schemas
+from backend_python.core import fast_json
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_fast_json.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Fast JSON", slug="fast-json", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    for d in range(20):
+        fecha = HOY - timedelta(days=d)
+        cierre = models.CierreTurno(fecha=fecha, responsable="Ana", elaborado_por="Luis", saldo_inicial=100.5,
+                                    ventas_efectivo=1000.0 + d, propinas_parrot=None, restaurante_id=REST_ID,
+                                    efectivo_fisico=None, estado=models.EstadoArqueo.CUADRADA if d % 2 else None,
+                                    notas="ñandú \"citado\"" if d == 3 else None)
+        db.add(cierre)
+        db.flush()
+        db.add_all([models.GastoDiario(cierre_id=cierre.id, proveedor=f"P{k}", categoria="GAS",
+                                       comprobante=models.TipoComprobante.TICKET, descripcion="x",
+                                       monto=10.25 * (k + 1)) for k in range(d % 3)])
+        if d % 4 == 0:
+            db.add(models.PropinaDiaria(cierre_id=cierre.id, terminal=models.TerminalOrigen.PARROT, monto=5.0))
+        db.add(models.Gasto(fecha=fecha, proveedor="Toyo", categoria="PROTEINA", monto=99.99 + d,
+                            metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID,
+                            descripcion=None if d % 2 else "factura"))
+        db.add(models.MovimientoBanco(fecha=fecha, concepto="SPEI", monto=-50.0 - d,
+                                      tipo=models.TipoMovimientoBanco.CARGO, restaurante_id=REST_ID,
+                                      conciliacion_confianza=0.9 if d == 1 else None))
+    db.add_all([models.Proveedor(nombre=f"Prov {i}", categoria_default="GAS", restaurante_id=REST_ID,
+                                 rfc=None if i % 2 else f"RFC{i}") for i in range(5)])
+    emp = models.Empleado(nombre="Eva", puesto="Cocina", salario_base=1.0, fecha_ingreso=HOY, restaurante_id=REST_ID)
+    db.add(emp)
+    db.flush()
+    db.add_all([models.NominaPago(empleado_id=emp.id, periodo_inicio=HOY, periodo_fin=HOY, salario_base=1.0,
+                                  neto_pagado=900.0 + k, fecha_pago=HOY - timedelta(days=7 * k),
+                                  restaurante_id=REST_ID) for k in range(6)])
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _via_pydantic(modelo, schema, orden):
+    """Lo que regresaba FastAPI con response_model=List[schema]."""
+    db = TestingSessionLocal()
+    try:
+        objetos = db.query(modelo).filter(modelo.restaurante_id == REST_ID).order_by(*orden).all()
+        adapter = TypeAdapter(List[schema])
+        return json.loads(adapter.dump_json(adapter.validate_python(objetos, from_attributes=True)))
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("url,modelo,schema,orden", [
+    ("/api/gastos", models.Gasto, schemas.GastoResponse, ("fecha",)),
+    ("/api/cierre-turno?limit=100", models.CierreTurno, schemas.CierreTurnoResponse, ("fecha",)),
+    ("/api/banco/movimientos", models.MovimientoBanco, schemas.MovimientoBancoResponse, ("fecha",)),
+    ("/api/proveedores", models.Proveedor, schemas.ProveedorResponse, ("id",)),
+])
+def test_misma_salida_que_response_model(url, modelo, schema, orden):
+    sep = "&" if "?" in url else "?"
+    resp = client.get(f"{url}{sep}restaurante_id={REST_ID}")
+    assert resp.status_code == 200
+    esperado = _via_pydantic(modelo, schema, [getattr(modelo, c).desc() if c == "fecha" else getattr(modelo, c)
+                                               for c in orden])
+    assert resp.json() == esperado
+
+
+def test_cierres_con_hijos_en_consultas_constantes_y_openapi_intacto():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        data = client.get(f"/api/cierre-turno?limit=100&restaurante_id={REST_ID}").json()
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert len(data) == 20 and sum(len(c["gastos"]) for c in data) == 19
+    assert len(sentencias) == 3  # cierres + gastos diarios + propinas
+
+    esquema = app.openapi()["paths"]["/api/gastos"]["get"]["responses"]["200"]["content"]["application/json"]
+    assert esquema["schema"]["items"]["$ref"].endswith("/GastoResponse")
+
+
+def test_nomina_con_empleado_sin_n_mas_1():
+    data = client.get(f"/api/nomina?restaurante_id={REST_ID}").json()
+    assert len(data) == 6
+    assert data[0]["empleado_nombre"] == "Eva" and data[0]["empleado_puesto"] == "Cocina"
+    assert data[0]["fecha_pago"] == str(HOY) and data[0]["neto_pagado"] == 900.0
+
+
+def test_respaldo_sin_orjson(monkeypatch):
+    contenido = [{"fecha": HOY, "estado": models.EstadoArqueo.CUADRADA, "monto": 1.5, "nota": "ñ", "x": None}]
+    con_orjson = fast_json.dumps(contenido)
+    monkeypatch.setattr(fast_json, "orjson", None)
+    assert json.loads(fast_json.dumps(contenido)) == json.loads(con_orjson)
+    assert json.loads(con_orjson)[0]["estado"] == models.EstadoArqueo.CUADRADA.value
@@ -0,0 +1,176 @@
+"""
+Tests del dashboard de gastos agregado en SQL (/api/gastos/dashboard)
+"""
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_gastos_dashboard.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+CATEGORIAS = ["PROTEINA", "proteina ", "BEBIDAS", "Nómina", "RENTA", None]
+COMPROBANTES = ["FACTURA", "SIN_COMPROBANTE", "TICKET", None]
+PROVEEDORES = ["toyo", "TOYO ", "Kume", "CFE", ""]
+REST_ID = None
+FILAS = []  # (tabla, fecha, categoria, comprobante, proveedor, monto)
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Dash Gastos", slug="dash-gastos", plan="basico")
+    otro = models.Restaurante(nombre="Dash Otro", slug="dash-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID = r.id
+    cuenta = models.CatalogoCuenta(restaurante_id=REST_ID, codigo="5001", nombre="Costo de alimentos",
+                                   tipo="COSTO", categoria_pl="costo_alimentos")
+    db.add(cuenta)
+    db.flush()
+    rnd = random.Random(9)
+    ahora = datetime.utcnow()
+    gastos = []
+    for _ in range(3000):
+        fecha = date(2026, 2, 25) + timedelta(days=rnd.randrange(70))  # feb (fuera), mar, abr, may (fuera)
+        cat, comp, prov = rnd.choice(CATEGORIAS), rnd.choice(COMPROBANTES), rnd.choice(PROVEEDORES)
+        monto = round(rnd.uniform(10, 900), 2)
+        gastos.append({"fecha": fecha, "proveedor": prov, "categoria": cat or "", "comprobante": comp,
+                       "monto": monto, "metodo_pago": models.MetodoPago.TRANSFERENCIA, "restaurante_id": REST_ID,
+                       "created_at": ahora, "descripcion": "d",
+                       "catalogo_cuenta_id": cuenta.id if cat == "PROTEINA" else None})
+        FILAS.append(("gastos", fecha, cat or "", comp, prov, monto))
+    db.execute(insert(models.Gasto), gastos)
+    db.execute(insert(models.Gasto), [{**gastos[0], "restaurante_id": otro.id}])
+    for d in range(61):
+        fecha = date(2026, 3, 1) + timedelta(days=d)
+        cierre = models.CierreTurno(fecha=fecha, responsable="x", elaborado_por="x", saldo_inicial=0,
+                                    restaurante_id=REST_ID)
+        db.add(cierre)
+        db.flush()
+        for _ in range(3):
+            cat, prov = rnd.choice([c for c in CATEGORIAS if c]), rnd.choice(PROVEEDORES) or "MERCADO"
+            comp = rnd.choice(["TICKET", "SIN_COMPROBANTE", "VALE"])
+            monto = round(rnd.uniform(10, 300), 2)
+            db.add(models.GastoDiario(cierre_id=cierre.id, proveedor=prov, categoria=cat, comprobante=comp,
+                                      descripcion="caja", monto=monto))
+            FILAS.append(("gastos_diarios", fecha, cat, comp, prov, monto))
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _esperado(mes, anio):
+    """Cálculo directo fila por fila, como lo hacía el endpoint original."""
+    mp = {"FACTURA", "TICKET", "RECIBO", "NOTA_REMISION", "VALE", "TRANSFERENCIA"}
+    act = [f for f in FILAS if f[1].month == mes and f[1].year == anio]
+    ant = [f for f in FILAS if f[1].month == mes - 1 and f[1].year == anio]
+    por_cat, prev, n_cat, semanas, provs = defaultdict(float), defaultdict(float), defaultdict(int), [0.0] * 4, defaultdict(float)
+    for _t, fecha, cat, _c, prov, monto in act:
+        k = (cat or "OTROS").strip().upper()
+        por_cat[k] += monto
+        n_cat[k] += 1
+        semanas[min(3, (fecha.day - 1) // 7)] += monto
+        if prov:
+            provs[prov.strip().upper()] += monto
+    for _t, _f, cat, _c, _p, monto in ant:
+        prev[(cat or "OTROS").strip().upper()] += monto
+    return {
+        "total": sum(f[5] for f in act),
+        "mp": sum(f[5] for f in act if (f[3] or "").upper() in mp),
+        "efectivo": sum(f[5] for f in act if f[0] == "gastos_diarios"),
+        "n": len(act), "por_cat": por_cat, "n_cat": n_cat, "prev": prev, "semanas": semanas,
+        "proveedor_top": max(provs.items(), key=lambda x: x[1])[0],
+    }
+
+
+def test_dashboard_igual_al_calculo_por_fila_con_pocas_consultas():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:  # lectura del ETag (core/etag.py)
+            sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        resp = client.get(f"/api/gastos/dashboard/{REST_ID}?mes=4&anio=2026")
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert resp.status_code == 200
+    assert len(sentencias) <= 4
+
+    data, esp = resp.json(), _esperado(4, 2026)
+    res = data["resumen"]
+    assert res["total_gastos"] == pytest.approx(esp["total"], abs=0.05)
+    assert res["total_mp"] == pytest.approx(esp["mp"], abs=0.05)
+    assert res["total_mp"] + res["total_nmp"] == pytest.approx(res["total_gastos"], abs=0.05)
+    assert res["total_efectivo"] == pytest.approx(esp["efectivo"], abs=0.05)
+    assert res["num_transacciones"] == esp["n"]
+    assert res["proveedor_top"]["nombre"] == esp["proveedor_top"]
+    assert [s["monto"] for s in data["tendencia_semanal"]] == pytest.approx(esp["semanas"], abs=0.05)
+
+    por_cat = {c["categoria"]: c for c in data["por_categoria"]}
+    assert set(por_cat) == set(esp["por_cat"])
+    assert "NÓMINA" in por_cat and "OTROS" in por_cat
+    for cat, c in por_cat.items():
+        assert c["monto_total"] == pytest.approx(esp["por_cat"][cat], abs=0.05)
+        assert c["mes_anterior_monto"] == pytest.approx(esp["prev"][cat], abs=0.05)
+        assert c["num_transacciones"] == esp["n_cat"][cat]
+        # Solo el detalle que despliega la UI, del más reciente al más antiguo
+        assert len(c["gastos"]) == min(15, esp["n_cat"][cat])
+        fechas = [g["fecha"] for g in c["gastos"]]
+        assert fechas == sorted(fechas, reverse=True)
+        assert fechas[-1] >= "2026-04-28"
+    assert por_cat["PROTEINA"]["cuenta_contable"] == "Costo de alimentos"
+    assert por_cat["PROTEINA"]["tipo_cuenta"] == "costo"
+
+
+def test_limites_de_mes_y_enero():
+    data = client.get(f"/api/gastos/dashboard/{REST_ID}?mes=3&anio=2026&max_detalle=2").json()
+    esp = _esperado(3, 2026)
+    assert data["resumen"]["num_transacciones"] == esp["n"]
+    assert all(len(c["gastos"]) <= 2 for c in data["por_categoria"])
+    vacio = client.get(f"/api/gastos/dashboard/{REST_ID}?mes=1&anio=2026").json()
+    assert vacio["resumen"]["total_gastos"] == 0 and vacio["por_categoria"] == []
+
+
+def test_union_de_ramas_compila_para_postgres():
+    # gastos_diarios.comprobante es enum nativo en Postgres: el UNION con VARCHAR necesita CAST
+    from sqlalchemy import Enum
+    from sqlalchemy.dialects import postgresql
+    from backend_python.routers.gastos_dashboard_router import _ramas_gastos
+
+    u = _ramas_gastos(REST_ID, date(2026, 3, 1), date(2026, 4, 1), "categoria", "comprobante", "monto")
+    for rama in u.element.selects:
+        assert not any(isinstance(c.type, Enum) for c in rama.selected_columns)
+    sql = str(u.element.compile(dialect=postgresql.dialect()))
+    assert "CAST(gastos_diarios.comprobante AS VARCHAR)" in sql
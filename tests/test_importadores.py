@@ -0,0 +1,148 @@
+"""
+Tests de importadores masivos (estados de cuenta y ventas CSV): streaming + escritura por lotes
+"""
+import io
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services.importadores import importar_movimientos, iter_movimientos_csv
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_importadores.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+REST_A = None
+REST_B = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_A, REST_B
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    a = models.Restaurante(nombre="Banco A", slug="banco-a", plan="basico")
+    b = models.Restaurante(nombre="Banco B", slug="banco-b", plan="basico")
+    db.add_all([a, b])
+    db.commit()
+    REST_A, REST_B = a.id, b.id
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _csv(n):
+    inicio = date(2025, 1, 1)
+    saldo = 1_000_000.0
+    lineas = ["Fecha,Referencia,Concepto,Cargo,Abono,Saldo"]
+    for i in range(n):
+        cargo = 100 + i % 97
+        saldo -= cargo
+        lineas.append(f"{(inicio + timedelta(days=i % 365)).strftime('%d/%m/%Y')},REF{i:06d},"
+                      f"PAGO PROVEEDOR {i},\"${cargo:,.2f}\",,\"{saldo:,.2f}\"")
+    return "\n".join(lineas).encode()
+
+
+def _contar(rest_id):
+    db = TestingSessionLocal()
+    n = db.query(models.MovimientoBanco).filter(models.MovimientoBanco.restaurante_id == rest_id).count()
+    db.close()
+    return n
+
+
+def test_reimportar_no_duplica_y_es_rapido():
+    archivo = _csv(5000)
+    inicio = time.monotonic()
+    r1 = client.post(f"/api/banco/upload?restaurante_id={REST_A}",
+                     files={"file": ("estado.csv", archivo, "text/csv")}).json()
+    r2 = client.post(f"/api/banco/upload?restaurante_id={REST_A}",
+                     files={"file": ("estado.csv", archivo, "text/csv")}).json()
+    assert time.monotonic() - inicio < 10
+    assert r1["importados"] == 5000 and r1["duplicados"] == 0
+    assert r2["importados"] == 0 and r2["duplicados"] == 5000
+    assert _contar(REST_A) == 5000
+
+
+def test_mismo_estado_en_otro_restaurante_si_se_importa():
+    r = client.post(f"/api/banco/upload?restaurante_id={REST_B}",
+                    files={"file": ("estado.csv", _csv(10), "text/csv")}).json()
+    assert r["importados"] == 10
+    assert _contar(REST_B) == 10
+
+
+def test_csv_fechas_como_date_y_duplicados_en_el_mismo_archivo():
+    texto = (b"05/03/2026,R1,RENTA,\"$15,000.00\",,85000.00\n"
+             b"05/03/2026,R1,RENTA,\"$15,000.00\",,85000.00\n"
+             b"2026-03-06,R2,DEPOSITO,,2500,87500\n"
+             b"linea,invalida\n")
+    movs = list(iter_movimientos_csv(io.BytesIO(texto)))
+    assert [m["fecha"] for m in movs] == [date(2026, 3, 5), date(2026, 3, 5), date(2026, 3, 6)]
+    assert movs[2]["tipo"] == models.TipoMovimientoBanco.ABONO
+    db = TestingSessionLocal()
+    res = importar_movimientos(db, iter(movs), restaurante_id=None, chunk_size=2)
+    db.close()
+    assert res == {"leidos": 3, "importados": 2, "duplicados": 1}
+
+
+# ── Ventas: importar-csv por lotes ───────────────────────────────────────────
+
+def _ventas_csv(n, inicio=date(2000, 1, 1), efectivo=1000):
+    lineas = ["RESUMEN,,,", "FECHA,MES,SEMANA,EFECTIVO,PROP EF,PAY,PROP PA,TERMINALES,PROP TE,UBER,RAPPI,"
+              "CORTESIAS,OTROS,TOTAL,PROPINA"]
+    for i in range(n):
+        f = inicio + timedelta(days=i)
+        lineas.append(f"{f.strftime('%d-%b-%Y')},{f.strftime('%b').lower()},{f.isocalendar()[1]},"
+                      f"\"${efectivo:,}\",0,500,0,800,0,0,0,0,0,\"${efectivo + 1300:,}\",100")
+    lineas.append(f"{(inicio + timedelta(days=n)).strftime('%d-%b-%Y')},x,1,-,-,-,-,-,-,-,-,-,-,-,-")
+    return "\n".join(lineas).encode()
+
+
+def test_ventas_10k_renglones_crear_y_actualizar():
+    inicio = time.monotonic()
+    r1 = client.post(f"/api/ventas/importar-csv?restaurante_id={REST_A}",
+                     files={"file": ("ventas.csv", _ventas_csv(10_000), "text/csv")}).json()
+    r2 = client.post(f"/api/ventas/importar-csv?restaurante_id={REST_A}",
+                     files={"file": ("ventas.csv", _ventas_csv(10_000, efectivo=2000), "text/csv")}).json()
+    assert time.monotonic() - inicio < 15
+    assert (r1["registros_creados"], r1["registros_actualizados"], r1["registros_saltados"]) == (10_000, 0, 1)
+    assert (r2["registros_creados"], r2["registros_actualizados"]) == (0, 10_000)
+
+    db = TestingSessionLocal()
+    V = models.VentaDiaria
+    assert db.query(V).filter(V.restaurante_id == REST_A).count() == 10_000
+    assert db.query(V).filter(V.restaurante_id == REST_A, V.fecha == date(2000, 1, 1)).one().efectivo == 2000
+    db.close()
+
+    # Otro restaurante con las mismas fechas crea sus propios registros
+    r3 = client.post(f"/api/ventas/importar-csv?restaurante_id={REST_B}",
+                     files={"file": ("ventas.csv", _ventas_csv(5), "text/csv")}).json()
+    assert r3["registros_creados"] == 5
+
+
+def test_ventas_csv_sin_detalle_400():
+    resp = client.post("/api/ventas/importar-csv", files={"file": ("v.csv", b"a,b,c\n1,2,3", "text/csv")})
+    assert resp.status_code == 400
@@ -0,0 +1,165 @@
+"""
+Tests del snapshot de KPIs del día (/api/pl/{restaurante_id}/kpis-hoy)
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import kpis_snapshot
+from backend_python.services.pl_service import pl_service
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_kpis_snapshot.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+OTRO_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _cierre(fecha: date, rid: int, venta: float) -> models.CierreTurno:
+    return models.CierreTurno(fecha=fecha, responsable="x", elaborado_por="x", saldo_inicial=0,
+                              restaurante_id=rid, ventas_efectivo=venta * 0.4, ventas_parrot=venta * 0.5,
+                              ventas_uber=venta * 0.1, total_venta=venta)
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    kpis_snapshot.invalidate()
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="KPIs Test", slug="kpis-test", plan="basico")
+    otro = models.Restaurante(nombre="KPIs Otro", slug="kpis-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    alimentos = models.CatalogoCuenta(restaurante_id=REST_ID, codigo="5001", nombre="Alimentos",
+                                      tipo="COSTO", categoria_pl="costo_alimentos")
+    inactiva = models.CatalogoCuenta(restaurante_id=REST_ID, codigo="5002", nombre="Bebidas",
+                                     tipo="COSTO", categoria_pl="costo_bebidas", activo=False)
+    db.add_all([alimentos, inactiva])
+    # Hoy y 3 de las 4 semanas previas (una sin cierre); el día intermedio no cuenta
+    hoy = _cierre(HOY, REST_ID, 12000.0)
+    db.add_all([hoy, _cierre(HOY - timedelta(weeks=1), REST_ID, 10000.0),
+                _cierre(HOY - timedelta(weeks=2), REST_ID, 9000.0),
+                _cierre(HOY - timedelta(weeks=4), REST_ID, 11000.0),
+                _cierre(HOY - timedelta(days=3), REST_ID, 99999.0),
+                _cierre(HOY - timedelta(weeks=3), OTRO_ID, 50000.0)])
+    db.flush()
+    db.add_all([
+        models.GastoDiario(cierre_id=hoy.id, proveedor="Mercado", categoria="VERDURAS raras", comprobante="TICKET",
+                           descripcion="caja", monto=300.0, catalogo_cuenta_id=alimentos.id),
+        models.GastoDiario(cierre_id=hoy.id, proveedor="Gas", categoria="GAS", comprobante="TICKET",
+                           descripcion="caja", monto=150.0),
+        models.Gasto(fecha=HOY, proveedor="Toyo", categoria="PROTEINA", monto=1200.0,
+                     metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID),
+        models.Gasto(fecha=HOY, proveedor="Vinos", categoria="BEBIDAS", monto=500.0,
+                     metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID,
+                     catalogo_cuenta_id=inactiva.id),
+        models.Gasto(fecha=HOY - timedelta(days=1), proveedor="Toyo", categoria="PROTEINA", monto=7777.0,
+                     metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID),
+        models.Gasto(fecha=HOY, proveedor="Toyo", categoria="PROTEINA", monto=4444.0,
+                     metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=OTRO_ID),
+    ])
+    emp = models.Empleado(nombre="E", puesto="Cocina", salario_base=1.0, fecha_ingreso=HOY,
+                          restaurante_id=REST_ID)
+    db.add(emp)
+    db.flush()
+    db.add(models.NominaPago(empleado_id=emp.id, periodo_inicio=HOY, periodo_fin=HOY, salario_base=1.0,
+                             neto_pagado=2000.0, fecha_pago=HOY, restaurante_id=REST_ID))
+    db.add_all([
+        models.AlertaLog(restaurante_id=REST_ID, tipo="FOOD_COST", mensaje=f"m{i}",
+                         created_at=datetime(2026, 1, 1) + timedelta(hours=i), revisada=(i == 6))
+        for i in range(7)
+    ])
+    db.commit()
+    db.close()
+    yield
+    kpis_snapshot.invalidate()
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def test_kpis_en_dos_consultas_e_iguales_al_pl():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:  # lectura del ETag (core/etag.py)
+            sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        data = client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()
+        client.get(f"/api/pl/{REST_ID}/kpis-hoy")  # memoizado
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert len(sentencias) == 2
+
+    db = TestingSessionLocal()
+    try:
+        pl = pl_service.calcular_pl(db, REST_ID, HOY, HOY)
+    finally:
+        db.close()
+    assert data["fecha"] == str(HOY)
+    assert data["ventas_hoy"] == 12000.0
+    assert data["promedio_dia_semana_4s"] == 10000.0
+    assert data["variacion_vs_promedio_pct"] == 20.0
+    assert data["margen_estimado_hoy"] == pytest.approx(round(pl.utilidad_neta, 2))
+    assert data["food_cost_hoy_pct"] == pytest.approx(round(pl.food_cost_pct, 2))
+    assert data["margen_estimado_hoy"] == 12000.0 - 300 - 150 - 1200 - 500 - 2000
+    assert [a["mensaje"] for a in data["alertas_activas"]] == ["m5", "m4", "m3", "m2", "m1"]
+
+
+def test_escritura_invalida_el_snapshot_y_otro_restaurante():
+    antes = client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()
+    db = TestingSessionLocal()
+    db.add(models.Gasto(fecha=HOY, proveedor="Toyo", categoria="PROTEINA", monto=1000.0,
+                        metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID))
+    db.commit()
+    db.close()
+    despues = client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()
+    assert despues["margen_estimado_hoy"] == antes["margen_estimado_hoy"] - 1000.0
+
+    otro = client.get(f"/api/pl/{OTRO_ID}/kpis-hoy").json()
+    assert otro["ventas_hoy"] is None and otro["promedio_dia_semana_4s"] == 50000.0
+    assert otro["variacion_vs_promedio_pct"] is None
+    assert otro["margen_estimado_hoy"] == -4444.0 and otro["alertas_activas"] == []
+
+
+def test_lectura_entre_flush_y_commit_no_deja_snapshot_viejo():
+    antes = client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()
+    db = TestingSessionLocal()
+    try:
+        db.add(models.Gasto(fecha=HOY, proveedor="Toyo", categoria="PROTEINA", monto=250.0,
+                            metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID))
+        db.flush()
+        # Otro request lee mientras la escritura no se ha confirmado: ve y memoiza lo anterior
+        assert client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()["margen_estimado_hoy"] == antes["margen_estimado_hoy"]
+        db.commit()
+    finally:
+        db.close()
+    despues = client.get(f"/api/pl/{REST_ID}/kpis-hoy").json()
+    assert despues["margen_estimado_hoy"] == antes["margen_estimado_hoy"] - 250.0
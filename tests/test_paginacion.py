@@ -0,0 +1,139 @@
+"""
+Tests de paginación por llave (core/paginacion.py) en los listados
+"""
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.core import paginacion
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_paginacion.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Paginación", slug="paginacion", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    ahora = datetime.utcnow()
+    # Varias filas por fecha: el id desempata
+    db.execute(insert(models.Gasto), [{
+        "fecha": HOY - timedelta(days=i // 4), "proveedor": f"P{i}", "categoria": "GAS", "monto": 10.0 + i,
+        "metodo_pago": models.MetodoPago.EFECTIVO, "restaurante_id": REST_ID, "created_at": ahora,
+    } for i in range(53)])
+    db.execute(insert(models.GastoTransferencia), [{
+        "restaurante_id": REST_ID, "proveedor": f"T{i}", "categoria": "OTROS", "monto": 100.0,
+        "fecha_factura": HOY - timedelta(days=i // 2), "estado": "PAGADO" if i % 3 == 0 else "PENDIENTE",
+        "fecha_vencimiento": HOY - timedelta(days=1) if i % 2 else HOY + timedelta(days=5),
+    } for i in range(17)])
+    db.execute(insert(models.AlertaLog), [{
+        "restaurante_id": REST_ID, "tipo": "T", "mensaje": f"m{i}", "severidad": "INFO",
+        "created_at": ahora - timedelta(hours=i // 2), "revisada": False,
+    } for i in range(25)])
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _todas_las_paginas(url, limit):
+    ids, cursor, paginas = [], None, 0
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        resp = client.get(url, params=params)
+        assert resp.status_code == 200
+        ids += [x["id"] for x in resp.json()]
+        paginas += 1
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            return ids, paginas
+        assert 'rel="next"' in resp.headers["link"]
+
+
+def test_gastos_por_cursor_igual_al_listado_completo():
+    url = f"/api/gastos?restaurante_id={REST_ID}"
+    completo = client.get(url).json()
+    assert len(completo) == 53 and "x-next-cursor" not in client.get(url).headers  # sin cursor: como antes
+    esperado = [g["id"] for g in sorted(completo, key=lambda g: (g["fecha"], g["id"]), reverse=True)]
+    ids, paginas = _todas_las_paginas(url, 10)
+    assert ids == esperado and paginas == 6
+
+
+def test_total_solo_si_se_pide_y_consultas_por_pagina():
+    url = f"/api/gastos?restaurante_id={REST_ID}&limit=10"
+    assert "x-total-count" not in client.get(url).headers
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        resp = client.get(url + "&incluir_total=true")
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert resp.headers["x-total-count"] == "53" and len(resp.json()) == 10
+    assert len(sentencias) == 2  # página + COUNT
+
+
+def test_cursor_invalido_o_de_otro_listado(monkeypatch):
+    resp = client.get("/api/gastos", params={"cursor": "no-es-un-cursor"})
+    assert resp.status_code == 400 and resp.json()["detail"]["code"] == "INVALID_CURSOR"
+    otro = paginacion.encode_cursor("ventas", [str(HOY), 1])
+    assert client.get("/api/gastos", params={"cursor": otro}).status_code == 400
+
+    monkeypatch.setattr(paginacion, "PAGINA_MAX", 7)
+    assert len(client.get(f"/api/gastos?restaurante_id={REST_ID}&limit=1000").json()) == 7
+
+
+def test_rbs_con_filtro_de_estado_calculado():
+    url = f"/api/rbs/{REST_ID}"
+    for estado in ("VENCIDO", "PENDIENTE", "PAGADO"):
+        completo = client.get(url, params={"estado": estado}).json()
+        assert completo and all(x["estado"] == estado for x in completo)
+        ids, _ = _todas_las_paginas(f"{url}?estado={estado}", 2)
+        assert sorted(ids) == sorted(x["id"] for x in completo)
+
+
+def test_historial_alertas_por_page_y_por_cursor():
+    url = f"/api/alertas/{REST_ID}/historial"
+    pag1 = client.get(url, params={"limit": 10}).json()
+    assert pag1["total"] == 25 and pag1["page"] == 1 and pag1["next_cursor"]
+    pag2 = client.get(url, params={"limit": 10, "page": 2}).json()
+    por_cursor = client.get(url, params={"limit": 10, "cursor": pag1["next_cursor"], "incluir_total": False}).json()
+    assert [x["id"] for x in por_cursor["items"]] == [x["id"] for x in pag2["items"]]
+    assert por_cursor["total"] is None
+    ultima = client.get(url, params={"limit": 10, "page": 3}).json()
+    assert len(ultima["items"]) == 5 and ultima["next_cursor"] is None
@@ -0,0 +1,60 @@
+"""
+Tests del cache de parseo por hash de contenido
+"""
+import pytest
+from backend_python.services.parse_cache import ParseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(directory=str(tmp_path / "cache"), max_entries=3, memory_entries=2)
+
+
+def test_hit_despues_de_miss(cache):
+    llamadas = []
+
+    def parse():
+        llamadas.append(1)
+        return {"total": 100.0}
+
+    assert cache.get_or_parse("factura", "1", b"pdf-bytes", parse) == {"total": 100.0}
+    assert cache.get_or_parse("factura", "1", b"pdf-bytes", parse) == {"total": 100.0}
+    assert len(llamadas) == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_hits_devuelven_copias(cache):
+    resultado = cache.get_or_parse("factura", "1", b"pdf", lambda: {"total": 1.0, "conceptos": [{"c": 1}]})
+    resultado["match_error"] = "sin proveedor"  # lo que agrega el router por request
+    hit = cache.get_or_parse("factura", "1", b"pdf", lambda: {})
+    assert hit == {"total": 1.0, "conceptos": [{"c": 1}]}
+    hit["conceptos"].append({"c": 2})
+    assert cache.get_or_parse("factura", "1", b"pdf", lambda: {})["conceptos"] == [{"c": 1}]
+
+
+def test_version_y_namespace_separan_entradas(cache):
+    cache.get_or_parse("factura", "1", b"x", lambda: {"v": 1})
+    assert cache.get_or_parse("factura", "2", b"x", lambda: {"v": 2}) == {"v": 2}
+    assert cache.get_or_parse("ocr", "1", b"x", lambda: {"v": 3}) == {"v": 3}
+
+
+def test_errores_no_se_cachean(cache):
+    cache.get_or_parse("invoice", "1", b"roto", lambda: {"error": "falló"})
+    assert cache.get_or_parse("invoice", "1", b"roto", lambda: {"total": 5}) == {"total": 5}
+
+
+def test_persistencia_en_disco_entre_instancias(tmp_path):
+    d = str(tmp_path / "shared")
+    ParseCache(directory=d).get_or_parse("factura", "1", b"abc", lambda: {"folio": "A1"})
+    otra = ParseCache(directory=d)
+    assert otra.get_or_parse("factura", "1", b"abc", lambda: {"folio": "X"}) == {"folio": "A1"}
+    assert otra.stats()["disk_hits"] == 1
+
+
+def test_eviccion_respeta_max_entries(cache):
+    for i in range(6):
+        cache.set(cache.make_key("factura", "1", bytes([i])), {"i": i})
+    assert cache.evict() == 3
+    assert cache.stats()["evictions"] == 3
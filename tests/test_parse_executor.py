@@ -0,0 +1,88 @@
+"""
+Tests del executor de parseo — el event loop sigue respondiendo mientras se parsea
+"""
+import asyncio
+import time
+
+import pytest
+from backend_python.services import parse_executor
+from backend_python.services.parse_executor import ParseTimeoutError, run_parse
+
+
+def _trabajo_bloqueante(segundos: float) -> dict:
+    time.sleep(segundos)
+    return {"ok": True, "segundos": segundos}
+
+
+def _trabajo_con_error(_contents: bytes) -> dict:
+    raise ValueError("El PDF no contiene texto extraible")
+
+
+@pytest.fixture(autouse=True, scope="module")
+def pool():
+    yield
+    parse_executor.shutdown()
+
+
+def test_run_parse_devuelve_resultado():
+    assert asyncio.run(run_parse(_trabajo_bloqueante, 0.01)) == {"ok": True, "segundos": 0.01}
+
+
+def test_value_error_se_propaga():
+    with pytest.raises(ValueError, match="texto extraible"):
+        asyncio.run(run_parse(_trabajo_con_error, b""))
+
+
+def test_timeout_por_trabajo():
+    with pytest.raises(ParseTimeoutError):
+        asyncio.run(run_parse(_trabajo_bloqueante, 1.0, timeout=0.1))
+
+
+def test_event_loop_no_se_bloquea_durante_parseo():
+    async def escenario():
+        jobs = [asyncio.ensure_future(run_parse(_trabajo_bloqueante, 0.3)) for _ in range(4)]
+        # Latencia de una tarea "no relacionada" mientras los parseos corren
+        peor = 0.0
+        while not all(j.done() for j in jobs):
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.01)
+            peor = max(peor, time.perf_counter() - t0)
+        await asyncio.gather(*jobs)
+        return peor
+
+    assert asyncio.run(escenario()) < 0.2
+
+
+def test_timeout_libera_el_worker(monkeypatch):
+    parse_executor.shutdown()
+    monkeypatch.setattr(parse_executor, "MAX_WORKERS", 2)
+
+    async def escenario():
+        colgados = [run_parse(_trabajo_bloqueante, 30.0, timeout=0.3) for _ in range(2)]
+        resultados = await asyncio.gather(*colgados, return_exceptions=True)
+        assert all(isinstance(r, ParseTimeoutError) for r in resultados)
+        # Los dos workers estaban colgados; si siguieran vivos este trabajo esperaría en cola
+        t0 = time.perf_counter()
+        assert await run_parse(_trabajo_bloqueante, 0.01, timeout=5) == {"ok": True, "segundos": 0.01}
+        return time.perf_counter() - t0
+
+    assert asyncio.run(escenario()) < 3
+    parse_executor.shutdown()
+
+
+def test_reintento_tras_reciclar_respeta_el_plazo(monkeypatch):
+    parse_executor.shutdown()
+    monkeypatch.setattr(parse_executor, "MAX_WORKERS", 3)
+
+    async def escenario():
+        return await asyncio.gather(
+            run_parse(_trabajo_bloqueante, 30.0, timeout=0.5),  # recicla el pool a los 0.5s
+            run_parse(_trabajo_bloqueante, 0.6, timeout=1.0),   # se reintenta y ya no le alcanza el plazo
+            run_parse(_trabajo_bloqueante, 0.8, timeout=5.0),   # se reintenta y termina
+            return_exceptions=True,
+        )
+
+    colgado, sin_plazo, reintentado = asyncio.run(escenario())
+    assert isinstance(colgado, ParseTimeoutError) and isinstance(sin_plazo, ParseTimeoutError)
+    assert reintentado == {"ok": True, "segundos": 0.8}
+    parse_executor.shutdown()
@@ -0,0 +1,77 @@
+"""
+Tests de PDFDocument — extracción de una sola pasada compartida por los parsers
+"""
+from pdfplumber.page import Page
+
+from backend_python.factura_parser import parse_factura_pdf_uncached
+from backend_python.services.gastos_pdf_parser import parse_ocr_pdf
+from backend_python.services.pdf_document import PDFDocument
+
+
+def make_pdf(pages):
+    """PDF mínimo (Helvetica, una línea de texto por renglón) sin dependencias extra."""
+    objs = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    n = len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(n))
+    objs.append(f"<< /Type /Pages /Kids [{kids}] /Count {n} >>")
+    font_id = 3 + 2 * n
+    for i, texto in enumerate(pages):
+        ops = "BT /F1 12 Tf 50 750 Td 14 TL " + " ".join(f"({l}) Tj T*" for l in texto.split("\n")) + " ET"
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                    f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>")
+        objs.append(f"<< /Length {len(ops)} >>\nstream\n{ops}\nendstream")
+    objs.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = "%PDF-1.4\n"
+    offsets = []
+    for k, o in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{k} 0 obj\n{o}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n" + "".join(f"{x:010d} 00000 n \n" for x in offsets)
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+FACTURA = make_pdf(["COMERCIAL TOYO SA DE CV\nFecha: 2026-03-02\n2 KG NORI PREMIUM 580.00\nTOTAL: $1,160.00",
+                    "pagina dos", "pagina tres"])
+
+
+def test_max_pages_limita_paginas():
+    with PDFDocument(FACTURA, max_pages=2) as doc:
+        assert len(doc) == 2
+        assert "pagina tres" not in doc.full_text
+        assert doc.text(5) == ""
+        assert doc.page(5) is None
+
+
+def test_texto_y_tablas_se_extraen_una_vez(monkeypatch):
+    llamadas = {"text": 0, "tables": 0}
+    orig_text, orig_tables = Page.extract_text, Page.find_tables
+
+    def _text(self, *a, **kw):
+        llamadas["text"] += 1
+        return orig_text(self, *a, **kw)
+
+    def _tables(self, *a, **kw):
+        llamadas["tables"] += 1
+        return orig_tables(self, *a, **kw)
+
+    monkeypatch.setattr(Page, "extract_text", _text)
+    monkeypatch.setattr(Page, "find_tables", _tables)
+    with PDFDocument(FACTURA) as doc:
+        doc.text_with_tables()
+        doc.full_text
+        doc.tables(0)
+        doc.table(0)
+    assert llamadas == {"text": 3, "tables": 3}
+
+
+def test_parsers_sobre_documento_compartido():
+    factura = parse_factura_pdf_uncached(FACTURA)
+    assert factura["proveedor"] == "TOYO"
+    assert factura["total"] == 1160.0
+
+    ocr = parse_ocr_pdf(FACTURA)
+    assert ocr["proveedor"] == "TOYO"
+    assert ocr["fecha"] == "2026-03-02"
+    assert ocr["items"][0]["monto"] == 580.0
@@ -0,0 +1,135 @@
+"""
+Tests de canonicalización de proveedores (services/proveedor_canonico.py)
+"""
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import proveedor_canonico
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_proveedor_canonico.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+REST_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _gasto(proveedor, monto, categoria="ABARROTES"):
+    return models.Gasto(fecha=HOY, proveedor=proveedor, categoria=categoria, monto=monto,
+                        metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID)
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Canónico", slug="canonico", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    db.add_all([
+        _gasto("LA BUENA TIERRA", 100.0), _gasto("LA BUENA TIERRA", 100.0), _gasto("Buena Tierra", 50.0),
+        _gasto("Buena Tierra S.A. de C.V.", 25.0), _gasto("CESAR HUMBERTO CARRANZA", 10.0, "GAS"),
+        _gasto("Cesar Humberto Caranza", 5.0, "GAS"), _gasto("CARNES AVILA", 80.0, "PROTEINA"),
+    ])
+    db.add(models.GastoTransferencia(restaurante_id=REST_ID, proveedor="Hielo Cristal", categoria="HIELO",
+                                     monto=30.0, fecha_factura=HOY, rfc_emisor="HCR010101AB1"))
+    db.add(models.Proveedor(nombre="HIELERA DEL CENTRO", categoria_default="HIELO", restaurante_id=REST_ID,
+                            rfc="HCR010101AB1"))
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    proveedor_canonico.invalidate()
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _info(rfcs=()):
+    return {"transacciones": 1, "total": 0.0, "rfcs": set(rfcs), "proveedor_id": None}
+
+
+def test_agrupar_variantes_rfc_y_descartados():
+    nombres = {c: _info() for c in ("LA BUENA TIERRA", "BUENA TIERRA", "BUENA TIERRA SA DE CV",
+                                    "CESAR HUMBERTO CARRANZA", "CESAR HUMBERTO CARANZA", "CARNES AVILA")}
+    nombres["POLLOS DEL VALLE"] = _info({"PVA0101"})
+    nombres["POLLOS VALLE"] = _info({"PVB0202"})  # mismo nombre, RFC distinto: no se unen
+    nombres["DISTRIBUIDORA XYZ"] = _info({"DXY0303"})
+    nombres["DXYZ"] = _info({"DXY0303"})  # nombres distintos, mismo RFC: se unen
+    grupos = {frozenset([g["canonico"]] + [c for c, _ in g["variantes"]]) for g in proveedor_canonico.agrupar(nombres)}
+    assert grupos == {
+        frozenset({"LA BUENA TIERRA", "BUENA TIERRA", "BUENA TIERRA SA DE CV"}),
+        frozenset({"CESAR HUMBERTO CARRANZA", "CESAR HUMBERTO CARANZA"}),
+        frozenset({"DISTRIBUIDORA XYZ", "DXYZ"}),
+    }
+    descartados = {"CESAR HUMBERTO CARRANZA": {"CESAR HUMBERTO CARANZA"},
+                   "CESAR HUMBERTO CARANZA": {"CESAR HUMBERTO CARRANZA"}}
+    assert len(proveedor_canonico.agrupar(nombres, descartados=descartados)) == 2
+
+
+def test_revision_confirmar_y_ruta_de_escritura():
+    data = client.get(f"/api/proveedores-canonicos/{REST_ID}/sugerencias").json()
+    por_canonico = {s["canonico"]["nombre"]: s for s in data["sugerencias"]}
+    tierra = por_canonico["LA BUENA TIERRA"]  # la variante más usada
+    assert {v["nombre"] for v in tierra["variantes"]} == {"BUENA TIERRA", "BUENA TIERRA S.A. DE C.V."}
+    assert tierra["total"] == 275.0
+    hielo = por_canonico["HIELERA DEL CENTRO"]  # mismo RFC; el del catálogo es el canónico
+    assert [v["nombre"] for v in hielo["variantes"]] == ["HIELO CRISTAL"]
+
+    resp = client.post(f"/api/proveedores-canonicos/{REST_ID}/confirmar", json={
+        "canonico": "La Buena Tierra", "variantes": [v["nombre"] for v in tierra["variantes"]],
+    })
+    assert resp.status_code == 200
+    assert resp.json()["gastos_actualizados"] == 2 and resp.json()["canonico"] == "LA BUENA TIERRA"
+
+    alertas = {a["proveedor"]: a for a in client.get(f"/api/proveedores-stats/{REST_ID}/alertas").json()}
+    assert alertas["LA BUENA TIERRA"]["mes_actual"] == 275.0 and "BUENA TIERRA" not in alertas
+
+    db = TestingSessionLocal()
+    try:
+        prov = db.query(models.Proveedor).filter(models.Proveedor.nombre == "La Buena Tierra").one()
+        assert prov.categoria_default == "ABARROTES" and len(prov.aliases) == 2
+        nuevo = _gasto("buena  tierra", 1.0)  # variante confirmada: se guarda con la clave canónica
+        db.add(nuevo)
+        db.commit()
+        assert nuevo.proveedor == "buena  tierra" and nuevo.proveedor_key == "LA BUENA TIERRA"
+    finally:
+        db.close()
+
+    nombres = {s["canonico"]["nombre"] for s in client.get(f"/api/proveedores-canonicos/{REST_ID}/sugerencias").json()["sugerencias"]}
+    assert "LA BUENA TIERRA" not in nombres
+
+
+def test_descartar_y_validaciones():
+    resp = client.post(f"/api/proveedores-canonicos/{REST_ID}/descartar",
+                       json={"nombres": ["CESAR HUMBERTO CARRANZA", "Cesar Humberto Caranza"]})
+    assert resp.json() == {"pares_descartados": 1}
+    data = client.get(f"/api/proveedores-canonicos/{REST_ID}/sugerencias").json()
+    assert all("CESAR" not in s["canonico"]["nombre"] for s in data["sugerencias"])
+
+    resp = client.post(f"/api/proveedores-canonicos/{REST_ID}/confirmar",
+                       json={"canonico": "CARNES AVILA", "variantes": ["carnes avila"]})
+    assert resp.status_code == 400 and resp.json()["detail"]["code"] == "FUSION_INVALIDA"
@@ -0,0 +1,105 @@
+"""
+Tests del matcher de proveedores (Aho-Corasick por restaurante)
+"""
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base, Restaurante, Proveedor, ProveedorAlias
+from backend_python.factura_parser import PROVEEDOR_MAP, detect_proveedor
+from backend_python.services import proveedor_matcher
+from backend_python.services.proveedor_matcher import ProveedorMatcher, build_matcher, get_matcher
+
+engine_test = create_engine("sqlite://", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+REST_ID = None
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    db = TestingSessionLocal()
+    r = Restaurante(nombre="Matcher Test", slug="matcher-test", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    db.add_all([
+        Proveedor(nombre="Pescados del Golfo", categoria_default="PROTEINA", restaurante_id=REST_ID, rfc="PGO010101AB1"),
+        Proveedor(nombre="Toyo", categoria_default="PRODUCTOS_ASIATICOS", restaurante_id=REST_ID),
+    ])
+    db.commit()
+    db.close()
+    yield
+    Base.metadata.drop_all(bind=engine_test)
+
+
+def test_coincide_con_busqueda_ingenua():
+    rnd = random.Random(7)
+    alfabeto = "ABC "
+    patrones = {"".join(rnd.choice("ABC") for _ in range(rnd.randint(2, 5))) for _ in range(60)}
+    m = ProveedorMatcher([(p, {"nombre": p, "categoria": "X"}, "nombre") for p in patrones])
+    for _ in range(50):
+        texto = " ".join("".join(rnd.choice(alfabeto) for _ in range(80)).split())
+        esperados = set()
+        for p in patrones:
+            ini = texto.find(p)
+            while ini != -1:
+                fin = ini + len(p)
+                if (ini == 0 or texto[ini - 1] == " ") and (fin == len(texto) or texto[fin] == " "):
+                    esperados.add((ini, p))
+                ini = texto.find(p, ini + 1)
+        assert {(i, pl["nombre"]) for i, pl, _v in m.find_all(texto)} == esperados
+
+
+def test_palabra_completa_y_acentos():
+    m = build_matcher((), (), {"TOYO": {"nombre": "TOYO", "categoria": "PRODUCTOS_ASIATICOS"},
+                               "PANADERIA LOPEZ": {"nombre": "LOPEZ", "categoria": "ABARROTES"}})
+    assert m.match("Agencia TOYOTA del centro") is None
+    assert m.match("Comercial Toyo SA")["nombre"] == "TOYO"
+    assert m.match("PANADERÍA   López")["nombre"] == "LOPEZ"
+
+
+def test_mapa_fijo_conserva_resultados():
+    assert detect_proveedor("ALIMENTOS Y CARNES VACA NEGRA SA")["nombre"] == "VACA NEGRA"
+    assert detect_proveedor("Factura KUME IMPORTACIONES")["metodo"] == "TRANSFERENCIA"
+    assert detect_proveedor("sin proveedor conocido") is None
+
+
+def test_rfc_tiene_prioridad_sobre_mapa_fijo():
+    db = TestingSessionLocal()
+    m = get_matcher(db, REST_ID, PROVEEDOR_MAP)
+    db.close()
+    hit = m.match("KUME ... RFC emisor: PGO010101AB1")
+    assert hit["nombre"] == "Pescados del Golfo"
+    assert hit["via"] == "rfc"
+    assert m.match("COMERCIAL TOYO")["proveedor_id"] is not None
+
+
+def test_alias_nuevo_invalida_cache():
+    db = TestingSessionLocal()
+    antes = get_matcher(db, REST_ID)
+    assert antes.match("MARISCOS EL GUERO") is None
+    prov = db.query(Proveedor).filter(Proveedor.nombre == "Pescados del Golfo").first()
+    proveedor_matcher.registrar_alias(db, prov, "Mariscos el Güero")
+    db.commit()
+    despues = get_matcher(db, REST_ID)
+    db.close()
+    assert despues is not antes
+    assert despues.match("MARISCOS EL GUERO")["nombre"] == "Pescados del Golfo"
+    assert despues.fingerprint != antes.fingerprint
+
+
+def test_aprender_rfc_desde_factura():
+    db = TestingSessionLocal()
+    proveedor_matcher.aprender_rfc(db, REST_ID, "TOYO", "cto990101xx1")
+    db.commit()
+    toyo = db.query(Proveedor).filter(Proveedor.nombre == "Toyo").first()
+    assert toyo.rfc == "CTO990101XX1"
+    proveedor_matcher.aprender_rfc(db, REST_ID, "Toyo", "CTO000000ZZ9")
+    db.commit()
+    aliases = db.query(ProveedorAlias).filter(ProveedorAlias.proveedor_id == toyo.id).all()
+    db.close()
+    assert [(a.alias, a.tipo, a.origen) for a in aliases] == [("CTO000000ZZ9", "RFC", "APRENDIDO")]
@@ -0,0 +1,133 @@
+"""
+Tests de proveedores analytics con proveedor_key (agregación en SQL)
+"""
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_proveedores_analytics.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+HOY = date.today()
+INICIO_MES = HOY.replace(day=1)
+MES_ANTERIOR = (INICIO_MES - timedelta(days=1)).replace(day=1)
+REST_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _gasto(fecha, proveedor, monto, categoria="PROTEINA"):
+    return models.Gasto(fecha=fecha, proveedor=proveedor, categoria=categoria, monto=monto,
+                        metodo_pago=models.MetodoPago.TRANSFERENCIA, restaurante_id=REST_ID,
+                        descripcion=f"{proveedor} {monto}")
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Proveedores", slug="proveedores-analytics", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    db.add_all([
+        _gasto(INICIO_MES, "Toyo Foods", 300.0),
+        _gasto(INICIO_MES, "  toyo   foods ", 200.0),
+        _gasto(INICIO_MES, "Gas Nieto", 50.0, "GAS"),
+        _gasto(MES_ANTERIOR, "TOYO FOODS", 400.0),
+        _gasto(MES_ANTERIOR, "", 999.0),
+    ])
+    cierre = models.CierreTurno(fecha=INICIO_MES, responsable="Ana", elaborado_por="Luis", saldo_inicial=0.0,
+                                restaurante_id=REST_ID)
+    db.add(cierre)
+    db.flush()
+    db.add(models.GastoDiario(cierre_id=cierre.id, proveedor="Toyo foods", categoria="ABARROTES",
+                              comprobante=models.TipoComprobante.TICKET, descripcion="caja", monto=100.0,
+                              restaurante_id=REST_ID))
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def test_clave_se_mantiene_al_escribir():
+    db = TestingSessionLocal()
+    try:
+        g = _gasto(HOY, " Pollos  del Valle", 1.0)
+        db.add(g)
+        db.flush()
+        assert g.proveedor_key == "POLLOS DEL VALLE"
+        g.proveedor = "Carnes Ávila"
+        db.flush()
+        assert db.execute(text("SELECT proveedor_key FROM gastos WHERE id = :id"), {"id": g.id}).scalar() == "CARNES ÁVILA"
+        # INSERT por Core (importadores, scripts): la clave sale del default de la columna
+        db.execute(insert(models.Gasto), [{"fecha": HOY, "proveedor": "core sa", "categoria": "GAS", "monto": 1.0,
+                                           "metodo_pago": models.MetodoPago.EFECTIVO, "restaurante_id": REST_ID}])
+        assert db.query(models.Gasto.proveedor_key).filter(models.Gasto.proveedor == "core sa").scalar() == "CORE SA"
+        db.rollback()
+    finally:
+        db.close()
+
+
+def test_alertas_y_estadisticas_agrupadas_en_sql():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:
+            sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        stats = client.get(f"/api/proveedores-stats/{REST_ID}/estadisticas").json()
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert len(sentencias) == 3  # proveedores activos + totales de cada mes
+    assert stats["top_proveedor"] == {"nombre": "TOYO FOODS", "total": 600.0}
+    assert stats["mayor_incremento"]["variacion_pct"] == 50.0
+
+    alertas = {a["proveedor"]: a for a in client.get(f"/api/proveedores-stats/{REST_ID}/alertas").json()}
+    assert set(alertas) == {"TOYO FOODS", "GAS NIETO"}
+    toyo = alertas["TOYO FOODS"]
+    assert (toyo["mes_actual"], toyo["mes_anterior"], toyo["transacciones_mes"]) == (600.0, 400.0, 3)
+    assert toyo["categoria"] == "PROTEINA" and toyo["alerta"] is True
+
+
+def test_historial_y_comparativo():
+    data = client.get(f"/api/proveedores-stats/{REST_ID}/historial/toyo%20foods?meses=3").json()
+    assert data["total_mes_actual"] == 600.0 and data["total_mes_anterior"] == 400.0
+    assert len(data["transacciones"]) == 4 and data["transacciones"][0]["fecha"] >= data["transacciones"][-1]["fecha"]
+    assert [t["total"] for t in data["tendencia"]][-2:] == [400.0, 600.0]
+
+    comparativo = {c["categoria"]: c for c in client.get(f"/api/proveedores-stats/{REST_ID}/comparativo").json()}
+    assert comparativo["PROTEINA"]["proveedores"] == [{"nombre": "TOYO FOODS", "total": 600.0, "pct": 100.0}]
+    assert comparativo["GAS"]["total_categoria"] == 50.0
+
+    with engine_test.connect() as conn:
+        plan = " ".join(str(f) for f in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT monto FROM gastos WHERE restaurante_id = 1 AND proveedor_key = 'X' AND fecha >= '2026-01-01'"
+        )))
+    assert "ix_gastos_restaurante_proveedor_key_fecha" in plan
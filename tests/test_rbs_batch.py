@@ -0,0 +1,131 @@
+"""
+Tests de ingesta de facturas por lote (RBS)
+"""
+import io
+import zipfile
+from datetime import date
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import invoice_batch
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_rbs_batch.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+REST_ID = None
+
+# Resultados simulados del parser por nombre de archivo
+PARSEOS = {
+    "toyo.pdf": {"tipo_parser": "cfdi", "proveedor": "TOYO", "total": 1160.0, "fecha": "2026-03-02",
+                 "folio_fiscal": "aaaa-1111", "items": [{"descripcion": "NORI"}], "categoria_sugerida": "PRODUCTOS ASIATICOS"},
+    "toyo_copia.pdf": {"tipo_parser": "cfdi", "proveedor": "TOYO", "total": 1160.0, "fecha": "2026-03-02",
+                       "folio_fiscal": "AAAA-1111", "items": []},
+    "vaca.pdf": {"tipo_parser": "cfdi", "proveedor": "VACA NEGRA", "total": 5000.0, "fecha": "2026-03-03",
+                 "folio_fiscal": "bbbb-2222", "items": []},
+    "existente.pdf": {"tipo_parser": "cfdi", "proveedor": "KUME", "total": 800.0, "fecha": "2026-03-01",
+                      "folio_fiscal": "cccc-3333", "items": []},
+    "spei.pdf": {"tipo_parser": "comprobante_pago", "monto": 1160.0},
+    "escaneado.jpg": {"tipo_parser": "vision", "error": "ANTHROPIC_API_KEY no configurada"},
+}
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Batch Test", slug="batch-test", plan="basico")
+    db.add(r)
+    db.flush()
+    REST_ID = r.id
+    db.add(models.GastoTransferencia(
+        restaurante_id=REST_ID, proveedor="KUME", categoria="OTROS", monto=800.0,
+        fecha_factura=date(2026, 3, 1), folio_fiscal="CCCC-3333",
+    ))
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+@pytest.fixture(autouse=True)
+def parser_falso(monkeypatch):
+    async def _fake(nombre, contenido):
+        return dict(PARSEOS[nombre])
+    monkeypatch.setattr(invoice_batch, "_parsear_archivo", _fake)
+
+
+client = TestClient(app)
+
+
+def _zip(nombres):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for n in nombres:
+            zf.writestr(n, b"%PDF-1.4 fake")
+    return buf.getvalue()
+
+
+def test_lote_dedup_y_reporte_por_archivo():
+    files = [
+        ("files", ("toyo.pdf", b"%PDF a", "application/pdf")),
+        ("files", ("lote.zip", _zip(["toyo_copia.pdf", "vaca.pdf", "notas.txt"]), "application/zip")),
+        ("files", ("existente.pdf", b"%PDF c", "application/pdf")),
+        ("files", ("spei.pdf", b"%PDF d", "application/pdf")),
+        ("files", ("escaneado.jpg", b"\xff\xd8", "image/jpeg")),
+    ]
+    resp = client.post(f"/api/rbs/batch-ingest?restaurante_id={REST_ID}&esperar=true", files=files)
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["estado"] == "COMPLETADO"
+    por_archivo = {a["archivo"]: a["status"] for a in job["archivos"]}
+    assert por_archivo == {
+        "notas.txt": "rechazado",
+        "toyo.pdf": "creado",
+        "toyo_copia.pdf": "duplicado",
+        "vaca.pdf": "creado",
+        "existente.pdf": "duplicado",
+        "spei.pdf": "error",
+        "escaneado.jpg": "error",
+    }
+    assert job["creados"] == 2 and job["duplicados"] == 2 and job["errores"] == 3
+    assert job["progreso"] == 1.0
+
+    db = TestingSessionLocal()
+    filas = db.query(models.GastoTransferencia).filter(models.GastoTransferencia.restaurante_id == REST_ID).all()
+    db.close()
+    assert sorted(f.proveedor for f in filas) == ["KUME", "TOYO", "VACA NEGRA"]
+
+
+def test_lote_en_background_consultable():
+    resp = client.post(f"/api/rbs/batch-ingest?restaurante_id={REST_ID}",
+                       files=[("files", ("vaca.pdf", b"%PDF b", "application/pdf"))])
+    job_id = resp.json()["job_id"]
+    estado = client.get(f"/api/rbs/batch-ingest/{job_id}").json()
+    assert estado["estado"] == "COMPLETADO"
+    assert estado["archivos"][0]["status"] == "duplicado"
+
+
+def test_job_inexistente_404():
+    assert client.get("/api/rbs/batch-ingest/noexiste").status_code == 404
@@ -0,0 +1,117 @@
+"""
+Tests de recategorización por conjuntos (/api/gastos/recategorizar)
+"""
+import random
+import time
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.routers.gastos_categorizacion_router import _resolver_cuenta_id
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_recategorizar.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+CATEGORIAS = ["ABARROTES", "PROTEINA", "BEBIDAS", "RENTA", "LUZ", "GAS", "LIMPIEZA", "Vegetales Frutas",
+              "PUBLICIDAD", "NOMINA", "texto raro", None]
+N_GASTOS = 100_000
+REST_ID = None
+OTRO_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Recat Test", slug="recat-test", plan="basico")
+    otro = models.Restaurante(nombre="Recat Otro", slug="recat-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    for rid in (REST_ID, OTRO_ID):
+        db.add_all([
+            models.CatalogoCuenta(restaurante_id=rid, codigo=c, nombre=c, tipo="GASTO", categoria_pl=c)
+            for c in ("5001", "5002", "6001", "6002", "6003", "6005", "6007", "6008")
+        ])
+    cierre = models.CierreTurno(fecha=date(2026, 3, 1), responsable="x", elaborado_por="x", saldo_inicial=0,
+                                restaurante_id=REST_ID)
+    db.add(cierre)
+    db.commit()
+    rnd = random.Random(11)
+    ahora = datetime.utcnow()
+    filas = [{"fecha": date(2026, 1, 1), "proveedor": "P", "categoria": rnd.choice(CATEGORIAS) or "", "monto": 1.0,
+              "metodo_pago": models.MetodoPago.TRANSFERENCIA, "restaurante_id": REST_ID, "created_at": ahora,
+              "catalogo_cuenta_id": None}
+             for _ in range(N_GASTOS)]
+    db.execute(insert(models.Gasto), filas)
+    db.execute(insert(models.Gasto), [{**filas[0], "restaurante_id": OTRO_ID}])
+    db.execute(insert(models.GastoDiario), [
+        {"cierre_id": cierre.id, "proveedor": "P", "categoria": c or "OTROS", "comprobante": "TICKET",
+         "descripcion": "d", "monto": 1.0, "created_at": ahora, "clase": "NMP"}
+        for c in CATEGORIAS
+    ])
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def test_recategorizar_100k_con_consultas_constantes():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        inicio = time.monotonic()
+        data = client.post(f"/api/gastos/recategorizar/{REST_ID}").json()
+        duracion = time.monotonic() - inicio
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+
+    assert duracion < 10
+    assert len(sentencias) < 30
+    assert data["total_gastos_procesados"] == N_GASTOS
+    assert data["gastos_actualizados"] == N_GASTOS
+    assert data["total_gd_procesados"] == len(CATEGORIAS)
+    assert sum(data["desglose_por_categoria"].values()) == N_GASTOS
+
+    # Cada gasto quedó con la misma cuenta que resolvería la versión por fila
+    db = TestingSessionLocal()
+    esperado = {c: _resolver_cuenta_id(db, REST_ID, c) for c in {c or "" for c in CATEGORIAS}}
+    pares = db.query(models.Gasto.categoria, models.Gasto.catalogo_cuenta_id).filter(
+        models.Gasto.restaurante_id == REST_ID).distinct().all()
+    assert {cat: cid for cat, cid in pares} == esperado
+    otro = db.query(models.Gasto).filter(models.Gasto.restaurante_id == OTRO_ID).one()
+    assert otro.catalogo_cuenta_id is None
+    db.close()
+
+    # Idempotente: segunda pasada no cambia nada
+    data2 = client.post(f"/api/gastos/recategorizar/{REST_ID}").json()
+    assert data2["gastos_actualizados"] == 0 and data2["gastos_diarios_actualizados"] == 0
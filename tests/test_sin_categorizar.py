@@ -0,0 +1,202 @@
+"""
+Tests de la cola de categorización (/api/gastos/sin-categorizar) con cursor
+"""
+import random
+from datetime import date, datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.orm import sessionmaker
+from backend_python.models import Base
+from backend_python.main import app
+from backend_python.database import get_db
+from backend_python import models
+from backend_python.services import data_versions, sugerencias_cuenta
+from backend_python.services.pl_service import _map_categoria_texto
+
+SQLALCHEMY_TEST_URL = "sqlite:///./test_sin_categorizar.db"
+engine_test = create_engine(SQLALCHEMY_TEST_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+
+CATEGORIAS = ["ABARROTES", "Proteina", "bebidas alcoholicas", "RENTA", "Gas", "texto raro", "LIMPIEZA"]
+N_GASTOS = 3000
+N_DIAS = 60
+REST_ID = None
+OTRO_ID = None
+
+
+def override_get_db():
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True, scope="module")
+def setup_db():
+    global REST_ID, OTRO_ID
+    Base.metadata.create_all(bind=engine_test)
+    previo = app.dependency_overrides.get(get_db)
+    app.dependency_overrides[get_db] = override_get_db
+    sugerencias_cuenta.invalidate()
+    db = TestingSessionLocal()
+    r = models.Restaurante(nombre="Cola Test", slug="cola-test", plan="basico")
+    otro = models.Restaurante(nombre="Cola Otro", slug="cola-otro", plan="basico")
+    db.add_all([r, otro])
+    db.flush()
+    REST_ID, OTRO_ID = r.id, otro.id
+    db.add_all([
+        models.CatalogoCuenta(restaurante_id=REST_ID, codigo=codigo, nombre=nombre, tipo="GASTO", categoria_pl=pl)
+        for codigo, nombre, pl in [
+            ("5001", "Abarrotes", "costo_alimentos"), ("5002", "Bebidas", "costo_bebidas"),
+            ("6001", "Renta", "renta"), ("6003", "Servicios", "servicios"), ("6008", "Otros gastos", "otros_gastos"),
+        ]
+    ])
+    db.flush()
+    cuentas = [c.id for c in db.query(models.CatalogoCuenta).all()]
+    inicio = date(2026, 1, 1)
+    cierres = [models.CierreTurno(fecha=inicio + timedelta(days=d), responsable="x", elaborado_por="x",
+                                  saldo_inicial=0, restaurante_id=REST_ID) for d in range(N_DIAS)]
+    db.add_all(cierres)
+    db.commit()
+    rnd = random.Random(7)
+    ahora = datetime.utcnow()
+    # Muchos gastos por día: empates de fecha entre y dentro de tablas
+    db.execute(insert(models.Gasto), [
+        {"fecha": inicio + timedelta(days=rnd.randrange(N_DIAS)), "proveedor": "P", "categoria": rnd.choice(CATEGORIAS),
+         "monto": 10.0, "metodo_pago": models.MetodoPago.TRANSFERENCIA, "restaurante_id": REST_ID,
+         "created_at": ahora, "catalogo_cuenta_id": rnd.choice(cuentas + [None, None])}
+        for _ in range(N_GASTOS)
+    ])
+    db.execute(insert(models.GastoDiario), [
+        {"cierre_id": rnd.choice(cierres).id, "proveedor": "P", "categoria": rnd.choice(CATEGORIAS),
+         "comprobante": "TICKET", "descripcion": "d", "monto": 5.0, "created_at": ahora, "clase": "NMP",
+         "catalogo_cuenta_id": rnd.choice(cuentas + [None])}
+        for _ in range(500)
+    ])
+    db.execute(insert(models.Gasto), [
+        {"fecha": inicio, "proveedor": "AJENO", "categoria": "RENTA", "monto": 1.0,
+         "metodo_pago": models.MetodoPago.EFECTIVO, "restaurante_id": OTRO_ID, "created_at": ahora}
+    ])
+    db.commit()
+    db.close()
+    yield
+    if previo:
+        app.dependency_overrides[get_db] = previo
+    else:
+        app.dependency_overrides.pop(get_db, None)
+    Base.metadata.drop_all(bind=engine_test)
+
+
+client = TestClient(app)
+
+
+def _sugerir_referencia(cuentas, categoria_texto, cuenta_actual_id):
+    """Versión previa por fila: recorre el catálogo en cada llamada."""
+    if not categoria_texto:
+        return None
+    txt_lower = categoria_texto.lower().strip()
+    for c in cuentas:
+        if c.nombre.lower().strip() == txt_lower:
+            return {"catalogo_cuenta_id": c.id, "nombre": c.nombre, "confianza": "alta"}
+    for c in cuentas:
+        if txt_lower in c.nombre.lower() or c.nombre.lower() in txt_lower:
+            return {"catalogo_cuenta_id": c.id, "nombre": c.nombre, "confianza": "media"}
+    cat_pl = _map_categoria_texto(categoria_texto)
+    for c in cuentas:
+        if c.categoria_pl == cat_pl:
+            return {"catalogo_cuenta_id": c.id, "nombre": c.nombre,
+                    "confianza": "alta" if c.id == cuenta_actual_id else "baja"}
+    return None
+
+
+def _url(**params):
+    qs = "&".join(f"{k}={v}" for k, v in params.items())
+    return f"/api/gastos/sin-categorizar/{REST_ID}?incluir_todos=true&{qs}"
+
+
+def test_cursor_recorre_todo_sin_repetir_y_en_orden():
+    vistos, cursor, paginas = [], None, 0
+    while True:
+        data = client.get(_url(limit=250, **({"cursor": cursor} if cursor else {}))).json()
+        vistos.extend((i["fecha"], i["tabla"], i["id"]) for i in data["items"])
+        paginas += 1
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert len(vistos) == N_GASTOS + 500 == len(set(vistos))
+    assert vistos == sorted(vistos, key=lambda k: (-date.fromisoformat(k[0]).toordinal(), k[1], -k[2]))
+    assert paginas == (N_GASTOS + 500 + 249) // 250
+
+    # page=N devuelve las mismas filas que el cursor
+    pagina3 = client.get(_url(limit=250, page=3)).json()["items"]
+    assert [(i["fecha"], i["tabla"], i["id"]) for i in pagina3] == vistos[500:750]
+
+
+def test_conteos_y_sugerencias_iguales_a_la_version_por_fila():
+    sentencias = []
+
+    def contar(conn, cursor, statement, params, context, executemany):
+        if "data_versions" not in statement:  # versión del catálogo para el índice
+            sentencias.append(statement)
+
+    client.get(_url(limit=50))  # calienta el índice del catálogo
+    event.listen(engine_test, "before_cursor_execute", contar)
+    try:
+        data = client.get(_url(limit=500)).json()
+    finally:
+        event.remove(engine_test, "before_cursor_execute", contar)
+    assert len(sentencias) == 2  # conteos agrupados + página
+
+    db = TestingSessionLocal()
+    G, GD = models.Gasto, models.GastoDiario
+    assert data["total_gastos"] == N_GASTOS and data["total_gastos_diarios"] == 500
+    assert data["total"] == N_GASTOS + 500
+    assert data["total_sin_catalogo"] == (
+        db.query(G).filter(G.restaurante_id == REST_ID, G.catalogo_cuenta_id == None).count()
+        + db.query(GD).filter(GD.catalogo_cuenta_id == None).count()
+    )
+    cuentas = db.query(models.CatalogoCuenta).filter(models.CatalogoCuenta.restaurante_id == REST_ID).all()
+    for i in data["items"]:
+        assert i["sugerencia"] == _sugerir_referencia(cuentas, i["categoria_texto"], i["catalogo_cuenta_id"])
+    db.close()
+
+
+def test_indice_se_invalida_al_cambiar_el_catalogo():
+    def sugerencia_gas():
+        items = client.get(f"/api/gastos/sin-categorizar/{REST_ID}").json()["items"]
+        return next(i["sugerencia"] for i in items if i["categoria_texto"] == "Gas")
+
+    assert sugerencia_gas()["nombre"] == "Otros gastos"  # "gas" contenido en "otros gastos"
+    db = TestingSessionLocal()
+    db.add(models.CatalogoCuenta(restaurante_id=REST_ID, codigo="6004", nombre="Gas",
+                                 tipo="GASTO", categoria_pl="servicios"))
+    db.commit()
+    db.close()
+    nueva = sugerencia_gas()
+    assert nueva["nombre"] == "Gas" and nueva["confianza"] == "alta"
+
+    # Escritura desde otro proceso (sin eventos del ORM aquí): basta con la versión del catálogo
+    with engine_test.begin() as conn:
+        conn.execute(text("UPDATE catalogo_cuentas SET activo = 0 WHERE restaurante_id = :r AND codigo = '6004'"),
+                     {"r": REST_ID})
+        data_versions.bump_conexion(conn, [(REST_ID, "catalogo")])
+    assert sugerencia_gas()["nombre"] == "Otros gastos"
+
+
+def test_memo_de_textos_acotado():
+    db = TestingSessionLocal()
+    try:
+        indice = sugerencias_cuenta.get_indice(db, REST_ID)
+    finally:
+        db.close()
+    for i in range(sugerencias_cuenta.MEMO_MAX_TEXTOS + 50):
+        indice.sugerir(f"texto {i}")
+    assert indice._memo.cache_info().currsize == sugerencias_cuenta.MEMO_MAX_TEXTOS
+
+
+def test_cursor_invalido():
+    resp = client.get(_url(cursor="no-es-un-cursor"))
+    assert resp.status_code == 400
@@ -0,0 +1,174 @@
+"""
+Tests del cliente de vision (backend stub, sin red)
+"""
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from PIL import Image
+from backend_python.services import parse_executor, vision_client
+from backend_python.services.parse_cache import ParseCache
+from backend_python.services.pdf_parser import InvoiceParser, parse_image_file
+from backend_python.services.vision_client import AnthropicVisionBackend, StubVisionBackend, VisionClient
+from tests.test_pdf_document import make_pdf
+
+
+@pytest.fixture(autouse=True)
+def cache_aislado(monkeypatch, tmp_path):
+    monkeypatch.setattr(vision_client, "parse_cache", ParseCache(directory=str(tmp_path)))
+    previo = vision_client._client
+    vision_client.set_backend(StubVisionBackend())
+    yield
+    vision_client._client = previo
+
+
+def _imagen(color, size=(64, 48)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+class _BackendContador(StubVisionBackend):
+    """Stub lento que registra cuántas llamadas corren al mismo tiempo."""
+
+    def __init__(self, latency):
+        super().__init__(latency)
+        self._lock = threading.Lock()
+        self.activas = 0
+        self.max_activas = 0
+
+    def extract(self, image_bytes, media_type, prompt, mode, deadline=None):
+        with self._lock:
+            self.activas += 1
+            self.max_activas = max(self.max_activas, self.activas)
+        try:
+            return super().extract(image_bytes, media_type, prompt, mode, deadline)
+        finally:
+            with self._lock:
+                self.activas -= 1
+
+
+def test_stub_determinista_y_cache_por_imagen():
+    client = vision_client.get_client()
+    img = _imagen("red")
+    a = client.extract(img, "image/png", "prompt")
+    b = client.extract(img, "image/png", "prompt")
+    assert a == b and a["total"] > 0
+    assert client.extract(_imagen("blue"), "image/png", "prompt")["folio"] != a["folio"]
+    assert client.stats()["llamadas"] == 2
+    assert client.stats()["cache_hits"] == 1
+
+
+def test_concurrencia_limitada():
+    backend = _BackendContador(latency=0.05)
+    client = VisionClient(backend=backend)
+    hilos = [threading.Thread(target=client.extract, args=(_imagen((i, 0, 0)), "image/png", "p"))
+             for i in range(8)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert client.stats()["llamadas"] == 8
+    assert backend.max_activas <= vision_client.MAX_CONCURRENCY
+
+
+def test_rechaza_cuando_la_cola_esta_llena():
+    client = VisionClient(backend=StubVisionBackend(latency=0.3), queue_timeout=0.02)
+    resultados = []
+    hilos = [threading.Thread(target=lambda i=i: resultados.append(
+                 client.extract(_imagen((0, i, 0)), "image/png", "p")))
+             for i in range(vision_client.MAX_CONCURRENCY + 2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    assert client.stats()["rechazadas"] >= 1
+    assert any("saturado" in (r.get("error") or "") for r in resultados)
+
+
+def test_reduce_imagenes_grandes():
+    grande = _imagen("white", size=(4000, 3000))
+    datos, media = vision_client.downscale(grande, "image/png", max_edge=1000)
+    assert media == "image/jpeg"
+    assert max(Image.open(io.BytesIO(datos)).size) == 1000
+    chica = _imagen("white")
+    assert vision_client.downscale(chica, "image/png") == (chica, "image/png")
+
+
+def test_imagen_y_pdf_escaneado_usan_el_cliente():
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
+        tmp.write(_imagen("green"))
+    try:
+        r = parse_image_file(tmp.name, "image/png")
+    finally:
+        os.unlink(tmp.name)
+    assert r["tipo_parser"] == "vision"
+    assert r["categoria_sugerida"]
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(make_pdf(["ESCANEADO"]))
+    try:
+        raw = InvoiceParser()._parse_with_vision(tmp.name)
+    finally:
+        os.unlink(tmp.name)
+    assert raw.get("folio", "").startswith("STUB-")
+
+
+def _intentar_turno(_):
+    semaforo = vision_client.slots()
+    if semaforo.acquire(timeout=0.05):
+        semaforo.release()
+        return True
+    return False
+
+
+def test_semaforo_compartido_con_workers_spawn():
+    ctx = multiprocessing.get_context("spawn")
+    semaforo = ctx.BoundedSemaphore(1)
+    with ProcessPoolExecutor(1, mp_context=ctx, initializer=vision_client.init_worker,
+                             initargs=(semaforo,)) as pool:
+        assert pool.submit(_intentar_turno, 0).result() is True
+        semaforo.acquire()
+        try:
+            assert pool.submit(_intentar_turno, 0).result() is False
+        finally:
+            semaforo.release()
+
+
+def test_espera_de_turno_acotada_por_el_plazo_del_trabajo():
+    client = VisionClient(backend=StubVisionBackend(), queue_timeout=60)
+    semaforo = vision_client.slots()
+    tomados = [semaforo.acquire(timeout=1) for _ in range(vision_client.MAX_CONCURRENCY)]
+    try:
+        t0 = time.perf_counter()
+        r = parse_executor._con_plazo(time.time() + vision_client.MIN_CALL_SECONDS + 0.2,
+                                      client.extract, _imagen("gray"), "image/png", "p")
+        assert "saturado" in r["error"] and time.perf_counter() - t0 < 2
+    finally:
+        for ok in tomados:
+            if ok:
+                semaforo.release()
+
+
+def test_reintentos_acotados_por_el_plazo(monkeypatch):
+    timeouts = []
+
+    class _Respuesta:
+        status_code = 503
+
+    def _post(*args, timeout, **kwargs):
+        timeouts.append(timeout)
+        return _Respuesta()
+
+    monkeypatch.setattr(vision_client.httpx, "post", _post)
+    backend = AnthropicVisionBackend(api_key="x")
+    t0 = time.perf_counter()
+    r = backend.extract(b"img", "image/png", "p", "factura", deadline=time.time() + 3.0)
+    assert r["error"].endswith("HTTP 503") and time.perf_counter() - t0 < 3
+    assert timeouts and all(t <= 3.0 for t in timeouts)
+    assert backend.extract(b"img", "image/png", "p", "factura", deadline=time.time() + 1.0)["error"].endswith("sin tiempo para llamar")
@@ -1,12 +1,47 @@
 import tailwindcss from '@tailwindcss/vite';
 import react from '@vitejs/plugin-react';
+import fs from 'fs';
 import path from 'path';
-import {defineConfig, loadEnv} from 'vite';
+import zlib from 'zlib';
+import {defineConfig, loadEnv, type Plugin} from 'vite';
+
+// Escribe <archivo>.br y <archivo>.gz junto a cada asset de texto del build.
+// El backend (core/compresion.py) los sirve según Accept-Encoding sin comprimir
+// en cada request. Usa zlib de Node: no requiere dependencias extra.
+function precomprimir(minBytes = 1024): Plugin {
+  const comprimibles = /\.(js|mjs|css|html|svg|json|txt|map|webmanifest)$/;
+  let outDir = 'dist';
+  const recorrer = (dir: string): string[] =>
+    fs.readdirSync(dir, {withFileTypes: true}).flatMap((e) =>
+      e.isDirectory() ? recorrer(path.join(dir, e.name)) : [path.join(dir, e.name)],
+    );
+  return {
+    name: 'koi-precomprimir',
+    apply: 'build',
+    configResolved(config) {
+      outDir = path.resolve(config.root, config.build.outDir);
+    },
+    closeBundle() {
+      for (const archivo of recorrer(outDir)) {
+        if (!comprimibles.test(archivo)) continue;
+        const datos = fs.readFileSync(archivo);
+        if (datos.length < minBytes) continue;
+        fs.writeFileSync(`${archivo}.br`, zlib.brotliCompressSync(datos, {
+          params: {
+            [zlib.constants.BROTLI_PARAM_QUALITY]: zlib.constants.BROTLI_MAX_QUALITY,
+            [zlib.constants.BROTLI_PARAM_SIZE_HINT]: datos.length,
+          },
+        }));
+        fs.writeFileSync(`${archivo}.gz`, zlib.gzipSync(datos, {level: zlib.constants.Z_BEST_COMPRESSION}));
+      }
+    },
+  };
+}
 
 export default defineConfig(({mode}) => {
   const env = loadEnv(mode, '.', '');
   return {
-    plugins: [react(), tailwindcss()],
+    plugins: [react(), tailwindcss(), precomprimir()],
     define: {
       'process.env.GEMINI_API_KEY': JSON.stringify(env.GEMINI_API_KEY),
     },